@@ -1,11 +1,39 @@
 from django.contrib import admin
 
-from .models import UserType, CustomUser, Author, Book, Library, Entry
+from . import sharding
+from .models import (
+    UserType,
+    CustomUser,
+    Author,
+    Book,
+    Library,
+    Entry,
+    PendingEntry,
+    LibraryBookDailyUsage,
+    UserDailyUsage,
+    Change,
+    ChangeLogTruncation,
+)
 
 admin.site.register(UserType)
 admin.site.register(CustomUser)
 admin.site.register(Author)
 admin.site.register(Book)
 admin.site.register(Library)
-admin.site.register(Entry)
+admin.site.register(PendingEntry)
+admin.site.register(LibraryBookDailyUsage)
+admin.site.register(UserDailyUsage)
+admin.site.register(Change)
+admin.site.register(ChangeLogTruncation)
 
+
+@admin.register(Entry)
+class EntryAdmin(admin.ModelAdmin):
+    def get_object(self, request, object_id, from_field=None):
+        # With sharding, the change and delete pages find the entry on its shard
+        if not sharding.enabled() or from_field is not None:
+            return super().get_object(request, object_id, from_field)
+        try:
+            return sharding.find_entry(int(object_id), self.get_queryset(request))
+        except ValueError:
+            return None
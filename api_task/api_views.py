@@ -1,6 +1,30 @@
-from rest_framework import generics
-from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from operator import attrgetter
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.views import View
+from rest_framework import exceptions, generics, status
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .authentication import SignedTokenAuthentication
+from .batch import run_batch
+from . import changes
+from . import export
+from .events import broadcaster
+from .ingestion import buffer_status, enqueue_entries, is_saturated
 from .models import UserType, CustomUser, Author, Book, Library, Entry
+from .negotiation import IgnoreAcceptNegotiation
+from .pagination import KeysetPagination
+from .parsers import CSVParser, NDJSONParser
+from .provisioning import provision_users
+from . import rollups
+from . import sharding
+from .tokens import issue_token, revoke_token
 from .serializers import (
     UserTypeSerializer,
     CustomUserSerializer,
@@ -8,9 +32,45 @@ from .serializers import (
     BookSerializer,
     LibrarySerializer,
     EntrySerializer,
+    EntryFeedSerializer,
+    EntryIngestSerializer,
+    TokenObtainSerializer,
+    UsageQuerySerializer,
+    ChangesQuerySerializer,
+    EntryStreamQuerySerializer,
+    BatchSerializer,
+    CatalogExportQuerySerializer,
 )
 
 
+class HealthView(APIView):
+    """
+    API view reporting that the service is up.
+
+    Does no authentication and no database access, which makes it suitable
+    for load balancer health checks and for measuring the per-request
+    overhead of the API stack.
+
+    Inherits from:
+    `APIView` - Django Rest Framework base view class.
+
+    Example:
+    ```
+    GET /api/health/
+
+    # Response:
+    {
+        "status": "ok"
+    }
+    ```
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        return Response({"status": "ok"})
+
+
 class UserTypeListCreateView(generics.ListCreateAPIView):
     """
     API view for listing and creating UserTypes.
@@ -78,6 +138,65 @@ class CustomUserListView(generics.ListAPIView):
     permission_classes = [IsAdminUser]
 
 
+class UserBulkCreateView(APIView):
+    """
+    API view for provisioning CustomUser instances in bulk with admin access.
+
+    Accepts a CSV body (`text/csv`, with a header row), an NDJSON body
+    (`application/x-ndjson`) or a JSON list of objects. Each row may contain
+    `username`, `email`, `password`, `first_name`, `last_name` and `type`
+    (the name of an existing UserType, 'user' when omitted).
+
+    Passwords are hashed in parallel across a process pool and the users are
+    inserted with `bulk_create`. Invalid rows are skipped and reported.
+
+    Inherits from:
+    `APIView` - Django Rest Framework base view class.
+
+    Attributes:
+    - `parser_classes`: CSV, NDJSON and JSON parsers.
+    - `permission_classes`: A list of permission classes, in this case, limiting access
+      to users with admin privileges (IsAdminUser).
+
+    Example:
+    ```
+    # To create users from a CSV file (requires admin access):
+    POST /api/users/bulk/
+    Content-Type: text/csv
+
+    username,email,password
+    john_doe,john.doe@example.com,s3cret-Passw0rd
+
+    # Response:
+    {
+        "created": 1,
+        "errors": [],
+        "elapsed": 0.412,
+        "users_per_second": 2.4
+    }
+    ```
+
+    The response status is 201 unless every row was rejected, in which case
+    it is 400.
+    """
+    parser_classes = [CSVParser, NDJSONParser, JSONParser]
+    permission_classes = [IsAdminUser]
+
+    def post(self, request, *args, **kwargs):
+        rows = request.data
+        if not isinstance(rows, list):
+            return Response(
+                {"detail": "Expected a list of user rows."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        result = provision_users(rows)
+        response_status = status.HTTP_201_CREATED
+        if result.errors and not result.created:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response(result.as_dict(), status=response_status)
+
+
 class AuthorListView(generics.ListAPIView):
     """
     API view for listing Author instances.
@@ -149,6 +268,12 @@ class LibraryListView(generics.ListAPIView):
     queryset = Library.objects.all()
     serializer_class = LibrarySerializer
 
+    def get_queryset(self):
+        # With sharding, each library and its books are read from its shard
+        if sharding.enabled():
+            return sharding.fan_out(self.queryset.order_by("pk"), key=attrgetter("pk"))
+        return super().get_queryset()
+
 
 class EntryCreateView(generics.CreateAPIView):
     """
@@ -178,6 +303,28 @@ class EntryCreateView(generics.CreateAPIView):
     }
     ```
 
+    Buffered mode:
+    Requests sending `Prefer: respond-async` are only validated for shape,
+    appended to the PendingEntry buffer and answered with 202; the body may
+    also be a list of up to `ENTRY_INGEST_MAX_BATCH` entries. The
+    `flush_entries` command inserts buffered entries in batches. While the
+    buffer holds more than `ENTRY_BUFFER_MAX_PENDING` rows, buffered requests
+    get 503 with a `Retry-After` header.
+
+    ```
+    POST /api/entries/create/
+    Prefer: respond-async
+    [
+        {"user": 1, "library": 1, "book": 2},
+        {"user": 2, "library": 1, "book": 3}
+    ]
+
+    # Response (202):
+    {
+        "accepted": 2
+    }
+    ```
+
     Note: Make sure to authenticate users and handle other permissions as needed
     based on your project requirements.
     """
@@ -185,6 +332,73 @@ class EntryCreateView(generics.CreateAPIView):
     serializer_class = EntrySerializer
     permission_classes = [IsAdminUser]
 
+    def create(self, request, *args, **kwargs):
+        if "respond-async" in request.headers.get("Prefer", ""):
+            return self.create_buffered(request)
+        return super().create(request, *args, **kwargs)
+
+    def create_buffered(self, request) -> Response:
+        """
+        Validate the payload and append it to the ingestion buffer.
+
+        Args:
+        - `request`: The request holding one entry or a list of entries.
+
+        Returns:
+        - 202 with the number of accepted entries, 400 for invalid payloads
+          and 503 when the buffer is saturated.
+        """
+        if is_saturated():
+            return Response(
+                {"detail": "Ingestion buffer is full, retry later."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": str(settings.ENTRY_BUFFER_RETRY_AFTER)},
+            )
+
+        many = isinstance(request.data, list)
+        if many and len(request.data) > settings.ENTRY_INGEST_MAX_BATCH:
+            return Response(
+                {"detail": f"At most {settings.ENTRY_INGEST_MAX_BATCH} entries per request."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        serializer = EntryIngestSerializer(data=request.data, many=many)
+        serializer.is_valid(raise_exception=True)
+        rows = serializer.validated_data if many else [serializer.validated_data]
+        accepted = enqueue_entries(rows)
+        return Response({"accepted": accepted}, status=status.HTTP_202_ACCEPTED)
+
+
+class EntryIngestStatusView(APIView):
+    """
+    API view reporting the state of the buffered Entry ingestion path with
+    admin access.
+
+    Inherits from:
+    `APIView` - Django Rest Framework base view class.
+
+    Attributes:
+    - `permission_classes`: A list of permission classes, in this case, limiting access
+      to users with admin privileges (IsAdminUser).
+
+    Example:
+    ```
+    GET /api/entries/ingest/status/
+
+    # Response:
+    {
+        "pending": 1250,
+        "failed": 3,
+        "oldest_pending": "2024-01-26T00:18:00Z",
+        "max_pending": 100000
+    }
+    ```
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(buffer_status())
+
 
 class EntryUpdateView(generics.UpdateAPIView):
     """
@@ -203,7 +417,9 @@ class EntryUpdateView(generics.UpdateAPIView):
     - `permission_classes`: A list of permission classes, in this case, allowing
       access only to authenticated users (IsAuthenticated).
 
-    Custom Method:
+    Custom Methods:
+    - `get_object`: With sharding, finds the entry on whichever shard holds
+      it, since its id does not tell its library.
     - `perform_update`: Override this method to customize the update behavior.
       In this case, it ensures that only superusers or the owner of the Entry
       instance can perform the update.
@@ -225,6 +441,15 @@ class EntryUpdateView(generics.UpdateAPIView):
     serializer_class = EntrySerializer
     permission_classes = [IsAuthenticated]
 
+    def get_object(self) -> Entry:
+        if not sharding.enabled():
+            return super().get_object()
+        entry = sharding.find_entry(self.kwargs[self.lookup_url_kwarg or self.lookup_field], self.get_queryset())
+        if entry is None:
+            raise Http404
+        self.check_object_permissions(self.request, entry)
+        return entry
+
     def perform_update(self, serializer: EntrySerializer) -> None:
         """
         Custom method to perform the update of the Entry instance.
@@ -239,5 +464,512 @@ class EntryUpdateView(generics.UpdateAPIView):
         - None
         """
         user = self.request.user
-        if user.is_superuser or serializer.instance.user == user:
+        if user.is_superuser or serializer.instance.user_id == user.pk:
             serializer.save()
+
+
+class UserEntryFeedView(generics.ListAPIView):
+    """
+    API view listing a user's entries, newest first.
+
+    Users can list their own entries, staff users anyone's. Each entry
+    embeds its book title and library name. Pages are keyset-paginated on
+    `(date_added, id)` and read through `entry_user_feed_idx`, so every page
+    costs the same however long the user's history is; follow `next` to
+    scroll. The page size can be set with `limit` (up to 200).
+
+    Inherits from:
+    `generics.ListAPIView` - Django Rest Framework class for handling listing
+    objects.
+
+    Attributes:
+    - `serializer_class`: The serializer class used for serializing Entry instances.
+    - `pagination_class`: Keyset pagination on `(date_added, id)`.
+    - `permission_classes`: A list of permission classes, in this case, allowing
+      access only to authenticated users (IsAuthenticated).
+
+    Example:
+    ```
+    GET /api/users/1/entries/?limit=2
+
+    # Response:
+    {
+        "next": "http://testserver/api/users/1/entries/?cursor=WyIyMDI0LTAx...&limit=2",
+        "results": [
+            {
+                "id": 12,
+                "date_added": "2024-01-26T00:18:00Z",
+                "book": 1,
+                "book_title": "Sample Book",
+                "library": 1,
+                "library_name": "City Library"
+            },
+            ...
+        ]
+    }
+    ```
+    """
+    serializer_class = EntryFeedSerializer
+    pagination_class = KeysetPagination
+    permission_classes = [IsAuthenticated]
+
+    def get_user_id(self) -> int:
+        """
+        Return the id of the user whose entries are listed.
+
+        Raises:
+        - `PermissionDenied`: When a non-staff user asks for another user's entries.
+        """
+        user = self.request.user
+        user_id = self.kwargs["pk"]
+        if user_id != user.pk and not user.is_staff:
+            raise PermissionDenied("You can only list your own entries.")
+        return user_id
+
+    def get_queryset(self):
+        return (
+            Entry.objects.filter(user_id=self.get_user_id())
+            .select_related("book", "library")
+            .only("id", "date_added", "book__title", "library__name")
+        )
+
+
+class MyEntryFeedView(UserEntryFeedView):
+    """
+    API view listing the authenticated user's entries, newest first; see
+    `UserEntryFeedView`.
+
+    Example:
+    ```
+    GET /api/me/entries/
+    ```
+    """
+
+    def get_user_id(self) -> int:
+        return self.request.user.pk
+
+
+class TokenObtainView(generics.GenericAPIView):
+    """
+    API view for issuing signed bearer tokens.
+
+    Exchanges a username and password for a signed, expiring token accepted
+    by `SignedTokenAuthentication`. Token clients then call the API without
+    sessions or CSRF tokens.
+
+    Inherits from:
+    `generics.GenericAPIView` - Django Rest Framework base class for generic views.
+
+    Attributes:
+    - `serializer_class`: The serializer class validating the credentials.
+    - `permission_classes`: Open to anonymous clients (AllowAny).
+
+    Example:
+    ```
+    POST /api/tokens/
+    {
+        "username": "john_doe",
+        "password": "s3cret-Passw0rd"
+    }
+
+    # Response:
+    {
+        "token": "eyJ1c2VyIjox...",
+        "expires": 1706230800
+    }
+    ```
+    """
+    serializer_class = TokenObtainSerializer
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        token, expires = issue_token(serializer.validated_data["user"])
+        return Response({"token": token, "expires": expires}, status=status.HTTP_201_CREATED)
+
+
+class TokenRevokeView(APIView):
+    """
+    API view for revoking the bearer token used to authenticate the request.
+
+    The token is added to the revocation list until it expires. Has no
+    effect when `API_TOKEN_REVOCATION` is disabled.
+
+    Inherits from:
+    `APIView` - Django Rest Framework base view class.
+
+    Attributes:
+    - `authentication_classes`: Only bearer tokens (SignedTokenAuthentication).
+    - `permission_classes`: Limiting access to authenticated users (IsAuthenticated).
+
+    Example:
+    ```
+    POST /api/tokens/revoke/
+    Authorization: Bearer <token>
+    ```
+    """
+    authentication_classes = [SignedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        revoke_token(request.auth)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class UsageView(APIView):
+    """
+    Base API view for the usage statistics endpoints.
+
+    The statistics are read from the rollup tables maintained by
+    `api_task.rollups`, never from the Entry table, so answering a request
+    costs one small aggregate query over the requested days.
+
+    Inherits from:
+    `APIView` - Django Rest Framework base view class.
+    """
+
+    def get(self, request, *args, **kwargs):
+        params = UsageQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        return Response(list(self.get_rows(params.validated_data)))
+
+    def get_rows(self, params: dict):
+        raise NotImplementedError
+
+
+class LibraryUsageView(UsageView):
+    """
+    API view listing entries per library per day.
+
+    Query parameters: `start`, `end` (dates, inclusive) and `library`.
+
+    Example:
+    ```
+    GET /api/stats/libraries/daily/?library=1&start=2024-01-01
+
+    # Response:
+    [
+        {"library": 1, "library__name": "City Library", "day": "2024-01-26", "total": 42}
+    ]
+    ```
+    """
+
+    def get_rows(self, params: dict):
+        return rollups.library_daily(params.get("library"), params.get("start"), params.get("end"))
+
+
+class TopBooksView(UsageView):
+    """
+    API view listing the most checked-out books.
+
+    Query parameters: `start`, `end` (dates, inclusive), `library` and
+    `limit` (1 to 100, default 10).
+
+    Example:
+    ```
+    GET /api/stats/books/top/?limit=3
+
+    # Response:
+    [
+        {"book": 7, "book__title": "Sample Book", "total": 120},
+        {"book": 2, "book__title": "Another Book", "total": 87},
+        {"book": 5, "book__title": "New Book", "total": 40}
+    ]
+    ```
+    """
+
+    def get_rows(self, params: dict):
+        return rollups.top_books(
+            params.get("library"), params.get("start"), params.get("end"), params["limit"]
+        )
+
+
+class UserUsageView(UsageView):
+    """
+    API view listing entries per user per day with admin access.
+
+    Query parameters: `start`, `end` (dates, inclusive) and `user`.
+
+    Attributes:
+    - `permission_classes`: A list of permission classes, in this case, limiting access
+      to users with admin privileges (IsAdminUser).
+
+    Example:
+    ```
+    GET /api/stats/users/daily/?user=1
+
+    # Response:
+    [
+        {"user": 1, "day": "2024-01-26", "total": 3}
+    ]
+    ```
+    """
+    permission_classes = [IsAdminUser]
+
+    def get_rows(self, params: dict):
+        return rollups.user_daily(params.get("user"), params.get("start"), params.get("end"))
+
+
+class ChangesView(APIView):
+    """
+    API view serving the change log for delta sync.
+
+    Clients keep the catalog (authors, books, libraries and their
+    memberships) in sync by downloading it once, then polling for what
+    changed since their last cursor, at a cost proportional to the changes
+    rather than to the catalog. Staff users also receive Entry changes.
+
+    - Without `since`, only the current cursor is returned; fetch it before
+      the initial download.
+    - With `since`, the changes after it are returned as one delta, keeping
+      the last state of each object or membership. Follow `next` right away
+      while `more` is true.
+    - If `since` predates the retained log, the response is 410 Gone and
+      the client must download the catalog again.
+
+    Deleting a book or library also removes its memberships; those removals
+    are sent too.
+
+    Inherits from:
+    `APIView` - Django Rest Framework base view class.
+
+    Example:
+    ```
+    GET /api/changes/?since=1042
+
+    # Response:
+    {
+        "since": 1042,
+        "next": 1045,
+        "more": false,
+        "changes": {
+            "books": {"saved": [{"id": 7, "title": "Sample Book"}], "deleted": [3]},
+            "library_books": {"added": [[1, 7]], "removed": []}
+        }
+    }
+    ```
+    """
+
+    def get(self, request, *args, **kwargs):
+        params = ChangesQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        changes.sequence_changes()
+
+        if "since" not in params.validated_data:
+            return Response({"next": changes.current_seq()})
+
+        since = params.validated_data["since"]
+        if since < changes.horizon():
+            return Response(
+                {
+                    "detail": "The change log no longer reaches this cursor, download the catalog again.",
+                    "reset": True,
+                },
+                status=status.HTTP_410_GONE,
+            )
+
+        kinds = None if request.user.is_staff else changes.CATALOG_KINDS
+        return Response(changes.changes_since(since, params.validated_data.get("limit"), kinds))
+
+
+class BatchView(APIView):
+    """
+    API view running several read requests in one round trip.
+
+    Each sub-request is a GET against the API routes and goes through its
+    view as usual (permissions, throttles, pagination), as the user who
+    made the batch request; connection, authentication and middleware
+    costs are paid once for the whole batch. Sub-requests run concurrently
+    and, with `"snapshot": true`, all read the same database snapshot.
+    Batches hold at most `API_BATCH_MAX_REQUESTS` sub-requests.
+
+    Inherits from:
+    `APIView` - Django Rest Framework base view class.
+
+    Example:
+    ```
+    POST /api/batch/
+    {
+        "requests": ["/api/user-types/", "/api/authors/"],
+        "snapshot": true
+    }
+
+    # Response:
+    {
+        "responses": [
+            {"status": 200, "body": [{"name": "admin"}, {"name": "user"}]},
+            {"status": 200, "body": [{"name": "John Doe"}]}
+        ]
+    }
+    ```
+    """
+
+    def post(self, request, *args, **kwargs):
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        responses = run_batch(request, serializer.validated_data["requests"], serializer.validated_data["snapshot"])
+        return Response({"responses": responses})
+
+
+class CatalogExportView(APIView):
+    """
+    API view downloading the whole catalog as one file.
+
+    Each row is a book with its authors and libraries. The file is streamed
+    as it is read from a server-side cursor, from a single database
+    snapshot, so the export uses constant memory and is consistent however
+    large the catalog is. The format is taken from the file extension:
+    `csv`, `ndjson` or, when `pyarrow` is installed, `parquet`; with
+    `?compress=gzip` the file is gzipped while streaming. Over ASGI the
+    cursor is read from a thread feeding an asynchronous iterator.
+
+    The `Accept` header is ignored: the extension alone sets the format.
+
+    Attributes:
+    - `permission_classes`: A list of permission classes, in this case, allowing
+      access to authenticated users (IsAuthenticated).
+    - `content_negotiation_class`: Negotiation ignoring `Accept`, which would
+      otherwise refuse the types of the exported files with 406.
+
+    Inherits from:
+    `APIView` - Django Rest Framework base view class.
+
+    Example:
+    ```
+    GET /api/export/catalog.ndjson
+
+    # Response:
+    {"book_id":1,"title":"Sample Book","author_ids":[1],"author_names":["John Doe"],"library_ids":[1],"library_names":["City Library"]}
+    {"book_id":2,"title":"Another Book","author_ids":[],"author_names":[],"library_ids":[],"library_names":[]}
+    ```
+    """
+    permission_classes = [IsAuthenticated]
+    content_negotiation_class = IgnoreAcceptNegotiation
+
+    def get(self, request, *args, **kwargs):
+        file_format = kwargs["file_format"]
+        if file_format not in export.FORMATS:
+            raise exceptions.NotFound()
+        if file_format not in export.available_formats():
+            raise exceptions.NotAcceptable(f"Exporting {file_format} is not available on this server.")
+
+        params = CatalogExportQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        compress = params.validated_data.get("compress") == "gzip"
+
+        filename = f"catalog.{file_format}"
+        content_type = export.CONTENT_TYPES[file_format]
+        if compress and file_format != "parquet":
+            filename += ".gz"
+            content_type = "application/gzip"
+
+        # Over ASGI a synchronous iterator would be buffered whole before
+        # being sent, so the cursor is driven from a thread instead
+        if isinstance(request._request, ASGIRequest):
+            content = export.astream_catalog(file_format, compress)
+        else:
+            content = export.stream_catalog(file_format, compress)
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+
+class EntryStreamView(View):
+    """
+    Server-sent events stream of newly created entries, served over ASGI.
+
+    Each connection is a subscriber of the process-wide `broadcaster`
+    (see `api_task.events`), which receives every new entry once, from a
+    single `LISTEN` connection, and fans it out; subscribers cost no query.
+    Events are filtered with the `library` and `user` query parameters.
+    Staff users can stream any entries, other users only their own.
+
+    A client falling behind loses the oldest buffered events rather than
+    growing the server's memory (`ENTRY_STREAM_BUFFER` per connection) and
+    receives a `lagged` event with the number dropped; it can catch up
+    from its activity feed. A comment line is sent every
+    `ENTRY_STREAM_HEARTBEAT` seconds without events.
+
+    Authenticates with a bearer token or the session, so browsers can use
+    `EventSource` directly. Under WSGI the endpoint answers 501.
+
+    Inherits from:
+    `View` - Django's base class-based view; DRF views cannot stream asynchronously.
+
+    Example:
+    ```
+    GET /api/entries/stream/?library=1
+    Accept: text/event-stream
+
+    # Response:
+    event: entry
+    id: 12
+    data: {"id":12,"user":1,"library":1,"book":2,"date_added":"2024-01-26T00:18:00Z"}
+
+    event: lagged
+    data: {"dropped":3}
+    ```
+    """
+
+    async def get(self, request, *args, **kwargs):
+        if not isinstance(request, ASGIRequest):
+            return JsonResponse(
+                {"detail": "The entry stream is only served over ASGI."},
+                status=status.HTTP_501_NOT_IMPLEMENTED,
+            )
+
+        user = await self.authenticate(request)
+        if user is None or not user.is_authenticated:
+            return JsonResponse(
+                {"detail": "Authentication credentials were not provided."},
+                status=status.HTTP_401_UNAUTHORIZED,
+            )
+
+        params = EntryStreamQuerySerializer(data=request.GET)
+        if not params.is_valid():
+            return JsonResponse(params.errors, status=status.HTTP_400_BAD_REQUEST)
+        library = params.validated_data.get("library")
+        user_id = params.validated_data.get("user")
+        if not user.is_staff:
+            if user_id not in (None, user.pk):
+                return JsonResponse(
+                    {"detail": "You can only stream your own entries."},
+                    status=status.HTTP_403_FORBIDDEN,
+                )
+            user_id = user.pk
+
+        if len(broadcaster) >= getattr(settings, "ENTRY_STREAM_MAX_SUBSCRIBERS", 10000):
+            return JsonResponse(
+                {"detail": "Too many stream subscribers, retry later."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": "30"},
+            )
+
+        response = StreamingHttpResponse(self.stream(library, user_id), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    async def authenticate(self, request):
+        """
+        Return the user of a bearer token, or else the session user.
+        """
+        try:
+            result = await sync_to_async(SignedTokenAuthentication().authenticate)(request)
+        except exceptions.AuthenticationFailed:
+            return None
+        if result is not None:
+            return result[0]
+        return await request.auser()
+
+    async def stream(self, library, user_id):
+        subscription = broadcaster.subscribe(library, user_id)
+        try:
+            # Sent right away so clients and proxies see the stream open
+            yield b": connected\n\n"
+            async for frame in subscription.frames(getattr(settings, "ENTRY_STREAM_HEARTBEAT", 15)):
+                yield frame
+        finally:
+            broadcaster.unsubscribe(subscription)
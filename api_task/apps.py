@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class ApiTaskConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "api_task"
+
+    def ready(self):
+        # Connect the signal receivers declared in api_task.signals
+        from . import signals  # noqa: F401
+        from .tokens import check_revocation_cache
+
+        # Fail at startup if revoked tokens would stay valid in other workers
+        check_revocation_cache()
@@ -0,0 +1,90 @@
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+
+from .models import CustomUser
+from .tokens import InvalidToken, verify_token
+
+
+class TokenUser:
+    """
+    Lightweight user built from a verified token payload, without a query.
+
+    Provides what the API permissions and views need (`pk`, `type_id`,
+    `is_staff`, `is_superuser`, ...). It compares equal to the CustomUser
+    with the same primary key, so ownership checks such as
+    `entry.user == request.user` keep working. The full CustomUser can be
+    loaded lazily through `get_user`.
+    """
+    is_active = True
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, payload: dict):
+        self.payload = payload
+        self.pk = self.id = payload["user"]
+        self.username = payload.get("username", "")
+        self.type_id = payload.get("type")
+        self.is_staff = bool(payload.get("staff"))
+        self.is_superuser = bool(payload.get("superuser"))
+        self._user = None
+
+    def __str__(self):
+        return self.username
+
+    def __eq__(self, other):
+        if isinstance(other, (TokenUser, CustomUser)):
+            return self.pk == other.pk
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.pk)
+
+    def get_username(self):
+        return self.username
+
+    def get_user(self) -> CustomUser:
+        """
+        Load and return the CustomUser this token was issued for.
+        """
+        if self._user is None:
+            self._user = CustomUser.objects.select_related("type").get(pk=self.pk)
+        return self._user
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """
+    DRF authentication class for signed bearer tokens issued by
+    `api_task.tokens.issue_token`.
+
+    Clients send `Authorization: Bearer <token>`. The token is verified by
+    its HMAC signature and expiry alone (plus, when `API_TOKEN_REVOCATION`
+    is enabled, a revocation list lookup), so authenticating a request does
+    not touch the database by default and needs no session or CSRF token.
+
+    Example:
+    ```
+    # Obtain a token, then call the API with it:
+    POST /api/tokens/ {"username": "john_doe", "password": "..."}
+    PUT /api/entries/1/update/
+    Authorization: Bearer <token>
+    ```
+    """
+    keyword = "Bearer"
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed("Invalid token header.")
+
+        try:
+            payload = verify_token(auth[1].decode())
+        except (InvalidToken, UnicodeError) as e:
+            raise exceptions.AuthenticationFailed(str(e))
+
+        return TokenUser(payload), payload
+
+    def authenticate_header(self, request):
+        return f'{self.keyword} realm="api"'
@@ -0,0 +1,109 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .models import CustomUser
+
+
+class UserCache:
+    """
+    Small per-process LRU cache of CustomUser instances with a TTL.
+
+    Users are stored with their UserType already joined, so reading
+    `user.type` afterwards costs no query. Callers always get a copy of the
+    cached instance, never the shared one. Entries are dropped by the
+    CustomUser and UserType signal handlers in `api_task.signals`.
+
+    Like the UserType registry, users loaded inside an atomic block are
+    only cached once the transaction commits.
+
+    Attributes:
+    - `ttl`: Seconds an entry stays valid (`USER_CACHE_TTL`).
+    - `max_size`: Maximum number of cached users (`USER_CACHE_SIZE`).
+    """
+
+    def __init__(self, ttl: float = None, max_size: int = None):
+        self.ttl = ttl if ttl is not None else getattr(settings, "USER_CACHE_TTL", 60)
+        self.max_size = max_size if max_size is not None else getattr(settings, "USER_CACHE_SIZE", 1024)
+        self._users = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """
+        Return a copy of the user with primary key `user_id`.
+
+        Args:
+        - `user_id`: The primary key of the user.
+
+        Returns:
+        - A CustomUser instance with its type selected, or None if no such user exists.
+        """
+        with self._lock:
+            cached = self._users.get(user_id)
+            if cached is not None:
+                expires, user = cached
+                if expires > time.monotonic():
+                    self._users.move_to_end(user_id)
+                    return copy.copy(user)
+                del self._users[user_id]
+            generation = self._generation
+
+        user = CustomUser._default_manager.select_related("type").filter(pk=user_id).first()
+        if user is not None:
+            self._remember(user_id, user, generation)
+            user = copy.copy(user)
+        return user
+
+    def invalidate(self, user_id=None) -> None:
+        """
+        Drop one cached user, or every cached user when `user_id` is None.
+        """
+        with self._lock:
+            if user_id is None:
+                self._users.clear()
+            else:
+                self._users.pop(user_id, None)
+            self._generation += 1
+
+    def _remember(self, user_id, user, generation: int) -> None:
+        def store():
+            with self._lock:
+                if generation != self._generation:
+                    return
+                self._users[user_id] = (time.monotonic() + self.ttl, user)
+                self._users.move_to_end(user_id)
+                while len(self._users) > self.max_size:
+                    self._users.popitem(last=False)
+
+        if transaction.get_connection().in_atomic_block:
+            transaction.on_commit(store)
+        else:
+            store()
+
+
+user_cache = UserCache()
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    Authentication backend loading session users through `user_cache`.
+
+    Authentication itself is unchanged; only `get_user`, which the
+    `AuthenticationMiddleware` calls on every request carrying a session, is
+    served from the per-process cache.
+    """
+
+    def get_user(self, user_id):
+        try:
+            user_id = CustomUser._meta.pk.to_python(user_id)
+        except ValidationError:
+            return None
+        user = user_cache.get(user_id)
+        return user if user is not None and self.user_can_authenticate(user) else None
@@ -0,0 +1,206 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.http import HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+from rest_framework import status
+from rest_framework.views import APIView
+
+logger = logging.getLogger(__name__)
+
+# Parts of the batch request that sub-requests must not inherit
+SKIPPED_META = ("wsgi.input", "CONTENT_LENGTH", "CONTENT_TYPE", "HTTP_CONTENT_LENGTH", "HTTP_CONTENT_TYPE")
+
+_executor = None
+_executor_lock = threading.Lock()
+# Connections opened by the worker threads, closed by `shutdown`
+_worker_connections = set()
+_local = threading.local()
+
+
+def run_batch(request, paths: list, snapshot: bool = False) -> list:
+    """
+    Run GET sub-requests against the API routes on behalf of `request`.
+
+    Every sub-request goes through its view as usual (permissions,
+    throttles, pagination), but is authenticated as the batch request's
+    user without authenticating again. Sub-requests run concurrently on a
+    pool of `API_BATCH_WORKERS` threads, each with its own database
+    connection, kept open across sub-requests and batches for
+    `API_BATCH_CONN_MAX_AGE` seconds. Endpoints streaming their response,
+    which has no data to embed, cannot be batched.
+
+    With `snapshot`, all sub-requests read the same database snapshot: the
+    batch opens a `REPEATABLE READ` transaction, exports its snapshot with
+    `pg_export_snapshot()` and every worker imports it before running its
+    sub-request, so the responses are consistent with each other.
+
+    Args:
+    - `request`: The DRF request of the batch.
+    - `paths`: Paths of the sub-requests, with their query strings.
+    - `snapshot`: Whether to read one consistent snapshot.
+
+    Returns:
+    - One `{"status": ..., "body": ...}` dict per path, in order.
+    """
+    calls = [_prepare(request, path) for path in paths]
+    workers = getattr(settings, "API_BATCH_WORKERS", 4)
+
+    if workers <= 1 or len(calls) <= 1:
+        if not snapshot:
+            return [call() for call in calls]
+        with repeatable_read():
+            return [call() for call in calls]
+
+    if not snapshot:
+        return list(_get_executor(workers).map(_in_worker, calls))
+
+    with repeatable_read():
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_export_snapshot()")
+            snapshot_id = cursor.fetchone()[0]
+        # The exporting transaction must stay open until every worker has
+        # imported the snapshot, i.e. until all sub-requests are done
+        return list(_get_executor(workers).map(_in_worker, calls, [snapshot_id] * len(calls)))
+
+
+def _prepare(request, path: str):
+    """
+    Resolve `path` and return a callable running it as a sub-request, or
+    returning the error response right away.
+    """
+    parts = urlsplit(path)
+    try:
+        match = resolve(parts.path, urlconf=settings.API_URLCONF)
+    except Resolver404:
+        return lambda: _error(status.HTTP_404_NOT_FOUND, "Not found.")
+
+    view_class = getattr(match.func, "cls", None)
+    if view_class is None or not issubclass(view_class, APIView) or match.url_name == "batch":
+        return lambda: _error(status.HTTP_400_BAD_REQUEST, "This endpoint cannot be batched.")
+
+    sub = HttpRequest()
+    sub.method = "GET"
+    sub.path = sub.path_info = parts.path
+    sub.META = {key: value for key, value in request.META.items() if key not in SKIPPED_META}
+    sub.META.update(REQUEST_METHOD="GET", PATH_INFO=parts.path, QUERY_STRING=parts.query)
+    sub.GET = QueryDict(parts.query)
+    sub.COOKIES = request.COOKIES
+    sub.resolver_match = match
+    if hasattr(request._request, "session"):
+        sub.session = request._request.session
+    # Picked up by DRF's Request in place of the view's authenticators
+    sub._force_auth_user = request.user
+    sub._force_auth_token = request.auth
+
+    def call():
+        try:
+            response = match.func(sub, *match.args, **match.kwargs)
+        except Exception:
+            logger.exception("Batched request to %s failed", path)
+            return _error(status.HTTP_500_INTERNAL_SERVER_ERROR, "Internal server error.")
+        if not hasattr(response, "data"):
+            # A streaming or plain Django response, e.g. the catalog export,
+            # whose content is never read. Not closed: close() would send
+            # request_finished, closing the batch request's connections.
+            return _error(status.HTTP_400_BAD_REQUEST, "This endpoint cannot be batched.")
+        return {"status": response.status_code, "body": response.data}
+
+    return call
+
+
+def _in_worker(call, snapshot_id=None) -> dict:
+    try:
+        if snapshot_id is None:
+            return call()
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+                cursor.execute("SET TRANSACTION SNAPSHOT %s", [snapshot_id])
+            return call()
+    finally:
+        _release_connections()
+
+
+def _release_connections() -> None:
+    """
+    Keep the worker's connections for the next sub-requests, until they are
+    `API_BATCH_CONN_MAX_AGE` seconds old or unusable.
+
+    Worker threads outlive requests, so nothing else closes their
+    connections; and under `CONN_MAX_AGE` (0 by default) each sub-request
+    would connect to the database anew.
+    """
+    max_age = getattr(settings, "API_BATCH_CONN_MAX_AGE", 60)
+    opened = getattr(_local, "opened", None)
+    if opened is None:
+        opened = _local.opened = {}
+    for conn in connections.all(initialized_only=True):
+        if conn.connection is None:
+            continue
+        if opened.get(conn.alias) is not conn.connection:
+            # Opened by this sub-request
+            opened[conn.alias] = conn.connection
+            conn.close_at = None if max_age is None else time.monotonic() + max_age
+            with _executor_lock:
+                _worker_connections.add(conn)
+        conn.close_if_unusable_or_obsolete()
+
+
+def shutdown() -> None:
+    """
+    Stop the worker threads and close their database connections, e.g.
+    before the test database is dropped.
+    """
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+    with _executor_lock:
+        conns = list(_worker_connections)
+        _worker_connections.clear()
+    for conn in conns:
+        # Owned by a worker thread that has exited
+        conn.inc_thread_sharing()
+        try:
+            conn.close()
+        finally:
+            conn.dec_thread_sharing()
+
+
+class repeatable_read:
+    """
+    A transaction at the `REPEATABLE READ` isolation level; within an
+    already open transaction (e.g. under ATOMIC_REQUESTS) that transaction
+    is used as it is.
+    """
+
+    def __enter__(self):
+        nested = connection.in_atomic_block
+        self._atomic = transaction.atomic()
+        self._atomic.__enter__()
+        if not nested:
+            with connection.cursor() as cursor:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+
+    def __exit__(self, *exc_info):
+        return self._atomic.__exit__(*exc_info)
+
+
+def _error(status_code: int, detail: str) -> dict:
+    return {"status": status_code, "body": {"detail": detail}}
+
+
+def _get_executor(workers: int) -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api-batch")
+    return _executor
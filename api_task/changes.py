@@ -0,0 +1,205 @@
+import datetime
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Author, Book, Change, ChangeLogTruncation, Entry, Library
+
+# Fields sent for saved objects, per kind
+OBJECT_FIELDS = {
+    "authors": (Author, ("id", "name", "birth_year")),
+    "books": (Book, ("id", "title")),
+    "libraries": (Library, ("id", "name")),
+    "entries": (Entry, ("id", "user", "library", "book", "date_added")),
+}
+RELATION_KINDS = ("book_authors", "library_books")
+CATALOG_KINDS = ("authors", "books", "libraries", *RELATION_KINDS)
+
+# Key of the transaction-level advisory lock held while numbering changes
+SEQUENCER_LOCK = 0x6368616E
+
+
+def kind_of(model) -> str:
+    """
+    Return the change kind recorded for instances of `model`, or None.
+    """
+    for kind, (kind_model, _) in OBJECT_FIELDS.items():
+        if model is kind_model:
+            return kind
+    return None
+
+
+def record(kind: str, action: str, keys) -> None:
+    """
+    Append changes to the log, in the current transaction.
+
+    Args:
+    - `kind`: One of the `OBJECT_FIELDS` or `RELATION_KINDS` kinds.
+    - `action`: `Change.SAVE` or `Change.DELETE`.
+    - `keys`: Primary keys for objects, `(left, right)` pairs for memberships.
+    """
+    now = timezone.now()
+    changes = []
+    for key in keys:
+        object_id, related_id = key if kind in RELATION_KINDS else (key, None)
+        changes.append(
+            Change(kind=kind, object_id=object_id, related_id=related_id, action=action, created_at=now)
+        )
+    Change.objects.bulk_create(changes)
+
+
+def sequence_changes() -> int:
+    """
+    Number the committed changes that have no `seq` yet, in insertion order.
+
+    Only one sequencer runs at a time; when another one holds the lock this
+    returns 0 immediately rather than waiting. Since numbers are handed out
+    after the changes committed, and each run starts after the previous one
+    committed, `seq` grows in commit order.
+
+    Returns:
+    - The number of changes numbered.
+    """
+    table = Change._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_xact_lock(%s)", [SEQUENCER_LOCK])
+        if not cursor.fetchone()[0]:
+            return 0
+        cursor.execute(
+            f"UPDATE {table} SET seq = numbered.seq "
+            f"FROM (SELECT id, nextval('{table}_sync_seq') AS seq FROM "
+            f"(SELECT id FROM {table} WHERE seq IS NULL ORDER BY id) AS pending) AS numbered "
+            f"WHERE {table}.id = numbered.id"
+        )
+        return cursor.rowcount
+
+
+def current_seq() -> int:
+    """
+    Return the highest sequence number handed out so far, as far as the log
+    and its truncations tell; 0 for a new log.
+    """
+    return max(Change.objects.aggregate(seq=Max("seq"))["seq"] or 0, horizon())
+
+
+def horizon() -> int:
+    """
+    Return the sequence number the log was last truncated through, 0 if it
+    never was. Cursors older than this cannot be served.
+    """
+    return ChangeLogTruncation.objects.aggregate(seq=Max("through_seq"))["seq"] or 0
+
+
+def changes_since(since: int, limit: int = None, kinds=None) -> dict:
+    """
+    Collect the changes after `since` as one compact delta.
+
+    Changes are read in sequence order, at most `limit` at a time, and only
+    the last change of each object or membership within the batch is kept.
+    Saved objects are sent in their current state, fetched with one query
+    per kind; objects gone by then are reported as deleted.
+
+    Args:
+    - `since`: The `next` cursor of the previous delta, 0 for the first one.
+    - `limit`: Maximum number of log rows read; defaults to `CHANGE_LOG_BATCH_SIZE`.
+    - `kinds`: The kinds to include; all of them by default.
+
+    Returns:
+    - A dict with `since`, `next` (the cursor for the next call), `more`
+      (whether `next` should be fetched right away) and `changes`, keyed by
+      kind: `{"saved": [...], "deleted": [ids]}` for objects and
+      `{"added": [[left, right]], "removed": [[left, right]]}` for memberships.
+    """
+    if limit is None:
+        limit = getattr(settings, "CHANGE_LOG_BATCH_SIZE", 1000)
+    high = current_seq()
+    rows = Change.objects.filter(seq__gt=since, seq__lte=high)
+    if kinds is not None:
+        rows = rows.filter(kind__in=kinds)
+    rows = list(rows.order_by("seq").values_list("seq", "kind", "object_id", "related_id", "action")[:limit + 1])
+
+    more = len(rows) > limit
+    rows = rows[:limit]
+    latest = {}
+    for _, kind, object_id, related_id, action in rows:
+        latest[(kind, object_id, related_id)] = action
+
+    changes = {}
+    ordered = sorted(latest.items(), key=lambda item: (item[0][0], item[0][1], item[0][2] or 0))
+    for (kind, object_id, related_id), action in ordered:
+        if kind in RELATION_KINDS:
+            bucket = changes.setdefault(kind, {"added": [], "removed": []})
+            bucket["added" if action == Change.SAVE else "removed"].append([object_id, related_id])
+        else:
+            bucket = changes.setdefault(kind, {"saved": [], "deleted": []})
+            bucket["saved" if action == Change.SAVE else "deleted"].append(object_id)
+
+    for kind, bucket in changes.items():
+        if kind in OBJECT_FIELDS and bucket["saved"]:
+            model, fields = OBJECT_FIELDS[kind]
+            objects = list(model.objects.filter(pk__in=bucket["saved"]).order_by("pk").values(*fields))
+            gone = set(bucket["saved"]).difference(obj["id"] for obj in objects)
+            bucket["saved"] = objects
+            bucket["deleted"] = sorted(gone.union(bucket["deleted"]))
+
+    return {
+        "since": since,
+        "next": rows[-1][0] if more else max(high, since),
+        "more": more,
+        "changes": changes,
+    }
+
+
+def compact(compact_after: datetime.timedelta = None, retention: datetime.timedelta = None, now=None) -> dict:
+    """
+    Compact the old part of the change log.
+
+    Changes recorded more than `compact_after` ago are superseded when the
+    same object or membership changed again later, and are removed; this
+    never changes what a client ends up with. Changes older than
+    `retention` are removed outright and the truncation is recorded, so
+    clients with older cursors are told to download the catalog again.
+
+    Args:
+    - `compact_after`: Age after which superseded changes are removed;
+      defaults to `CHANGE_LOG_COMPACT_AFTER_HOURS`.
+    - `retention`: Age after which all changes are removed; defaults to
+      `CHANGE_LOG_RETENTION_DAYS` (None keeps them forever).
+    - `now`: The reference time, for tests.
+
+    Returns:
+    - A dict with the number of `superseded` and `truncated` changes removed.
+    """
+    if compact_after is None:
+        compact_after = datetime.timedelta(hours=getattr(settings, "CHANGE_LOG_COMPACT_AFTER_HOURS", 24))
+    if retention is None:
+        days = getattr(settings, "CHANGE_LOG_RETENTION_DAYS", None)
+        retention = datetime.timedelta(days=days) if days is not None else None
+    now = now or timezone.now()
+    table = Change._meta.db_table
+
+    sequence_changes()
+    result = {"superseded": 0, "truncated": 0}
+    with transaction.atomic():
+        boundary = _last_seq_before(now - compact_after)
+        if boundary:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"DELETE FROM {table} AS old USING {table} AS newer "
+                    "WHERE old.seq <= %s AND newer.kind = old.kind AND newer.object_id = old.object_id "
+                    "AND coalesce(newer.related_id, 0) = coalesce(old.related_id, 0) AND newer.seq > old.seq",
+                    [boundary],
+                )
+                result["superseded"] = cursor.rowcount
+
+        through = _last_seq_before(now - retention) if retention is not None else None
+        if through:
+            result["truncated"], _ = Change.objects.filter(seq__lte=through).delete()
+            ChangeLogTruncation.objects.create(through_seq=through, removed=result["truncated"])
+    return result
+
+
+def _last_seq_before(moment: datetime.datetime) -> int:
+    return Change.objects.filter(created_at__lt=moment).aggregate(seq=Max("seq"))["seq"]
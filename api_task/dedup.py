@@ -0,0 +1,264 @@
+import hashlib
+import itertools
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from . import changes
+from .models import Author, Book, BookAuthor, Change
+
+# Name suffixes that do not tell authors apart
+SUFFIXES = {"jr", "sr", "ii", "iii", "iv"}
+
+BOOK_CONTENT_HASH_CONSTRAINT = "book_content_hash_unique"
+
+_APOSTROPHES = re.compile(r"['’`]")
+_SEPARATORS = re.compile(r"[^0-9a-z]+")
+
+
+def name_tokens(name: str) -> tuple:
+    """
+    Split an author name into normalized tokens, given names first.
+
+    Accents, case, punctuation and suffixes are dropped, initials are split
+    ("J.R.R." gives three tokens) and "Surname, Given" is reordered, so
+    "Tolkien, J. R. R." and "J.R.R. Tolkien" give the same tokens.
+    """
+    name = unicodedata.normalize("NFKD", name or "")
+    name = "".join(c for c in name if not unicodedata.combining(c)).casefold()
+    name = _APOSTROPHES.sub("", name)
+
+    surname, comma, given = name.partition(",")
+    if comma and _SEPARATORS.sub(" ", given).strip() not in SUFFIXES:
+        name = f"{given} {surname}"
+    return tuple(token for token in _SEPARATORS.sub(" ", name).split() if token not in SUFFIXES)
+
+
+def name_key(name: str) -> str:
+    """
+    Return the normalized key of an author name; names with equal keys are
+    spelled alike.
+    """
+    return " ".join(name_tokens(name))
+
+
+def block_key(name: str) -> str:
+    """
+    Return the blocking key of an author name: the surname and the first
+    given initial. Only authors sharing a blocking key are compared, which
+    keeps deduplication close to linear in the number of authors.
+    """
+    tokens = name_tokens(name)
+    if not tokens:
+        return ""
+    return f"{tokens[-1]} {tokens[0][0]}" if len(tokens) > 1 else tokens[0]
+
+
+def names_match(a: tuple, b: tuple) -> bool:
+    """
+    Tell whether two token tuples can name the same author: same surname,
+    and given names agreeing in order, an initial matching any name that
+    starts with it ("j r r tolkien" and "john ronald reuel tolkien").
+    """
+    if not a or not b or a[-1] != b[-1]:
+        return False
+    given_a, given_b = a[:-1], b[:-1]
+    if not given_a or not given_b:
+        return given_a == given_b
+    for x, y in zip(given_a, given_b):
+        if x != y and not ((len(x) == 1 and y.startswith(x)) or (len(y) == 1 and x.startswith(y))):
+            return False
+    return True
+
+
+def title_key(title: str) -> str:
+    """
+    Return the normalized form of a book title: Unicode-normalized, case
+    folded and with whitespace collapsed.
+    """
+    return " ".join(unicodedata.normalize("NFKC", title or "").casefold().split())
+
+
+def content_hash(title: str, author_ids) -> str:
+    """
+    Return the content hash of a book: the SHA-256 of its normalized title
+    and sorted author ids. Two books with the same hash are duplicates.
+    """
+    authors = ",".join(str(pk) for pk in sorted(set(author_ids)))
+    return hashlib.sha256(f"{title_key(title)}\x1f{authors}".encode()).hexdigest()
+
+
+def find_book(title: str, authors) -> Book:
+    """
+    Return the book with this title and exactly these authors, or None;
+    a single probe of the unique content hash index.
+    """
+    return Book.objects.filter(content_hash=content_hash(title, [author.pk for author in authors])).first()
+
+
+def refresh_content_hashes(book_ids) -> None:
+    """
+    Recompute the content hash of the given books from their current title
+    and authors, writing only the hashes that changed.
+    """
+    books = list(Book.objects.filter(pk__in=book_ids).only("pk", "title", "content_hash"))
+    if not books:
+        return
+    authors = {}
+    for book_id, author_id in BookAuthor.objects.filter(book_id__in=book_ids).values_list("book_id", "author_id"):
+        authors.setdefault(book_id, []).append(author_id)
+
+    changed = []
+    for book in books:
+        value = content_hash(book.title, authors.get(book.pk, ()))
+        if value != book.content_hash:
+            book.content_hash = value
+            changed.append(book)
+    Book.objects.bulk_update(changed, ["content_hash"])
+
+
+def _match_birth_year() -> bool:
+    return getattr(settings, "AUTHOR_DEDUP_MATCH_BIRTH_YEAR", False)
+
+
+def _same_author(a: Author, b: Author) -> bool:
+    if _match_birth_year() and a.birth_year != b.birth_year:
+        return False
+    return names_match(name_tokens(a.name), name_tokens(b.name))
+
+
+def cluster_block(authors: list) -> list:
+    """
+    Group the authors of one block into clusters of duplicates.
+
+    Authors are taken in primary key order and join the one cluster whose
+    members they all match; an author matching several clusters ("J. Smith"
+    next to "John Smith" and "Jane Smith") is ambiguous and stays alone.
+
+    Returns:
+    - A list of clusters, each a list of authors, oldest first.
+    """
+    clusters = []
+    for author in sorted(authors, key=lambda a: a.pk):
+        matching = [c for c in clusters if all(_same_author(author, member) for member in c)]
+        if len(matching) == 1:
+            matching[0].append(author)
+        else:
+            clusters.append([author])
+    return clusters
+
+
+def find_duplicates() -> dict:
+    """
+    Find duplicate authors in the whole table.
+
+    Authors are read in blocking key order with a server-side cursor and
+    clustered one block at a time, so memory holds a single block.
+
+    Returns:
+    - A dict mapping the primary key of each canonical (oldest) author to
+      the primary keys of its duplicates.
+    """
+    authors = Author.objects.exclude(block_key="").order_by("block_key", "pk").only("pk", "name", "birth_year", "block_key")
+    duplicates = {}
+    for _, block in itertools.groupby(authors.iterator(chunk_size=2000), key=lambda a: a.block_key):
+        block = list(block)
+        if len(block) < 2:
+            continue
+        for cluster in cluster_block(block):
+            if len(cluster) > 1:
+                duplicates[cluster[0].pk] = [author.pk for author in cluster[1:]]
+    return duplicates
+
+
+def merge_authors(canonical: int, duplicates: list) -> int:
+    """
+    Merge duplicate authors into the canonical one.
+
+    BookAuthor rows of the duplicates are repointed to the canonical author
+    with one UPDATE, except for books the canonical author is already
+    linked to; the duplicates are then deleted along with their remaining
+    rows. The change log records every membership moved.
+
+    Raises `IntegrityError`, merging nothing, when the merge would make two
+    books identical (same title and authors).
+
+    Returns:
+    - The number of BookAuthor rows repointed.
+    """
+    with transaction.atomic():
+        rows = BookAuthor.objects.filter(author_id__in=duplicates).exclude(
+            book_id__in=BookAuthor.objects.filter(author_id=canonical).values("book_id")
+        )
+        # One row per book is kept and repointed; unique (book, author)
+        # forbids repointing two
+        keep = {}
+        for pk, book_id, author_id in rows.order_by("pk").values_list("pk", "book_id", "author_id"):
+            keep.setdefault(book_id, (pk, author_id))
+
+        if keep:
+            BookAuthor.objects.filter(pk__in=[pk for pk, _ in keep.values()]).update(author_id=canonical)
+            changes.record(
+                "book_authors", Change.DELETE, sorted((book, author) for book, (_, author) in keep.items())
+            )
+            changes.record("book_authors", Change.SAVE, sorted((book, canonical) for book in keep))
+
+        Author.objects.filter(pk__in=duplicates).delete()
+        refresh_content_hashes(list(keep))
+
+        # The content hash constraint is deferred to commit; check it now so
+        # a merge creating duplicate books fails on its own
+        with connection.cursor() as cursor:
+            cursor.execute(f"SET CONSTRAINTS {BOOK_CONTENT_HASH_CONSTRAINT} IMMEDIATE")
+            cursor.execute(f"SET CONSTRAINTS {BOOK_CONTENT_HASH_CONSTRAINT} DEFERRED")
+    return len(keep)
+
+
+class AuthorResolver:
+    """
+    Resolves author names met during ingestion to existing authors,
+    creating them only when no existing author matches.
+
+    Candidates are looked up by blocking key, one indexed query per block,
+    and each block is cached for the lifetime of the resolver, so a run
+    resolving many authors costs one query per distinct surname and
+    initial. When several existing authors match and they are not
+    duplicates of each other, only an exact normalized match is used.
+
+    Example:
+    ```
+    resolver = AuthorResolver()
+    resolver.resolve("J. R. R. Tolkien", 1892)
+    resolver.resolve("Tolkien, J.R.R.", 1937)  # the same Author
+    ```
+    """
+
+    def __init__(self):
+        self._blocks = {}
+
+    def resolve(self, name: str, birth_year: int) -> Author:
+        key = block_key(name)
+        if not key:
+            author, _ = Author.objects.get_or_create(name=name, birth_year=birth_year)
+            return author
+
+        block = self._blocks.get(key)
+        if block is None:
+            block = self._blocks[key] = list(Author.objects.filter(block_key=key).order_by("pk"))
+
+        author = self._match(Author(name=name, birth_year=birth_year), block)
+        if author is None:
+            author, _ = Author.objects.get_or_create(name=name, birth_year=birth_year)
+            block.append(author)
+        return author
+
+    def _match(self, wanted: Author, block: list):
+        candidates = [author for author in block if _same_author(wanted, author)]
+        if not candidates:
+            return None
+        if all(_same_author(a, b) for a, b in itertools.combinations(candidates, 2)):
+            return candidates[0]
+        exact = name_key(wanted.name)
+        return next((author for author in candidates if name_key(author.name) == exact), None)
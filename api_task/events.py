@@ -0,0 +1,248 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+
+import psycopg2
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+# PostgreSQL channel new entries are announced on
+CHANNEL = "api_task_entries"
+
+# NOTIFY payloads must stay below 8000 bytes; one entry takes about 100
+NOTIFY_BATCH_SIZE = 50
+
+# Seconds between attempts to reconnect a lost LISTEN connection
+RECONNECT_DELAY = 1.0
+
+
+def entry_event(entry) -> dict:
+    """
+    Return the event published for a newly created Entry.
+    """
+    return {
+        "id": entry.pk,
+        "user": entry.user_id,
+        "library": entry.library_id,
+        "book": entry.book_id,
+        "date_added": entry.date_added,
+    }
+
+
+def publish_entries(entries) -> None:
+    """
+    Announce newly created entries to stream subscribers once the current
+    transaction commits.
+
+    With the `"postgres"` source (the default), events are sent with
+    `pg_notify` in the current transaction, so every process listening on
+    `CHANNEL` receives them, and only if the transaction commits. With
+    the `"local"` source, they are handed to this process's broadcaster
+    from an `on_commit` callback.
+
+    Args:
+    - `entries`: The Entry instances created.
+    """
+    events = [entry_event(entry) for entry in entries]
+    if not events:
+        return
+
+    if getattr(settings, "ENTRY_STREAM_SOURCE", "postgres") == "local":
+        transaction.on_commit(lambda: broadcaster.publish_threadsafe(events))
+        return
+
+    with connection.cursor() as cursor:
+        for start in range(0, len(events), NOTIFY_BATCH_SIZE):
+            payload = json.dumps(events[start:start + NOTIFY_BATCH_SIZE], cls=DjangoJSONEncoder)
+            cursor.execute("SELECT pg_notify(%s, %s)", [CHANNEL, payload])
+
+
+class Subscription:
+    """
+    One stream subscriber: its filters and a bounded buffer of encoded
+    events.
+
+    When the buffer is full the oldest event is dropped, so a slow client
+    can never hold more than `maxsize` events in memory; it is told how
+    many it missed with a `lagged` event.
+
+    Attributes:
+    - `library`: Only receive entries of this library (None for all).
+    - `user`: Only receive entries of this user (None for all).
+    - `dropped`: Events dropped since the last one delivered.
+    """
+
+    def __init__(self, library: int = None, user: int = None, maxsize: int = 100):
+        self.library = library
+        self.user = user
+        self.dropped = 0
+        self._queue = asyncio.Queue(maxsize)
+
+    @property
+    def key(self) -> tuple:
+        return self.library, self.user
+
+    def push(self, frame: bytes) -> None:
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(frame)
+
+    async def frames(self, heartbeat: float):
+        """
+        Yield encoded server-sent events as they arrive, and a comment line
+        every `heartbeat` seconds without events to keep the connection open.
+        """
+        while True:
+            try:
+                frame = await asyncio.wait_for(self._queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield b": keep-alive\n\n"
+                continue
+            if self.dropped:
+                yield encode_event("lagged", {"dropped": self.dropped})
+                self.dropped = 0
+            yield frame
+
+
+class EntryBroadcaster:
+    """
+    Fans new entries out to the stream subscribers of this process.
+
+    Subscribers are indexed by their `(library, user)` filter, so an event
+    is encoded once and looked up under at most four keys, whatever the
+    number of subscribers. With the `"postgres"` source a single `LISTEN`
+    connection per process feeds the broadcaster, read from the event loop
+    without a thread.
+
+    Attributes:
+    - `listening`: An `asyncio.Event` set while the `LISTEN` connection is up.
+    """
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._count = 0
+        self._loop = None
+        self._listener = None
+        self.listening = None
+
+    def __len__(self):
+        return self._count
+
+    def subscribe(self, library: int = None, user: int = None, maxsize: int = None) -> Subscription:
+        """
+        Register a subscriber; must be called from the event loop.
+        """
+        if maxsize is None:
+            maxsize = getattr(settings, "ENTRY_STREAM_BUFFER", 100)
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Subscribers and the listener of a previous loop went with it
+            self._loop, self._listener = loop, None
+            self.listening = asyncio.Event()
+            self._subscribers.clear()
+            self._count = 0
+        if self._listener is None and getattr(settings, "ENTRY_STREAM_SOURCE", "postgres") == "postgres":
+            self._listener = self._loop.create_task(self._listen())
+
+        subscription = Subscription(library, user, maxsize)
+        self._subscribers[subscription.key].add(subscription)
+        self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscribers = self._subscribers.get(subscription.key)
+        if subscribers and subscription in subscribers:
+            subscribers.discard(subscription)
+            self._count -= 1
+            if not subscribers:
+                del self._subscribers[subscription.key]
+
+    def publish(self, events: list) -> None:
+        """
+        Deliver events to the matching subscribers; must be called from the
+        event loop.
+        """
+        for event in events:
+            library, user = event["library"], event["user"]
+            frame = None
+            for key in ((None, None), (library, None), (None, user), (library, user)):
+                for subscription in self._subscribers.get(key, ()):
+                    if frame is None:
+                        frame = encode_event("entry", event, event["id"])
+                    subscription.push(frame)
+
+    def publish_threadsafe(self, events: list) -> None:
+        """
+        Deliver events from any thread.
+        """
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self.publish, events)
+
+    async def stop(self) -> None:
+        """
+        Stop listening; subscribers stay registered.
+        """
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                await self._listen_once()
+            except (psycopg2.Error, OSError) as e:
+                logger.warning("Entry stream listener lost its connection: %s", e)
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def _listen_once(self) -> None:
+        params = connections["default"].get_connection_params()
+        pg = await asyncio.to_thread(psycopg2.connect, **params)
+        pg.autocommit = True
+        lost = asyncio.Event()
+
+        def read():
+            try:
+                pg.poll()
+            except psycopg2.Error:
+                lost.set()
+                return
+            while pg.notifies:
+                notify = pg.notifies.pop(0)
+                self.publish(json.loads(notify.payload))
+
+        try:
+            with pg.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL}")
+            self._loop.add_reader(pg.fileno(), read)
+            self.listening.set()
+            try:
+                await lost.wait()
+            finally:
+                self.listening.clear()
+                self._loop.remove_reader(pg.fileno())
+        finally:
+            pg.close()
+        raise psycopg2.OperationalError("LISTEN connection closed")
+
+
+def encode_event(event: str, data: dict, event_id=None) -> bytes:
+    """
+    Encode one server-sent event.
+    """
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':'))}")
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+broadcaster = EntryBroadcaster()
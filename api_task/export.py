@@ -0,0 +1,310 @@
+import asyncio
+import csv
+import gzip
+import importlib.util
+import io
+import json
+import threading
+import zlib
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+
+from .batch import repeatable_read
+from .models import Author, Book, BookAuthor, Library
+
+# Columns of the exported catalog, one row per book
+COLUMNS = ("book_id", "title", "author_ids", "author_names", "library_ids", "library_names")
+
+FORMATS = ("csv", "ndjson", "parquet")
+
+CONTENT_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def available_formats() -> tuple:
+    """
+    Return the formats that can be exported; Parquet needs the optional
+    `pyarrow` package.
+    """
+    # Looked up without importing pyarrow, which is slow to import and only
+    # needed once a Parquet export starts
+    if importlib.util.find_spec("pyarrow") is not None:
+        return FORMATS
+    return tuple(f for f in FORMATS if f != "parquet")
+
+
+def catalog_query(text_arrays: bool = False) -> str:
+    """
+    Return the SQL reading the joined catalog, ordered by book.
+
+    Args:
+    - `text_arrays`: Render the list columns as JSON arrays, for CSV.
+    """
+    book = Book._meta.db_table
+    author = Author._meta.db_table
+    book_author = BookAuthor._meta.db_table
+    library = Library._meta.db_table
+    library_books = Library.books.through._meta.db_table
+
+    def array(expression, kind):
+        expression = f"coalesce({expression}, '{{}}'::{kind}[])"
+        return f"to_json({expression})::text" if text_arrays else expression
+
+    return (
+        f"SELECT b.id AS book_id, b.title, "
+        f"{array('a.ids', 'bigint')} AS author_ids, {array('a.names', 'text')} AS author_names, "
+        f"{array('l.ids', 'bigint')} AS library_ids, {array('l.names', 'text')} AS library_names "
+        f"FROM {book} AS b "
+        f"LEFT JOIN LATERAL (SELECT array_agg(au.id ORDER BY au.id) AS ids, "
+        f"array_agg(au.name::text ORDER BY au.id) AS names "
+        f"FROM {book_author} AS ba JOIN {author} AS au ON au.id = ba.author_id "
+        f"WHERE ba.book_id = b.id) AS a ON true "
+        f"LEFT JOIN LATERAL (SELECT array_agg(li.id ORDER BY li.id) AS ids, "
+        f"array_agg(li.name::text ORDER BY li.id) AS names "
+        f"FROM {library_books} AS lb JOIN {library} AS li ON li.id = lb.library_id "
+        f"WHERE lb.book_id = b.id) AS l ON true "
+        f"ORDER BY b.id"
+    )
+
+
+def stream_catalog(file_format: str, compress: bool = False, chunk_size: int = None):
+    """
+    Yield the catalog encoded in `file_format`, in chunks of bytes.
+
+    Rows are read from a server-side cursor `chunk_size` at a time, inside
+    one `REPEATABLE READ` transaction, so memory use does not depend on the
+    size of the catalog and the whole export reflects a single snapshot.
+    The transaction stays open until the generator is exhausted or closed.
+
+    List columns are JSON arrays in CSV, arrays in NDJSON and list columns
+    in Parquet. With `compress`, CSV and NDJSON are gzipped as they are
+    streamed; Parquet uses gzip for its column chunks instead, the file
+    itself staying a valid Parquet file.
+
+    Args:
+    - `file_format`: One of `FORMATS`.
+    - `compress`: Whether to compress the output with gzip.
+    - `chunk_size`: Rows fetched per round trip; defaults to `CATALOG_EXPORT_CHUNK_SIZE`.
+    """
+    if file_format not in available_formats():
+        raise ImproperlyConfigured(f"Cannot export the catalog as {file_format!r}")
+    if chunk_size is None:
+        chunk_size = getattr(settings, "CATALOG_EXPORT_CHUNK_SIZE", 2000)
+
+    encoder = ENCODERS[file_format](compress)
+    gzipper = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if compress and file_format != "parquet" else None
+
+    def output(data: bytes):
+        return gzipper.compress(data) if gzipper is not None else data
+
+    with repeatable_read():
+        with connection.chunked_cursor() as cursor:
+            cursor.execute(catalog_query(text_arrays=file_format == "csv"))
+            data = output(encoder.header())
+            while rows := cursor.fetchmany(chunk_size):
+                data += output(encoder.encode(rows))
+                if data:
+                    yield data
+                    data = b""
+    data += output(encoder.close())
+    if gzipper is not None:
+        data += gzipper.flush()
+    if data:
+        yield data
+
+
+async def astream_catalog(file_format: str, compress: bool = False, chunk_size: int = None):
+    """
+    Asynchronous version of `stream_catalog`, for responses served over ASGI.
+
+    A thread of its own drives `stream_catalog`, on its own database
+    connection, and hands the chunks over through an `asyncio.Queue` of
+    `CATALOG_EXPORT_ASYNC_BUFFER` chunks: the event loop is never blocked on
+    the cursor, and the thread waits while the client is slower than the
+    database. Closing the generator (e.g. when the client disconnects)
+    stops the thread, which ends the transaction and closes its connection.
+
+    Args:
+    - `file_format`: One of `FORMATS`.
+    - `compress`: Whether to compress the output with gzip.
+    - `chunk_size`: Rows fetched per round trip; defaults to `CATALOG_EXPORT_CHUNK_SIZE`.
+    """
+    if file_format not in available_formats():
+        raise ImproperlyConfigured(f"Cannot export the catalog as {file_format!r}")
+
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=getattr(settings, "CATALOG_EXPORT_ASYNC_BUFFER", 8))
+    stopped = threading.Event()
+    end = object()
+
+    def put(item) -> bool:
+        # Waits for room in the queue; False once the consumer has gone
+        if stopped.is_set():
+            return False
+        asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+        return not stopped.is_set()
+
+    def produce():
+        chunks = stream_catalog(file_format, compress, chunk_size)
+        try:
+            for chunk in chunks:
+                if not put(chunk):
+                    return
+            put(end)
+        except Exception as e:
+            put(e)
+        finally:
+            chunks.close()
+            connection.close()
+
+    thread = threading.Thread(target=produce, name="catalog-export", daemon=True)
+    thread.start()
+    try:
+        while (item := await queue.get()) is not end:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stopped.set()
+        # Unblock a producer waiting for room in the queue
+        while not queue.empty():
+            queue.get_nowait()
+
+
+def write_catalog(out, file_format: str, compress: bool = False, chunk_size: int = None) -> None:
+    """
+    Write the catalog to the binary file object `out`.
+
+    CSV is produced by the server with `COPY ... TO STDOUT` from a
+    `REPEATABLE READ` snapshot, without a row ever being decoded in Python;
+    the other formats are written from `stream_catalog`.
+
+    Args:
+    - `out`: A file object open for writing bytes.
+    - `file_format`: One of `FORMATS`.
+    - `compress`: Whether to compress the output with gzip.
+    - `chunk_size`: Rows fetched per round trip, for the other formats.
+    """
+    if file_format != "csv":
+        for chunk in stream_catalog(file_format, compress, chunk_size):
+            out.write(chunk)
+        return
+
+    target = gzip.GzipFile(fileobj=out, mode="wb", mtime=0) if compress else out
+    try:
+        with repeatable_read(), connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY ({catalog_query(text_arrays=True)}) TO STDOUT WITH (FORMAT csv, HEADER)", target
+            )
+    finally:
+        if compress:
+            target.close()
+
+
+class CSVEncoder:
+    def __init__(self, compress: bool):
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, lineterminator="\n")
+
+    def header(self) -> bytes:
+        return self.encode([COLUMNS])
+
+    def encode(self, rows) -> bytes:
+        self._writer.writerows(rows)
+        data = self._buffer.getvalue().encode()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+    def close(self) -> bytes:
+        return b""
+
+
+class NDJSONEncoder:
+    def __init__(self, compress: bool):
+        pass
+
+    def header(self) -> bytes:
+        return b""
+
+    def encode(self, rows) -> bytes:
+        return "".join(
+            json.dumps(dict(zip(COLUMNS, row)), cls=DjangoJSONEncoder, ensure_ascii=False, separators=(",", ":"))
+            + "\n"
+            for row in rows
+        ).encode()
+
+    def close(self) -> bytes:
+        return b""
+
+
+class ParquetEncoder:
+    """
+    Writes each chunk of rows as one Parquet row group into an in-memory
+    sink that is emptied after every chunk.
+    """
+
+    def __init__(self, compress: bool):
+        import pyarrow
+        import pyarrow.parquet
+
+        self._schema = pyarrow.schema([
+            ("book_id", pyarrow.int64()),
+            ("title", pyarrow.string()),
+            ("author_ids", pyarrow.list_(pyarrow.int64())),
+            ("author_names", pyarrow.list_(pyarrow.string())),
+            ("library_ids", pyarrow.list_(pyarrow.int64())),
+            ("library_names", pyarrow.list_(pyarrow.string())),
+        ])
+        self._sink = _Sink()
+        self._pyarrow = pyarrow
+        self._writer = pyarrow.parquet.ParquetWriter(
+            self._sink, self._schema, compression="gzip" if compress else "snappy"
+        )
+
+    def header(self) -> bytes:
+        return self._sink.drain()
+
+    def encode(self, rows) -> bytes:
+        pyarrow = self._pyarrow
+        columns = list(zip(*rows))
+        self._writer.write_table(pyarrow.Table.from_arrays(
+            [pyarrow.array(column, type=field.type) for column, field in zip(columns, self._schema)],
+            schema=self._schema,
+        ))
+        return self._sink.drain()
+
+    def close(self) -> bytes:
+        self._writer.close()
+        return self._sink.drain()
+
+
+class _Sink(io.RawIOBase):
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+ENCODERS = {"csv": CSVEncoder, "ndjson": NDJSONEncoder, "parquet": ParquetEncoder}
@@ -0,0 +1,452 @@
+import hashlib
+import re
+from dataclasses import dataclass, field
+
+from django.apps import apps
+from django.conf import settings
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections, connection, migrations, models, transaction
+from django.test import Client, override_settings
+from django.urls import get_resolver, reverse
+
+from .models import Entry
+
+# Comparisons on a column in a scan filter: the column, then the operator
+_COMPARISON = re.compile(
+    r"\(*(?:(\w+)\.)?\"?(\w+)\"?\)*(?:::[a-z ]+?)?\)*\s+(=|>=|<=|<|>)\s", re.IGNORECASE
+)
+_QUALIFIED_COLUMN = re.compile(r"(\w+)\.\"?(\w+)\"?")
+
+# Endpoints not replayed: streams, writes and token endpoints
+SKIPPED_ENDPOINTS = {"entry-stream", "token-obtain", "token-revoke"}
+
+# Query parameters sent to endpoints that need some to do real work
+REPLAY_PARAMS = {
+    "changes": {"since": 0},
+}
+
+
+@dataclass
+class CapturedQuery:
+    """
+    A query issued while replaying an endpoint.
+
+    Attributes:
+    - `sql`: The SQL with `%s` placeholders.
+    - `params`: The parameters of its first run.
+    - `endpoints`: URL names of the endpoints that issued it.
+    - `count`: How many times it ran.
+    """
+    sql: str
+    params: tuple | dict
+    endpoints: set = field(default_factory=set)
+    count: int = 0
+
+
+class QueryCollector:
+    """
+    Execute wrapper recording every SELECT run on the connection, tagged
+    with the current `label`. Queries are grouped by their SQL, keeping the
+    parameters of the first run, so a query run once per row of a page is
+    explained once and weighted by its count.
+
+    Example:
+    ```
+    collector = QueryCollector()
+    with connection.execute_wrapper(collector):
+        collector.label = "book-list"
+        list(Book.objects.all())
+    collector.queries  # {sql: CapturedQuery(...)}
+    ```
+    """
+
+    def __init__(self):
+        self.label = None
+        self.queries = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith(("SELECT", "WITH")):
+            query = self.queries.get(sql)
+            if query is None:
+                query = self.queries[sql] = CapturedQuery(sql, params)
+            query.count += 1
+            if self.label:
+                query.endpoints.add(self.label)
+        return execute(sql, params, many, context)
+
+
+@dataclass
+class Proposal:
+    """
+    An index proposed for sequential scans seen in the query plans.
+
+    Attributes:
+    - `table`: The table to index (the parent of partitions).
+    - `columns`: Indexed columns, equality columns first.
+    - `rows`: Rows the scans read, summed over the queries.
+    - `queries`: The captured queries whose plans had the scans.
+    - `before_ms`, `after_ms`: Execution time of those queries, weighted
+      by how often they ran, without and with the index.
+    - `before_buffers`, `after_buffers`: Shared buffers they touched.
+    """
+    table: str
+    columns: tuple
+    rows: int = 0
+    queries: list = field(default_factory=list)
+    before_ms: float = None
+    after_ms: float = None
+    before_buffers: int = None
+    after_buffers: int = None
+
+    @property
+    def name(self) -> str:
+        digest = hashlib.md5(f"{self.table}:{','.join(self.columns)}".encode()).hexdigest()[:6]
+        prefix = self.table.removeprefix("api_task_")
+        return f"{prefix[:12]}_{'_'.join(self.columns)[:8]}_{digest}_idx".replace("__", "_")
+
+    @property
+    def endpoints(self) -> list:
+        return sorted(set().union(*(query.endpoints for query in self.queries)))
+
+    @property
+    def saved_pct(self) -> float:
+        if not self.before_ms:
+            return 0.0
+        return round((1 - self.after_ms / self.before_ms) * 100, 1)
+
+    def to_dict(self) -> dict:
+        return {
+            "table": self.table,
+            "columns": list(self.columns),
+            "name": self.name,
+            "rows_scanned": self.rows,
+            "endpoints": self.endpoints,
+            "queries": len(self.queries),
+            "before_ms": self.before_ms,
+            "after_ms": self.after_ms,
+            "before_buffers": self.before_buffers,
+            "after_buffers": self.after_buffers,
+            "saved_pct": self.saved_pct,
+        }
+
+
+def replay_endpoints(collector: QueryCollector, user, paths=()) -> list:
+    """
+    Send a GET request to every API endpoint, and to `paths`, as `user`,
+    recording their queries in `collector`.
+
+    Endpoints taking a user's primary key are called with the user who added
+    the latest entry, so their plans reflect real rows; the others with
+    `REPLAY_PARAMS`. Must run inside a transaction that is rolled back
+    afterwards, since some reads record state (e.g. the change log).
+
+    Returns:
+    - The response status of each request, by label.
+    """
+    client = Client(raise_request_exception=False)
+    client.force_login(user)
+    # Per-user endpoints are called for the user with the latest entry
+    sample_user = Entry.objects.order_by("-date_added").values_list("user_id", flat=True).first()
+    requests = []
+    for pattern in get_resolver("api_task.urls").url_patterns:
+        view_class = getattr(pattern.callback, "view_class", None)
+        if pattern.name in SKIPPED_ENDPOINTS or view_class is None or not hasattr(view_class, "get"):
+            continue
+        kwargs = {}
+        for name in pattern.pattern.converters:
+            kwargs[name] = sample_user or user.pk if name == "pk" else "ndjson"
+        path = reverse(pattern.name, kwargs=kwargs)
+        requests.append((pattern.name, path, REPLAY_PARAMS.get(pattern.name, {})))
+    requests.extend((path, path, {}) for path in paths)
+
+    # Like the test runner, keep the connection and its transaction open
+    # across requests, and accept the client's host name
+    for signal in (request_started, request_finished):
+        signal.disconnect(close_old_connections)
+    statuses = {}
+    try:
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+            with connection.execute_wrapper(collector):
+                for label, path, params in requests:
+                    collector.label = label
+                    response = client.get(path, params)
+                    if response.streaming:
+                        b"".join(response.streaming_content)
+                    statuses[label] = response.status_code
+    finally:
+        collector.label = None
+        for signal in (request_started, request_finished):
+            signal.connect(close_old_connections)
+    return statuses
+
+
+def explain(sql: str, params) -> dict:
+    """
+    Run a query under `EXPLAIN (ANALYZE, BUFFERS)` and return its plan,
+    with `Execution Time`.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}", params)
+        return cursor.fetchone()[0][0]
+
+
+def seq_scans(plan: dict):
+    """
+    Yield `(relation, alias, rows, equality_columns, range_columns)` for each
+    sequential scan in a plan, with the columns its filter (or the hash
+    join it feeds) compares.
+    """
+    def walk(node, parents):
+        if node.get("Node Type") == "Seq Scan":
+            alias = node.get("Alias")
+            rows = (node.get("Actual Rows", 0) + node.get("Rows Removed by Filter", 0)) * node.get("Actual Loops", 1)
+            equality, ranges = [], []
+            for prefix, column, operator in _COMPARISON.findall(node.get("Filter", "")):
+                if prefix in ("", alias, node["Relation Name"]):
+                    (equality if operator == "=" else ranges).append(column)
+            if len(parents) >= 2 and parents[-1].get("Node Type") == "Hash" and "Hash Cond" in parents[-2]:
+                for prefix, column in _QUALIFIED_COLUMN.findall(parents[-2]["Hash Cond"]):
+                    if prefix == alias:
+                        equality.append(column)
+            yield node["Relation Name"], alias, rows, equality, ranges
+        for child in node.get("Plans", ()):
+            yield from walk(child, parents + [node])
+
+    yield from walk(plan["Plan"], [])
+
+
+def advise(queries, min_rows: int = None, repeat: int = 2) -> list:
+    """
+    Explain the captured queries and propose indexes for the sequential
+    scans reading at least `min_rows` rows of a table, or of a table that
+    large, that no existing index could serve.
+
+    Each proposal is measured: the affected queries are explained again
+    after creating the index in a savepoint that is rolled back.
+
+    Args:
+    - `queries`: `CapturedQuery` objects.
+    - `min_rows`: Size from which a table counts as large; defaults to
+      `INDEX_ADVISOR_MIN_ROWS`.
+    - `repeat`: Runs per measurement; the fastest counts.
+
+    Returns:
+    - `Proposal`s, largest saving first.
+    """
+    if min_rows is None:
+        min_rows = getattr(settings, "INDEX_ADVISOR_MIN_ROWS", 10000)
+
+    proposals = {}
+    for query in queries:
+        for relation, _, rows, equality, ranges in seq_scans(explain(query.sql, query.params)):
+            table = parent_table(relation)
+            if rows < min_rows and table_rows(table) < min_rows:
+                continue
+            valid = table_columns(table)
+            columns = [c for c in equality if c in valid] + [c for c in ranges if c in valid][:1]
+            columns = tuple(dict.fromkeys(columns))
+            if not columns or is_covered(table, columns):
+                continue
+            proposal = proposals.setdefault((table, columns), Proposal(table, columns))
+            proposal.rows += rows
+            if query not in proposal.queries:
+                proposal.queries.append(query)
+
+    for proposal in proposals.values():
+        measure(proposal, repeat)
+    return sorted(proposals.values(), key=lambda p: (p.after_ms or 0) - (p.before_ms or 0))
+
+
+def measure(proposal: Proposal, repeat: int = 2) -> None:
+    """
+    Fill in the before and after timings of a proposal, creating its index
+    in a savepoint that is rolled back.
+    """
+    proposal.before_ms, proposal.before_buffers = _timings(proposal.queries, repeat)
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(create_index_sql(proposal))
+            cursor.execute(f"ANALYZE {connection.ops.quote_name(proposal.table)}")
+        proposal.after_ms, proposal.after_buffers = _timings(proposal.queries, repeat)
+        transaction.set_rollback(True)
+
+
+def _timings(queries, repeat: int) -> tuple:
+    total_ms, total_buffers = 0.0, 0
+    for query in queries:
+        plans = [explain(query.sql, query.params) for _ in range(max(repeat, 1))]
+        fastest = min(plans, key=lambda plan: plan["Execution Time"])
+        total_ms += fastest["Execution Time"] * query.count
+        plan = fastest["Plan"]
+        total_buffers += (plan.get("Shared Hit Blocks", 0) + plan.get("Shared Read Blocks", 0)) * query.count
+    return round(total_ms, 3), total_buffers
+
+
+def parent_table(relation: str) -> str:
+    """
+    Return the partitioned table a partition belongs to, or `relation`.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT parent.relname FROM pg_inherits JOIN pg_class parent ON parent.oid = inhparent "
+            "WHERE inhrelid = to_regclass(%s)",
+            [relation],
+        )
+        row = cursor.fetchone()
+    return row[0] if row else relation
+
+
+def table_rows(table: str) -> int:
+    """
+    Return the estimated rows of a table, including its partitions.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT coalesce(sum(greatest(reltuples, 0)), 0) FROM pg_class WHERE oid = to_regclass(%s) "
+            "OR oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = to_regclass(%s))",
+            [table, table],
+        )
+        return int(cursor.fetchone()[0])
+
+
+def table_columns(table: str) -> set:
+    with connection.cursor() as cursor:
+        return {column.name for column in connection.introspection.get_table_description(cursor, table)}
+
+
+def existing_indexes(table: str) -> list:
+    """
+    Return the key columns of each index on a table, in index order.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT array_agg(a.attname ORDER BY k.ord) FROM pg_index i "
+            "CROSS JOIN LATERAL unnest(i.indkey) WITH ORDINALITY AS k(attnum, ord) "
+            "JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum "
+            "WHERE i.indrelid = to_regclass(%s) AND k.ord <= i.indnkeyatts GROUP BY i.indexrelid",
+            [table],
+        )
+        return [tuple(row[0]) for row in cursor.fetchall()]
+
+
+def is_covered(table: str, columns: tuple) -> bool:
+    """
+    Tell whether an existing index starts with `columns`, in any order.
+    """
+    wanted = set(columns)
+    return any(set(index[:len(columns)]) == wanted for index in existing_indexes(table))
+
+
+def create_index_sql(proposal: Proposal) -> str:
+    quote = connection.ops.quote_name
+    columns = ", ".join(quote(column) for column in proposal.columns)
+    return f"CREATE INDEX {quote(proposal.name)} ON {quote(proposal.table)} ({columns})"
+
+
+def migration_operations(proposals) -> list:
+    """
+    Return the migration operations creating the proposed indexes:
+    `AddIndex` on models, `RunSQL` on auto-created many-to-many tables,
+    which have no model state to add an index to.
+    """
+    models_by_table = {
+        model._meta.db_table: model for model in apps.get_app_config("api_task").get_models(include_auto_created=True)
+    }
+    operations = []
+    for proposal in proposals:
+        model = models_by_table.get(proposal.table)
+        if model is None or model._meta.auto_created:
+            operations.append(migrations.RunSQL(
+                create_index_sql(proposal),
+                f"DROP INDEX {connection.ops.quote_name(proposal.name)}",
+            ))
+            continue
+        fields = {f.column: f.name for f in model._meta.concrete_fields}
+        operations.append(migrations.AddIndex(
+            model_name=model._meta.model_name,
+            index=models.Index(fields=[fields[column] for column in proposal.columns], name=proposal.name),
+        ))
+    return operations
+
+
+def generate_data(entries: int = 100000) -> dict:
+    """
+    Fill the database with synthetic catalog and activity data, scaled on
+    the number of entries, for running the advisor against a local
+    PostgreSQL. Rows are inserted with `generate_series`, bypassing model
+    signals, and the tables are analyzed afterwards. Called in a
+    transaction, the rows (and their statistics) go with its rollback.
+
+    Returns:
+    - The rows inserted per table.
+    """
+    authors = max(entries // 20, 10)
+    books = max(entries // 10, 10)
+    libraries = max(entries // 5000, 5)
+    users = max(entries // 100, 10)
+    statements = [
+        ("api_task_author",
+         "INSERT INTO api_task_author (name, birth_year, name_key, block_key) "
+         "SELECT 'Author ' || g, 1900 + g %% 100, 'author ' || g, g || ' a' "
+         "FROM generate_series(1, %s) g ON CONFLICT DO NOTHING", [authors]),
+        ("api_task_book",
+         "INSERT INTO api_task_book (title, content_hash) "
+         "SELECT 'Book ' || g, md5(random()::text || g) FROM generate_series(1, %s) g", [books]),
+        ("api_task_bookauthor",
+         "INSERT INTO api_task_bookauthor (book_id, author_id) "
+         "SELECT b.id, a.ids[1 + floor(random() * cardinality(a.ids))::int] "
+         "FROM api_task_book b, (SELECT array_agg(id) ids FROM api_task_author) a ON CONFLICT DO NOTHING", []),
+        ("api_task_library",
+         "INSERT INTO api_task_library (name) SELECT 'Library ' || g FROM generate_series(1, %s) g", [libraries]),
+        ("api_task_library_books",
+         "INSERT INTO api_task_library_books (library_id, book_id) "
+         "SELECT l.ids[1 + floor(random() * cardinality(l.ids))::int], b.id "
+         "FROM api_task_book b, (SELECT array_agg(id) ids FROM api_task_library) l ON CONFLICT DO NOTHING", []),
+        ("api_task_customuser",
+         "INSERT INTO api_task_customuser (password, is_superuser, username, first_name, last_name, email, "
+         "is_staff, is_active, date_joined) "
+         "SELECT '!', false, name, '', '', name || '@example.com', false, true, now() "
+         "FROM (SELECT 'generated_' || md5(random()::text || g) AS name FROM generate_series(1, %s) g) u",
+         [users]),
+        ("api_task_entry",
+         "INSERT INTO api_task_entry (user_id, library_id, book_id, date_added) "
+         "SELECT u.ids[1 + floor(random() * cardinality(u.ids))::int], "
+         "l.ids[1 + floor(random() * cardinality(l.ids))::int], "
+         "b.ids[1 + floor(random() * cardinality(b.ids))::int], now() - random() * interval '365 days' "
+         "FROM generate_series(1, %s), (SELECT array_agg(id) ids FROM api_task_customuser) u, "
+         "(SELECT array_agg(id) ids FROM api_task_library) l, (SELECT array_agg(id) ids FROM api_task_book) b",
+         [entries]),
+    ]
+    inserted = {}
+    with transaction.atomic(), connection.cursor() as cursor:
+        for table, sql, params in statements:
+            cursor.execute(sql, params)
+            inserted[table] = cursor.rowcount
+    with connection.cursor() as cursor:
+        for table, _, _ in statements:
+            cursor.execute(f"ANALYZE {table}")
+    return inserted
+
+
+def write_migration(proposals, app_label: str = "api_task") -> str:
+    """
+    Write a migration creating the proposed indexes after the latest
+    migration of the app, formatted like `makemigrations` output.
+
+    Returns:
+    - The path of the migration file.
+    """
+    from django.core.management.utils import run_formatters
+    from django.db.migrations.loader import MigrationLoader
+    from django.db.migrations.writer import MigrationWriter
+
+    leaf = MigrationLoader(None, ignore_no_migrations=True).graph.leaf_nodes(app_label)[0][1]
+    migration = migrations.Migration(f"{int(leaf[:4]) + 1:04d}_advised_indexes", app_label)
+    migration.dependencies = [(app_label, leaf)]
+    migration.operations = migration_operations(proposals)
+
+    writer = MigrationWriter(migration)
+    with open(writer.path, "w", encoding="utf-8") as f:
+        f.write(writer.as_string())
+    run_formatters([writer.path])
+    return writer.path
@@ -0,0 +1,207 @@
+import threading
+import time
+from contextlib import ExitStack
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Min
+
+from . import changes, events, sharding
+from .models import Book, Change, CustomUser, Entry, Library, PendingEntry
+from .rollups import record_entries
+
+
+@dataclass
+class FlushResult:
+    """
+    Outcome of one `flush_pending` batch.
+
+    Attributes:
+    - `inserted`: Entries created from the batch.
+    - `rejected`: Pending rows marked as failed.
+    """
+    inserted: int = 0
+    rejected: int = 0
+
+    @property
+    def processed(self) -> int:
+        return self.inserted + self.rejected
+
+
+def enqueue_entries(rows: list) -> int:
+    """
+    Append validated check-ins to the PendingEntry buffer.
+
+    Args:
+    - `rows`: Dicts with `user`, `library` and `book` primary keys, as
+      validated by `EntryIngestSerializer`.
+
+    Returns:
+    - The number of buffered rows.
+    """
+    PendingEntry.objects.bulk_create(
+        [
+            PendingEntry(user_id=row["user"], library_id=row["library"], book_id=row["book"])
+            for row in rows
+        ]
+    )
+    _backlog.added(len(rows))
+    return len(rows)
+
+
+def flush_pending(batch_size: int = 5000) -> FlushResult:
+    """
+    Move one batch of pending check-ins into Entry.
+
+    The batch is claimed with `SELECT ... FOR UPDATE SKIP LOCKED`, so several
+    flushers can run side by side. The existence checks `Entry.save()` does
+    per row are done here with one query per related table; rows pointing
+    at missing users, libraries or books are kept with `error` set, the
+    others are inserted with `bulk_create`, counted in the usage rollups,
+    added to the change log, announced to the entry stream and removed from
+    the buffer. With sharding, entries take their ids from the global
+    sequence and are inserted on the shard of their library.
+
+    Args:
+    - `batch_size`: Maximum number of pending rows to process.
+
+    Returns:
+    - A `FlushResult`; `processed` is 0 once the buffer is empty.
+    """
+    result = FlushResult()
+    with transaction.atomic():
+        batch = list(
+            PendingEntry.objects.select_for_update(skip_locked=True)
+            .filter(error="")
+            .order_by("id")[:batch_size]
+        )
+        if not batch:
+            return result
+
+        user_ids = _existing(CustomUser, {row.user_id for row in batch})
+        library_ids = _existing(Library, {row.library_id for row in batch})
+        book_ids = _existing(Book, {row.book_id for row in batch})
+
+        entries, done, failed = [], [], {}
+        for row in batch:
+            error = _check(row, user_ids, library_ids, book_ids)
+            if error:
+                failed.setdefault(error, []).append(row.pk)
+                continue
+            entries.append(
+                Entry(
+                    user_id=row.user_id,
+                    library_id=row.library_id,
+                    book_id=row.book_id,
+                    date_added=row.received_at,
+                )
+            )
+            done.append(row.pk)
+
+        if sharding.enabled():
+            for entry in entries:
+                entry.pk = sharding.next_entry_id()
+        else:
+            Entry.objects.bulk_create(entries)
+        record_entries(entries)
+        changes.record("entries", Change.SAVE, [entry.pk for entry in entries])
+        events.publish_entries(entries)
+        PendingEntry.objects.filter(pk__in=done).delete()
+        for error, pks in failed.items():
+            PendingEntry.objects.filter(pk__in=pks).update(error=error)
+        if sharding.enabled():
+            _insert_on_shards(entries)
+
+    result.inserted = len(entries)
+    result.rejected = len(batch) - len(entries)
+    return result
+
+
+def _insert_on_shards(entries: list) -> None:
+    # Entries go to the shard of their library. Every shard's transaction
+    # stays open until all inserts succeeded, and this runs last in the
+    # buffer's transaction, so a failure rolls everything back and only the
+    # commits themselves can leave the databases apart.
+    by_shard = {}
+    for entry in entries:
+        by_shard.setdefault(sharding.entry_database(entry.library_id), []).append(entry)
+    with ExitStack() as stack:
+        for alias, shard_entries in by_shard.items():
+            stack.enter_context(transaction.atomic(using=alias))
+            Entry.objects.using(alias).bulk_create(shard_entries)
+
+
+def buffer_status() -> dict:
+    """
+    Describe the ingestion buffer for the status endpoint.
+
+    Returns:
+    - A dict with the number of pending and failed rows, when the oldest
+      pending row was received and the back-pressure limit.
+    """
+    pending = PendingEntry.objects.filter(error="")
+    oldest = pending.order_by("id").values_list("received_at", flat=True).first()
+    return {
+        "pending": pending.count(),
+        "failed": PendingEntry.objects.exclude(error="").count(),
+        "oldest_pending": oldest,
+        "max_pending": _max_pending(),
+    }
+
+
+def is_saturated() -> bool:
+    """
+    Tell whether the buffer holds more than `ENTRY_BUFFER_MAX_PENDING` rows.
+
+    The backlog is estimated from the id range of pending rows (two index
+    probes) and the estimate is reused for `ENTRY_BUFFER_CHECK_INTERVAL`
+    seconds, plus the rows this process buffered since, so the check stays
+    off the database for most requests.
+    """
+    return _backlog.estimate() >= _max_pending()
+
+
+def _max_pending() -> int:
+    return getattr(settings, "ENTRY_BUFFER_MAX_PENDING", 100000)
+
+
+def _existing(model, pks: set) -> set:
+    return set(model.objects.filter(pk__in=pks).values_list("pk", flat=True))
+
+
+def _check(row, user_ids: set, library_ids: set, book_ids: set) -> str:
+    if row.book_id not in book_ids:
+        return "This entry must have a valid book."
+    if row.user_id not in user_ids:
+        return "This entry must have a valid user."
+    if row.library_id not in library_ids:
+        return "This entry must belong to a valid library."
+    return ""
+
+
+class _Backlog:
+    def __init__(self):
+        self._estimate = 0
+        self._checked = None
+        self._lock = threading.Lock()
+
+    def estimate(self) -> int:
+        interval = getattr(settings, "ENTRY_BUFFER_CHECK_INTERVAL", 1.0)
+        now = time.monotonic()
+        with self._lock:
+            if self._checked is not None and now - self._checked < interval:
+                return self._estimate
+
+        bounds = PendingEntry.objects.filter(error="").aggregate(low=Min("id"), high=Max("id"))
+        estimate = bounds["high"] - bounds["low"] + 1 if bounds["high"] is not None else 0
+        with self._lock:
+            self._estimate, self._checked = estimate, now
+        return estimate
+
+    def added(self, count: int) -> None:
+        with self._lock:
+            self._estimate += count
+
+
+_backlog = _Backlog()
@@ -0,0 +1,576 @@
+"""
+Load generator driving a running instance of the API over HTTP
+(`manage.py loadtest`).
+
+Requests are picked from a weighted mix of scenarios (`SCENARIOS`), each
+building one request for a logged-in user. They are sent by an asyncio
+client keeping up to `concurrency` HTTP/1.1 keep-alive connections, either:
+
+- open-loop, at a fixed arrival rate whatever the response times: latency
+  is measured from the time a request was due, so time spent waiting for a
+  free connection counts (no coordinated omission); or
+- closed-loop, with `concurrency` clients each sending a request as soon as
+  the previous one got its response.
+
+The client is a small HTTP/1.1 implementation on asyncio streams, so the
+command needs nothing beyond the standard library.
+"""
+import asyncio
+import json
+import random
+import ssl
+import time
+import zlib
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+from django.core import signing
+from django.urls import reverse
+
+DEFAULT_MIX = {"book-list": 50, "library-list": 20, "entry-create": 20, "entry-update": 10}
+
+# Entries per user fetched for entry-update, and created when a staff user
+# has none yet
+ENTRY_POOL_SIZE = 100
+SEED_ENTRIES = 5
+
+
+class HTTPError(Exception):
+    """
+    Raised for malformed responses and failed requests during setup.
+    """
+
+
+class StaleConnection(HTTPError):
+    """
+    Raised when the server closed a kept-alive connection before answering,
+    e.g. on its keep-alive timeout; the request can be sent again.
+    """
+
+
+class Connection:
+    """
+    An HTTP/1.1 keep-alive connection to the target.
+    """
+
+    def __init__(self, host: str, port: int, use_ssl: bool):
+        self.host, self.port, self.use_ssl = host, port, use_ssl
+        self.reader = self.writer = None
+        self.reusable = False
+        self.served = 0
+
+    async def open(self) -> None:
+        context = ssl.create_default_context() if self.use_ssl else None
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port, ssl=context)
+        self.reusable = True
+
+    def close(self) -> None:
+        self.reusable = False
+        if self.writer is not None:
+            self.writer.close()
+
+    async def request(self, method: str, path: str, headers: dict, body: bytes = b"") -> tuple:
+        """
+        Send a request and read its response.
+
+        Returns:
+        - The `(status, body)` of the response.
+        """
+        if self.writer is None:
+            await self.open()
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}", f"Content-Length: {len(body)}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        try:
+            self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+            await self.writer.drain()
+            response = await read_response(self.reader, self)
+        except (asyncio.IncompleteReadError, ConnectionResetError, BrokenPipeError) as e:
+            self.close()
+            if self.served and not getattr(e, "partial", b""):
+                raise StaleConnection("Connection closed by the server") from e
+            raise HTTPError(f"Incomplete response: {e}") from e
+        except ValueError as e:
+            self.close()
+            raise HTTPError(f"Malformed response: {e}") from e
+        self.served += 1
+        return response
+
+
+async def read_response(reader: asyncio.StreamReader, connection: Connection = None) -> tuple:
+    """
+    Read an HTTP/1.1 response: its status line, headers and a body framed
+    by `Content-Length`, chunked transfer encoding or the end of the
+    connection. Marks `connection` as not reusable if the server closes it.
+    """
+    status_line = await reader.readuntil(b"\r\n")
+    status = int(status_line.split(b" ", 2)[1])
+    headers = {}
+    while (line := await reader.readuntil(b"\r\n")) != b"\r\n":
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        chunks = []
+        while size := int((await reader.readuntil(b"\r\n")).split(b";")[0], 16):
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+        # Trailers, up to the empty line
+        while await reader.readuntil(b"\r\n") != b"\r\n":
+            pass
+        body = b"".join(chunks)
+    elif "content-length" in headers:
+        body = await reader.readexactly(int(headers["content-length"]))
+    elif status in (204, 304) or 100 <= status < 200:
+        body = b""
+    else:
+        body = await reader.read()
+        headers["connection"] = "close"
+
+    if connection is not None and headers.get("connection", "").lower() == "close":
+        connection.close()
+    return status, body
+
+
+class ConnectionPool:
+    """
+    Up to `size` connections to the target, reused across requests. A
+    request waits for a free connection when all of them are busy.
+    """
+
+    def __init__(self, url: str, size: int):
+        parts = urlsplit(url)
+        self.use_ssl = parts.scheme == "https"
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.use_ssl else 80)
+        self.prefix = parts.path.rstrip("/")
+        self.idle = []
+        self.slots = asyncio.Semaphore(size)
+
+    async def request(self, method: str, path: str, headers: dict = None, body=None) -> tuple:
+        """
+        Send a request, with a JSON `body` if one is given.
+
+        Returns:
+        - The `(status, body)` of the response.
+        """
+        headers = dict(headers or {})
+        payload = b""
+        if body is not None:
+            payload = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+        async with self.slots:
+            connection = self.idle.pop() if self.idle else Connection(self.host, self.port, self.use_ssl)
+            try:
+                try:
+                    response = await connection.request(method, self.prefix + path, headers, payload)
+                except StaleConnection:
+                    connection = Connection(self.host, self.port, self.use_ssl)
+                    response = await connection.request(method, self.prefix + path, headers, payload)
+            except BaseException:
+                connection.close()
+                raise
+            if connection.reusable:
+                self.idle.append(connection)
+            return response
+
+    def close(self) -> None:
+        for connection in self.idle:
+            connection.close()
+        self.idle = []
+
+
+def token_payload(token: str) -> dict:
+    """
+    Read the payload of a bearer token issued by `api_task.tokens` without
+    verifying it: the payload is signed, not encrypted, and the target may
+    not share this process's `SECRET_KEY`.
+    """
+    data = token.split(":", 1)[0]
+    compressed = data.startswith(".")
+    data = signing.b64_decode(data.lstrip(".").encode())
+    return json.loads(zlib.decompress(data) if compressed else data)
+
+
+@dataclass
+class User:
+    """
+    A logged-in user and the entries it may update.
+
+    Attributes:
+    - `username`: The username.
+    - `token`: The bearer token sent with each request.
+    - `pk`, `is_staff`: Read from the token's payload.
+    - `entries`: `(id, library, book)` of the user's latest entries.
+    """
+
+    username: str
+    token: str
+    pk: int
+    is_staff: bool
+    entries: list = field(default_factory=list)
+
+    @property
+    def headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.token}"}
+
+
+@dataclass
+class Catalog:
+    """
+    Ids of the books and libraries that entries are created with.
+    """
+
+    books: list
+    libraries: list
+
+
+def book_list(rng, user, catalog):
+    return "GET", reverse("book-list"), None
+
+
+def library_list(rng, user, catalog):
+    return "GET", reverse("library-list"), None
+
+
+def entry_create(rng, user, catalog):
+    body = {"user": user.pk, "library": rng.choice(catalog.libraries), "book": rng.choice(catalog.books)}
+    return "POST", reverse("entry-create"), body
+
+
+def entry_update(rng, user, catalog):
+    entry, library, _ = rng.choice(user.entries)
+    body = {"user": user.pk, "library": library, "book": rng.choice(catalog.books)}
+    return "PUT", reverse("entry-update", args=[entry]), body
+
+
+# Each scenario builds `(method, path, json body)` for a user
+SCENARIOS = {
+    "book-list": book_list,
+    "library-list": library_list,
+    "entry-create": entry_create,
+    "entry-update": entry_update,
+}
+
+
+def parse_mix(value: str) -> dict:
+    """
+    Parse a mix such as `book-list=50,entry-create=10` into weights by
+    scenario.
+
+    Raises:
+    - `ValueError` for unknown scenarios and invalid weights.
+    """
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.strip().partition("=")
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}")
+        mix[name] = float(weight or 1)
+        if mix[name] < 0:
+            raise ValueError(f"Negative weight for {name!r}")
+    if not any(mix.values()):
+        raise ValueError("The mix has no scenario with a positive weight")
+    return mix
+
+
+async def login(pool: ConnectionPool, username: str, password: str) -> User:
+    status, body = await pool.request("POST", reverse("token-obtain"), body={"username": username, "password": password})
+    if status != 201:
+        raise HTTPError(f"Login of {username!r} failed with {status}: {body[:200].decode(errors='replace')}")
+    token = json.loads(body)["token"]
+    payload = token_payload(token)
+    return User(username, token, payload["user"], bool(payload.get("staff")))
+
+
+async def load_entries(pool: ConnectionPool, user: User) -> None:
+    path = f"{reverse('my-entry-feed')}?limit={ENTRY_POOL_SIZE}"
+    status, body = await pool.request("GET", path, user.headers)
+    if status != 200:
+        raise HTTPError(f"Could not list the entries of {user.username!r}: {status}")
+    user.entries = [(entry["id"], entry["library"], entry["book"]) for entry in json.loads(body)["results"]]
+
+
+async def load_catalog(pool: ConnectionPool, user: User) -> Catalog:
+    # The list endpoints do not serialize ids; the catalog export does, for
+    # every book and the libraries holding one
+    path = reverse("catalog-export", args=["ndjson"])
+    status, body = await pool.request("GET", path, user.headers)
+    if status != 200:
+        raise HTTPError(f"Could not export the catalog: {status}")
+    books, libraries = [], set()
+    for line in body.splitlines():
+        row = json.loads(line)
+        books.append(row["book_id"])
+        libraries.update(row["library_ids"])
+    return Catalog(books, sorted(libraries))
+
+
+async def prepare(pool: ConnectionPool, credentials: list, mix: dict) -> tuple:
+    """
+    Log the users in and load what the scenarios of `mix` need: the catalog
+    for entry-create, each user's entries for entry-update (creating a few
+    for staff users without any).
+
+    Returns:
+    - The users, the catalog and the mix, without the scenarios no user can
+      run (entry-update when no user has entries), with the warnings
+      explaining why.
+    """
+    users = await asyncio.gather(*(login(pool, username, password) for username, password in credentials))
+    catalog = Catalog([], [])
+    if mix.get("entry-create") or mix.get("entry-update"):
+        catalog = await load_catalog(pool, users[0])
+        if not catalog.books or not catalog.libraries:
+            raise HTTPError("Entries need at least one library holding a book on the target")
+
+    warnings = []
+    mix = dict(mix)
+    if mix.get("entry-create") and not any(user.is_staff for user in users):
+        warnings.append("entry-create needs a staff user; every request will be refused")
+    if mix.get("entry-update"):
+        for user in users:
+            await load_entries(pool, user)
+            if not user.entries and user.is_staff:
+                rng = random.Random(user.pk)
+                for _ in range(SEED_ENTRIES):
+                    method, path, body = entry_create(rng, user, catalog)
+                    await pool.request(method, path, user.headers, body)
+                await load_entries(pool, user)
+        if not any(user.entries for user in users):
+            warnings.append("entry-update dropped from the mix: no user has entries")
+            del mix["entry-update"]
+    return users, catalog, mix, warnings
+
+
+@dataclass
+class Result:
+    scenario: str
+    status: int
+    latency: float
+    error: str = None
+
+    @property
+    def failed(self) -> bool:
+        return self.error is not None or self.status >= 400
+
+
+class LoadTest:
+    """
+    Send a weighted mix of scenarios to a target and collect a `Result` per
+    request.
+
+    Args:
+    - `pool`: The connection pool to the target.
+    - `users`, `catalog`: As returned by `prepare`.
+    - `mix`: Weights by scenario.
+    - `seed`: Seed of the choice of scenarios, users and rows, so that runs
+      send the same sequence of requests.
+    - `timeout`: Seconds after which a request is abandoned as an error.
+    """
+
+    def __init__(self, pool: ConnectionPool, users: list, catalog: Catalog, mix: dict, seed: int = 0, timeout: float = 30):
+        self.pool = pool
+        self.timeout = timeout
+        self.users = users
+        self.catalog = catalog
+        self.names = list(mix)
+        self.weights = [mix[name] for name in self.names]
+        self.rng = random.Random(seed)
+        self.results = []
+        self.in_flight = 0
+
+    def next_request(self) -> tuple:
+        name = self.rng.choices(self.names, self.weights)[0]
+        users = [user for user in self.users if user.entries] if name == "entry-update" else self.users
+        user = self.rng.choice(users)
+        return name, user, SCENARIOS[name](self.rng, user, self.catalog)
+
+    async def send(self, name: str, user: User, request: tuple, started: float) -> None:
+        method, path, body = request
+        self.in_flight += 1
+        try:
+            status, _ = await asyncio.wait_for(self.pool.request(method, path, user.headers, body), self.timeout)
+            error = None
+        except (OSError, HTTPError) as e:
+            status, error = 0, f"{type(e).__name__}: {e}"
+        finally:
+            self.in_flight -= 1
+        self.results.append(Result(name, status, time.perf_counter() - started, error))
+
+    async def open_loop(self, rate: float, duration: float, max_in_flight: int, poisson: bool = False) -> None:
+        """
+        Start requests at `rate` per second for `duration` seconds, evenly
+        spaced or with exponential gaps (`poisson`). Requests due while
+        `max_in_flight` are still running are not sent and count as errors.
+        """
+        tasks = set()
+        start = time.perf_counter()
+        due = start
+        while due < start + duration:
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            name, user, request = self.next_request()
+            if self.in_flight >= max_in_flight:
+                self.results.append(Result(name, 0, 0.0, "overloaded: too many requests in flight"))
+            else:
+                task = asyncio.create_task(self.send(name, user, request, due))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            due += self.rng.expovariate(rate) if poisson else 1 / rate
+        await asyncio.gather(*tasks)
+
+    async def closed_loop(self, concurrency: int, duration: float) -> None:
+        """
+        Run `concurrency` clients sending requests back to back for
+        `duration` seconds.
+        """
+        deadline = time.perf_counter() + duration
+
+        async def client():
+            while time.perf_counter() < deadline:
+                name, user, request = self.next_request()
+                await self.send(name, user, request, time.perf_counter())
+
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+
+
+def percentile(latencies: list, q: float) -> float:
+    """
+    Return the `q` quantile (0 to 1) of sorted latencies, by nearest rank.
+    """
+    return latencies[min(len(latencies) - 1, int(len(latencies) * q))]
+
+
+def summarize(results: list, elapsed: float) -> dict:
+    """
+    Summarize results, overall and per scenario.
+
+    Returns:
+    - A dict with the number of `requests` and `errors`, the `error_rate`,
+      the `throughput_rps` of successful responses, the HTTP `statuses`
+      (0 for requests that got no response), the first few `error_samples`,
+      and the mean, p50, p95, p99 and max of the `latency_ms` of answered
+      requests; under `scenarios`, the same for each scenario.
+    """
+
+    def stats(results):
+        answered = sorted(result.latency * 1000 for result in results if result.status)
+        errors = sum(result.failed for result in results)
+        statuses = {}
+        for result in results:
+            statuses[str(result.status)] = statuses.get(str(result.status), 0) + 1
+        summary = {
+            "requests": len(results),
+            "errors": errors,
+            "error_rate": round(errors / len(results), 4) if results else 0.0,
+            "throughput_rps": round((len(results) - errors) / elapsed, 2) if elapsed else 0.0,
+            "statuses": statuses,
+            "latency_ms": None,
+        }
+        if answered:
+            summary["latency_ms"] = {
+                "mean": round(sum(answered) / len(answered), 3),
+                "p50": round(percentile(answered, 0.50), 3),
+                "p95": round(percentile(answered, 0.95), 3),
+                "p99": round(percentile(answered, 0.99), 3),
+                "max": round(answered[-1], 3),
+            }
+        return summary
+
+    summary = stats(results)
+    summary["error_samples"] = sorted({result.error for result in results if result.error})[:5]
+    by_scenario = {}
+    for result in results:
+        by_scenario.setdefault(result.scenario, []).append(result)
+    summary["scenarios"] = {name: stats(rows) for name, rows in sorted(by_scenario.items())}
+    return summary
+
+
+def compare(report: dict, baseline: dict) -> dict:
+    """
+    Compare a report with one of an earlier run (of another build, ...).
+
+    Returns:
+    - The change in percent of the throughput, the error rate and the
+      latency percentiles, overall and for each scenario both runs sent.
+    """
+
+    def change(new, old):
+        if new is None or old is None:
+            return None
+        return round((new - old) / old * 100, 1) if old else None
+
+    def metrics(new, old):
+        result = {
+            "throughput_rps": change(new["throughput_rps"], old["throughput_rps"]),
+            "error_rate": round((new["error_rate"] - old["error_rate"]) * 100, 2),
+        }
+        for key in ("p50", "p95", "p99"):
+            result[key] = change((new["latency_ms"] or {}).get(key), (old["latency_ms"] or {}).get(key))
+        return result
+
+    comparison = metrics(report, baseline)
+    comparison["scenarios"] = {
+        name: metrics(stats, baseline["scenarios"][name])
+        for name, stats in report["scenarios"].items()
+        if name in baseline.get("scenarios", {})
+    }
+    return comparison
+
+
+async def run(
+    url: str,
+    credentials: list,
+    mix: dict,
+    duration: float,
+    rate: float = 0,
+    concurrency: int = 10,
+    max_in_flight: int = 1000,
+    poisson: bool = False,
+    seed: int = 0,
+    timeout: float = 30,
+) -> dict:
+    """
+    Log in, prepare and run a load test against `url`.
+
+    Args:
+    - `credentials`: `(username, password)` of the users sending requests.
+    - `rate`: Requests started per second (open-loop); 0 runs `concurrency`
+      clients back to back (closed-loop) instead.
+    - `concurrency`: Connections kept to the target.
+    - `max_in_flight`, `poisson`: See `LoadTest.open_loop`.
+    - `seed`, `timeout`: See `LoadTest`.
+
+    Returns:
+    - The report: the settings of the run, `elapsed` seconds, `warnings`
+      and the summary of `summarize`.
+    """
+    pool = ConnectionPool(url, concurrency)
+    try:
+        users, catalog, mix, warnings = await prepare(pool, credentials, mix)
+        test = LoadTest(pool, users, catalog, mix, seed, timeout)
+        started = time.perf_counter()
+        if rate:
+            await test.open_loop(rate, duration, max_in_flight, poisson)
+        else:
+            await test.closed_loop(concurrency, duration)
+        elapsed = time.perf_counter() - started
+    finally:
+        pool.close()
+
+    return {
+        "url": url,
+        "mode": "open" if rate else "closed",
+        "rate": rate or None,
+        "arrivals": ("poisson" if poisson else "uniform") if rate else None,
+        "duration": duration,
+        "elapsed": round(elapsed, 3),
+        "concurrency": concurrency,
+        "users": len(users),
+        "mix": mix,
+        "seed": seed,
+        "timeout": timeout,
+        "warnings": warnings,
+        **summarize(test.results, elapsed),
+    }
@@ -0,0 +1,81 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api_task.index_advisor import (
+    QueryCollector,
+    advise,
+    generate_data,
+    migration_operations,
+    replay_endpoints,
+    write_migration,
+)
+
+
+class Command(BaseCommand):
+    help = "Replay the API endpoints, explain their queries and propose indexes for large sequential scans"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--min-rows",
+            type=int,
+            default=None,
+            help="Smallest table, or scan, worth an index; defaults to INDEX_ADVISOR_MIN_ROWS",
+        )
+        parser.add_argument(
+            "--path",
+            action="append",
+            default=[],
+            help="Extra path to replay, with its query string (repeatable)",
+        )
+        parser.add_argument("--user", help="Username to replay as; defaults to a temporary superuser")
+        parser.add_argument(
+            "--generate",
+            type=int,
+            default=0,
+            metavar="ENTRIES",
+            help="First fill the database with synthetic data scaled on this many entries, "
+            "rolled back with the replay",
+        )
+        parser.add_argument("--write-migration", action="store_true", help="Write a migration adding the indexes")
+        parser.add_argument("--json", action="store_true", help="Print the proposals as JSON")
+
+    def handle(self, *args, **options):
+        collector = QueryCollector()
+        # Generate, replay and measure in one transaction rolled back at the
+        # end: no synthetic row is left behind, reads may write, and every
+        # index is created in a savepoint
+        with transaction.atomic():
+            if options["generate"]:
+                inserted = generate_data(options["generate"])
+                self.stderr.write(", ".join(f"{count} rows in {table}" for table, count in inserted.items()))
+            User = get_user_model()
+            if options["user"]:
+                user = User.objects.get(username=options["user"])
+            else:
+                user = User.objects.create_superuser("index_advisor", password=None)
+            replay_endpoints(collector, user, options["path"])
+            proposals = advise(list(collector.queries.values()), options["min_rows"])
+            transaction.set_rollback(True)
+
+        if options["json"]:
+            self.stdout.write(json.dumps([proposal.to_dict() for proposal in proposals], indent=2))
+        elif not proposals:
+            self.stdout.write(f"No index needed for the {len(collector.queries)} queries captured")
+        else:
+            for proposal in proposals:
+                self.stdout.write(
+                    f"{proposal.table} ({', '.join(proposal.columns)}): {proposal.rows} rows scanned by "
+                    f"{len(proposal.queries)} queries from {', '.join(proposal.endpoints) or '-'}; "
+                    f"{proposal.before_ms:.1f} ms -> {proposal.after_ms:.1f} ms ({proposal.saved_pct}% saved), "
+                    f"{proposal.before_buffers} -> {proposal.after_buffers} buffers"
+                )
+                for operation in migration_operations([proposal]):
+                    self.stdout.write(f"    {operation.describe()}")
+
+        if options["write_migration"] and proposals:
+            path = write_migration(proposals)
+            self.stderr.write(self.style.SUCCESS(f"Migration written to {path}"))
+            self.stderr.write("Add the AddIndex indexes to the models' Meta.indexes to keep makemigrations in sync")
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api_task.partitions import archive_partitions, databases
+
+
+class Command(BaseCommand):
+    help = (
+        "Export Entry partitions older than the retention period to NDJSON archives and drop them, "
+        "on every database holding entries"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--retention-months",
+            type=int,
+            default=None,
+            help="Months to keep, counting the current one; defaults to ENTRY_RETENTION_MONTHS",
+        )
+        parser.add_argument("--archive-dir", default=None, help="Defaults to ENTRY_ARCHIVE_DIR")
+
+    def handle(self, *args, **options):
+        if options["retention_months"] is not None and options["retention_months"] < 1:
+            raise CommandError("--retention-months must be at least 1")
+
+        archived = []
+        for alias in databases():
+            archived += archive_partitions(options["retention_months"], options["archive_dir"], using=alias)
+        for month, path, rows in archived:
+            self.stdout.write(f"Archived {rows} entries from {month:%Y-%m} to {path}")
+        self.stdout.write(self.style.SUCCESS(f"Archived {len(archived)} partitions"))
@@ -0,0 +1,95 @@
+import io
+import json
+import statistics
+import time
+from wsgiref.util import setup_testing_defaults
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from testTaskproject.handlers import APIWSGIHandler
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare per-request latency of the full middleware stack and the "
+        "API-only stack, in-process, on the health endpoint and the book list"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2000, help="Timed requests per case")
+        parser.add_argument("--warmup", type=int, default=100, help="Untimed requests per case")
+        parser.add_argument(
+            "--path",
+            action="append",
+            dest="paths",
+            help="Path to benchmark (repeatable); defaults to the health and book list endpoints",
+        )
+        parser.add_argument("--json", action="store_true", help="Print results as JSON")
+
+    def handle(self, *args, **options):
+        paths = options["paths"] or [reverse("health"), reverse("book-list")]
+        stacks = {"full": WSGIHandler(), "api": APIWSGIHandler()}
+
+        results = []
+        for path in paths:
+            timings = {}
+            for name, handler in stacks.items():
+                timings[name] = self.measure(handler, path, options["requests"], options["warmup"])
+            full, api = timings["full"], timings["api"]
+            results.append({
+                "path": path,
+                "full": full,
+                "api": api,
+                "saved_us": round(full["mean_us"] - api["mean_us"], 1),
+            })
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        for result in results:
+            self.stdout.write(result["path"])
+            for name in stacks:
+                stats = result[name]
+                self.stdout.write(
+                    f"  {name:<5} mean {stats['mean_us']:>9.1f}us  "
+                    f"p50 {stats['p50_us']:>9.1f}us  p99 {stats['p99_us']:>9.1f}us"
+                )
+            self.stdout.write(self.style.SUCCESS(f"  API stack saves {result['saved_us']:.1f}us per request"))
+
+    def measure(self, handler, path, requests, warmup):
+        for _ in range(warmup):
+            self.call(handler, path)
+
+        samples = []
+        for _ in range(requests):
+            started = time.perf_counter_ns()
+            self.call(handler, path)
+            samples.append((time.perf_counter_ns() - started) / 1000)
+
+        samples.sort()
+        return {
+            "mean_us": round(statistics.fmean(samples), 1),
+            "p50_us": round(samples[len(samples) // 2], 1),
+            "p99_us": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))], 1),
+        }
+
+    def call(self, handler, path):
+        environ = {
+            "REQUEST_METHOD": "GET",
+            "PATH_INFO": path,
+            "HTTP_HOST": "localhost",
+            "HTTP_ACCEPT": "application/json",
+            "wsgi.input": io.BytesIO(),
+        }
+        setup_testing_defaults(environ)
+        status = []
+        response = handler(environ, lambda code, headers, exc_info=None: status.append(code))
+        try:
+            b"".join(response)
+        finally:
+            response.close()
+        if not status[0].startswith("200"):
+            raise CommandError(f"GET {path} returned {status[0]}")
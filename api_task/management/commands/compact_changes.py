@@ -0,0 +1,37 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from api_task.changes import compact
+
+
+class Command(BaseCommand):
+    help = "Remove superseded and expired changes from the delta sync change log"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--compact-after-hours",
+            type=float,
+            default=None,
+            help="Age of the changes to compact; defaults to CHANGE_LOG_COMPACT_AFTER_HOURS",
+        )
+        parser.add_argument(
+            "--retention-days",
+            type=float,
+            default=None,
+            help="Age of the changes to drop; defaults to CHANGE_LOG_RETENTION_DAYS",
+        )
+
+    def handle(self, *args, **options):
+        compact_after = retention = None
+        if options["compact_after_hours"] is not None:
+            compact_after = datetime.timedelta(hours=options["compact_after_hours"])
+        if options["retention_days"] is not None:
+            retention = datetime.timedelta(days=options["retention_days"])
+
+        result = compact(compact_after, retention)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Removed {result['superseded']} superseded and {result['truncated']} expired changes"
+            )
+        )
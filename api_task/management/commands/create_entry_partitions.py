@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from api_task.partitions import databases, ensure_partitions
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the monthly Entry partitions for the current and upcoming months, "
+        "on every database holding entries"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months",
+            type=int,
+            default=None,
+            help="Months ahead to create; defaults to ENTRY_PARTITIONS_AHEAD",
+        )
+
+    def handle(self, *args, **options):
+        aliases = databases()
+        created = 0
+        for alias in aliases:
+            months = ensure_partitions(options["months"], using=alias)
+            for month in months:
+                where = f" on {alias}" if len(aliases) > 1 else ""
+                self.stdout.write(f"Created partition for {month:%Y-%m}{where}")
+            created += len(months)
+        self.stdout.write(self.style.SUCCESS(f"Created {created} partitions"))
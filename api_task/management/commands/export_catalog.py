@@ -0,0 +1,33 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api_task.export import FORMATS, available_formats, write_catalog
+
+
+class Command(BaseCommand):
+    help = "Export the Book/Author/Library catalog from a consistent snapshot"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=FORMATS, default="csv", help="Output format (default: csv)")
+        parser.add_argument("--output", default="-", help="File to write; '-' writes to standard output")
+        parser.add_argument("--gzip", action="store_true", help="Compress the output with gzip")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=None,
+            help="Rows fetched per round trip; defaults to CATALOG_EXPORT_CHUNK_SIZE",
+        )
+
+    def handle(self, *args, **options):
+        if options["format"] not in available_formats():
+            raise CommandError(f"Exporting {options['format']} requires the pyarrow package")
+
+        if options["output"] == "-":
+            write_catalog(sys.stdout.buffer, options["format"], options["gzip"], options["chunk_size"])
+            sys.stdout.buffer.flush()
+            return
+
+        with open(options["output"], "wb") as out:
+            write_catalog(out, options["format"], options["gzip"], options["chunk_size"])
+        self.stderr.write(self.style.SUCCESS(f"Catalog written to {options['output']}"))
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api_task.ingestion import flush_pending
+
+
+class Command(BaseCommand):
+    help = "Insert buffered check-ins from PendingEntry into Entry in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000, help="Pending rows per transaction")
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep running and poll for new rows instead of exiting once the buffer is empty",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="Seconds to sleep when the buffer is empty (with --loop)",
+        )
+
+    def handle(self, *args, **options):
+        inserted = rejected = 0
+        try:
+            while True:
+                result = flush_pending(options["batch_size"])
+                inserted += result.inserted
+                rejected += result.rejected
+                if result.rejected:
+                    self.stderr.write(self.style.WARNING(f"Rejected {result.rejected} pending entries"))
+                if result.processed:
+                    continue
+                if not options["loop"]:
+                    break
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(f"Inserted {inserted} entries, rejected {rejected}"))
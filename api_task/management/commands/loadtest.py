@@ -0,0 +1,100 @@
+import asyncio
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api_task import loadtest
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive a weighted mix of API requests against a running instance and "
+        "report throughput, error rates and p50/p95/p99 latency as JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("url", help="Base URL of the instance, e.g. http://127.0.0.1:8000")
+        parser.add_argument(
+            "--user",
+            action="append",
+            required=True,
+            metavar="USERNAME:PASSWORD",
+            help="User logging in for a bearer token (repeatable); entry-create needs a staff user",
+        )
+        parser.add_argument(
+            "--mix",
+            default=",".join(f"{name}={weight}" for name, weight in loadtest.DEFAULT_MIX.items()),
+            help="Weighted scenarios, from %s (default: %%(default)s)" % ", ".join(loadtest.SCENARIOS),
+        )
+        parser.add_argument("--duration", type=float, default=30, help="Seconds of load (default: 30)")
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=0,
+            help="Requests started per second, whatever the response times (open loop); "
+            "by default clients send requests back to back (closed loop)",
+        )
+        parser.add_argument("--poisson", action="store_true", help="Open loop: exponential gaps between arrivals")
+        parser.add_argument("--concurrency", type=int, default=10, help="Connections to the instance (default: 10)")
+        parser.add_argument(
+            "--max-in-flight",
+            type=int,
+            default=1000,
+            help="Open loop: requests due beyond this many in flight are counted as errors (default: 1000)",
+        )
+        parser.add_argument("--timeout", type=float, default=30, help="Seconds before a request fails (default: 30)")
+        parser.add_argument("--seed", type=int, default=0, help="Seed of the request sequence (default: 0)")
+        parser.add_argument("--label", help="Name of the build under test, stored in the report")
+        parser.add_argument("--output", help="Also write the report to this file")
+        parser.add_argument("--compare", metavar="REPORT", help="Report of an earlier run to compare with")
+
+    def handle(self, *args, **options):
+        try:
+            mix = loadtest.parse_mix(options["mix"])
+        except ValueError as e:
+            raise CommandError(str(e))
+        credentials = []
+        for value in options["user"]:
+            username, separator, password = value.partition(":")
+            if not separator:
+                raise CommandError(f"--user takes USERNAME:PASSWORD, got {value!r}")
+            credentials.append((username, password))
+        if options["concurrency"] < 1 or options["duration"] <= 0 or options["rate"] < 0:
+            raise CommandError("--concurrency and --duration must be positive, --rate not negative")
+
+        baseline = None
+        if options["compare"]:
+            with open(options["compare"], encoding="utf-8") as f:
+                baseline = json.load(f)
+
+        try:
+            report = asyncio.run(
+                loadtest.run(
+                    options["url"],
+                    credentials,
+                    mix,
+                    options["duration"],
+                    rate=options["rate"],
+                    concurrency=options["concurrency"],
+                    max_in_flight=options["max_in_flight"],
+                    poisson=options["poisson"],
+                    seed=options["seed"],
+                    timeout=options["timeout"],
+                )
+            )
+        except (OSError, loadtest.HTTPError) as e:
+            raise CommandError(f"Could not prepare the load test: {e}")
+
+        report = {"label": options["label"], **report}
+        if baseline is not None:
+            report["comparison"] = loadtest.compare(report, baseline)
+        for warning in report["warnings"]:
+            self.stderr.write(self.style.WARNING(warning))
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            os.makedirs(os.path.dirname(os.path.abspath(options["output"])), exist_ok=True)
+            with open(options["output"], "w", encoding="utf-8") as f:
+                f.write(output + "\n")
+        self.stdout.write(output)
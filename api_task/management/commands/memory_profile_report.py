@@ -0,0 +1,43 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api_task.profiling import read_reports, report_files, summarize_memory
+
+
+class Command(BaseCommand):
+    help = "Summarize per-request memory profiles by URL name, highest peak first"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=10, help="Allocation sites listed per URL name (default: 10)")
+        parser.add_argument("--dir", help="Directory of the reports; defaults to MEMORY_PROFILE_DIR")
+        parser.add_argument("--url-name", help="Only summarize requests to this URL name")
+        parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+
+    def handle(self, *args, **options):
+        directory = options["dir"] or settings.MEMORY_PROFILE_DIR
+        reports = read_reports(report_files(directory, "memory"))
+        if options["url_name"]:
+            reports = [report for report in reports if report["url_name"] == options["url_name"]]
+        if not reports:
+            raise CommandError(f"No memory profiles found in {directory}")
+        summary = summarize_memory(reports, options["top"])
+
+        if options["json"]:
+            self.stdout.write(json.dumps(summary, indent=2))
+            return
+
+        self.stdout.write(f"{len(reports)} memory profiles in {directory}")
+        for group in summary:
+            self.stdout.write(
+                f"\n{group['url_name']}: {group['count']} requests, peak max {_mb(group['max_peak_bytes'])} "
+                f"({group['path']}), mean {_mb(group['mean_peak_bytes'])}, "
+                f"held at response {_mb(group['mean_allocated_bytes'])}"
+            )
+            for site in group["sites"]:
+                self.stdout.write(f"  {_mb(site['size']):>10}  {site['site']}")
+
+
+def _mb(size: int) -> str:
+    return f"{size / (1024 * 1024):.1f} MB"
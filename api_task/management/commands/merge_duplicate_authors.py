@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from api_task.dedup import find_duplicates, merge_authors
+
+
+class Command(BaseCommand):
+    help = "Merge authors whose names are spelled differently, repointing their BookAuthor rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="List the duplicates without merging them")
+
+    def handle(self, *args, **options):
+        duplicates = find_duplicates()
+        merged = sum(len(others) for others in duplicates.values())
+
+        if options["dry_run"]:
+            for canonical, others in duplicates.items():
+                self.stdout.write(f"{canonical} <- {', '.join(map(str, others))}")
+            self.stdout.write(self.style.SUCCESS(f"Would merge {merged} duplicate authors into {len(duplicates)}"))
+            return
+
+        repointed = sum(merge_authors(canonical, others) for canonical, others in duplicates.items())
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Merged {merged} duplicate authors into {len(duplicates)}, repointing {repointed} book links"
+            )
+        )
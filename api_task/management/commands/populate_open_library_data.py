@@ -1,13 +1,17 @@
-import requests
 from django.core.management.base import BaseCommand
+from django.db import transaction
 
-from api_task.models import Author, Book, Library
+from api_task.dedup import AuthorResolver, find_book
+from api_task.models import Book, Library
 
 
 class Command(BaseCommand):
     help = "Populate database with book data from the Open Library API"
 
     def handle(self, *args, **options):
+        # Imported here so listing or running other commands does not load it
+        import requests
+
         # Define the Open Library API endpoint for books
         open_library_url = "https://openlibrary.org/subjects/science.json"
 
@@ -19,6 +23,9 @@ class Command(BaseCommand):
             # Extract book information from the API response
             book_data_list = data.get("works", [])
 
+            # Resolve author names to existing authors, whatever their spelling
+            resolver = AuthorResolver()
+
             # Loop through the book data and create objects in the database
             for book_data in book_data_list:
                 title = book_data.get("title", "")
@@ -32,17 +39,21 @@ class Command(BaseCommand):
                     author_name = author_data.get("name", "")
                     author_birth_year = author_data.get("birth_year", publish_year)
 
-                    # Create or retrieve authors with name and birth year
-                    author, created = Author.objects.get_or_create(
-                        name=author_name,
-                        defaults={"birth_year": author_birth_year}
-                    )
+                    # Reuse a matching author, e.g. "Tolkien, J. R. R." for
+                    # "J.R.R. Tolkien", or create one with name and birth year
+                    author = resolver.resolve(author_name, author_birth_year)
 
                     author_instances.append(author)
 
-                # Create or retrieve books
-                book, created = Book.objects.get_or_create(title=title)
-                book.authors.set(author_instances)
+                # Retrieve the book with this title and these authors, or
+                # create it; one probe of the content hash index. The book and
+                # its authors are committed together: the deferred unique
+                # hash check must not see the book without its authors
+                book = find_book(title, author_instances)
+                if book is None:
+                    with transaction.atomic():
+                        book = Book.objects.create(title=title)
+                        book.authors.add(*author_instances)
 
                 # Create or retrieve library
                 library_name = "Default Library"
@@ -0,0 +1,115 @@
+import datetime
+import json
+import os
+import platform
+import statistics
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api_task.startup import profile_startup
+
+
+class Command(BaseCommand):
+    help = (
+        "Profile the cold start of testTaskproject.wsgi in fresh interpreters: "
+        "per-module import-time tree and time to first response"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default="/api/health/", help="Path of the first request")
+        parser.add_argument("--runs", type=int, default=5, help="Cold starts measured; the median is reported")
+        parser.add_argument("--depth", type=int, default=4, help="Levels of the import tree shown")
+        parser.add_argument("--min-ms", type=float, default=2.0, help="Hide imports cheaper than this")
+        parser.add_argument("--top", type=int, default=12, help="Packages listed by import time")
+        parser.add_argument("--json", action="store_true", help="Print results as JSON")
+        parser.add_argument(
+            "--baseline",
+            help="JSON file with a previous result: fail when slower than it by more than "
+            "--max-regression percent; recorded there when missing",
+        )
+        parser.add_argument("--max-regression", type=float, default=20.0, help="Allowed slowdown in percent")
+        parser.add_argument("--save-baseline", action="store_true", help="Overwrite the baseline with this result")
+
+    def handle(self, *args, **options):
+        if options["runs"] < 1:
+            raise CommandError("--runs must be at least 1")
+        try:
+            profiles = [profile_startup(options["path"]) for _ in range(options["runs"])]
+        except RuntimeError as e:
+            raise CommandError(str(e))
+
+        profiles.sort(key=lambda p: p.first_response_ms)
+        median = profiles[len(profiles) // 2]
+        result = {
+            "path": options["path"],
+            "runs": len(profiles),
+            "status": median.status,
+            "ready_ms": round(statistics.median(p.ready_ms for p in profiles), 1),
+            "first_response_ms": round(statistics.median(p.first_response_ms for p in profiles), 1),
+            "wsgi_import_ms": round(statistics.median(p.import_ms for p in profiles), 1),
+            "packages": {
+                name: round(ms, 1) for name, ms in list(median.package_totals().items())[:options["top"]]
+            },
+            "imports": [
+                node.to_dict(options["depth"] - 1, options["min_ms"] * 1000)
+                for node in median.imports
+                if node.cumulative_us >= options["min_ms"] * 1000
+            ],
+        }
+
+        if options["json"]:
+            self.stdout.write(json.dumps(result, indent=2))
+        else:
+            self.write_report(result)
+
+        if options["baseline"]:
+            self.check_baseline(result, options)
+
+    def write_report(self, result: dict) -> None:
+        self.stdout.write(f"Cold start of testTaskproject.wsgi, median of {result['runs']} runs")
+        self.stdout.write(f"  application ready     {result['ready_ms']:>8.1f} ms")
+        self.stdout.write(f"  first response        {result['first_response_ms']:>8.1f} ms  "
+                          f"(GET {result['path']} -> {result['status']})")
+        self.stdout.write(f"  importing the WSGI app {result['wsgi_import_ms']:>7.1f} ms")
+
+        self.stdout.write("Import time by package (self):")
+        for name, ms in result["packages"].items():
+            self.stdout.write(f"  {name:<30} {ms:>8.1f} ms")
+
+        self.stdout.write("Import tree (cumulative):")
+
+        def write(node, level):
+            label = "  " * level + node["name"]
+            self.stdout.write(f"  {label:<60} {node['cumulative_ms']:>8.1f} ms")
+            for child in node.get("children", ()):
+                write(child, level + 1)
+
+        for node in sorted(result["imports"], key=lambda n: -n["cumulative_ms"]):
+            write(node, 0)
+
+    def check_baseline(self, result: dict, options: dict) -> None:
+        path = options["baseline"]
+        record = {
+            "first_response_ms": result["first_response_ms"],
+            "ready_ms": result["ready_ms"],
+            "python": platform.python_version(),
+            "recorded": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        }
+        if options["save_baseline"] or not os.path.exists(path):
+            with open(path, "w") as f:
+                json.dump(record, f, indent=2)
+            self.stderr.write(f"Baseline recorded in {path}")
+            return
+
+        with open(path) as f:
+            baseline = json.load(f)
+        limit = baseline["first_response_ms"] * (1 + options["max_regression"] / 100)
+        change = (result["first_response_ms"] / baseline["first_response_ms"] - 1) * 100
+        if result["first_response_ms"] > limit:
+            raise CommandError(
+                f"Startup regressed: first response in {result['first_response_ms']:.1f} ms, "
+                f"{change:+.1f}% against the baseline of {baseline['first_response_ms']:.1f} ms"
+            )
+        self.stderr.write(self.style.SUCCESS(
+            f"Startup within {options['max_regression']:.0f}% of the baseline ({change:+.1f}%)"
+        ))
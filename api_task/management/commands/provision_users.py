@@ -0,0 +1,52 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api_task.provisioning import CSV, FORMATS, NDJSON, provision_users, read_rows
+
+
+class Command(BaseCommand):
+    help = "Create users in bulk from a CSV or NDJSON file, hashing passwords in parallel"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or NDJSON file to import, '-' to read stdin")
+        parser.add_argument(
+            "--format",
+            choices=FORMATS,
+            help="Input format; guessed from the file extension when omitted",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Number of password hashing processes (default: USER_PROVISIONING_WORKERS or CPU count)",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000, help="Rows per INSERT")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or (NDJSON if path.endswith((".ndjson", ".jsonl")) else CSV)
+
+        try:
+            if path == "-":
+                rows = read_rows(sys.stdin, fmt)
+            else:
+                with open(path, newline="", encoding="utf-8") as handle:
+                    rows = read_rows(handle, fmt)
+        except (OSError, UnicodeDecodeError) as e:
+            raise CommandError(f"Error reading {path}: {e}")
+
+        result = provision_users(rows, workers=options["workers"], batch_size=options["batch_size"])
+
+        for error in result.errors:
+            details = "; ".join(
+                f"{field}: {' '.join(messages)}" for field, messages in error["errors"].items()
+            )
+            self.stderr.write(self.style.ERROR(f"Row {error['row']}: {details}"))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {result.created} users in {result.elapsed:.2f}s "
+                f"({result.users_per_second:.1f} users/s), {len(result.errors)} rows rejected"
+            )
+        )
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api_task import sharding
+
+
+class Command(BaseCommand):
+    help = "Move libraries between shards to even out their entries, or as requested"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--move",
+            nargs=2,
+            action="append",
+            metavar=("LIBRARY", "SHARD"),
+            help="Move this library to this shard instead of planning moves (repeatable)",
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.1,
+            help="Fraction of the mean load a shard may exceed before libraries move (default: 0.1)",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Print the moves without moving anything")
+        parser.add_argument(
+            "--sync-catalog",
+            action="store_true",
+            help="First copy the catalog and the libraries to the shards, e.g. after a bulk load",
+        )
+        parser.add_argument("--batch-size", type=int, default=sharding.COPY_BATCH_SIZE, help="Entries copied per statement")
+
+    def handle(self, *args, **options):
+        if not sharding.enabled():
+            raise CommandError("Sharding is disabled: SHARD_DATABASES is empty")
+
+        if options["sync_catalog"] and not options["dry_run"]:
+            copied = sharding.sync_catalog()
+            self.stdout.write("Catalog synced: " + ", ".join(f"{n} {name}" for name, n in copied.items()))
+
+        if options["move"]:
+            moves = []
+            for library_id, target in options["move"]:
+                if target not in sharding.shard_aliases():
+                    raise CommandError(f"Unknown shard {target!r}")
+                moves.append((int(library_id), sharding.library_shard(int(library_id)), target))
+        else:
+            loads = sharding.shard_loads()
+            for alias, libraries in loads.items():
+                self.stdout.write(f"{alias}: {len(libraries)} libraries, {sum(libraries.values())} entries")
+            moves = sharding.plan_rebalance(loads, options["tolerance"])
+
+        if not moves:
+            self.stdout.write("Shards are balanced")
+        for library_id, source, target in moves:
+            if options["dry_run"]:
+                self.stdout.write(f"Would move library {library_id} from {source} to {target}")
+                continue
+            moved = sharding.move_library(library_id, target, options["batch_size"])
+            self.stdout.write(f"Moved library {library_id} from {source} to {target} with {moved} entries")
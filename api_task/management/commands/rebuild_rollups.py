@@ -0,0 +1,23 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api_task.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute the Entry usage rollups from Entry.date_added"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", help="First day to rebuild (YYYY-MM-DD); defaults to all days")
+        parser.add_argument("--end", help="Last day to rebuild (YYYY-MM-DD); defaults to all days")
+
+    def handle(self, *args, **options):
+        try:
+            start = datetime.date.fromisoformat(options["start"]) if options["start"] else None
+            end = datetime.date.fromisoformat(options["end"]) if options["end"] else None
+        except ValueError as e:
+            raise CommandError(f"Invalid date: {e}")
+
+        rebuild(start, end)
+        self.stdout.write(self.style.SUCCESS("Usage rollups rebuilt"))
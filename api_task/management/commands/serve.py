@@ -0,0 +1,70 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from testTaskproject.prefork import PreforkServer
+
+
+class Command(BaseCommand):
+    help = "Run the production prefork WSGI server: warm the app once, then fork workers sharing it"
+
+    def add_arguments(self, parser):
+        parser.add_argument("addrport", nargs="?", default="0.0.0.0:8000", help="Address and port to bind")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Worker processes; defaults to SERVE_WORKERS, or one per CPU",
+        )
+        parser.add_argument(
+            "--max-requests",
+            type=int,
+            default=None,
+            help="Requests after which a worker is recycled; defaults to SERVE_MAX_REQUESTS",
+        )
+        parser.add_argument(
+            "--max-requests-jitter",
+            type=int,
+            default=None,
+            help="Random extra requests per worker; defaults to SERVE_MAX_REQUESTS_JITTER",
+        )
+        parser.add_argument(
+            "--max-rss-mb",
+            type=int,
+            default=None,
+            help="Resident memory after which a worker is recycled; defaults to SERVE_MAX_RSS_MB",
+        )
+        parser.add_argument(
+            "--report-interval",
+            type=float,
+            default=None,
+            help="Seconds between worker memory reports; defaults to SERVE_REPORT_INTERVAL",
+        )
+
+    def handle(self, *args, **options):
+        host, _, port = options["addrport"].rpartition(":")
+        try:
+            port = int(port)
+        except ValueError:
+            raise CommandError(f"{options['addrport']!r} is not a valid address:port")
+
+        def option(name, setting, default):
+            value = options[name]
+            return value if value is not None else getattr(settings, setting, default)
+
+        workers = option("workers", "SERVE_WORKERS", None) or os.cpu_count() or 1
+        try:
+            listener = PreforkServer.bind(host or "0.0.0.0", port)
+        except OSError as e:
+            raise CommandError(f"Cannot listen on {options['addrport']}: {e}")
+
+        PreforkServer(
+            listener,
+            workers=workers,
+            max_requests=option("max_requests", "SERVE_MAX_REQUESTS", 0),
+            max_requests_jitter=option("max_requests_jitter", "SERVE_MAX_REQUESTS_JITTER", 0),
+            max_rss_mb=option("max_rss_mb", "SERVE_MAX_RSS_MB", 0),
+            report_interval=option("report_interval", "SERVE_REPORT_INTERVAL", 0),
+            stdout=self.stdout,
+        ).run()
@@ -0,0 +1,44 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api_task.slow_queries import log_files, read_records, summarize
+
+
+class Command(BaseCommand):
+    help = "Summarize the slow-query log: the queries costing the most total time"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=10, help="Number of queries listed (default: 10)")
+        parser.add_argument(
+            "--file",
+            help="Log to read, the files of every process with their rotated backups; "
+            "defaults to SLOW_QUERY_LOG_FILE",
+        )
+        parser.add_argument("--plans", action="store_true", help="Print the plan of each query's slowest run")
+        parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+
+    def handle(self, *args, **options):
+        paths = log_files(options["file"])
+        if not paths:
+            raise CommandError("No slow-query log found")
+        records = read_records(paths)
+        summary = summarize(records, options["top"])
+
+        if options["json"]:
+            self.stdout.write(json.dumps(summary, indent=2))
+            return
+
+        self.stdout.write(f"{len(records)} slow queries in {', '.join(paths)}")
+        for rank, query in enumerate(summary, 1):
+            self.stdout.write(
+                f"\n#{rank} {query['fingerprint']}: {query['count']} runs, total {query['total_ms']:.0f} ms, "
+                f"mean {query['mean_ms']:.0f} ms, max {query['max_ms']:.0f} ms"
+            )
+            self.stdout.write(f"  {query['sql']}")
+            for key in ("views", "serializers"):
+                if query[key]:
+                    names = sorted(query[key].items(), key=lambda item: -item[1])
+                    self.stdout.write(f"  {key}: " + ", ".join(f"{name} ({count})" for name, count in names))
+            if options["plans"] and query["plan"]:
+                self.stdout.write("  plan: " + json.dumps(query["plan"], indent=2).replace("\n", "\n  "))
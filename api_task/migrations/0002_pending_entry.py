@@ -0,0 +1,52 @@
+# Generated by Django 5.0.1 on 2026-10-19 10:41
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api_task", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="entry",
+            name="date_added",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now, editable=False
+            ),
+        ),
+        migrations.CreateModel(
+            name="PendingEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("user_id", models.BigIntegerField()),
+                ("library_id", models.BigIntegerField()),
+                ("book_id", models.BigIntegerField()),
+                (
+                    "received_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("error", models.CharField(blank=True, default="", max_length=200)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("error", "")),
+                        fields=["id"],
+                        name="pending_entry_queue_idx",
+                    )
+                ],
+            },
+        ),
+    ]
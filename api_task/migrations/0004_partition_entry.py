@@ -0,0 +1,113 @@
+"""
+Convert api_task_entry into a table range-partitioned by month on date_added.
+
+PostgreSQL requires the partition key in the primary key, so the table's
+primary key becomes (id, date_added); ids still come from a single sequence
+and Django keeps treating `id` as the primary key. Monthly partitions are
+created for every month holding rows, up to three months ahead, plus a
+default partition catching rows outside them. The model state is
+unchanged.
+
+Existing rows are copied, which takes a while on a large table.
+"""
+import datetime
+
+from django.db import migrations
+
+TABLE = "api_task_entry"
+
+INDEXES_AND_CONSTRAINTS = """
+CREATE INDEX api_task_entry_book_id_af378bd1 ON {table} (book_id);
+CREATE INDEX api_task_entry_library_id_ae465061 ON {table} (library_id);
+CREATE INDEX api_task_entry_user_id_143fc0a6 ON {table} (user_id);
+ALTER TABLE {table} ADD CONSTRAINT api_task_entry_book_id_af378bd1_fk_api_task_book_id
+    FOREIGN KEY (book_id) REFERENCES api_task_book (id) DEFERRABLE INITIALLY DEFERRED;
+ALTER TABLE {table} ADD CONSTRAINT api_task_entry_library_id_ae465061_fk_api_task_library_id
+    FOREIGN KEY (library_id) REFERENCES api_task_library (id) DEFERRABLE INITIALLY DEFERRED;
+ALTER TABLE {table} ADD CONSTRAINT api_task_entry_user_id_143fc0a6_fk_api_task_customuser_id
+    FOREIGN KEY (user_id) REFERENCES api_task_customuser (id) DEFERRABLE INITIALLY DEFERRED;
+"""
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition(apps, schema_editor):
+    execute = schema_editor.execute
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT (min(date_added) AT TIME ZONE 'UTC')::date, max(id) FROM {TABLE}"
+        )
+        oldest, max_id = cursor.fetchone()
+
+    execute(
+        f"CREATE TABLE {TABLE}_partitioned ("
+        "id bigint NOT NULL, "
+        "date_added timestamp with time zone NOT NULL, "
+        "book_id bigint NOT NULL, "
+        "user_id bigint NOT NULL, "
+        "library_id bigint NOT NULL, "
+        "PRIMARY KEY (id, date_added)"
+        ") PARTITION BY RANGE (date_added)"
+    )
+    execute(f"CREATE TABLE {TABLE}_default PARTITION OF {TABLE}_partitioned DEFAULT")
+
+    today = datetime.date.today().replace(day=1)
+    month = min(oldest.replace(day=1), today) if oldest else today
+    while month <= add_months(today, 3):
+        execute(
+            f"CREATE TABLE {TABLE}_y{month.year:04d}m{month.month:02d} PARTITION OF {TABLE}_partitioned "
+            f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') TO ('{add_months(month, 1).isoformat()} 00:00:00+00')"
+        )
+        month = add_months(month, 1)
+
+    execute(
+        f"INSERT INTO {TABLE}_partitioned (id, date_added, book_id, user_id, library_id) "
+        f"SELECT id, date_added, book_id, user_id, library_id FROM {TABLE}"
+    )
+    execute(f"DROP TABLE {TABLE}")
+    execute(f"ALTER TABLE {TABLE}_partitioned RENAME TO {TABLE}")
+    execute(f"ALTER INDEX {TABLE}_partitioned_pkey RENAME TO {TABLE}_pkey")
+    execute(f"CREATE SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id")
+    execute(f"SELECT setval('{TABLE}_id_seq', {max_id or 1}, {'true' if max_id else 'false'})")
+    execute(f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{TABLE}_id_seq')")
+    execute(INDEXES_AND_CONSTRAINTS.format(table=TABLE))
+
+
+def unpartition(apps, schema_editor):
+    execute = schema_editor.execute
+    execute(
+        f"CREATE TABLE {TABLE}_plain ("
+        "id bigint NOT NULL PRIMARY KEY GENERATED BY DEFAULT AS IDENTITY, "
+        "date_added timestamp with time zone NOT NULL, "
+        "book_id bigint NOT NULL, "
+        "user_id bigint NOT NULL, "
+        "library_id bigint NOT NULL"
+        ")"
+    )
+    execute(
+        f"INSERT INTO {TABLE}_plain (id, date_added, book_id, user_id, library_id) "
+        f"SELECT id, date_added, book_id, user_id, library_id FROM {TABLE}"
+    )
+    execute(f"DROP TABLE {TABLE} CASCADE")
+    execute(f"ALTER TABLE {TABLE}_plain RENAME TO {TABLE}")
+    execute(f"ALTER INDEX {TABLE}_plain_pkey RENAME TO {TABLE}_pkey")
+    execute(
+        f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), coalesce(max(id), 1), max(id) IS NOT NULL) "
+        f"FROM {TABLE}"
+    )
+    execute(INDEXES_AND_CONSTRAINTS.format(table=TABLE))
+
+
+class Migration(migrations.Migration):
+    atomic = True
+
+    dependencies = [
+        ("api_task", "0003_usage_rollups"),
+    ]
+
+    operations = [
+        migrations.RunPython(partition, unpartition, elidable=False),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.1 on 2026-10-19 10:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api_task", "0004_partition_entry"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="entry",
+            name="user",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="entry",
+            index=models.Index(
+                fields=["user", "-date_added", "id"],
+                include=("library", "book"),
+                name="entry_user_feed_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.0.1 on 2026-10-19 10:51
+
+import django.contrib.postgres.indexes
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api_task", "0005_entry_user_feed_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ChangeLogTruncation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("through_seq", models.BigIntegerField()),
+                ("removed", models.IntegerField()),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="Change",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("seq", models.BigIntegerField(null=True, unique=True)),
+                ("kind", models.CharField(max_length=20)),
+                ("object_id", models.BigIntegerField()),
+                ("related_id", models.BigIntegerField(null=True)),
+                (
+                    "action",
+                    models.CharField(
+                        choices=[("save", "Save"), ("delete", "Delete")], max_length=6
+                    ),
+                ),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("seq__isnull", True)),
+                        fields=["id"],
+                        name="change_unsequenced_idx",
+                    ),
+                    models.Index(
+                        fields=["kind", "object_id", "related_id", "seq"],
+                        name="change_key_idx",
+                    ),
+                    django.contrib.postgres.indexes.BrinIndex(
+                        fields=["created_at"], name="change_created_brin"
+                    ),
+                ],
+            },
+        ),
+        migrations.RunSQL(
+            "CREATE SEQUENCE api_task_change_sync_seq",
+            "DROP SEQUENCE api_task_change_sync_seq",
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.0.1 on 2026-10-19 11:06
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+# Copies of api_task.dedup as of this migration, which must not change with it
+SUFFIXES = {"jr", "sr", "ii", "iii", "iv"}
+
+_APOSTROPHES = re.compile(r"['’`]")
+_SEPARATORS = re.compile(r"[^0-9a-z]+")
+
+
+def name_tokens(name):
+    name = unicodedata.normalize("NFKD", name or "")
+    name = "".join(c for c in name if not unicodedata.combining(c)).casefold()
+    name = _APOSTROPHES.sub("", name)
+
+    surname, comma, given = name.partition(",")
+    if comma and _SEPARATORS.sub(" ", given).strip() not in SUFFIXES:
+        name = f"{given} {surname}"
+    return tuple(
+        token for token in _SEPARATORS.sub(" ", name).split() if token not in SUFFIXES
+    )
+
+
+def name_key(name):
+    return " ".join(name_tokens(name))
+
+
+def block_key(name):
+    tokens = name_tokens(name)
+    if not tokens:
+        return ""
+    return f"{tokens[-1]} {tokens[0][0]}" if len(tokens) > 1 else tokens[0]
+
+
+def fill_keys(apps, schema_editor):
+    Author = apps.get_model("api_task", "Author")
+    authors = list(Author.objects.only("pk", "name"))
+    for author in authors:
+        author.name_key = name_key(author.name)[:100]
+        author.block_key = block_key(author.name)[:100]
+    Author.objects.bulk_update(authors, ["name_key", "block_key"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api_task", "0006_change_log"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="author",
+            name="block_key",
+            field=models.CharField(
+                db_index=True, default="", editable=False, max_length=100
+            ),
+        ),
+        migrations.AddField(
+            model_name="author",
+            name="name_key",
+            field=models.CharField(default="", editable=False, max_length=100),
+        ),
+        migrations.RunPython(fill_keys, migrations.RunPython.noop),
+    ]
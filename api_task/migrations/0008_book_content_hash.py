@@ -0,0 +1,58 @@
+# Generated by Django 5.0.1 on 2026-10-19 11:08
+
+import hashlib
+import unicodedata
+
+import django.db.models.constraints
+from django.db import migrations, models
+
+
+# Copies of api_task.dedup as of this migration, which must not change with it
+def title_key(title):
+    return " ".join(unicodedata.normalize("NFKC", title or "").casefold().split())
+
+
+def content_hash(title, author_ids):
+    authors = ",".join(str(pk) for pk in sorted(set(author_ids)))
+    return hashlib.sha256(f"{title_key(title)}\x1f{authors}".encode()).hexdigest()
+
+
+def fill_hashes(apps, schema_editor):
+    Book = apps.get_model("api_task", "Book")
+    BookAuthor = apps.get_model("api_task", "BookAuthor")
+    authors = {}
+    for book_id, author_id in BookAuthor.objects.values_list("book_id", "author_id"):
+        authors.setdefault(book_id, []).append(author_id)
+
+    # Books duplicating an older one keep a NULL hash until merged
+    seen = set()
+    books = list(Book.objects.order_by("pk").only("pk", "title"))
+    for book in books:
+        value = content_hash(book.title, authors.get(book.pk, ()))
+        book.content_hash = value if value not in seen else None
+        seen.add(value)
+    Book.objects.bulk_update(books, ["content_hash"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api_task", "0007_author_dedup_keys"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="book",
+            name="content_hash",
+            field=models.CharField(editable=False, max_length=64, null=True),
+        ),
+        migrations.RunPython(fill_hashes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="book",
+            constraint=models.UniqueConstraint(
+                deferrable=django.db.models.constraints.Deferrable["DEFERRED"],
+                fields=("content_hash",),
+                name="book_content_hash_unique",
+            ),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.1 on 2026-10-19 11:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api_task", "0008_book_content_hash"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LibraryShard",
+            fields=[
+                (
+                    "library",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="placement",
+                        serialize=False,
+                        to="api_task.library",
+                    ),
+                ),
+                ("shard", models.CharField(db_index=True, max_length=100)),
+                ("moved_at", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
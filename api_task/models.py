@@ -1,5 +1,8 @@
 from django.db import models, IntegrityError
+from django.db.models import Q
 from django.contrib.auth.models import AbstractUser, Group, Permission
+from django.contrib.postgres.indexes import BrinIndex
+from django.utils import timezone
 
 
 class UserType(models.Model):
@@ -19,6 +22,9 @@ class UserType(models.Model):
     }
     ```
     """
+    ADMIN = "admin"
+    USER = "user"
+
     name = models.CharField(max_length=50, unique=True, blank=False, default=None)
 
     def __str__(self):
@@ -55,19 +61,21 @@ class CustomUser(AbstractUser):
         If the user is a superuser and has no specified type, set the type to 'admin'.
         For regular users, set the type to 'user'.
 
+        The default type is resolved through the process-wide UserType
+        registry, so saving a user does not query the UserType table.
+
         Args:
         - `*args`, `**kwargs`: Additional arguments for the save method.
 
         Returns:
         - None
         """
+        from .registry import user_types
+
         # Set the default user type to 'admin' for superusers
-        if self.is_superuser and (not self.type or self.type.name == "admin"):
-            admin_user_type, created = UserType.objects.get_or_create(name='admin')
-            self.type = admin_user_type
-        elif not self.type:
-            regular_user, created = UserType.objects.get_or_create(name='user')
-            self.type = regular_user
+        if self.type_id is None:
+            default_type = UserType.ADMIN if self.is_superuser else UserType.USER
+            self.type_id = user_types.get_id(default_type)
 
         super().save(*args, **kwargs)
 
@@ -79,6 +87,8 @@ class Author(models.Model):
     Attributes:
     - `name`: A character field representing the author's name.
     - `birth_year`: An additional field to ensure uniqueness in combination with the name.
+    - `name_key`: The normalized name, set on save (see `api_task.dedup`).
+    - `block_key`: The deduplication blocking key (surname and first initial), set on save.
 
     Example:
     ```
@@ -90,6 +100,8 @@ class Author(models.Model):
     """
     name = models.CharField(max_length=100)
     birth_year = models.PositiveIntegerField()
+    name_key = models.CharField(max_length=100, default="", editable=False)
+    block_key = models.CharField(max_length=100, default="", editable=False, db_index=True)
 
     class Meta:
         unique_together = ['name', 'birth_year']
@@ -105,6 +117,9 @@ class Book(models.Model):
     Attributes:
     - `title`: A character field representing the book title.
     - `authors`: A many-to-many relationship with Author.
+    - `content_hash`: SHA-256 of the normalized title and sorted author ids,
+      maintained by signals (see `api_task.dedup.content_hash`). Unique,
+      checked at commit so a book can be built up author by author.
 
     Example:
     ```
@@ -119,6 +134,16 @@ class Book(models.Model):
     """
     title = models.CharField(max_length=100, blank=False, default=None)
     authors = models.ManyToManyField(Author, through='BookAuthor')
+    content_hash = models.CharField(max_length=64, null=True, editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["content_hash"],
+                name="book_content_hash_unique",
+                deferrable=models.Deferrable.DEFERRED,
+            ),
+        ]
 
     def __str__(self):
         author_names = ', '.join(str(author) for author in self.authors.all())
@@ -129,7 +154,8 @@ class BookAuthor(models.Model):
     """
     Through model for the ManyToMany relationship between Book and Author.
 
-    Enforces uniqueness based on the combination of Book's title and associated authors.
+    Uniqueness of a book's title together with its authors is enforced by
+    `Book.content_hash`, which is updated whenever rows are added or removed.
     """
     book = models.ForeignKey(Book, on_delete=models.CASCADE)
     author = models.ForeignKey(Author, on_delete=models.CASCADE)
@@ -176,6 +202,46 @@ class Library(models.Model):
         return self.name
 
 
+class LibraryShard(models.Model):
+    """
+    Model placing a library on a shard database (see `api_task.sharding`).
+
+    Rows are only kept on the global database, where they form the
+    directory consulted to route a library's books and entries.
+
+    Attributes:
+    - `library`: The placed library, also the primary key.
+    - `shard`: Alias of the database holding the library's replica, books
+      and entries.
+    - `moved_at`: When the library was last moved between shards.
+    """
+    library = models.OneToOneField(Library, on_delete=models.CASCADE, primary_key=True, related_name="placement")
+    shard = models.CharField(max_length=100, db_index=True)
+    moved_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Library {self.library_id} on {self.shard}"
+
+
+class RevokedToken(models.Model):
+    """
+    Model listing revoked bearer tokens until they expire (see
+    `api_task.tokens.revoke_token`).
+
+    The list lives in the database so that every worker process sees a
+    revocation, whichever process handled it.
+
+    Attributes:
+    - `jti`: The random id of the revoked token, also the primary key.
+    - `expires`: When the token expires; the row is useless afterwards.
+    """
+    jti = models.CharField(max_length=64, primary_key=True)
+    expires = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Token {self.jti} revoked until {self.expires}"
+
+
 class Entry(models.Model):
     """
     Model representing an entry (user interaction) with a library.
@@ -195,10 +261,22 @@ class Entry(models.Model):
     }
     ```
     """
-    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
+    # Lookups by user are served by entry_user_feed_idx, which starts with user_id
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, db_index=False)
     library = models.ForeignKey(Library, on_delete=models.CASCADE)
     book = models.ForeignKey(Book, on_delete=models.CASCADE)
-    date_added = models.DateTimeField(auto_now_add=True)
+    date_added = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        indexes = [
+            # Serves the per-user activity feed newest first; the included
+            # columns let a page of entries be read from the index alone
+            models.Index(
+                fields=["user", "-date_added", "id"],
+                include=["library", "book"],
+                name="entry_user_feed_idx",
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         # Validate that the entry has a book, user, and library
@@ -211,7 +289,214 @@ class Entry(models.Model):
         if not self.library_id or not Library.objects.filter(id=self.library_id).exists():
             raise IntegrityError('This entry must belong to a valid library.')
 
+        # Managers hand the global database to new entries; they belong on
+        # the shard of their library
+        from . import sharding
+        using = sharding.entry_database(self.library_id, kwargs.get("using"))
+        if sharding.enabled():
+            if self.pk is None:
+                self.pk = sharding.next_entry_id()
+                kwargs.setdefault("force_insert", not args)
+            elif not self._state.adding and self._state.db and self._state.db != using:
+                sharding.move_entry(self, self._state.db, using)
+        kwargs["using"] = using
         super().save(*args, **kwargs)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded keys so usage rollups can move counts on update
+        instance._loaded_keys = tuple(
+            instance.__dict__.get(name) for name in ("user_id", "library_id", "book_id", "date_added")
+        )
+        return instance
+
     def __str__(self):
         return f"Entry by {self.user.username} for book '{self.book.title}' at {self.library.name}"
+
+
+class PendingEntry(models.Model):
+    """
+    Model representing an Entry accepted by the buffered ingestion path but
+    not inserted yet.
+
+    Rows are written without foreign keys or existence checks and moved into
+    Entry in batches by the `flush_entries` command. Rows the flusher cannot
+    insert stay in the table with `error` set.
+
+    Attributes:
+    - `user_id`: The primary key of the CustomUser.
+    - `library_id`: The primary key of the Library.
+    - `book_id`: The primary key of the Book.
+    - `received_at`: When the check-in was accepted; becomes `Entry.date_added`.
+    - `error`: Why the row was rejected, empty while pending.
+
+    Example:
+    ```
+    {
+        "user_id": 1,
+        "library_id": 1,
+        "book_id": 1
+    }
+    ```
+    """
+    user_id = models.BigIntegerField()
+    library_id = models.BigIntegerField()
+    book_id = models.BigIntegerField()
+    received_at = models.DateTimeField(default=timezone.now)
+    error = models.CharField(max_length=200, blank=True, default="")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["id"], condition=Q(error=""), name="pending_entry_queue_idx"),
+        ]
+
+    def __str__(self):
+        return f"Pending entry by user {self.user_id} for book {self.book_id} at library {self.library_id}"
+
+
+class LibraryBookDailyUsage(models.Model):
+    """
+    Rollup of Entry counts per library, book and day.
+
+    Maintained incrementally by `api_task.rollups` as entries are created
+    or moved, and recomputed from `Entry.date_added` by the
+    `rebuild_rollups` command.
+
+    Attributes:
+    - `library`: A foreign key to the Library model.
+    - `book`: A foreign key to the Book model.
+    - `day`: The day the entries were added, in the project time zone.
+    - `entries`: Number of entries for the library, book and day.
+
+    Example:
+    ```
+    {
+        "library": 1,
+        "book": 1,
+        "day": "2024-01-26",
+        "entries": 12
+    }
+    ```
+    """
+    library = models.ForeignKey(Library, on_delete=models.CASCADE)
+    book = models.ForeignKey(Book, on_delete=models.CASCADE)
+    day = models.DateField()
+    entries = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ['library', 'book', 'day']
+        indexes = [models.Index(fields=["day", "book"], name="library_book_daily_day_idx")]
+
+    def __str__(self):
+        return f"{self.day}: {self.entries} entries for book {self.book_id} at library {self.library_id}"
+
+
+class UserDailyUsage(models.Model):
+    """
+    Rollup of Entry counts per user and day.
+
+    Maintained like LibraryBookDailyUsage.
+
+    Attributes:
+    - `user`: A foreign key to the CustomUser model.
+    - `day`: The day the entries were added, in the project time zone.
+    - `entries`: Number of entries by the user on that day.
+
+    Example:
+    ```
+    {
+        "user": 1,
+        "day": "2024-01-26",
+        "entries": 3
+    }
+    ```
+    """
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
+    day = models.DateField()
+    entries = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ['user', 'day']
+
+    def __str__(self):
+        return f"{self.day}: {self.entries} entries by user {self.user_id}"
+
+
+class Change(models.Model):
+    """
+    Model representing one change to the catalog or to an Entry, as served
+    by the delta sync endpoint.
+
+    Rows are written in the same transaction as the change itself, with
+    `seq` unset. `api_task.changes.sequence_changes` numbers committed rows
+    afterwards, one sequencer at a time, so `seq` increases in commit order
+    and a client that has seen every change up to some `seq` never misses
+    one committed later with a lower number.
+
+    Attributes:
+    - `seq`: Position in the change log, assigned after commit.
+    - `kind`: What changed: `authors`, `books`, `libraries` or `entries` for
+      objects, `book_authors` or `library_books` for memberships.
+    - `object_id`: The primary key of the object, or the left-hand side of
+      the membership (the book, or the library).
+    - `related_id`: The right-hand side of a membership (the author, or the
+      book); null for objects.
+    - `action`: `save` for inserts, updates and added memberships, `delete`
+      for deletions and removed memberships.
+    - `created_at`: When the change was recorded.
+
+    Example:
+    ```
+    {
+        "seq": 1042,
+        "kind": "library_books",
+        "object_id": 1,
+        "related_id": 7,
+        "action": "save"
+    }
+    ```
+    """
+    SAVE = "save"
+    DELETE = "delete"
+    ACTIONS = [(SAVE, "Save"), (DELETE, "Delete")]
+
+    seq = models.BigIntegerField(null=True, unique=True)
+    kind = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    related_id = models.BigIntegerField(null=True)
+    action = models.CharField(max_length=6, choices=ACTIONS)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["id"], condition=Q(seq__isnull=True), name="change_unsequenced_idx"),
+            models.Index(fields=["kind", "object_id", "related_id", "seq"], name="change_key_idx"),
+            # created_at grows with the table, so a block range index finds
+            # old segments for compaction at almost no write cost
+            BrinIndex(fields=["created_at"], name="change_created_brin"),
+        ]
+
+    def __str__(self):
+        target = f"{self.object_id}/{self.related_id}" if self.related_id is not None else self.object_id
+        return f"#{self.seq}: {self.action} {self.kind} {target}"
+
+
+class ChangeLogTruncation(models.Model):
+    """
+    Model recording that the change log was truncated.
+
+    Clients whose cursor is older than the latest `through_seq` may have
+    missed deletions and must download the catalog again.
+
+    Attributes:
+    - `through_seq`: Changes up to and including this sequence number were removed.
+    - `removed`: Number of removed changes.
+    - `created_at`: When the log was truncated.
+    """
+    through_seq = models.BigIntegerField()
+    removed = models.IntegerField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Change log truncated through #{self.through_seq}"
@@ -0,0 +1,19 @@
+from rest_framework.negotiation import BaseContentNegotiation
+
+
+class IgnoreAcceptNegotiation(BaseContentNegotiation):
+    """
+    Content negotiation for views whose response format does not depend on
+    the `Accept` header, such as file downloads whose format is part of the
+    URL.
+
+    The first renderer of the view is always selected, for error responses,
+    so that a client asking for the downloaded type (e.g. `Accept: text/csv`)
+    gets the file rather than `406 Not Acceptable`.
+    """
+
+    def select_parser(self, request, parsers):
+        return parsers[0] if parsers else None
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
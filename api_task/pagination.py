@@ -0,0 +1,118 @@
+import base64
+import datetime
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from . import sharding
+
+
+class KeysetPagination(BasePagination):
+    """
+    Pagination by position rather than offset, for feeds ordered newest
+    first.
+
+    Rows are ordered by `date_added` descending, then `id`. The `cursor`
+    query parameter holds the `(date_added, id)` of the last row of the
+    previous page, and the next page is read with
+    `date_added <= <date> AND (date_added < <date> OR id > <id>)`, which an
+    index on `(..., date_added DESC, id)` answers by seeking straight to
+    the position. Fetching any page therefore costs the same, however deep
+    into the feed it is.
+
+    Attributes:
+    - `page_size`: Rows per page by default.
+    - `page_size_query_param`: Query parameter overriding the page size.
+    - `max_page_size`: Upper bound for the requested page size.
+
+    Example:
+    ```
+    # Response:
+    {
+        "next": "http://testserver/api/me/entries/?cursor=WyIyMDI0LTAx...",
+        "results": [...]
+    }
+    ```
+    """
+    page_size = 50
+    page_size_query_param = "limit"
+    max_page_size = 200
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by("-date_added", "id")
+        position = self.decode_cursor(request)
+        if position is not None:
+            date_added, pk = position
+            queryset = queryset.filter(date_added__lte=date_added).filter(
+                Q(date_added__lt=date_added) | Q(id__gt=pk)
+            )
+
+        # One extra row tells whether there is a next page; with sharding,
+        # the newest rows of every shard are merged
+        rows = sharding.fan_out(queryset, key=feed_order, limit=self.page_size + 1)
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_page_size(self, request) -> int:
+        try:
+            requested = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(requested, 1), self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(last.date_added, last.pk))
+
+    def get_previous_link(self):
+        return None
+
+    def encode_cursor(self, date_added: datetime.datetime, pk: int) -> str:
+        payload = json.dumps([date_added.isoformat(), pk], separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4))
+            date_added, pk = json.loads(payload)
+            date_added = datetime.datetime.fromisoformat(date_added)
+            if date_added.tzinfo is None or not isinstance(pk, int):
+                raise ValueError
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        return date_added, pk
+
+
+def feed_order(row) -> tuple:
+    """
+    Sort key matching `order_by("-date_added", "id")`.
+    """
+    return -row.date_added.timestamp(), row.pk
@@ -0,0 +1,42 @@
+import codecs
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from .provisioning import CSV, NDJSON, read_rows
+
+
+class RowParser(BaseParser):
+    """
+    Base parser turning a text request body into a list of rows.
+
+    Attributes:
+    - `row_format`: The `api_task.provisioning` format handled by the parser.
+    """
+    row_format = None
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        try:
+            lines = codecs.iterdecode(stream, encoding)
+            return read_rows(lines, self.row_format)
+        except UnicodeDecodeError as exc:
+            raise ParseError(f"Request body is not valid {encoding}: {exc}")
+
+
+class CSVParser(RowParser):
+    """
+    Parses `text/csv` bodies with a header row into a list of dicts.
+    """
+    media_type = "text/csv"
+    row_format = CSV
+
+
+class NDJSONParser(RowParser):
+    """
+    Parses `application/x-ndjson` bodies, one JSON object per line.
+    """
+    media_type = "application/x-ndjson"
+    row_format = NDJSON
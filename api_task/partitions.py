@@ -0,0 +1,215 @@
+import datetime
+import gzip
+import json
+import os
+import re
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from . import sharding
+from .models import Entry
+
+PARTITION_RE = re.compile(r"^%s_y(\d{4})m(\d{2})$" % Entry._meta.db_table)
+EXPORT_COLUMNS = ("id", "user_id", "library_id", "book_id", "date_added")
+
+
+def month_start(day: datetime.date) -> datetime.date:
+    return day.replace(day=1)
+
+
+def add_months(month: datetime.date, months: int) -> datetime.date:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: datetime.date) -> str:
+    """
+    Return the name of the Entry partition holding `month` (UTC), e.g.
+    `api_task_entry_y2024m01`.
+    """
+    return f"{Entry._meta.db_table}_y{month.year:04d}m{month.month:02d}"
+
+
+def databases() -> list:
+    """
+    Return the aliases of the databases holding Entry partitions: the
+    default database, or with sharding the global database and every shard.
+    Partition maintenance runs on each of them.
+    """
+    if not sharding.enabled():
+        return [DEFAULT_DB_ALIAS]
+    return [sharding.global_alias(), *sharding.shard_aliases()]
+
+
+def list_partitions(using: str = DEFAULT_DB_ALIAS) -> list:
+    """
+    Return the months of the monthly Entry partitions currently attached on
+    database `using`, oldest first. The default partition is not included.
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = %s",
+            [Entry._meta.db_table],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    months = []
+    for name in names:
+        match = PARTITION_RE.match(name)
+        if match:
+            months.append(datetime.date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+
+def ensure_partitions(months_ahead: int = None, today: datetime.date = None, using: str = DEFAULT_DB_ALIAS) -> list:
+    """
+    Create the monthly Entry partitions from the current month up to
+    `months_ahead` months in the future.
+
+    Rows that already landed in the default partition for a new month are
+    moved into it, so the partition can always be attached.
+
+    Args:
+    - `months_ahead`: Future months to cover; defaults to `ENTRY_PARTITIONS_AHEAD`.
+    - `today`: The reference day, for tests.
+    - `using`: The database alias (see `databases`).
+
+    Returns:
+    - The months of the partitions created.
+    """
+    if months_ahead is None:
+        months_ahead = getattr(settings, "ENTRY_PARTITIONS_AHEAD", 3)
+    first = month_start(today or timezone.now().date())
+    existing = set(list_partitions(using))
+
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(first, offset)
+        if month not in existing:
+            create_partition(month, using)
+            created.append(month)
+    return created
+
+
+def create_partition(month: datetime.date, using: str = DEFAULT_DB_ALIAS) -> None:
+    """
+    Create and attach the Entry partition for `month` on database `using`.
+    """
+    table = Entry._meta.db_table
+    name = partition_name(month)
+    bounds = [_boundary(month), _boundary(add_months(month, 1))]
+
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        cursor.execute(
+            f"SELECT EXISTS (SELECT 1 FROM {table}_default WHERE date_added >= %s AND date_added < %s)",
+            bounds,
+        )
+        if not cursor.fetchone()[0]:
+            cursor.execute(
+                f"CREATE TABLE {name} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)", bounds
+            )
+            return
+
+        cursor.execute(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS)")
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {table}_default WHERE date_added >= %s AND date_added < %s "
+            f"RETURNING *) INSERT INTO {name} SELECT * FROM moved",
+            bounds,
+        )
+        cursor.execute(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)", bounds)
+
+
+def archive_partitions(
+    retention_months: int = None, archive_dir=None, today: datetime.date = None, using: str = DEFAULT_DB_ALIAS
+) -> list:
+    """
+    Detach Entry partitions older than the retention period, export them to
+    gzip-compressed NDJSON files and drop them.
+
+    Each partition is detached first, so queries stop seeing it, then
+    exported (`<archive_dir>/<partition>.ndjson.gz`, written to a temporary
+    file and renamed once complete) and finally dropped. If the export
+    fails, the partition is attached again. With sharding, the archives of
+    each database go to a subdirectory named after its alias, since shards
+    have partitions of the same name.
+
+    Args:
+    - `retention_months`: Months to keep, counting the current one;
+      defaults to `ENTRY_RETENTION_MONTHS`.
+    - `archive_dir`: Where archives are written; defaults to `ENTRY_ARCHIVE_DIR`.
+    - `today`: The reference day, for tests.
+    - `using`: The database alias (see `databases`).
+
+    Returns:
+    - `(month, path, rows)` tuples for the archived partitions.
+    """
+    if retention_months is None:
+        retention_months = getattr(settings, "ENTRY_RETENTION_MONTHS", 24)
+    archive_dir = archive_dir or settings.ENTRY_ARCHIVE_DIR
+    if sharding.enabled():
+        archive_dir = os.path.join(archive_dir, using)
+    os.makedirs(archive_dir, exist_ok=True)
+    cutoff = add_months(month_start(today or timezone.now().date()), -(retention_months - 1))
+
+    archived = []
+    for month in list_partitions(using):
+        if month >= cutoff:
+            break
+        path = os.path.join(archive_dir, f"{partition_name(month)}.ndjson.gz")
+        rows = archive_partition(month, path, using)
+        archived.append((month, path, rows))
+    return archived
+
+
+def archive_partition(month: datetime.date, path: str, using: str = DEFAULT_DB_ALIAS) -> int:
+    """
+    Detach, export and drop the Entry partition for `month` on database `using`.
+
+    Returns:
+    - The number of exported rows.
+    """
+    table = Entry._meta.db_table
+    name = partition_name(month)
+    bounds = [_boundary(month), _boundary(add_months(month, 1))]
+
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+    try:
+        rows = _export(name, path, using)
+    except BaseException:
+        with connection.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)", bounds)
+        raise
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE {name}")
+    return rows
+
+
+def _export(name: str, path: str, using: str) -> int:
+    temporary = f"{path}.partial"
+    rows = 0
+    with transaction.atomic(using=using), gzip.open(temporary, "wt", encoding="utf-8") as archive:
+        cursor = connections[using].chunked_cursor()
+        try:
+            cursor.execute(f"SELECT {', '.join(EXPORT_COLUMNS)} FROM {name} ORDER BY id")
+            while batch := cursor.fetchmany(2000):
+                for row in batch:
+                    record = dict(zip(EXPORT_COLUMNS, row))
+                    record["date_added"] = record["date_added"].isoformat()
+                    archive.write(json.dumps(record) + "\n")
+                    rows += 1
+        finally:
+            cursor.close()
+    os.replace(temporary, path)
+    return rows
+
+
+def _boundary(month: datetime.date) -> datetime.datetime:
+    return datetime.datetime.combine(month, datetime.time.min, tzinfo=datetime.timezone.utc)
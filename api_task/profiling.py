@@ -0,0 +1,501 @@
+"""
+Opt-in profiling of individual requests.
+
+A request is profiled when an admin user asks for it with a header (or a
+query parameter), or when it is picked by the sampling rate. Requests that
+are neither cost a header lookup (and a random number when sampling is on).
+
+`MemoryProfileMiddleware` traces the allocations of a profiled request with
+`tracemalloc` and writes a JSON report to `MEMORY_PROFILE_DIR`: the peak of
+traced memory while the request ran, and the allocation sites holding the
+most memory once the response is ready, both as raw tracebacks and grouped
+by the innermost frame in the project's own code (a serializer method, a
+view, ...). `manage.py memory_profile_report` summarizes the reports per URL
+name.
+
+`CPUProfileMiddleware` profiles the time of a request, either by sampling
+its thread's stack, written as collapsed stacks for flame graphs, or with
+`cProfile`, written as a pstats dump and a text summary. The profiles are
+listed for admin users at `/profiles/`.
+
+tracemalloc traces the whole process, so a single request is profiled at a
+time per process; requests arriving meanwhile run unprofiled. Allocations
+made by other threads during a profiled request are counted with it. With
+the prefork server, where each worker handles one request at a time, the
+reports are exact.
+"""
+import cProfile
+import glob
+import io
+import json
+import marshal
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timezone
+
+from django.conf import settings
+from rest_framework import exceptions
+from rest_framework.settings import api_settings
+
+# One profiled request at a time per process
+_lock = threading.Lock()
+
+
+def header_key(header: str) -> str:
+    """
+    Return the `request.META` key of an HTTP header.
+    """
+    return "HTTP_" + header.upper().replace("-", "_")
+
+
+def request_user(request):
+    """
+    Return the user making a request, before the view has authenticated it:
+    the session user, or else the user of the first API authentication
+    class accepting the request's credentials (a bearer token, ...).
+    Returns None for anonymous requests and invalid credentials.
+    """
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return user
+    from rest_framework.authentication import SessionAuthentication
+
+    for authentication_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        if issubclass(authentication_class, SessionAuthentication):
+            continue
+        try:
+            result = authentication_class().authenticate(request)
+        except exceptions.APIException:
+            return None
+        if result is not None:
+            return result[0]
+    return None
+
+
+def admin_request(request, header: str, param: str = None):
+    """
+    Tell whether a request made by an admin (staff) user sends `header`, or
+    else the query parameter `param`. The query string is only parsed when
+    it mentions `param`.
+
+    Returns:
+    - A `(value, trigger)` tuple, `trigger` being `"header"` or `"param"`
+      depending on where the value was found, or None.
+    """
+    value = request.META.get(header_key(header)) if header else None
+    trigger = "header"
+    if not value and param and param in request.META.get("QUERY_STRING", ""):
+        value, trigger = request.GET.get(param), "param"
+    if not value:
+        return None
+    user = request_user(request)
+    return (value, trigger) if user is not None and user.is_staff else None
+
+
+def profile_trigger(request, header: str, sample_rate: float):
+    """
+    Decide whether to profile a request.
+
+    Returns:
+    - `"header"` if an admin (staff) user sent `header`, `"sample"` if the
+      request was picked at `sample_rate`, else None.
+    """
+    if admin_request(request, header):
+        return "header"
+    if sample_rate and random.random() < sample_rate:
+        return "sample"
+    return None
+
+
+def request_info(request, response, trigger: str, duration_ms: float) -> dict:
+    """
+    Describe a profiled request for its report.
+    """
+    match = getattr(request, "resolver_match", None)
+    user = getattr(request, "user", None)
+    return {
+        "time": datetime.now(timezone.utc).isoformat(),
+        "method": request.method,
+        "path": request.path,
+        "url_name": match.url_name if match else None,
+        "view": match._func_path if match else None,
+        "status": response.status_code,
+        "user": user.pk if user is not None and user.is_authenticated else None,
+        "trigger": trigger,
+        "duration_ms": round(duration_ms, 3),
+        "pid": os.getpid(),
+    }
+
+
+def write_report(directory: str, kind: str, report: dict, keep: int, files: dict = None) -> str:
+    """
+    Write a report as `<time>-<url name>-<pid>.<kind>.json` in `directory`
+    and delete the oldest reports of that kind, with their files, beyond
+    `keep`.
+
+    Args:
+    - `files`: Extra files written next to the report, as contents (str or
+      bytes) by extension; their names are listed in the report's `files`.
+
+    Returns:
+    - The path of the report.
+    """
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+    base = os.path.join(directory, f"{stamp}-{report['url_name'] or 'unresolved'}-{report['pid']}")
+    report["files"] = []
+    for extension, content in (files or {}).items():
+        report["files"].append(f"{os.path.basename(base)}.{extension}")
+        if isinstance(content, bytes):
+            with open(f"{base}.{extension}", "wb") as f:
+                f.write(content)
+        else:
+            with open(f"{base}.{extension}", "w", encoding="utf-8") as f:
+                f.write(content)
+    path = f"{base}.{kind}.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, default=str)
+
+    for old in report_files(directory, kind)[:-keep or None]:
+        for name in glob.glob(glob.escape(old[: -len(f".{kind}.json")]) + ".*"):
+            try:
+                os.remove(name)
+            except FileNotFoundError:
+                # Pruned concurrently by another worker
+                pass
+    return path
+
+
+def report_files(directory: str, kind: str) -> list:
+    """
+    Return the reports of a kind in `directory`, oldest first.
+    """
+    return sorted(glob.glob(os.path.join(directory, f"*.{kind}.json")))
+
+
+def read_reports(paths) -> list:
+    reports = []
+    for path in paths:
+        try:
+            with open(path, encoding="utf-8") as f:
+                reports.append(json.load(f))
+        except (OSError, ValueError):
+            # Pruned, or still being written, by another worker
+            continue
+    return reports
+
+
+def profile_directories() -> dict:
+    return {"cpu": settings.CPU_PROFILE_DIR, "memory": settings.MEMORY_PROFILE_DIR}
+
+
+def recent_profiles(limit: int = 100) -> list:
+    """
+    Return the latest CPU and memory reports, newest first, each with its
+    `kind`, the `name` of its file and its `attachments`: the `name` and
+    `extension` of each of its other files.
+    """
+    paths = [
+        (os.path.basename(path), kind, path)
+        for kind, directory in profile_directories().items()
+        for path in report_files(directory, kind)
+    ]
+    # Names start with the time the report was written
+    paths = sorted(paths, reverse=True)[:limit]
+    reports = []
+    for name, kind, path in paths:
+        for report in read_reports([path]):
+            attachments = [{"name": file, "extension": file.rsplit(".", 1)[-1]} for file in report.get("files", ())]
+            reports.append({**report, "kind": kind, "name": name, "attachments": attachments})
+    return reports
+
+
+def is_project_file(filename: str) -> bool:
+    """
+    Tell whether a frame lies in the project's own code, other than the
+    wrappers every request or query passes through (this module, the
+    slow-query logger), which would otherwise own most allocations.
+    """
+    from . import slow_queries
+
+    if filename in (__file__, slow_queries.__file__):
+        return False
+    return filename.startswith(str(settings.BASE_DIR) + os.sep) and "site-packages" not in filename
+
+
+def allocation_sites(snapshot, baseline, top: int) -> tuple:
+    """
+    Compare two tracemalloc snapshots taken with tracebacks.
+
+    Returns:
+    - The net bytes and blocks allocated between the snapshots.
+    - Up to `top` tracebacks (innermost frame first) holding the most new
+      memory, with their `size` and `count`.
+    - Up to `top` project sites: the new memory grouped by the innermost
+      frame of each traceback that lies in the project's own code.
+    """
+    ignored = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+    differences = snapshot.filter_traces(ignored).compare_to(baseline.filter_traces(ignored), "traceback")
+
+    size = count = 0
+    tracebacks = []
+    sites = {}
+    for difference in differences:
+        size += difference.size_diff
+        count += difference.count_diff
+        if difference.size_diff <= 0:
+            continue
+        frames = [f"{frame.filename}:{frame.lineno}" for frame in reversed(difference.traceback)]
+        tracebacks.append({"size": difference.size_diff, "count": difference.count_diff, "traceback": frames})
+
+        frame = next((frame for frame in reversed(difference.traceback) if is_project_file(frame.filename)), None)
+        site = f"{os.path.relpath(frame.filename, settings.BASE_DIR)}:{frame.lineno}" if frame else "<library code>"
+        total = sites.setdefault(site, {"site": site, "size": 0, "count": 0})
+        total["size"] += difference.size_diff
+        total["count"] += difference.count_diff
+
+    tracebacks.sort(key=lambda item: -item["size"])
+    ranked = sorted(sites.values(), key=lambda item: -item["size"])
+    return size, count, tracebacks[:top], ranked[:top]
+
+
+class MemoryProfileMiddleware:
+    """
+    Profile the memory of requests sent with `MEMORY_PROFILE_HEADER` by
+    admin users, or sampled at `MEMORY_PROFILE_SAMPLE_RATE`, and write a
+    report per request to `MEMORY_PROFILE_DIR`.
+
+    A report holds the request (`url_name`, `view`, `path`, `status`,
+    `user`, `trigger`, `duration_ms`), the `peak_bytes` traced while it ran,
+    the net `allocated_bytes` and `allocated_blocks` still held when the
+    response was ready, and the `top` tracebacks and `sites` holding them.
+    Streaming responses are profiled up to their first byte.
+
+    Example:
+    ```
+    GET /api/libraries/
+    X-Profile-Memory: 1
+    ```
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        trigger = profile_trigger(request, settings.MEMORY_PROFILE_HEADER, settings.MEMORY_PROFILE_SAMPLE_RATE)
+        if trigger is None or not _lock.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            return self.profile(request, trigger)
+        finally:
+            _lock.release()
+
+    def profile(self, request, trigger: str):
+        # Tracing may already be on, e.g. through PYTHONTRACEMALLOC
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start(settings.MEMORY_PROFILE_FRAMES)
+        baseline = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+            duration_ms = (time.perf_counter() - start) * 1000
+            _, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+        finally:
+            if started:
+                tracemalloc.stop()
+
+        size, count, tracebacks, sites = allocation_sites(snapshot, baseline, settings.MEMORY_PROFILE_TOP)
+        report = {
+            **request_info(request, response, trigger, duration_ms),
+            "peak_bytes": peak - before,
+            "allocated_bytes": size,
+            "allocated_blocks": count,
+            "sites": sites,
+            "top": tracebacks,
+        }
+        write_report(settings.MEMORY_PROFILE_DIR, "memory", report, settings.MEMORY_PROFILE_KEEP)
+        return response
+
+
+class StackSampler:
+    """
+    Sample the stack of a thread every `interval` seconds from a background
+    thread, counting each stack in collapsed form: frames from the
+    outermost, as `module:function`, separated by semicolons.
+
+    Samples are taken whatever the thread is doing, so time waiting on the
+    database or the network shows up as well as time on the CPU. The
+    sampling thread needs the GIL, so a busy thread is sampled at most once
+    per switch interval (5 ms by default).
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self.run, name="cpu-profile-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+
+
+def collapse(frame) -> str:
+    """
+    Return the stack ending at `frame` in collapsed form, leaving out the
+    profiler's own frames.
+    """
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        if code.co_filename != __file__:
+            names.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_qualname}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def collapsed_text(stacks: Counter) -> str:
+    """
+    Format counted stacks as the input of flamegraph.pl or speedscope.
+    """
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+class CPUProfileMiddleware:
+    """
+    Profile the time of requests sent by admin users with
+    `CPU_PROFILE_HEADER` or the `CPU_PROFILE_PARAM` query parameter, and
+    write a report per request to `CPU_PROFILE_DIR`.
+
+    The value picks the profiler: `cprofile` runs `cProfile` and writes a
+    pstats dump (`.prof`, for snakeviz or `python -m pstats`) and its
+    `CPU_PROFILE_TOP` costliest functions (`.txt`); any other value samples
+    the stack every `CPU_PROFILE_INTERVAL` seconds and writes the collapsed
+    stacks (`.collapsed`). The report holds the request, as for memory
+    profiles, with a `trigger` of `header` or `param`, the `mode`, and the
+    number of `samples`.
+
+    Example:
+    ```
+    GET /api/books/?profile=1
+    GET /api/books/?profile=cprofile
+    ```
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        requested = admin_request(request, settings.CPU_PROFILE_HEADER, settings.CPU_PROFILE_PARAM)
+        if requested is None:
+            return self.get_response(request)
+        mode, trigger = requested
+        if mode == "cprofile":
+            return self.profile_calls(request, trigger)
+        return self.sample(request, trigger)
+
+    def sample(self, request, trigger: str):
+        sampler = StackSampler(threading.get_ident(), settings.CPU_PROFILE_INTERVAL)
+        sampler.start()
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            stacks = sampler.stop()
+
+        report = {
+            **request_info(request, response, trigger, duration_ms),
+            "mode": "sample",
+            "interval": settings.CPU_PROFILE_INTERVAL,
+            "samples": sum(stacks.values()),
+        }
+        self.write(report, {"collapsed": collapsed_text(stacks)})
+        return response
+
+    def profile_calls(self, request, trigger: str):
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+            duration_ms = (time.perf_counter() - start) * 1000
+
+        summary = io.StringIO()
+        stats = pstats.Stats(profiler, stream=summary)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(settings.CPU_PROFILE_TOP)
+        report = {
+            **request_info(request, response, trigger, duration_ms),
+            "mode": "cprofile",
+            "calls": stats.total_calls,
+        }
+        self.write(report, {"prof": marshal.dumps(stats.stats), "txt": summary.getvalue()})
+        return response
+
+    def write(self, report: dict, files: dict) -> None:
+        write_report(settings.CPU_PROFILE_DIR, "cpu", report, settings.CPU_PROFILE_KEEP, files)
+
+
+def summarize_memory(reports, top: int = 10) -> list:
+    """
+    Group memory reports by URL name, highest peak first.
+
+    Returns:
+    - A dict per URL name with its `count` of reports, the `max_peak_bytes`
+      and `mean_peak_bytes`, the `mean_allocated_bytes`, the `path` of its
+      highest peak and up to `top` project `sites` with the bytes they
+      held, summed over the reports.
+    """
+    groups = {}
+    for report in reports:
+        name = report["url_name"] or "<unresolved>"
+        group = groups.get(name)
+        if group is None:
+            group = groups[name] = {
+                "url_name": name,
+                "count": 0,
+                "max_peak_bytes": 0,
+                "peak_bytes": 0,
+                "allocated_bytes": 0,
+                "path": None,
+                "sites": {},
+            }
+        group["count"] += 1
+        group["peak_bytes"] += report["peak_bytes"]
+        group["allocated_bytes"] += report["allocated_bytes"]
+        if report["peak_bytes"] >= group["max_peak_bytes"]:
+            group["max_peak_bytes"] = report["peak_bytes"]
+            group["path"] = report["path"]
+        for site in report["sites"]:
+            group["sites"][site["site"]] = group["sites"].get(site["site"], 0) + site["size"]
+
+    ranked = sorted(groups.values(), key=lambda group: -group["max_peak_bytes"])
+    for group in ranked:
+        group["mean_peak_bytes"] = group.pop("peak_bytes") // group["count"]
+        group["mean_allocated_bytes"] = group.pop("allocated_bytes") // group["count"]
+        sites = sorted(group["sites"].items(), key=lambda item: -item[1])[:top]
+        group["sites"] = [{"site": site, "size": size} for site, size in sites]
+    return ranked
@@ -0,0 +1,241 @@
+import csv
+import json
+import os
+import time
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+
+from .models import CustomUser, UserType
+from .registry import user_types
+
+CSV = "csv"
+NDJSON = "ndjson"
+FORMATS = (CSV, NDJSON)
+
+USER_FIELDS = ("username", "email", "first_name", "last_name")
+
+
+@dataclass
+class ProvisioningResult:
+    """
+    Outcome of a bulk provisioning run.
+
+    Attributes:
+    - `created`: Number of users inserted.
+    - `errors`: Per-row errors as `{"row": <1-based row>, "errors": {...}}`.
+    - `elapsed`: Wall-clock seconds spent validating, hashing and inserting.
+    """
+    created: int = 0
+    errors: list = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def users_per_second(self) -> float:
+        return self.created / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "created": self.created,
+            "errors": self.errors,
+            "elapsed": round(self.elapsed, 3),
+            "users_per_second": round(self.users_per_second, 1),
+        }
+
+
+def read_rows(lines, fmt: str) -> list:
+    """
+    Parse user rows from an iterable of text lines.
+
+    CSV input must have a header row naming the columns. NDJSON input holds
+    one JSON object per line; lines that are not valid JSON are kept as raw
+    strings so that validation can report them against their row number.
+
+    Args:
+    - `lines`: An iterable of text lines, e.g. an open file.
+    - `fmt`: Either `"csv"` or `"ndjson"`.
+
+    Returns:
+    - A list of rows, one per user.
+    """
+    if fmt == CSV:
+        return list(csv.DictReader(lines))
+    if fmt == NDJSON:
+        rows = []
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                rows.append(line)
+        return rows
+    raise ValueError(f"Unsupported format '{fmt}', expected one of {', '.join(FORMATS)}.")
+
+
+def hash_passwords(passwords: list, workers: int) -> list:
+    """
+    Hash passwords with the configured hasher, in parallel when `workers` > 1.
+
+    Password hashing is CPU-bound, so the work is spread over a process pool
+    in large chunks to keep inter-process overhead negligible.
+
+    Args:
+    - `passwords`: Raw passwords; `None` produces an unusable password.
+    - `workers`: Number of worker processes.
+
+    Returns:
+    - Encoded passwords, in input order.
+    """
+    if workers <= 1 or len(passwords) < 2:
+        return [make_password(password) for password in passwords]
+
+    # Imported here: multiprocessing is only needed for bulk provisioning
+    from concurrent.futures import ProcessPoolExecutor
+
+    chunksize = max(1, len(passwords) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        return list(executor.map(make_password, passwords, chunksize=chunksize))
+
+
+def provision_users(rows: list, workers: int = None, batch_size: int = 1000) -> ProvisioningResult:
+    """
+    Validate, hash and insert users in bulk.
+
+    Every row is validated first (field validators, password validators,
+    duplicates within the input and against existing users, known user
+    type). Passwords of the valid rows are then hashed in parallel and the
+    users are inserted with `bulk_create`. A batch that still hits an
+    IntegrityError, e.g. because of a concurrent insert, is retried row by
+    row so the failure is attributed to the offending rows only.
+
+    Args:
+    - `rows`: Parsed rows, see `read_rows`.
+    - `workers`: Hashing processes; defaults to `USER_PROVISIONING_WORKERS`.
+    - `batch_size`: Rows per INSERT statement.
+
+    Returns:
+    - A `ProvisioningResult`.
+    """
+    if workers is None:
+        workers = getattr(settings, "USER_PROVISIONING_WORKERS", None) or os.cpu_count() or 1
+
+    started = time.perf_counter()
+    result = ProvisioningResult()
+    type_ids = _resolve_type_ids(rows)
+    taken_usernames, taken_emails = _existing_identities(rows)
+
+    valid = []
+    for number, row in enumerate(rows, start=1):
+        user, password, errors = _build_user(row, type_ids)
+        if user is not None:
+            if user.username in taken_usernames:
+                errors.setdefault("username", []).append("A user with that username already exists.")
+            if user.email in taken_emails:
+                errors.setdefault("email", []).append("A user with that email already exists.")
+        if errors:
+            result.errors.append({"row": number, "errors": errors})
+            continue
+        taken_usernames.add(user.username)
+        taken_emails.add(user.email)
+        valid.append((number, user, password))
+
+    hashes = hash_passwords([password for _, _, password in valid], workers)
+    for (_, user, _), encoded in zip(valid, hashes):
+        user.password = encoded
+
+    for start in range(0, len(valid), batch_size):
+        batch = valid[start:start + batch_size]
+        try:
+            with transaction.atomic():
+                CustomUser.objects.bulk_create([user for _, user, _ in batch])
+            result.created += len(batch)
+        except IntegrityError:
+            result.created += _insert_one_by_one(batch, result.errors)
+
+    result.errors.sort(key=lambda error: error["row"])
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def _init_worker():
+    # Needed when the pool uses the "spawn" start method
+    import django
+    django.setup()
+
+
+def _resolve_type_ids(rows: list) -> dict:
+    names = {_text(row, "type") for row in rows if isinstance(row, dict)}
+    type_ids = dict(UserType.objects.filter(name__in=names).values_list("name", "pk"))
+    type_ids[None] = user_types.get_id(UserType.USER)
+    return type_ids
+
+
+def _existing_identities(rows: list) -> tuple:
+    usernames = {
+        CustomUser.normalize_username(_text(row, "username"))
+        for row in rows if isinstance(row, dict)
+    }
+    emails = {
+        CustomUser.objects.normalize_email(_text(row, "email"))
+        for row in rows if isinstance(row, dict)
+    }
+    taken_usernames = set(
+        CustomUser.objects.filter(username__in=usernames).values_list("username", flat=True)
+    )
+    taken_emails = set(
+        CustomUser.objects.filter(email__in=emails).values_list("email", flat=True)
+    )
+    return taken_usernames, taken_emails
+
+
+def _text(row: dict, name: str) -> str:
+    return str(row.get(name) or "").strip()
+
+
+def _build_user(row, type_ids: dict) -> tuple:
+    if not isinstance(row, dict):
+        return None, None, {"non_field_errors": ["Expected an object with user fields."]}
+
+    values = {name: _text(row, name) for name in USER_FIELDS}
+    user = CustomUser(**values)
+    user.username = CustomUser.normalize_username(user.username)
+    user.email = CustomUser.objects.normalize_email(user.email)
+
+    errors = {}
+    try:
+        user.clean_fields(exclude=["password", "type"])
+    except ValidationError as exc:
+        errors.update(exc.message_dict)
+
+    type_name = _text(row, "type") or None
+    if type_name not in type_ids:
+        errors["type"] = [f"Unknown user type '{type_name}'."]
+    else:
+        user.type_id = type_ids[type_name]
+
+    password = row.get("password") or None
+    if password is not None:
+        password = str(password)
+        try:
+            validate_password(password, user)
+        except ValidationError as exc:
+            errors["password"] = exc.messages
+
+    return user, password, errors
+
+
+def _insert_one_by_one(batch: list, errors: list) -> int:
+    created = 0
+    for number, user, _ in batch:
+        try:
+            with transaction.atomic():
+                CustomUser.objects.bulk_create([user])
+            created += 1
+        except IntegrityError as exc:
+            errors.append({"row": number, "errors": {"non_field_errors": [str(exc).strip()]}})
+    return created
@@ -0,0 +1,92 @@
+import threading
+
+from django.db import DatabaseError, transaction
+
+from .models import UserType
+
+
+class UserTypeRegistry:
+    """
+    Process-wide cache mapping UserType names to primary keys.
+
+    `CustomUser.save()` resolves the default 'admin' / 'user' types through
+    this registry instead of calling `UserType.objects.get_or_create` on every
+    write. The registry is warmed once per process (see `warm`) and cleared by
+    the UserType signal handlers in `api_task.signals` whenever a UserType is
+    saved or deleted.
+
+    Lookups resolved inside an atomic block are only remembered once the
+    transaction commits, so an id from a rolled back insert never ends up in
+    the cache.
+
+    Example:
+    ```
+    from api_task.registry import user_types
+
+    user.type_id = user_types.get_id(UserType.USER)
+    ```
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get_id(self, name: str) -> int:
+        """
+        Return the primary key of the UserType called `name`.
+
+        The UserType is created if it does not exist yet.
+
+        Args:
+        - `name`: The UserType name.
+
+        Returns:
+        - The primary key of the UserType.
+        """
+        try:
+            return self._ids[name]
+        except KeyError:
+            pass
+
+        generation = self._generation
+        user_type, _ = UserType.objects.get_or_create(name=name)
+        self._remember(user_type.name, user_type.pk, generation)
+        return user_type.pk
+
+    def warm(self) -> None:
+        """
+        Load every existing UserType into the registry.
+
+        Errors are swallowed so that a process started before migrations have
+        been applied simply keeps a cold registry.
+        """
+        generation = self._generation
+        try:
+            rows = list(UserType.objects.values_list("name", "pk"))
+        except DatabaseError:
+            return
+        for name, pk in rows:
+            self._remember(name, pk, generation)
+
+    def invalidate(self) -> None:
+        """
+        Drop every cached name and discard lookups still waiting for commit.
+        """
+        with self._lock:
+            self._ids = {}
+            self._generation += 1
+
+    def _remember(self, name: str, pk: int, generation: int) -> None:
+        def store():
+            with self._lock:
+                if generation == self._generation:
+                    self._ids[name] = pk
+
+        if transaction.get_connection().in_atomic_block:
+            transaction.on_commit(store)
+        else:
+            store()
+
+
+user_types = UserTypeRegistry()
@@ -0,0 +1,214 @@
+import datetime
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import Entry, LibraryBookDailyUsage, UserDailyUsage
+
+# Rows per upsert statement, well below PostgreSQL's bind parameter limit
+UPSERT_BATCH_SIZE = 2000
+
+
+def entry_day(moment: datetime.datetime) -> datetime.date:
+    """
+    Return the rollup day of an entry added at `moment`, in the project
+    time zone.
+    """
+    return timezone.localtime(moment, timezone.get_default_timezone()).date()
+
+
+def record_entries(entries, sign: int = 1) -> None:
+    """
+    Add (or with `sign=-1`, remove) entries to the usage rollups.
+
+    Counts are aggregated in memory first, then applied with one
+    `INSERT ... ON CONFLICT DO UPDATE` per rollup table, in key order so
+    that concurrent writers do not deadlock.
+
+    Args:
+    - `entries`: Entry instances or `(user_id, library_id, book_id, date_added)` tuples.
+    - `sign`: 1 to count the entries, -1 to uncount them.
+    """
+    library_books, users = Counter(), Counter()
+    for entry in entries:
+        user_id, library_id, book_id, date_added = _keys(entry)
+        day = entry_day(date_added)
+        library_books[(library_id, book_id, day)] += sign
+        users[(user_id, day)] += sign
+
+    _upsert(LibraryBookDailyUsage, ("library_id", "book_id", "day"), library_books)
+    _upsert(UserDailyUsage, ("user_id", "day"), users)
+
+
+def entry_saved(instance: Entry, created: bool) -> None:
+    """
+    Keep the rollups in step with a saved Entry.
+
+    New entries are counted. For updated entries loaded from the database,
+    counts move from the keys the entry was loaded with to its new keys.
+    Deleting an entry does not uncount it: the rollups record check-ins as
+    they happened, independent of later archival (use `rebuild_rollups` to
+    recompute them from the Entry table).
+    """
+    keys = _keys(instance)
+    if created:
+        record_entries([keys])
+    else:
+        loaded = getattr(instance, "_loaded_keys", None)
+        if loaded is None or None in loaded or loaded == keys:
+            return
+        record_entries([loaded], sign=-1)
+        record_entries([keys])
+    instance._loaded_keys = keys
+
+
+def rebuild(start: datetime.date = None, end: datetime.date = None) -> None:
+    """
+    Recompute the rollups for days `start` to `end` (inclusive) from
+    `Entry.date_added`; all days when no bounds are given.
+
+    Both rollup tables are locked against concurrent increments while they
+    are rebuilt. Entries created meanwhile are counted by their own
+    transaction once the rebuild commits.
+
+    With sharding, the entries of every shard are counted along with those
+    on the global database, which holds the rollups. Shards are read
+    outside the lock, so an entry inserted on a shard while it is read may
+    be counted twice.
+    """
+    from . import sharding
+
+    tz = settings.TIME_ZONE
+    entry_table = Entry._meta.db_table
+    library_table = LibraryBookDailyUsage._meta.db_table
+    user_table = UserDailyUsage._meta.db_table
+
+    day_filter, entry_filter, day_params, entry_params = [], [], [], []
+    if start is not None:
+        day_filter.append("day >= %s")
+        day_params.append(start)
+        entry_filter.append("date_added >= %s")
+        entry_params.append(_start_of(start))
+    if end is not None:
+        day_filter.append("day <= %s")
+        day_params.append(end)
+        entry_filter.append("date_added < %s")
+        entry_params.append(_start_of(end + datetime.timedelta(days=1)))
+    day_where = f"WHERE {' AND '.join(day_filter)}" if day_filter else ""
+    entry_where = f"WHERE {' AND '.join(entry_filter)}" if entry_filter else ""
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {library_table}, {user_table} IN SHARE ROW EXCLUSIVE MODE")
+        cursor.execute(f"DELETE FROM {library_table} {day_where}", day_params)
+        cursor.execute(f"DELETE FROM {user_table} {day_where}", day_params)
+        cursor.execute(
+            f"INSERT INTO {library_table} (library_id, book_id, day, entries) "
+            f"SELECT library_id, book_id, (date_added AT TIME ZONE %s)::date, COUNT(*) "
+            f"FROM {entry_table} {entry_where} GROUP BY 1, 2, 3",
+            [tz, *entry_params],
+        )
+        cursor.execute(
+            f"INSERT INTO {user_table} (user_id, day, entries) "
+            f"SELECT user_id, (date_added AT TIME ZONE %s)::date, COUNT(*) "
+            f"FROM {entry_table} {entry_where} GROUP BY 1, 2",
+            [tz, *entry_params],
+        )
+        for alias in sharding.shard_aliases():
+            _count_shard(alias, entry_where, [tz, *entry_params])
+
+
+def _count_shard(alias: str, entry_where: str, params: list) -> None:
+    """
+    Add the daily counts of a shard's entries to the rollups.
+    """
+    entry_table = Entry._meta.db_table
+    queries = (
+        (LibraryBookDailyUsage, ("library_id", "book_id", "day"), "library_id, book_id", "GROUP BY 1, 2, 3"),
+        (UserDailyUsage, ("user_id", "day"), "user_id", "GROUP BY 1, 2"),
+    )
+    for model, key_columns, keys, group_by in queries:
+        with connections[alias].cursor() as cursor:
+            cursor.execute(
+                f"SELECT {keys}, (date_added AT TIME ZONE %s)::date, COUNT(*) "
+                f"FROM {entry_table} {entry_where} {group_by}",
+                params,
+            )
+            while rows := cursor.fetchmany(UPSERT_BATCH_SIZE):
+                _upsert(model, key_columns, Counter({tuple(row[:-1]): row[-1] for row in rows}))
+
+
+def library_daily(library=None, start=None, end=None):
+    """
+    Entries per library per day, answered from LibraryBookDailyUsage.
+    """
+    rows = _in_range(LibraryBookDailyUsage.objects.all(), start, end)
+    if library is not None:
+        rows = rows.filter(library_id=library)
+    return (
+        rows.values("library", "library__name", "day")
+        .annotate(total=Sum("entries"))
+        .order_by("day", "library")
+    )
+
+
+def top_books(library=None, start=None, end=None, limit: int = 10):
+    """
+    The most checked-out books, answered from LibraryBookDailyUsage.
+    """
+    rows = _in_range(LibraryBookDailyUsage.objects.all(), start, end)
+    if library is not None:
+        rows = rows.filter(library_id=library)
+    return (
+        rows.values("book", "book__title")
+        .annotate(total=Sum("entries"))
+        .order_by("-total", "book")[:limit]
+    )
+
+
+def user_daily(user=None, start=None, end=None):
+    """
+    Entries per user per day, answered from UserDailyUsage.
+    """
+    rows = _in_range(UserDailyUsage.objects.all(), start, end)
+    if user is not None:
+        rows = rows.filter(user_id=user)
+    return rows.values("user", "day").annotate(total=Sum("entries")).order_by("day", "user")
+
+
+def _keys(entry) -> tuple:
+    if isinstance(entry, Entry):
+        return entry.user_id, entry.library_id, entry.book_id, entry.date_added
+    return tuple(entry)
+
+
+def _start_of(day: datetime.date) -> datetime.datetime:
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min), timezone.get_default_timezone())
+
+
+def _in_range(rows, start, end):
+    if start is not None:
+        rows = rows.filter(day__gte=start)
+    if end is not None:
+        rows = rows.filter(day__lte=end)
+    return rows
+
+
+def _upsert(model, key_columns: tuple, counts: Counter) -> None:
+    rows = sorted((key, count) for key, count in counts.items() if count)
+    if not rows:
+        return
+
+    table = model._meta.db_table
+    columns = ", ".join(key_columns)
+    row_placeholder = "(" + ", ".join(["%s"] * (len(key_columns) + 1)) + ")"
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+            batch = rows[start:start + UPSERT_BATCH_SIZE]
+            cursor.execute(
+                f"INSERT INTO {table} ({columns}, entries) VALUES {', '.join([row_placeholder] * len(batch))} "
+                f"ON CONFLICT ({columns}) DO UPDATE SET entries = {table}.entries + EXCLUDED.entries",
+                [value for key, count in batch for value in (*key, count)],
+            )
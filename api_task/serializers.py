@@ -1,5 +1,9 @@
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.db import transaction
 from rest_framework import serializers
-from .models import UserType, CustomUser, Author, Book, BookAuthor, Library, Entry
+from .dedup import AuthorResolver, find_book
+from .models import UserType, CustomUser, Author, Book, Library, Entry
 
 
 class UserTypeSerializer(serializers.ModelSerializer):
@@ -100,11 +104,22 @@ class BookSerializer(serializers.ModelSerializer):
         fields = ["title", "authors"]
 
     def create(self, validated_data):
-        authors_data = validated_data.pop("authors")
-        book = Book.objects.create(**validated_data)
-        for author_data in authors_data:
-            author, _ = Author.objects.get_or_create(**author_data)
-            BookAuthor.objects.create(book=book, author=author)
+        """
+        Create a book with the authors passed to `save(authors=[...])`, as
+        dicts with `name` and `birth_year`. Author names are resolved to
+        existing authors however they are spelled (see
+        `api_task.dedup.AuthorResolver`), and a book with the same title and
+        authors that already exists is returned instead of a duplicate.
+        """
+        authors_data = validated_data.pop("authors", [])
+        resolver = AuthorResolver()
+        authors = [resolver.resolve(data["name"], data.get("birth_year")) for data in authors_data]
+
+        book = find_book(validated_data["title"], authors)
+        if book is None:
+            with transaction.atomic():
+                book = Book.objects.create(**validated_data)
+                book.authors.add(*authors)
         return book
 
 
@@ -153,7 +168,7 @@ class EntrySerializer(serializers.ModelSerializer):
     """
     Serializer for the Entry model.
 
-    Serializes the 'user' and 'library' fields of Entry instances.
+    Serializes the 'user', 'library' and 'book' fields of Entry instances.
 
     Attributes:
     - `model`: The Entry model.
@@ -163,10 +178,203 @@ class EntrySerializer(serializers.ModelSerializer):
     ```
     {
         "user": 1,
-        "library": 1
+        "library": 1,
+        "book": 1
     }
     ```
     """
     class Meta:
         model = Entry
-        fields = ["user", "library"]
+        fields = ["user", "library", "book"]
+
+
+class EntryFeedSerializer(serializers.ModelSerializer):
+    """
+    Serializer for the entries of a user's activity feed.
+
+    Embeds the book title and library name, which the feed view loads with
+    `select_related`.
+
+    Attributes:
+    - `model`: The Entry model.
+    - `fields`: The fields to include in the serialized representation.
+
+    Example:
+    ```
+    {
+        "id": 12,
+        "date_added": "2024-01-26T00:18:00Z",
+        "book": 1,
+        "book_title": "Sample Book",
+        "library": 1,
+        "library_name": "City Library"
+    }
+    ```
+    """
+    book_title = serializers.CharField(source="book.title", read_only=True)
+    library_name = serializers.CharField(source="library.name", read_only=True)
+
+    class Meta:
+        model = Entry
+        fields = ["id", "date_added", "book", "book_title", "library", "library_name"]
+
+
+class TokenObtainSerializer(serializers.Serializer):
+    """
+    Serializer validating credentials for issuing an API token.
+
+    Attributes:
+    - `username`: The username of the user requesting the token.
+    - `password`: The user's password (write-only).
+
+    Example:
+    ```
+    {
+        "username": "john_doe",
+        "password": "s3cret-Passw0rd"
+    }
+    ```
+    """
+    username = serializers.CharField()
+    password = serializers.CharField(write_only=True, trim_whitespace=False)
+
+    def validate(self, attrs):
+        user = authenticate(
+            self.context.get("request"),
+            username=attrs["username"],
+            password=attrs["password"],
+        )
+        if user is None:
+            raise serializers.ValidationError("Invalid credentials.", code="authorization")
+        attrs["user"] = user
+        return attrs
+
+
+class EntryIngestSerializer(serializers.Serializer):
+    """
+    Serializer validating check-ins for the buffered ingestion path.
+
+    Only checks the payload's shape; whether the referenced rows exist is
+    verified later, in bulk, by the flusher (see `api_task.ingestion`).
+
+    Attributes:
+    - `user`: The primary key of the CustomUser.
+    - `library`: The primary key of the Library.
+    - `book`: The primary key of the Book.
+
+    Example:
+    ```
+    {
+        "user": 1,
+        "library": 1,
+        "book": 1
+    }
+    ```
+    """
+    user = serializers.IntegerField(min_value=1)
+    library = serializers.IntegerField(min_value=1)
+    book = serializers.IntegerField(min_value=1)
+
+
+class UsageQuerySerializer(serializers.Serializer):
+    """
+    Serializer validating the query parameters of the usage endpoints.
+
+    Attributes:
+    - `start`: First day to include (optional).
+    - `end`: Last day to include (optional).
+    - `library`: Restrict to one library (optional).
+    - `user`: Restrict to one user (optional).
+    - `limit`: Number of books returned by the top books endpoint.
+
+    Example:
+    ```
+    ?start=2024-01-01&end=2024-01-31&library=1
+    ```
+    """
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    library = serializers.IntegerField(required=False, min_value=1)
+    user = serializers.IntegerField(required=False, min_value=1)
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=100, default=10)
+
+    def validate(self, attrs):
+        if "start" in attrs and "end" in attrs and attrs["start"] > attrs["end"]:
+            raise serializers.ValidationError("'start' must not be after 'end'.")
+        return attrs
+
+
+class ChangesQuerySerializer(serializers.Serializer):
+    """
+    Serializer validating the query parameters of the changes endpoint.
+
+    Attributes:
+    - `since`: The cursor returned by the previous call (optional).
+    - `limit`: Maximum number of changes read per call (optional).
+
+    Example:
+    ```
+    ?since=1042&limit=500
+    ```
+    """
+    since = serializers.IntegerField(required=False, min_value=0)
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=10000)
+
+
+class EntryStreamQuerySerializer(serializers.Serializer):
+    """
+    Serializer validating the query parameters of the entry stream.
+
+    Attributes:
+    - `library`: Only stream entries of this library (optional).
+    - `user`: Only stream entries of this user (optional).
+
+    Example:
+    ```
+    ?library=1
+    ```
+    """
+    library = serializers.IntegerField(required=False, min_value=1)
+    user = serializers.IntegerField(required=False, min_value=1)
+
+
+class BatchSerializer(serializers.Serializer):
+    """
+    Serializer validating a batch of API read requests.
+
+    Attributes:
+    - `requests`: Paths of GET requests under the API prefix, with their
+      query strings; at most `API_BATCH_MAX_REQUESTS`.
+    - `snapshot`: Whether all requests should read one database snapshot.
+
+    Example:
+    ```
+    {
+        "requests": ["/api/user-types/", "/api/authors/", "/api/books/?page=2"],
+        "snapshot": true
+    }
+    ```
+    """
+    requests = serializers.ListField(child=serializers.CharField(max_length=2000), allow_empty=False)
+    snapshot = serializers.BooleanField(default=False)
+
+    def validate_requests(self, value):
+        limit = getattr(settings, "API_BATCH_MAX_REQUESTS", 20)
+        if len(value) > limit:
+            raise serializers.ValidationError(f"At most {limit} requests per batch.")
+        return value
+
+
+class CatalogExportQuerySerializer(serializers.Serializer):
+    """
+    Serializer validating the query parameters of the catalog export.
+
+    Attributes:
+    - `compress`: `gzip` to receive a gzipped file (optional).
+
+    Example:
+    ```
+    ?compress=gzip
+    ```
+    """
+    compress = serializers.ChoiceField(choices=["gzip"], required=False)
@@ -0,0 +1,438 @@
+"""
+Horizontal sharding of libraries and their entries.
+
+With `SHARD_DATABASES` set, each library is placed on one of those database
+aliases, by default `SHARD_DATABASES[library_id % len(SHARD_DATABASES)]`.
+Its shard holds a replica of the Library row, its books (the
+`api_task_library_books` rows) and all its Entry rows, so the write load
+of entries spreads across shards. The global database
+(`SHARD_GLOBAL_DATABASE`) keeps:
+
+- the directory of placements (`LibraryShard`), which rebalancing updates;
+- the Library rows themselves, which allocate library ids and anchor the
+  usage rollups and the change log;
+- the catalog (UserType, CustomUser, Author, Book, BookAuthor), copied to
+  every shard whenever it is saved or deleted through the ORM, since the
+  Entry and library_books rows of a shard reference it.
+
+`ShardRouter` routes queries: entries and library books to the shard of
+their library, whatever is read through a sharded object to that object's
+database, and everything else to the global database. Queries that cannot
+name a library (e.g. all entries of a user) go through `fan_out()`, which
+runs them on every shard and merges the results; single entries are looked
+up by id with `find_entry()`. Entry ids come from the global database's
+sequence (`next_entry_id()`), so they are unique across shards.
+
+Entries flushed from the ingestion buffer (`flush_entries`) are inserted
+on their library's shard, and partition maintenance runs on the global
+database and every shard. Writers bypassing the ORM keep writing to the
+global database: bulk catalog loads must be followed by `sync_catalog()`
+(`rebalance_shards --sync-catalog`).
+
+With `SHARD_DATABASES` empty, the router and the replication signals do
+nothing and every query uses the default database.
+"""
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import Author, Book, BookAuthor, CustomUser, Entry, Library, LibraryShard, UserType
+
+# Copied to every shard, in dependency order
+REPLICATED_MODELS = (UserType, CustomUser, Author, Book, BookAuthor)
+
+# Rows copied per statement when syncing the catalog or moving a library
+COPY_BATCH_SIZE = 2000
+
+LibraryBooks = Library.books.through
+
+_placements = {}
+# Entry ids reserved on the global database by this process
+_entry_ids = deque()
+_entry_ids_lock = threading.Lock()
+
+
+def global_alias() -> str:
+    return getattr(settings, "SHARD_GLOBAL_DATABASE", "default")
+
+
+def shard_aliases() -> list:
+    """
+    Return the aliases of the shard databases, empty when sharding is off.
+    """
+    shards = list(getattr(settings, "SHARD_DATABASES", ()))
+    if global_alias() in shards:
+        raise ImproperlyConfigured("SHARD_GLOBAL_DATABASE cannot also be one of SHARD_DATABASES")
+    return shards
+
+
+def enabled() -> bool:
+    return bool(getattr(settings, "SHARD_DATABASES", ()))
+
+
+def default_shard(library_id: int) -> str:
+    shards = shard_aliases()
+    return shards[library_id % len(shards)]
+
+
+def library_shard(library_id: int) -> str:
+    """
+    Return the alias of the shard holding a library, from the directory.
+
+    Placements are cached per process for `SHARD_DIRECTORY_TTL` seconds;
+    libraries not in the directory yet get their default shard.
+    """
+    cached = _placements.get(library_id)
+    if cached is not None and cached[1] > time.monotonic():
+        return cached[0]
+    shard = (
+        LibraryShard.objects.using(global_alias()).filter(library_id=library_id).values_list("shard", flat=True).first()
+        or default_shard(library_id)
+    )
+    _placements[library_id] = (shard, time.monotonic() + getattr(settings, "SHARD_DIRECTORY_TTL", 5))
+    return shard
+
+
+def invalidate(library_id: int = None) -> None:
+    """
+    Forget the cached placement of a library, or of all libraries.
+    """
+    if library_id is None:
+        _placements.clear()
+    else:
+        _placements.pop(library_id, None)
+
+
+def entry_database(library_id: int, using: str = None) -> str:
+    """
+    Return the database an entry is saved to: its library's shard, unless
+    another shard is named explicitly.
+    """
+    if not enabled() or (using is not None and using != global_alias()):
+        return using
+    return library_shard(library_id)
+
+
+def _library_id(instance):
+    if isinstance(instance, Library):
+        return instance.pk
+    return getattr(instance, "library_id", None)
+
+
+class ShardRouter:
+    """
+    Database router sending entries and library books to the shard of their
+    library (see the module documentation).
+    """
+
+    def db_for_read(self, model, **hints):
+        if not enabled():
+            return None
+        instance = hints.get("instance")
+        if model is LibraryShard:
+            return global_alias()
+        if model is Entry or model is LibraryBooks:
+            library_id = _library_id(instance)
+            return library_shard(library_id) if library_id else global_alias()
+        if instance is None:
+            return global_alias()
+        if isinstance(instance, Library) and model is not Library:
+            # Books and entries reached through a library live on its shard
+            return library_shard(instance.pk) if instance.pk else global_alias()
+        return instance._state.db or global_alias()
+
+    db_for_write = db_for_read
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The catalog and the libraries are present wherever rows refer to them
+        return True if enabled() else None
+
+
+def fan_out(queryset, key=None, limit: int = None) -> list:
+    """
+    Run a query on every shard and merge the results.
+
+    Args:
+    - `queryset`: The query, ordered consistently with `key`.
+    - `key`: Sort key of the merged rows; results are concatenated in shard
+      order when omitted.
+    - `limit`: Rows kept, read from each shard and from the merged results.
+
+    Without sharding, the query simply runs on its own database.
+
+    Example:
+    ```
+    newest = fan_out(Entry.objects.filter(user_id=1).order_by("-date_added", "id"),
+                     key=lambda e: (-e.date_added.timestamp(), e.pk), limit=50)
+    ```
+    """
+    if not enabled():
+        return list(queryset if limit is None else queryset[:limit])
+    parts = [queryset.using(alias) if limit is None else queryset.using(alias)[:limit] for alias in shard_aliases()]
+    merged = heapq.merge(*parts, key=key) if key else itertools.chain(*parts)
+    return list(itertools.islice(merged, limit))
+
+
+def place_library(library: Library) -> str:
+    """
+    Record the placement of a new library in the directory and copy the
+    library to its shard.
+    """
+    shard = default_shard(library.pk)
+    placement, _ = LibraryShard.objects.using(global_alias()).get_or_create(library_id=library.pk, defaults={"shard": shard})
+    invalidate(library.pk)
+    replicate([library], [placement.shard])
+    return placement.shard
+
+
+def replicate(instances, aliases=None) -> None:
+    """
+    Insert or update rows on the given shards (all by default), exactly as
+    they are on the global database, without sending model signals.
+    """
+    if not instances:
+        return
+    model = type(instances[0])
+    fields = [f.name for f in model._meta.concrete_fields if not f.primary_key]
+    for alias in shard_aliases() if aliases is None else aliases:
+        model.objects.using(alias).bulk_create(
+            instances,
+            batch_size=COPY_BATCH_SIZE,
+            update_conflicts=bool(fields),
+            ignore_conflicts=not fields,
+            unique_fields=[model._meta.pk.name] if fields else None,
+            update_fields=fields or None,
+        )
+    for instance in instances:
+        # bulk_create marks instances as saved on the last shard
+        instance._state.db = global_alias()
+
+
+def replicate_delete(model, pks, aliases=None) -> None:
+    """
+    Delete rows from the given shards (all by default), cascading there
+    as on the global database.
+    """
+    for alias in shard_aliases() if aliases is None else aliases:
+        model.objects.using(alias).filter(pk__in=pks).delete()
+
+
+def is_replica(model, using: str) -> bool:
+    """
+    Tell whether a write of `model` on database `using` is a copy of a
+    write made on the global database; the change log and other
+    side effects only follow the original write.
+    """
+    return enabled() and using != global_alias() and (model in REPLICATED_MODELS or model is Library)
+
+
+def sync_catalog(aliases=None) -> dict:
+    """
+    Copy the whole catalog from the global database to the shards (all by
+    default), and each library to its shard: after bulk loads that bypass
+    model signals.
+
+    Returns:
+    - The rows copied per model name.
+    """
+    copied = {}
+    for model in REPLICATED_MODELS:
+        rows = model.objects.using(global_alias()).order_by("pk").iterator(chunk_size=COPY_BATCH_SIZE)
+        copied[model.__name__] = 0
+        for batch in iter(lambda: list(itertools.islice(rows, COPY_BATCH_SIZE)), []):
+            replicate(batch, aliases)
+            copied[model.__name__] += len(batch)
+
+    copied["Library"] = 0
+    for library in Library.objects.using(global_alias()).order_by("pk").iterator(chunk_size=COPY_BATCH_SIZE):
+        shard = library_shard(library.pk)
+        if aliases is None or shard in aliases:
+            replicate([library], [shard])
+            copied["Library"] += 1
+    return copied
+
+
+def next_entry_id() -> int:
+    """
+    Allocate the id of a new entry from the Entry sequence of the global
+    database, so that ids are unique across shards: the feed's cursor, the
+    change log and moves between shards rely on it.
+
+    Ids are reserved `SHARD_ENTRY_ID_BLOCK` at a time per process, so ids
+    are unique but only roughly increasing across processes.
+    """
+    with _entry_ids_lock:
+        if not _entry_ids:
+            with connections[global_alias()].cursor() as cursor:
+                cursor.execute(
+                    "SELECT nextval(%s) FROM generate_series(1, %s)",
+                    [f"{Entry._meta.db_table}_id_seq", getattr(settings, "SHARD_ENTRY_ID_BLOCK", 50)],
+                )
+                _entry_ids.extend(sorted(row[0] for row in cursor.fetchall()))
+        return _entry_ids.popleft()
+
+
+def _after_fork() -> None:
+    # A forked worker must not hand out the ids its parent reserved
+    global _entry_ids_lock
+    _entry_ids.clear()
+    _entry_ids_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def move_entry(entry: Entry, source: str, target: str) -> None:
+    """
+    Move an entry whose library changed to a library on another shard: copy
+    its row to `target` and delete it from `source`, without signals. The
+    caller then saves the entry on `target` as an update.
+    """
+    Entry.objects.using(target).bulk_create([entry])
+    with connections[source].cursor() as cursor:
+        cursor.execute(f"DELETE FROM {Entry._meta.db_table} WHERE id = %s", [entry.pk])
+
+
+def find_entry(pk, queryset=None):
+    """
+    Look up an entry by id on every shard, since the id alone does not tell
+    its library, then on the global database, which keeps the entries
+    written before sharding was enabled.
+    Returns None if no database holds it.
+
+    Args:
+    - `queryset`: Entry queryset to look in, e.g. with `select_related`.
+    """
+    queryset = Entry.objects.all() if queryset is None else queryset
+    for alias in [*shard_aliases(), global_alias()]:
+        entry = queryset.using(alias).filter(pk=pk).first()
+        if entry is not None:
+            return entry
+    return None
+
+
+def shard_loads() -> dict:
+    """
+    Return the entries of each library, per shard: `{alias: {library_id: entries}}`.
+    Libraries without entries count as 0.
+    """
+    loads = {alias: {} for alias in shard_aliases()}
+    for library_id in Library.objects.using(global_alias()).values_list("pk", flat=True):
+        loads[library_shard(library_id)].setdefault(library_id, 0)
+    for alias in loads:
+        rows = Entry.objects.using(alias).order_by().values_list("library_id").annotate(entries=Count("id"))
+        for library_id, entries in rows:
+            loads[alias][library_id] = entries
+    return loads
+
+
+def plan_rebalance(loads: dict, tolerance: float = 0.1) -> list:
+    """
+    Plan library moves evening out the entries per shard.
+
+    Libraries move one at a time from the most to the least loaded shard,
+    each time the one leaving the two closest to each other, until every
+    shard is within `tolerance` (a fraction) of the mean load or no move
+    narrows the gap.
+
+    Returns:
+    - `(library_id, source, target)` moves, in order.
+    """
+    loads = {alias: dict(libraries) for alias, libraries in loads.items()}
+    if len(loads) < 2:
+        return []
+    totals = {alias: sum(libraries.values()) for alias, libraries in loads.items()}
+    mean = sum(totals.values()) / len(totals)
+    moves = []
+    while True:
+        source = max(totals, key=totals.get)
+        target = min(totals, key=totals.get)
+        if totals[source] - mean <= mean * tolerance:
+            return moves
+        gap = totals[source] - totals[target]
+        candidates = [(n, pk) for pk, n in loads[source].items() if 0 < n < gap]
+        if not candidates:
+            return moves
+        # The library bringing both shards closest to each other
+        entries, library_id = min(candidates, key=lambda c: abs(gap - 2 * c[0]))
+        moves.append((library_id, source, target))
+        loads[target][library_id] = loads[source].pop(library_id)
+        totals[source] -= entries
+        totals[target] += entries
+
+
+def move_library(library_id: int, target: str, batch_size: int = COPY_BATCH_SIZE) -> int:
+    """
+    Move a library, its books and its entries to another shard.
+
+    Entries are copied in id order while the library keeps receiving
+    writes on its old shard; the directory then points to the new shard,
+    and the entries added meanwhile are copied while the old replica is
+    locked, just before it is deleted. Writers still routing to the old
+    shard from a stale placement cache then fail on the missing library
+    instead of writing entries that would be lost.
+
+    Moving is not a change of the data: no signal is sent and the change
+    log and usage rollups are untouched.
+
+    Returns:
+    - The number of entries moved.
+    """
+    source = library_shard(library_id)
+    if source == target:
+        return 0
+    if target not in shard_aliases():
+        raise ValueError(f"{target!r} is not one of SHARD_DATABASES")
+
+    library = Library.objects.using(global_alias()).get(pk=library_id)
+    replicate([library], [target])
+    copied, last_id = _copy_entries(library_id, source, target, 0, batch_size)
+
+    LibraryShard.objects.using(global_alias()).update_or_create(
+        library_id=library_id, defaults={"shard": target, "moved_at": timezone.now()}
+    )
+    invalidate(library_id)
+
+    with transaction.atomic(using=source), transaction.atomic(using=target):
+        with connections[source].cursor() as cursor:
+            # New entries take a key share lock on their library: they wait
+            # for the move, then fail on the deleted library
+            cursor.execute(f"SELECT id FROM {Library._meta.db_table} WHERE id = %s FOR UPDATE", [library_id])
+        more, _ = _copy_entries(library_id, source, target, last_id, batch_size)
+        # Membership ids are per shard; the target numbers its own
+        books = LibraryBooks.objects.using(source).filter(library_id=library_id).values_list("book_id", flat=True)
+        LibraryBooks.objects.using(target).bulk_create(
+            [LibraryBooks(library_id=library_id, book_id=book_id) for book_id in books], ignore_conflicts=True
+        )
+        with connections[source].cursor() as cursor:
+            for table, column in ((Entry, "library_id"), (LibraryBooks, "library_id"), (Library, "id")):
+                cursor.execute(f"DELETE FROM {table._meta.db_table} WHERE {column} = %s", [library_id])
+    return copied + more
+
+
+def _copy_entries(library_id: int, source: str, target: str, after_id: int, batch_size: int) -> tuple:
+    """
+    Copy the entries of a library with ids above `after_id`.
+
+    Returns:
+    - `(copied, last_id)`.
+    """
+    copied, last_id = 0, after_id
+    while True:
+        batch = list(
+            Entry.objects.using(source).filter(library_id=library_id, id__gt=last_id).order_by("id")[:batch_size]
+        )
+        if not batch:
+            return copied, last_id
+        Entry.objects.using(target).bulk_create(batch)
+        copied += len(batch)
+        last_id = batch[-1].pk
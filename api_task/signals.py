@@ -0,0 +1,289 @@
+from django.conf import settings
+from django.core.signals import request_started
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import changes, dedup, events, sharding, slow_queries
+from .backends import user_cache
+from .models import Author, Book, BookAuthor, Change, CustomUser, Entry, Library, UserType
+from .registry import user_types
+from .rollups import entry_saved
+
+
+@receiver(post_save, sender=UserType, dispatch_uid="user_type_saved")
+@receiver(post_delete, sender=UserType, dispatch_uid="user_type_deleted")
+def invalidate_user_types(sender, **kwargs):
+    """
+    Clear the UserType registry whenever a UserType is created, renamed or
+    deleted.
+
+    Cached users embed their UserType, so the user cache is cleared as well.
+    """
+    user_types.invalidate()
+    user_cache.invalidate()
+
+
+@receiver(post_save, sender=CustomUser, dispatch_uid="custom_user_saved")
+@receiver(post_delete, sender=CustomUser, dispatch_uid="custom_user_deleted")
+def invalidate_cached_user(sender, instance, **kwargs):
+    """
+    Drop a user from the per-process user cache when it is saved or deleted.
+    """
+    user_cache.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=Entry, dispatch_uid="entry_saved")
+def update_usage_rollups(sender, instance, created, raw=False, **kwargs):
+    """
+    Count new and moved entries in the usage rollups (see `api_task.rollups`).
+    """
+    if not raw:
+        entry_saved(instance, created)
+
+
+@receiver(post_save, sender=Entry, dispatch_uid="entry_created_event")
+def publish_new_entry(sender, instance, created, raw=False, **kwargs):
+    """
+    Announce new entries to the entry stream (see `api_task.events`).
+    """
+    if created and not raw:
+        events.publish_entries([instance])
+
+
+@receiver(pre_save, sender=Author, dispatch_uid="author_keys")
+def set_author_keys(sender, instance, **kwargs):
+    """
+    Keep the deduplication keys of an author in step with its name.
+    """
+    instance.name_key = dedup.name_key(instance.name)[:100]
+    instance.block_key = dedup.block_key(instance.name)[:100]
+
+
+@receiver(post_save, sender=Author, dispatch_uid="author_keys_saved")
+def save_author_keys(sender, instance, update_fields=None, raw=False, using=None, **kwargs):
+    """
+    Write the keys computed by `set_author_keys` when the name was saved
+    alone, e.g. with `save(update_fields=["name"])`.
+    """
+    if raw or update_fields is None or "name" not in update_fields or {"name_key", "block_key"} <= update_fields:
+        return
+    sender.objects.using(using).filter(pk=instance.pk).update(
+        name_key=instance.name_key, block_key=instance.block_key
+    )
+
+
+@receiver(pre_save, sender=Book, dispatch_uid="book_content_hash")
+def set_book_content_hash(sender, instance, **kwargs):
+    """
+    Hash a book's normalized title and authors as it is saved, so title
+    changes are reflected.
+    """
+    author_ids = []
+    if instance.pk is not None:
+        author_ids = BookAuthor.objects.filter(book_id=instance.pk).values_list("author_id", flat=True)
+    instance.content_hash = dedup.content_hash(instance.title, author_ids)
+
+
+@receiver(post_save, sender=Book, dispatch_uid="book_content_hash_saved")
+def save_book_content_hash(sender, instance, update_fields=None, raw=False, using=None, **kwargs):
+    """
+    Write the hash computed by `set_book_content_hash` when the title was
+    saved alone, e.g. with `save(update_fields=["title"])`, which would
+    leave the stored hash behind.
+    """
+    if raw or update_fields is None or "title" not in update_fields or "content_hash" in update_fields:
+        return
+    sender.objects.using(using).filter(pk=instance.pk).update(content_hash=instance.content_hash)
+
+
+@receiver(post_save, sender=BookAuthor, dispatch_uid="book_author_saved_hash")
+@receiver(post_delete, sender=BookAuthor, dispatch_uid="book_author_deleted_hash")
+def update_book_content_hash(sender, instance, raw=False, using=None, **kwargs):
+    """
+    Rehash the book of a BookAuthor row created, changed or deleted one at a
+    time; `remove()`, `clear()` and cascades end up here too.
+    """
+    if not raw and not sharding.is_replica(sender, using):
+        dedup.refresh_content_hashes([instance.book_id])
+
+
+@receiver(m2m_changed, sender=BookAuthor, dispatch_uid="book_authors_added_hash")
+def update_book_content_hashes(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Rehash the books `add()` and `set()` gave authors to in bulk.
+    """
+    if action == "post_add" and pk_set:
+        dedup.refresh_content_hashes(pk_set if reverse else [instance.pk])
+
+
+@receiver(post_save, sender=Author, dispatch_uid="author_change_saved")
+@receiver(post_save, sender=Book, dispatch_uid="book_change_saved")
+@receiver(post_save, sender=Library, dispatch_uid="library_change_saved")
+@receiver(post_save, sender=Entry, dispatch_uid="entry_change_saved")
+def log_saved_object(sender, instance, **kwargs):
+    """
+    Record an inserted or updated object in the change log.
+    """
+    changes.record(changes.kind_of(sender), Change.SAVE, [instance.pk])
+
+
+@receiver(post_delete, sender=Author, dispatch_uid="author_change_deleted")
+@receiver(post_delete, sender=Book, dispatch_uid="book_change_deleted")
+@receiver(post_delete, sender=Library, dispatch_uid="library_change_deleted")
+@receiver(post_delete, sender=Entry, dispatch_uid="entry_change_deleted")
+def log_deleted_object(sender, instance, using=None, **kwargs):
+    """
+    Record a deleted object in the change log.
+    """
+    if sharding.is_replica(sender, using):
+        return
+    changes.record(changes.kind_of(sender), Change.DELETE, [instance.pk])
+
+
+@receiver(post_save, sender=BookAuthor, dispatch_uid="book_author_change_saved")
+@receiver(post_delete, sender=BookAuthor, dispatch_uid="book_author_change_deleted")
+def log_book_author(sender, instance, signal, created=False, using=None, **kwargs):
+    """
+    Record a BookAuthor row created or deleted one at a time; `remove()`,
+    `clear()` and cascades delete rows one by one and end up here too.
+    """
+    if sharding.is_replica(sender, using):
+        return
+    deleted = signal is post_delete
+    if created or deleted:
+        action = Change.DELETE if deleted else Change.SAVE
+        changes.record("book_authors", action, [(instance.book_id, instance.author_id)])
+
+
+@receiver(m2m_changed, sender=BookAuthor, dispatch_uid="book_authors_changed")
+@receiver(m2m_changed, sender=Library.books.through, dispatch_uid="library_books_changed")
+def log_memberships(sender, instance, action, reverse, pk_set, using=None, **kwargs):
+    """
+    Record memberships changed through the many-to-many managers.
+
+    `add()` inserts rows in bulk without `post_save`, so additions are
+    recorded here for both relations. Library.books rows are deleted
+    without `post_delete`, so its removals are recorded here as well.
+    """
+    kind = "book_authors" if sender is BookAuthor else "library_books"
+    if action == "post_add" and pk_set:
+        pairs = [(pk, instance.pk) if reverse else (instance.pk, pk) for pk in pk_set]
+        changes.record(kind, Change.SAVE, sorted(pairs))
+    elif kind == "library_books" and action == "post_remove" and pk_set:
+        pairs = [(pk, instance.pk) if reverse else (instance.pk, pk) for pk in pk_set]
+        changes.record(kind, Change.DELETE, sorted(pairs))
+    elif kind == "library_books" and action == "pre_clear":
+        log_library_book_removals(instance, using)
+
+
+@receiver(pre_delete, sender=Book, dispatch_uid="book_library_books_deleted")
+@receiver(pre_delete, sender=Library, dispatch_uid="library_library_books_deleted")
+def log_cascaded_library_books(sender, instance, using=None, **kwargs):
+    """
+    Record the Library.books memberships a deleted book or library takes
+    with it. With sharding, the memberships are on the shards, where the
+    deletion is replicated.
+    """
+    log_library_book_removals(instance, using)
+
+
+def log_library_book_removals(instance, using=None) -> None:
+    rows = Library.books.through.objects.using(using).filter(**{type(instance)._meta.model_name: instance.pk})
+    pairs = list(rows.order_by("library_id", "book_id").values_list("library_id", "book_id"))
+    if pairs:
+        changes.record("library_books", Change.DELETE, pairs)
+
+
+@receiver(request_started, dispatch_uid="warm_user_types")
+def warm_user_types(sender, **kwargs):
+    """
+    Warm the UserType registry before the first request of each process.
+
+    The receiver disconnects itself after running once, so later requests
+    pay nothing for it.
+    """
+    request_started.disconnect(dispatch_uid="warm_user_types")
+    user_types.warm()
+
+
+@receiver(connection_created, dispatch_uid="slow_query_log")
+def install_slow_query_log(sender, connection, **kwargs):
+    """
+    Time the queries of the connections in `SLOW_QUERY_LOG_DATABASES` and
+    log the slow ones (see `api_task.slow_queries`).
+    """
+    if settings.SLOW_QUERY_LOG and connection.alias in settings.SLOW_QUERY_LOG_DATABASES:
+        slow_queries.install(connection)
+
+
+@receiver(post_save, sender=UserType, dispatch_uid="user_type_replicated")
+@receiver(post_save, sender=CustomUser, dispatch_uid="custom_user_replicated")
+@receiver(post_save, sender=Author, dispatch_uid="author_replicated")
+@receiver(post_save, sender=Book, dispatch_uid="book_replicated")
+@receiver(post_save, sender=BookAuthor, dispatch_uid="book_author_replicated")
+def replicate_saved_object(sender, instance, raw=False, using=None, **kwargs):
+    """
+    Copy catalog rows saved on the global database to every shard (see
+    `api_task.sharding`).
+    """
+    if sharding.enabled() and not raw and using == sharding.global_alias():
+        sharding.replicate([instance])
+
+
+@receiver(post_delete, sender=UserType, dispatch_uid="user_type_replica_deleted")
+@receiver(post_delete, sender=CustomUser, dispatch_uid="custom_user_replica_deleted")
+@receiver(post_delete, sender=Author, dispatch_uid="author_replica_deleted")
+@receiver(post_delete, sender=Book, dispatch_uid="book_replica_deleted")
+@receiver(post_delete, sender=BookAuthor, dispatch_uid="book_author_replica_deleted")
+def replicate_deleted_object(sender, instance, using=None, **kwargs):
+    """
+    Delete catalog rows deleted on the global database from every shard,
+    along with the rows referencing them there.
+    """
+    if sharding.enabled() and using == sharding.global_alias():
+        sharding.replicate_delete(sender, [instance.pk])
+
+
+@receiver(m2m_changed, sender=BookAuthor, dispatch_uid="book_authors_replicated")
+def replicate_book_authors(sender, instance, action, reverse, pk_set, using=None, **kwargs):
+    """
+    Copy BookAuthor rows added in bulk by `add()` and `set()` to every
+    shard.
+    """
+    if sharding.enabled() and action == "post_add" and pk_set and using == sharding.global_alias():
+        rows = BookAuthor.objects.using(using).filter(
+            **({"book_id__in": pk_set, "author_id": instance.pk} if reverse else {"book_id": instance.pk, "author_id__in": pk_set})
+        )
+        sharding.replicate(list(rows))
+
+
+@receiver(post_save, sender=Library, dispatch_uid="library_replicated")
+def replicate_library(sender, instance, created, raw=False, using=None, **kwargs):
+    """
+    Place new libraries on a shard, and copy saved libraries to their shard.
+    """
+    if not sharding.enabled() or raw or using != sharding.global_alias():
+        return
+    if created:
+        sharding.place_library(instance)
+    else:
+        sharding.replicate([instance], [sharding.library_shard(instance.pk)])
+
+
+@receiver(pre_delete, sender=Library, dispatch_uid="library_replica_located")
+def locate_library_replica(sender, instance, using=None, **kwargs):
+    # The directory row is deleted along with the library
+    if sharding.enabled() and using == sharding.global_alias():
+        instance._shard = sharding.library_shard(instance.pk)
+
+
+@receiver(post_delete, sender=Library, dispatch_uid="library_replica_deleted")
+def delete_library_replica(sender, instance, using=None, **kwargs):
+    """
+    Delete a library deleted on the global database from its shard, with
+    its books and entries.
+    """
+    if sharding.enabled() and using == sharding.global_alias():
+        sharding.replicate_delete(Library, [instance.pk], [instance._shard])
+        sharding.invalidate(instance.pk)
@@ -0,0 +1,327 @@
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+logger = logging.getLogger(__name__)
+
+# Statements that EXPLAIN can plan without running them
+EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w\"$])-?\d+(?:\.\d+)?(?![\w\"])")
+_PLACEHOLDER_LIST = re.compile(r"\(\?(?:\s*,\s*\?)+\)")
+_REPEATED_GROUPS = re.compile(r"(\(\?(?:, \?)*\))(?:, \1)+")
+_WHITESPACE = re.compile(r"\s+")
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = 0
+_dropped = 0
+_handler = None
+# Set in the thread writing the log, whose own queries are not logged
+_local = threading.local()
+
+
+def fingerprint(sql: str) -> str:
+    """
+    Normalize a query so that runs differing only in their values match:
+    literals and placeholders become `?`, lists of them (`IN (...)`, rows of
+    `VALUES`) collapse to one, and whitespace is collapsed.
+
+    Example:
+    ```
+    fingerprint('SELECT * FROM "t" WHERE id IN (%s, %s) AND name = \'x\'')
+    # 'SELECT * FROM "t" WHERE id IN (...) AND name = ?'
+    ```
+    """
+    sql = _STRING.sub("?", sql.replace("%s", "?"))
+    sql = _NUMBER.sub("?", sql)
+    sql = _WHITESPACE.sub(" ", sql).strip()
+    sql = _REPEATED_GROUPS.sub(r"\1", sql)
+    return _PLACEHOLDER_LIST.sub("(...)", sql)
+
+
+def fingerprint_id(normalized: str) -> str:
+    return hashlib.sha1(normalized.encode()).hexdigest()[:16]
+
+
+def redact(params) -> list:
+    """
+    Describe query parameters without their values: the type of each, and
+    the length of strings and sequences. None and booleans are kept.
+    """
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: _redact_value(value) for key, value in params.items()}
+    return [_redact_value(value) for value in params]
+
+
+def _redact_value(value):
+    if value is None or isinstance(value, bool):
+        return value
+    if isinstance(value, (str, bytes, list, tuple)):
+        return f"<{type(value).__name__}:{len(value)}>"
+    return f"<{type(value).__name__}>"
+
+
+def redact_plan(node: dict) -> dict:
+    """
+    Replace the literals that EXPLAIN inlines in conditions and filters
+    (the query's parameters) with `?`, in a plan node and its children.
+    """
+    for key, value in node.items():
+        if isinstance(value, str) and key.endswith(("Cond", "Filter")):
+            node[key] = _NUMBER.sub("?", _STRING.sub("?", value))
+    for child in node.get("Plans", ()):
+        redact_plan(child)
+    return node
+
+
+def origin() -> dict:
+    """
+    Find the view and serializer running the current query by walking the
+    stack: the innermost serializer (other than a `ListSerializer`) and the
+    innermost view, with the request path.
+    """
+    from django.views import View
+    from rest_framework.serializers import BaseSerializer, ListSerializer
+
+    found = {"view": None, "path": None, "serializer": None}
+    frame = sys._getframe(1)
+    while frame is not None and not (found["view"] and found["serializer"]):
+        # type(), unlike isinstance(), does not evaluate lazy objects such
+        # as request.user
+        cls = type(frame.f_locals.get("self"))
+        if cls is not type(None):
+            obj = frame.f_locals["self"]
+            if found["serializer"] is None and issubclass(cls, BaseSerializer) and not issubclass(cls, ListSerializer):
+                found["serializer"] = _qualified_name(obj)
+            elif found["view"] is None and issubclass(cls, View):
+                found["view"] = _qualified_name(obj)
+                request = getattr(obj, "request", None)
+                found["path"] = getattr(request, "path", None)
+        frame = frame.f_back
+    return found
+
+
+def _qualified_name(obj) -> str:
+    return f"{type(obj).__module__}.{type(obj).__qualname__}"
+
+
+class SlowQueryLogger:
+    """
+    Execute wrapper timing every query on a connection and logging those
+    slower than `SLOW_QUERY_THRESHOLD_MS`. Parameter values are never
+    written, neither in the record nor in the plan.
+
+    On the request path, a slow query costs a fingerprint and a stack walk
+    to find its view and serializer; its EXPLAIN plan is taken, and the
+    record written, by a background thread with its own connection. At most
+    `SLOW_QUERY_MAX_PENDING` records wait for that thread; further slow
+    queries are counted and reported with the next record.
+
+    Example:
+    ```
+    with connection.execute_wrapper(SlowQueryLogger("default")):
+        ...
+    ```
+    """
+
+    def __init__(self, alias: str):
+        self.alias = alias
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            if duration_ms >= settings.SLOW_QUERY_THRESHOLD_MS and not getattr(_local, "writer", False):
+                self.record(sql, params, many, duration_ms)
+
+    def record(self, sql: str, params, many: bool, duration_ms: float) -> None:
+        global _pending, _dropped
+        normalized = fingerprint(sql)
+        entry = {
+            "time": datetime.now(timezone.utc).isoformat(),
+            "database": self.alias,
+            "fingerprint": fingerprint_id(normalized),
+            "sql": normalized,
+            "duration_ms": round(duration_ms, 3),
+            **origin(),
+            "params": redact(params[0] if many and params else params),
+            "many": many,
+        }
+        explain = not many and sql.lstrip().upper().startswith(EXPLAINABLE)
+
+        with _executor_lock:
+            if _pending >= settings.SLOW_QUERY_MAX_PENDING:
+                _dropped += 1
+                return
+            _pending += 1
+            if _dropped:
+                entry["dropped_before"], _dropped = _dropped, 0
+        _get_executor().submit(_explain_and_write, entry, self.alias, sql if explain else None, params)
+
+
+def install(connection) -> None:
+    """
+    Add the slow-query logger to a connection's execute wrappers, once.
+    """
+    if not any(isinstance(wrapper, SlowQueryLogger) for wrapper in connection.execute_wrappers):
+        connection.execute_wrappers.append(SlowQueryLogger(connection.alias))
+
+
+def _explain_and_write(entry: dict, alias: str, sql: str, params) -> None:
+    global _pending
+    _local.writer = True
+    try:
+        if sql is not None:
+            try:
+                with connections[alias].cursor() as cursor:
+                    cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+                    entry["plan"] = redact_plan(cursor.fetchone()[0][0]["Plan"])
+            except Exception as e:
+                entry["plan_error"] = str(e).strip()
+            finally:
+                close_old_connections()
+        _log_handler().emit(logging.makeLogRecord({"msg": json.dumps(entry, default=str), "levelno": logging.INFO}))
+    except Exception:
+        logger.exception("Could not write the slow-query log")
+    finally:
+        with _executor_lock:
+            _pending -= 1
+
+
+def worker_log_file(path: str = None) -> str:
+    """
+    Return the log file of the current process: `SLOW_QUERY_LOG_FILE` with
+    the process id before its extension, e.g. `slow_queries.1234.log`.
+
+    Each worker of the prefork server writes and rotates a file of its own,
+    since `RotatingFileHandler` cannot share one between processes.
+    """
+    root, ext = os.path.splitext(path or settings.SLOW_QUERY_LOG_FILE)
+    return f"{root}.{os.getpid()}{ext}"
+
+
+def _log_handler() -> RotatingFileHandler:
+    global _handler
+    path = worker_log_file()
+    if _handler is None or _handler.baseFilename != os.path.abspath(path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if _handler is not None:
+            _handler.close()
+        _handler = RotatingFileHandler(
+            path,
+            maxBytes=settings.SLOW_QUERY_LOG_MAX_BYTES,
+            backupCount=settings.SLOW_QUERY_LOG_BACKUPS,
+            encoding="utf-8",
+        )
+    return _handler
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slow-query-log")
+    return _executor
+
+
+def _after_fork() -> None:
+    # The thread of the parent's executor does not exist in a forked child,
+    # and the child writes a log file of its own
+    global _executor, _executor_lock, _pending, _handler
+    _executor, _executor_lock, _pending, _handler = None, threading.Lock(), 0, None
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def flush(timeout: float = None) -> None:
+    """
+    Wait until every pending slow query has been written.
+    """
+    if _executor is not None:
+        _executor.submit(lambda: None).result(timeout)
+
+
+def log_files(path: str = None) -> list:
+    """
+    Return the log files of every process (see `worker_log_file`), each
+    process's rotated backups before its current file.
+    """
+    path = path or settings.SLOW_QUERY_LOG_FILE
+    root, ext = os.path.splitext(path)
+    pattern = re.compile(re.escape(root) + r"\.\d+" + re.escape(ext) + "$")
+    files = []
+    for name in sorted(glob.glob(f"{glob.escape(root)}.*{glob.escape(ext)}")):
+        if pattern.match(name):
+            backups = [f"{name}.{i}" for i in range(settings.SLOW_QUERY_LOG_BACKUPS, 0, -1)]
+            files += [backup for backup in backups if os.path.exists(backup)] + [name]
+    return files
+
+
+def read_records(paths) -> list:
+    records = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # A line cut short by a crash or a concurrent rotation
+                    continue
+    return records
+
+
+def summarize(records, top: int = 10) -> list:
+    """
+    Group slow-query records by fingerprint, costliest in total time first.
+
+    Returns:
+    - Up to `top` dicts with the `fingerprint`, `sql`, `count`, `total_ms`,
+      `mean_ms` and `max_ms` of a query, the `views` and `serializers` that
+      ran it with their counts, and the `plan` of its slowest run.
+    """
+    groups = {}
+    for record in records:
+        group = groups.get(record["fingerprint"])
+        if group is None:
+            group = groups[record["fingerprint"]] = {
+                "fingerprint": record["fingerprint"],
+                "sql": record["sql"],
+                "count": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "views": {},
+                "serializers": {},
+                "plan": None,
+            }
+        group["count"] += 1
+        group["total_ms"] += record["duration_ms"]
+        if record["duration_ms"] >= group["max_ms"]:
+            group["max_ms"] = record["duration_ms"]
+            group["plan"] = record.get("plan") or group["plan"]
+        for key, name in (("views", record.get("view")), ("serializers", record.get("serializer"))):
+            if name:
+                group[key][name] = group[key].get(name, 0) + 1
+
+    ranked = sorted(groups.values(), key=lambda group: -group["total_ms"])[:top]
+    for group in ranked:
+        group["total_ms"] = round(group["total_ms"], 3)
+        group["mean_ms"] = round(group["total_ms"] / group["count"], 3)
+    return ranked
@@ -0,0 +1,140 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+
+from django.conf import settings
+
+# Run in a fresh interpreter: imports the WSGI application and sends it one
+# request, reporting wall-clock times so interpreter start-up is included
+PROBE = """
+import io, json, os, sys, time
+from wsgiref.util import setup_testing_defaults
+imports_started = time.time()
+from testTaskproject.wsgi import application
+imported = time.time()
+environ = {"PATH_INFO": sys.argv[1], "wsgi.input": io.BytesIO()}
+setup_testing_defaults(environ)
+status = []
+b"".join(application(environ, lambda code, headers, exc_info=None: status.append(code)))
+print(json.dumps({
+    "imports_started": imports_started,
+    "imported": imported,
+    "responded": time.time(),
+    "status": status[0],
+}))
+"""
+
+
+@dataclass
+class ImportNode:
+    """
+    One module in the `-X importtime` tree.
+
+    Attributes:
+    - `name`: The module name.
+    - `self_us`: Microseconds spent importing the module itself.
+    - `cumulative_us`: Microseconds including the modules it imported.
+    - `children`: Modules first imported by this one.
+    """
+    name: str
+    self_us: int
+    cumulative_us: int
+    children: list = field(default_factory=list)
+
+    def to_dict(self, depth: int = None, min_us: int = 0) -> dict:
+        data = {"name": self.name, "self_ms": self.self_us / 1000, "cumulative_ms": self.cumulative_us / 1000}
+        if depth is None or depth > 0:
+            children = [c for c in self.children if c.cumulative_us >= min_us]
+            if children:
+                data["children"] = [
+                    c.to_dict(None if depth is None else depth - 1, min_us)
+                    for c in sorted(children, key=lambda c: -c.cumulative_us)
+                ]
+        return data
+
+
+@dataclass
+class StartupProfile:
+    """
+    The result of one cold start.
+
+    Attributes:
+    - `ready_ms`: From process start until the WSGI application is imported.
+    - `first_response_ms`: From process start until the first response is complete.
+    - `import_ms`: Time spent importing `testTaskproject.wsgi`.
+    - `status`: Status line of the first response.
+    - `imports`: Top-level nodes of the import tree, in import order.
+    """
+    ready_ms: float
+    first_response_ms: float
+    import_ms: float
+    status: str
+    imports: list
+
+    def package_totals(self) -> dict:
+        """
+        Return the self import time in milliseconds per top-level package,
+        largest first.
+        """
+        totals = {}
+        stack = list(self.imports)
+        while stack:
+            node = stack.pop()
+            package = node.name.partition(".")[0]
+            totals[package] = totals.get(package, 0) + node.self_us / 1000
+            stack.extend(node.children)
+        return dict(sorted(totals.items(), key=lambda item: -item[1]))
+
+
+def parse_importtime(text: str) -> list:
+    """
+    Build the import tree from `python -X importtime` output.
+
+    Modules are reported after the modules they import, indented two spaces
+    per level, so each line adopts the deeper lines just before it.
+
+    Returns:
+    - The top-level `ImportNode`s, in import order.
+    """
+    pending = []
+    for line in text.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        node = ImportNode(name.strip(), int(self_us), int(cumulative_us))
+        while pending and pending[-1][0] > depth:
+            node.children.insert(0, pending.pop()[1])
+        pending.append((depth, node))
+    return [node for _, node in pending]
+
+
+def profile_startup(path: str = "/api/health/") -> StartupProfile:
+    """
+    Start a fresh interpreter with `-X importtime`, import the WSGI
+    application and send it a GET request for `path`.
+    """
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+    spawned = time.time()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE, path],
+        cwd=settings.BASE_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    try:
+        times = json.loads(result.stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        raise RuntimeError(f"Startup probe failed:\n{result.stderr[-2000:]}")
+
+    return StartupProfile(
+        ready_ms=(times["imported"] - spawned) * 1000,
+        first_response_ms=(times["responded"] - spawned) * 1000,
+        import_ms=(times["imported"] - times["imports_started"]) * 1000,
+        status=times["status"],
+        imports=parse_importtime(result.stderr),
+    )
@@ -0,0 +1,142 @@
+import mimetypes
+import os
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from django.views.static import was_modified_since
+
+# Content-Encoding tokens and file suffixes, most preferred first
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+@require_safe
+def serve(request, path):
+    """
+    Serve a file collected into `STATIC_ROOT`.
+
+    The precompressed variant written by `CompressedManifestStaticFilesStorage`
+    that the client accepts (brotli, then gzip) is sent if there is one, so
+    nothing is compressed per request. Files are streamed with
+    `FileResponse`, which WSGI servers send through `wsgi.file_wrapper`
+    (`sendfile()` on gunicorn) without copying them through Python.
+
+    Content-hashed names never change content and are cached for a year
+    as `immutable`; other files are revalidated after `STATIC_MAX_AGE`
+    seconds, using their ETag and modification time.
+
+    Args:
+    - `request`: The HTTP request object.
+    - `path`: The file's path relative to `STATIC_ROOT`.
+
+    Returns:
+    - A `FileResponse`, 304 when the client's copy is current, or 404.
+    """
+    try:
+        fullpath = safe_join(settings.STATIC_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("Not found.")
+
+    variants = file_variants(fullpath)
+    if not variants:
+        raise Http404("Not found.")
+
+    encoding = choose_encoding(request.headers.get("Accept-Encoding", ""), variants)
+    suffix, size, mtime = variants[encoding]
+    etag = f'"{size:x}-{int(mtime):x}{"-" + encoding if encoding != "identity" else ""}"'
+
+    headers = {
+        "ETag": etag,
+        "Last-Modified": http_date(mtime),
+        "Cache-Control": IMMUTABLE if is_fingerprinted(path) else f"public, max-age={getattr(settings, 'STATIC_MAX_AGE', 60)}",
+    }
+    if len(variants) > 1:
+        headers["Vary"] = "Accept-Encoding"
+
+    if_none_match = request.headers.get("If-None-Match")
+    if (if_none_match and etag in if_none_match) or (
+        not if_none_match and not was_modified_since(request.headers.get("If-Modified-Since"), mtime)
+    ):
+        return HttpResponseNotModified(headers=headers)
+
+    content_type, _ = mimetypes.guess_type(fullpath)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+
+    if request.method == "HEAD":
+        response = HttpResponse(content_type=content_type or "application/octet-stream", headers=headers)
+        response["Content-Length"] = str(size)
+        return response
+
+    response = FileResponse(
+        open(fullpath + suffix, "rb"), content_type=content_type or "application/octet-stream", headers=headers
+    )
+    return response
+
+
+def choose_encoding(accept_encoding: str, variants: dict) -> str:
+    """
+    Pick the best encoding among `variants` allowed by an `Accept-Encoding`
+    header; `"identity"` when the client accepts no compressed variant.
+    """
+    accepted = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[token.strip().lower()] = quality
+
+    best, best_quality = "identity", 0.0
+    for encoding, _ in ENCODINGS:
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if encoding in variants and quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+@lru_cache(maxsize=4096)
+def file_variants(fullpath: str) -> dict:
+    """
+    Return the variants of a collected file as a dict mapping encodings
+    (`"identity"`, `"gzip"`, `"br"`) to `(suffix, size, mtime)`, or an
+    empty dict when the file does not exist.
+
+    Collected files do not change while the process runs, so results are
+    cached and a request costs no `stat()` calls.
+    """
+    variants = {}
+    for encoding, suffix in (("identity", ""), *ENCODINGS):
+        try:
+            stat = os.stat(fullpath + suffix)
+        except OSError:
+            if encoding == "identity":
+                return {}
+            continue
+        variants[encoding] = (suffix, stat.st_size, stat.st_mtime)
+    return variants
+
+
+def is_fingerprinted(path: str) -> bool:
+    """
+    Tell whether `path` is a content-hashed name from the staticfiles
+    manifest.
+    """
+    return path in _fingerprinted_names()
+
+
+@lru_cache(maxsize=1)
+def _fingerprinted_names() -> frozenset:
+    hashed_files = getattr(staticfiles_storage, "hashed_files", None) or {}
+    return frozenset(hashed_files.values())
@@ -0,0 +1,80 @@
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+# Extensions worth compressing; images and fonts are compressed already
+COMPRESSIBLE_EXTENSIONS = {
+    ".css", ".js", ".mjs", ".map", ".json", ".svg", ".txt", ".html", ".xml", ".ico", ".eot", ".ttf",
+}
+
+# Files smaller than this gain nothing from compression
+MIN_COMPRESS_SIZE = 256
+
+# Variants must save at least this fraction of the original size
+MIN_COMPRESS_RATIO = 0.95
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Static files storage writing content-hashed file names (see
+    `ManifestStaticFilesStorage`) and precompressed variants next to them.
+
+    After `collectstatic` has hashed the files, each compressible file gets
+    a `.gz` variant (gzip, level 9) and, when the optional `brotli` package
+    is installed, a `.br` variant (quality 11). Variants that do not make
+    the file noticeably smaller are not written. `api_task.static_serving`
+    picks the best variant for each request, so no worker ever compresses
+    a static file on the fly.
+
+    Example:
+    ```
+    STORAGES = {
+        "staticfiles": {"BACKEND": "api_task.storage.CompressedManifestStaticFilesStorage"},
+    }
+
+    # python manage.py collectstatic writes e.g.
+    # js/script.3d5e4a8f1c2b.js, js/script.3d5e4a8f1c2b.js.gz, js/script.3d5e4a8f1c2b.js.br
+    ```
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+
+        for name in self.hashed_files.values():
+            if os.path.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS:
+                self.compress(name)
+
+    def compress(self, name: str) -> list:
+        """
+        Write the compressed variants of `name`.
+
+        Returns:
+        - The suffixes of the variants written (`.gz`, `.br`).
+        """
+        path = self.path(name)
+        with open(path, "rb") as f:
+            content = f.read()
+        if len(content) < MIN_COMPRESS_SIZE:
+            return []
+
+        variants = {".gz": gzip.compress(content, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants[".br"] = brotli.compress(content, quality=11)
+
+        written = []
+        for suffix, compressed in variants.items():
+            if len(compressed) <= len(content) * MIN_COMPRESS_RATIO:
+                with open(path + suffix, "wb") as f:
+                    f.write(compressed)
+                written.append(suffix)
+            elif os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        return written
@@ -0,0 +1,142 @@
+import secrets
+import time
+import datetime
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+
+from .models import RevokedToken
+
+SALT = "api_task.tokens"
+
+
+class InvalidToken(Exception):
+    """
+    Raised when a bearer token is malformed, tampered with, expired or revoked.
+    """
+
+
+def issue_token(user, ttl: int = None) -> tuple:
+    """
+    Issue a signed, expiring bearer token for `user`.
+
+    The token is an HMAC-signed (`django.core.signing`, keyed by
+    `SECRET_KEY`) payload holding the user id, type, staff flags, expiry and
+    a random token id used for revocation. Verifying it needs no database
+    access unless revocation is enabled (see `is_revoked`).
+
+    Args:
+    - `user`: The CustomUser the token is issued for.
+    - `ttl`: Lifetime in seconds; defaults to `API_TOKEN_TTL`.
+
+    Returns:
+    - A `(token, expires)` tuple, `expires` being a UNIX timestamp.
+    """
+    ttl = ttl if ttl is not None else getattr(settings, "API_TOKEN_TTL", 3600)
+    expires = int(time.time()) + ttl
+    payload = {
+        "user": user.pk,
+        "username": user.get_username(),
+        "type": user.type_id,
+        "staff": user.is_staff,
+        "superuser": user.is_superuser,
+        "exp": expires,
+        "jti": secrets.token_urlsafe(12),
+    }
+    return signing.dumps(payload, salt=SALT), expires
+
+
+def verify_token(token: str) -> dict:
+    """
+    Check a token's signature, expiry and revocation status.
+
+    Args:
+    - `token`: The token as issued by `issue_token`.
+
+    Returns:
+    - The token payload.
+
+    Raises:
+    - `InvalidToken` if the token cannot be trusted.
+    """
+    try:
+        payload = signing.loads(token, salt=SALT)
+    except signing.BadSignature:
+        raise InvalidToken("Invalid token signature.")
+
+    if not isinstance(payload, dict) or payload.get("exp", 0) <= time.time():
+        raise InvalidToken("Token has expired.")
+    if is_revoked(payload):
+        raise InvalidToken("Token has been revoked.")
+    return payload
+
+
+def revoke_token(payload: dict) -> None:
+    """
+    Add a verified token to the revocation list until it expires.
+
+    The list is a `RevokedToken` table, or the cache named by
+    `API_TOKEN_REVOCATION_CACHE` when set, so that a revocation reaches every
+    worker process. Expired revocations are dropped along the way. Does
+    nothing unless `API_TOKEN_REVOCATION` is enabled.
+
+    Args:
+    - `payload`: The payload returned by `verify_token`.
+    """
+    if not getattr(settings, "API_TOKEN_REVOCATION", False):
+        return
+    cache = _revocation_cache()
+    if cache is not None:
+        timeout = max(1, int(payload["exp"] - time.time()))
+        cache.set(_revocation_key(payload), True, timeout=timeout)
+        return
+
+    expires = datetime.datetime.fromtimestamp(payload["exp"], tz=datetime.timezone.utc)
+    RevokedToken.objects.update_or_create(jti=payload["jti"], defaults={"expires": expires})
+    RevokedToken.objects.filter(expires__lte=timezone.now()).delete()
+
+
+def is_revoked(payload: dict) -> bool:
+    # Revocation is opt-in: with it off, verification stays free of lookups
+    if not getattr(settings, "API_TOKEN_REVOCATION", False):
+        return False
+    cache = _revocation_cache()
+    if cache is not None:
+        return cache.get(_revocation_key(payload), False)
+    return RevokedToken.objects.filter(jti=payload["jti"]).exists()
+
+
+def check_revocation_cache() -> None:
+    """
+    Refuse a revocation cache that worker processes do not share.
+
+    Called when the app is ready, so that a misconfigured instance fails at
+    startup rather than accepting revoked tokens in the other workers.
+
+    Raises:
+    - `ImproperlyConfigured` if `API_TOKEN_REVOCATION_CACHE` is a local
+      memory or dummy cache.
+    """
+    if not getattr(settings, "API_TOKEN_REVOCATION", False):
+        return
+    cache = _revocation_cache()
+    if isinstance(cache, (LocMemCache, DummyCache)):
+        raise ImproperlyConfigured(
+            f"API_TOKEN_REVOCATION_CACHE {settings.API_TOKEN_REVOCATION_CACHE!r} is not shared between "
+            "processes; use a shared cache (memcached, redis, database) or leave it unset for the "
+            "RevokedToken table"
+        )
+
+
+def _revocation_cache():
+    alias = getattr(settings, "API_TOKEN_REVOCATION_CACHE", None)
+    return caches[alias] if alias else None
+
+
+def _revocation_key(payload: dict) -> str:
+    return f"api_task:revoked-token:{payload['jti']}"
@@ -1,21 +1,49 @@
 from django.urls import path
 from .api_views import (
+    HealthView,
     UserTypeListCreateView,
     CustomUserListView,
+    UserBulkCreateView,
     AuthorListView,
     BookListView,
     LibraryListView,
     EntryCreateView,
+    EntryIngestStatusView,
     EntryUpdateView,
+    EntryStreamView,
+    UserEntryFeedView,
+    MyEntryFeedView,
+    TokenObtainView,
+    TokenRevokeView,
+    LibraryUsageView,
+    TopBooksView,
+    UserUsageView,
+    ChangesView,
+    BatchView,
+    CatalogExportView,
 )
 
 
 urlpatterns = [
+    path("health/", HealthView.as_view(), name="health"),
     path("user-types/", UserTypeListCreateView.as_view(), name="user-type-list"),
     path("users/", CustomUserListView.as_view(), name="user-list"),
+    path("users/bulk/", UserBulkCreateView.as_view(), name="user-bulk-create"),
     path("authors/", AuthorListView.as_view(), name="author-list"),
     path("books/", BookListView.as_view(), name="book-list"),
     path("libraries/", LibraryListView.as_view(), name="library-list"),
     path("entries/create/", EntryCreateView.as_view(), name="entry-create"),
+    path("entries/ingest/status/", EntryIngestStatusView.as_view(), name="entry-ingest-status"),
     path("entries/<int:pk>/update/", EntryUpdateView.as_view(), name="entry-update"),
+    path("entries/stream/", EntryStreamView.as_view(), name="entry-stream"),
+    path("users/<int:pk>/entries/", UserEntryFeedView.as_view(), name="user-entry-feed"),
+    path("me/entries/", MyEntryFeedView.as_view(), name="my-entry-feed"),
+    path("tokens/", TokenObtainView.as_view(), name="token-obtain"),
+    path("tokens/revoke/", TokenRevokeView.as_view(), name="token-revoke"),
+    path("stats/libraries/daily/", LibraryUsageView.as_view(), name="library-usage"),
+    path("stats/books/top/", TopBooksView.as_view(), name="top-books"),
+    path("stats/users/daily/", UserUsageView.as_view(), name="user-usage"),
+    path("changes/", ChangesView.as_view(), name="changes"),
+    path("batch/", BatchView.as_view(), name="batch"),
+    path("export/catalog.<str:file_format>", CatalogExportView.as_view(), name="catalog-export"),
 ]
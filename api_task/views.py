@@ -1,6 +1,12 @@
-from django.shortcuts import render, redirect
-from django.contrib.auth import authenticate, login
+import os
+
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib.auth import authenticate, login
+from django.http import FileResponse, Http404
+from django.shortcuts import render, redirect
+
+from .profiling import profile_directories, recent_profiles
 
 
 def login_view(request):
@@ -43,7 +49,9 @@ def dashboard_view(request):
 
     If the user is not authenticated, redirects to the login page.
 
-    Retrieves the user type and renders the dashboard page.
+    Retrieves the user type and renders the dashboard page. The session user
+    is loaded by `CachedModelBackend` with its type already selected, so
+    reading the type name does not query the database.
 
     Args:
     - `request`: The HTTP request object.
@@ -52,8 +60,46 @@ def dashboard_view(request):
     - If the user is authenticated, renders the dashboard page.
     - If the user is not authenticated, redirects to the login page.
     """
-    if not request.user:
-        return redirect('login')
+    if not request.user.is_authenticated:
+        return redirect('user-login')
 
-    user_type = request.user.type.name if hasattr(request.user, 'type') else None
+    user_type = request.user.type.name if request.user.type_id else None
     return render(request, 'dashboard.html', {'user_type': user_type})
+
+
+@staff_member_required
+def profile_index_view(request):
+    """
+    View listing the latest CPU and memory profiles of requests, with links
+    to their files, for admin users.
+
+    Args:
+    - `request`: The HTTP request object.
+
+    Returns:
+    - The profiles page, newest profile first.
+    """
+    return render(request, 'profiles.html', {'profiles': recent_profiles()})
+
+
+@staff_member_required
+def profile_file_view(request, kind, name):
+    """
+    View serving a file of a profile (its report, collapsed stacks, pstats
+    dump, ...) as a download, for admin users.
+
+    Args:
+    - `request`: The HTTP request object.
+    - `kind`: The kind of profile, `cpu` or `memory`.
+    - `name`: The name of the file in that kind's directory.
+
+    Returns:
+    - The file, or a 404 for unknown kinds and files.
+    """
+    directory = profile_directories().get(kind)
+    if directory is None or os.path.basename(name) != name:
+        raise Http404
+    path = os.path.join(directory, name)
+    if not os.path.isfile(path):
+        raise Http404
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=name)
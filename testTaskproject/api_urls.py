@@ -0,0 +1,11 @@
+"""
+URL configuration used by the API-only handlers in `testTaskproject.handlers`.
+
+Only the 'api/' routes are included, so API requests are resolved against a
+short pattern list and never reach the admin or the HTML views.
+"""
+from django.urls import path, include
+
+urlpatterns = [
+    path("api/", include("api_task.urls"))
+]
@@ -2,6 +2,10 @@
 ASGI config for testTaskproject project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Requests under ``API_URL_PREFIX`` are served by the API-only handler with its
+lean middleware stack; ``api_application`` serves the API alone. With
+``STATIC_SERVE``, files under ``STATIC_URL`` are served from ``STATIC_ROOT``
+by the static handler, precompressed and without middleware.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
@@ -13,4 +17,11 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "testTaskproject.settings")
 
-application = get_asgi_application()
+from django.conf import settings  # noqa: E402
+
+from testTaskproject.handlers import ASGIPrefixDispatcher, get_api_asgi_application, get_static_asgi_application  # noqa: E402
+
+api_application = get_api_asgi_application()
+application = ASGIPrefixDispatcher(api_application, get_asgi_application())
+if settings.STATIC_SERVE:
+    application = ASGIPrefixDispatcher(get_static_asgi_application(), application, prefix=settings.STATIC_URL)
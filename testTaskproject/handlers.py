@@ -0,0 +1,148 @@
+"""
+Request handlers serving the API through a lean middleware stack.
+
+`API_MIDDLEWARE` lists only what the JSON API needs: security headers, the
+(signed-cookie) session and the lazy `request.user` used by DRF's session
+authentication. CSRF, messages and clickjacking middleware are skipped; DRF
+views are CSRF-exempt at the Django level anyway and `SessionAuthentication`
+enforces CSRF on its own. The API handlers resolve URLs against
+`API_URLCONF`, which only contains the `api/` routes.
+
+The static handlers serve files collected into `STATIC_ROOT` under
+`STATIC_URL` with no middleware at all, through `STATIC_URLCONF`.
+
+`PrefixDispatcher` and `ASGIPrefixDispatcher` route requests under
+`API_URL_PREFIX` to the API handler and everything else (admin, login,
+dashboard) to the regular full-stack handler.
+"""
+import django
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+
+
+class APIHandlerMixin:
+    """
+    Builds the middleware chain from `API_MIDDLEWARE` instead of `MIDDLEWARE`
+    and routes every request through `API_URLCONF`.
+
+    Attributes:
+    - `middleware_setting`: Name of the setting listing the middleware.
+    - `urlconf_setting`: Name of the setting naming the URLconf.
+    """
+
+    middleware_setting = "API_MIDDLEWARE"
+    urlconf_setting = "API_URLCONF"
+
+    def load_middleware(self, is_async=False):
+        # BaseHandler reads settings.MIDDLEWARE directly; swap it while the
+        # chain is built, which happens once when the handler is created.
+        middleware = settings.MIDDLEWARE
+        settings.MIDDLEWARE = getattr(settings, self.middleware_setting)
+        try:
+            super().load_middleware(is_async=is_async)
+        finally:
+            settings.MIDDLEWARE = middleware
+
+    def get_response(self, request):
+        request.urlconf = getattr(settings, self.urlconf_setting)
+        return super().get_response(request)
+
+    async def get_response_async(self, request):
+        request.urlconf = getattr(settings, self.urlconf_setting)
+        return await super().get_response_async(request)
+
+
+class APIWSGIHandler(APIHandlerMixin, WSGIHandler):
+    pass
+
+
+class APIASGIHandler(APIHandlerMixin, ASGIHandler):
+    pass
+
+
+class StaticHandlerMixin(APIHandlerMixin):
+    """
+    Serves collected static files through `STATIC_MIDDLEWARE` (empty by
+    default) and `STATIC_URLCONF`.
+    """
+
+    middleware_setting = "STATIC_MIDDLEWARE"
+    urlconf_setting = "STATIC_URLCONF"
+
+
+class StaticWSGIHandler(StaticHandlerMixin, WSGIHandler):
+    pass
+
+
+class StaticASGIHandler(StaticHandlerMixin, ASGIHandler):
+    pass
+
+
+class PrefixDispatcher:
+    """
+    WSGI application sending paths under `prefix` to `api_app` and all other
+    paths to `default_app`.
+    """
+
+    def __init__(self, api_app, default_app, prefix=None):
+        self.api_app = api_app
+        self.default_app = default_app
+        self.prefix = prefix or settings.API_URL_PREFIX
+
+    def __call__(self, environ, start_response):
+        if environ.get("PATH_INFO", "").startswith(self.prefix):
+            return self.api_app(environ, start_response)
+        return self.default_app(environ, start_response)
+
+
+class ASGIPrefixDispatcher:
+    """
+    ASGI application sending HTTP paths under `prefix` to `api_app` and
+    everything else to `default_app`.
+    """
+
+    def __init__(self, api_app, default_app, prefix=None):
+        self.api_app = api_app
+        self.default_app = default_app
+        self.prefix = prefix or settings.API_URL_PREFIX
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "").removeprefix(scope.get("root_path", ""))
+        if scope["type"] == "http" and path.startswith(self.prefix):
+            return await self.api_app(scope, receive, send)
+        return await self.default_app(scope, receive, send)
+
+
+def get_api_wsgi_application():
+    """
+    The public interface to the API-only WSGI handler, mirroring
+    `django.core.wsgi.get_wsgi_application`.
+    """
+    django.setup(set_prefix=False)
+    return APIWSGIHandler()
+
+
+def get_api_asgi_application():
+    """
+    The public interface to the API-only ASGI handler, mirroring
+    `django.core.asgi.get_asgi_application`.
+    """
+    django.setup(set_prefix=False)
+    return APIASGIHandler()
+
+
+def get_static_wsgi_application():
+    """
+    The public interface to the static files WSGI handler.
+    """
+    django.setup(set_prefix=False)
+    return StaticWSGIHandler()
+
+
+def get_static_asgi_application():
+    """
+    The public interface to the static files ASGI handler.
+    """
+    django.setup(set_prefix=False)
+    return StaticASGIHandler()
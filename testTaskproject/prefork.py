@@ -0,0 +1,389 @@
+"""
+Prefork WSGI server used by the `serve` management command.
+
+The master process imports and warms the application once (settings,
+URLconfs, model metadata, serializer fields, templates, the UserType
+registry), freezes the garbage collector so the warmed objects are never
+written to again, closes its database connections and forks the workers.
+Workers share the master's pages copy-on-write, open their own database
+connections lazily on their first query, and accept connections from one
+shared listening socket.
+
+Workers are recycled after `max_requests` requests (plus a random jitter,
+so they do not all restart together) or once their resident memory
+exceeds `max_rss_mb`; the master replaces them immediately. Workers tell
+the master when they are ready and why they exit through a pipe, which
+gives the cold-start time, and the master periodically reports the
+resident and proportional memory of every worker.
+"""
+import gc
+import json
+import os
+import random
+import select
+import signal
+import socket
+import sys
+import time
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+from django.conf import settings
+from django.db import connections
+from django.utils.module_loading import import_string
+
+# Seconds a worker waits for a connection before checking for shutdown
+POLL_INTERVAL = 1.0
+
+# Seconds workers are given to finish their request on shutdown
+GRACEFUL_TIMEOUT = 30
+
+
+def warm_application():
+    """
+    Import the WSGI application and build every cache that would otherwise
+    be filled by the first requests of each worker, then close the database
+    connections opened meanwhile so none is shared across `fork()`.
+
+    Returns:
+    - The WSGI application named by `WSGI_APPLICATION`.
+    """
+    from django.apps import apps
+    from django.template import engines
+    from django.urls import get_resolver
+    from rest_framework.serializers import Serializer
+
+    from api_task import serializers, signals
+
+    application = import_string(settings.WSGI_APPLICATION)
+
+    for urlconf in {settings.ROOT_URLCONF, settings.API_URLCONF, getattr(settings, "STATIC_URLCONF", None)}:
+        if urlconf:
+            resolver = get_resolver(urlconf)
+            resolver.reverse_dict, resolver.namespace_dict, resolver.app_dict
+
+    for model in apps.get_models():
+        model._meta.get_fields()
+        model._meta.related_objects
+
+    for name in dir(serializers):
+        serializer_class = getattr(serializers, name)
+        if isinstance(serializer_class, type) and issubclass(serializer_class, Serializer):
+            try:
+                serializer_class().fields
+            except Exception:
+                # Serializers needing context or arguments warm on first use
+                pass
+
+    for engine in engines.all():
+        engine.engine.template_loaders
+
+    # Loads the UserType registry and disconnects the per-worker warm-up
+    signals.warm_user_types(sender=None)
+
+    connections.close_all()
+    return application
+
+
+class QuietHandler(WSGIRequestHandler):
+    # Seconds a client may take to send its request
+    timeout = 30
+
+    def log_message(self, format, *args):
+        pass
+
+
+class WorkerServer(WSGIServer):
+    """
+    `WSGIServer` serving from a socket bound by the master and counting the
+    requests it handled.
+    """
+
+    def __init__(self, listener):
+        super().__init__(listener.getsockname()[:2], QuietHandler, bind_and_activate=False)
+        self.socket.close()
+        self.socket = listener
+        self.server_address = listener.getsockname()[:2]
+        host, self.server_port = self.server_address
+        self.server_name = socket.getfqdn(host)
+        self.setup_environ()
+        self.handled = 0
+
+    def process_request(self, request, client_address):
+        super().process_request(request, client_address)
+        self.handled += 1
+
+
+class Worker:
+    """
+    One forked worker serving requests from the shared socket until it is
+    told to stop or reaches its request or memory limit.
+    """
+
+    def __init__(self, application, listener, events, max_requests: int, max_rss_mb: int):
+        self.application = application
+        self.listener = listener
+        self.events = events
+        self.max_requests = max_requests
+        self.max_rss_mb = max_rss_mb
+        self.stopping = False
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        random.seed()
+        gc.enable()
+
+        server = WorkerServer(self.listener)
+        server.set_app(self.application)
+        self.send("ready")
+
+        reason = "stopped"
+        while not self.stopping:
+            try:
+                readable, _, _ = select.select([self.listener], [], [], POLL_INTERVAL)
+            except InterruptedError:
+                continue
+            if not readable:
+                continue
+            # Returns without a request when another worker accepted first
+            server._handle_request_noblock()
+            if self.max_requests and server.handled >= self.max_requests:
+                reason = "max-requests"
+                break
+            if self.max_rss_mb and current_rss_kb() > self.max_rss_mb * 1024:
+                reason = "max-rss"
+                break
+
+        self.send("exit", reason=reason, requests=server.handled, rss_kb=current_rss_kb())
+
+    def stop(self, signum, frame):
+        self.stopping = True
+
+    def send(self, event: str, **fields) -> None:
+        message = json.dumps({"event": event, "pid": os.getpid(), **fields}).encode() + b"\n"
+        os.write(self.events, message)
+
+
+class PreforkServer:
+    """
+    Master process of the prefork server.
+
+    Attributes:
+    - `workers`: Number of worker processes.
+    - `max_requests`: Requests after which a worker is recycled (0 for never).
+    - `max_requests_jitter`: Random extra requests added per worker.
+    - `max_rss_mb`: Resident memory after which a worker is recycled (0 for no limit).
+    - `report_interval`: Seconds between memory reports (0 for none).
+
+    Example:
+    ```
+    listener = PreforkServer.bind("0.0.0.0", 8000)
+    PreforkServer(listener, workers=4, max_requests=10000).run()
+    ```
+    """
+
+    def __init__(self, listener, workers: int, max_requests: int = 0, max_requests_jitter: int = 0,
+                 max_rss_mb: int = 0, report_interval: float = 0, stdout=None):
+        self.listener = listener
+        self.workers = workers
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.max_rss_mb = max_rss_mb
+        self.report_interval = report_interval
+        self.stdout = stdout or sys.stdout
+        self.children = {}
+        self.stopping = False
+
+    @staticmethod
+    def bind(host: str, port: int, backlog: int = 2048):
+        listener = socket.create_server((host, port), backlog=backlog, reuse_port=False)
+        listener.setblocking(False)
+        return listener
+
+    def run(self) -> None:
+        started = time.perf_counter()
+        gc.disable()
+        application = warm_application()
+        # Objects created so far are never collected nor touched by the
+        # collector, so the pages holding them stay shared with the workers
+        gc.freeze()
+        gc.enable()
+        warmed = time.perf_counter()
+        self.log(f"Application warmed in {(warmed - started) * 1000:.0f} ms")
+
+        self.events, events_out = os.pipe()
+        os.set_blocking(self.events, False)
+        self._events_out = events_out
+        self._buffer = b""
+        self.application = application
+
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        for _ in range(self.workers):
+            self.spawn()
+
+        ready = set()
+        next_report = time.monotonic() + self.report_interval if self.report_interval else None
+        while not self.stopping:
+            for message in self.read_events(timeout=0.5):
+                if message["event"] == "ready" and len(ready) < self.workers:
+                    ready.add(message["pid"])
+                    if len(ready) == self.workers:
+                        # Counted from the start of the process when known, so
+                        # interpreter start-up and django.setup() are included
+                        cold_start = process_age()
+                        if cold_start is None:
+                            cold_start = time.perf_counter() - started
+                        self.log(
+                            f"{self.workers} workers ready, cold start {cold_start * 1000:.0f} ms, "
+                            f"serving on {self.address}"
+                        )
+                elif message["event"] == "exit" and message["reason"] != "stopped":
+                    self.log(
+                        f"Recycling worker {message['pid']} ({message['reason']}) after "
+                        f"{message['requests']} requests at {message['rss_kb'] // 1024} MB RSS"
+                    )
+            self.reap(respawn=True)
+            if next_report is not None and time.monotonic() >= next_report:
+                self.report()
+                next_report = time.monotonic() + self.report_interval
+
+        self.shutdown()
+
+    @property
+    def address(self) -> str:
+        host, port = self.listener.getsockname()[:2]
+        return f"http://{host}:{port}/"
+
+    def spawn(self) -> int:
+        max_requests = self.max_requests
+        if max_requests and self.max_requests_jitter:
+            max_requests += random.randint(0, self.max_requests_jitter)
+
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                os.close(self.events)
+                Worker(self.application, self.listener, self._events_out, max_requests, self.max_rss_mb).run()
+            except BaseException:
+                import traceback
+                traceback.print_exc()
+                status = 1
+            finally:
+                os._exit(status)
+        self.children[pid] = time.monotonic()
+        return pid
+
+    def read_events(self, timeout: float) -> list:
+        try:
+            readable, _, _ = select.select([self.events], [], [], timeout)
+        except InterruptedError:
+            return []
+        if not readable:
+            return []
+        try:
+            self._buffer += os.read(self.events, 65536)
+        except BlockingIOError:
+            return []
+        *lines, self._buffer = self._buffer.split(b"\n")
+        return [json.loads(line) for line in lines if line]
+
+    def reap(self, respawn: bool) -> None:
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            self.children.pop(pid, None)
+            if os.waitstatus_to_exitcode(status) != 0:
+                self.log(f"Worker {pid} died with status {os.waitstatus_to_exitcode(status)}")
+            if respawn and not self.stopping:
+                self.spawn()
+
+    def report(self) -> None:
+        rows = [(pid, process_memory(pid)) for pid in sorted(self.children)]
+        for pid, memory in rows:
+            if memory:
+                self.log(
+                    f"Worker {pid}: RSS {memory['rss_kb'] // 1024} MB, PSS {memory['pss_kb'] // 1024} MB, "
+                    f"shared {memory['shared_kb'] // 1024} MB"
+                )
+
+    def stop(self, signum, frame) -> None:
+        self.stopping = True
+
+    def shutdown(self) -> None:
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + GRACEFUL_TIMEOUT
+        while self.children and time.monotonic() < deadline:
+            self.reap(respawn=False)
+            time.sleep(0.05)
+        for pid in list(self.children):
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            self.children.pop(pid)
+        os.close(self.events)
+        os.close(self._events_out)
+        self.listener.close()
+        self.log("Server stopped")
+
+    def log(self, message: str) -> None:
+        self.stdout.write(message + "\n")
+        self.stdout.flush()
+
+
+def current_rss_kb() -> int:
+    """
+    Return the resident memory of this process in kB (0 if unknown).
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError):
+        return 0
+
+
+def process_age() -> float:
+    """
+    Return the seconds since this process started, from `/proc`; None where
+    it cannot be read.
+    """
+    try:
+        with open("/proc/self/stat") as f:
+            # Fields after the parenthesized command name; starttime is the 22nd
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return max(uptime - start_ticks / os.sysconf("SC_CLK_TCK"), 0.0)
+
+
+def process_memory(pid: int) -> dict:
+    """
+    Return the memory of a process from `/proc/<pid>/smaps_rollup`: `rss_kb`,
+    `pss_kb` (resident memory with shared pages split among the processes
+    sharing them) and `shared_kb`; None where it cannot be read.
+    """
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if value.strip().endswith("kB"):
+                    fields[key] = int(value.split()[0])
+    except (OSError, ValueError):
+        return None
+    return {
+        "rss_kb": fields.get("Rss", 0),
+        "pss_kb": fields.get("Pss", 0),
+        "shared_kb": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+    }
@@ -48,12 +48,27 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "api_task.profiling.CPUProfileMiddleware",
+    "api_task.profiling.MemoryProfileMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# Lean stack used for requests under API_URL_PREFIX (see testTaskproject.handlers)
+API_MIDDLEWARE = [
+    "django.middleware.security.SecurityMiddleware",
+    "django.contrib.sessions.middleware.SessionMiddleware",
+    "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "api_task.profiling.CPUProfileMiddleware",
+    "api_task.profiling.MemoryProfileMiddleware",
+]
+
 ROOT_URLCONF = "testTaskproject.urls"
 
+API_URLCONF = "testTaskproject.api_urls"
+
+API_URL_PREFIX = "/api/"
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
@@ -84,9 +99,38 @@ DATABASES = {
         'PASSWORD': 'myprojectpassword',
         'HOST': 'db',
         'PORT': '5432',
-    }
+    },
+    # Shard databases for SHARD_DATABASES; no connection is opened until used
+    'shard_1': {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': 'myproject_shard_1',
+        'USER': 'myprojectuser',
+        'PASSWORD': 'myprojectpassword',
+        'HOST': 'db',
+        'PORT': '5432',
+    },
+    'shard_2': {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': 'myproject_shard_2',
+        'USER': 'myprojectuser',
+        'PASSWORD': 'myprojectpassword',
+        'HOST': 'db',
+        'PORT': '5432',
+    },
 }
 
+# Horizontal sharding (api_task.sharding): libraries with their books and
+# entries are spread over SHARD_DATABASES (empty disables sharding), while
+# SHARD_GLOBAL_DATABASE keeps the placement directory, the Library rows and
+# the catalog, replicated to every shard. Placements are cached for
+# SHARD_DIRECTORY_TTL seconds. Entry ids are drawn from the global database's
+# sequence, SHARD_ENTRY_ID_BLOCK at a time per process
+DATABASE_ROUTERS = ["api_task.sharding.ShardRouter"]
+SHARD_GLOBAL_DATABASE = "default"
+SHARD_DATABASES = []
+SHARD_DIRECTORY_TTL = 5
+SHARD_ENTRY_ID_BLOCK = 50
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -126,6 +170,27 @@ STATIC_URL = "static/"
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'api_task/static')]
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
+# In production collectstatic writes content-hashed names plus .gz (and, with
+# the brotli package, .br) variants, which the static handler serves with
+# long-lived immutable caching (see api_task.storage, api_task.static_serving)
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {
+        "BACKEND": (
+            "django.contrib.staticfiles.storage.StaticFilesStorage"
+            if DEBUG else "api_task.storage.CompressedManifestStaticFilesStorage"
+        ),
+    },
+}
+
+# Serve STATIC_URL from STATIC_ROOT in wsgi.py/asgi.py, through a handler with
+# STATIC_MIDDLEWARE and STATIC_URLCONF; non-fingerprinted files are cached for
+# STATIC_MAX_AGE seconds
+STATIC_SERVE = not DEBUG
+STATIC_MIDDLEWARE = []
+STATIC_URLCONF = "testTaskproject.static_urls"
+STATIC_MAX_AGE = 60
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -133,4 +198,167 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 AUTH_USER_MODEL = 'api_task.CustomUser'
 
+# Sessions live in signed cookies, so no session row is read per request,
+# and session users are loaded through a per-process cache
+SESSION_ENGINE = "django.contrib.sessions.backends.signed_cookies"
+
+AUTHENTICATION_BACKENDS = ["api_task.backends.CachedModelBackend"]
+
+# Seconds a session user stays in the per-process cache, and its capacity
+USER_CACHE_TTL = 60
+USER_CACHE_SIZE = 1024
+
+REST_FRAMEWORK = {
+    "DEFAULT_AUTHENTICATION_CLASSES": [
+        "api_task.authentication.SignedTokenAuthentication",
+        "rest_framework.authentication.SessionAuthentication",
+        "rest_framework.authentication.BasicAuthentication",
+    ],
+    "DEFAULT_THROTTLE_CLASSES": [
+        "api_task.throttling.TokenBucketThrottle",
+    ],
+    # The browsable API (templates, forms, markdown) is only loaded in
+    # development; production workers render JSON alone
+    "DEFAULT_RENDERER_CLASSES": [
+        "rest_framework.renderers.JSONRenderer",
+        *(["rest_framework.renderers.BrowsableAPIRenderer"] if DEBUG else []),
+    ],
+}
+
+# Token-bucket rate limits per URL name ("default" applies to unlisted names):
+# "user" buckets are per user id, "anon" buckets per client IP
+API_THROTTLE_RATES = {
+    "library-list": {"user": "120/min", "anon": "30/min"},
+}
+
+# "shared" keeps buckets in a shared-memory segment used by every worker on
+# the node, "local" in a per-process dict
+API_THROTTLE_STORE = "shared"
+API_THROTTLE_SEGMENT = "api_task_throttle"
+API_THROTTLE_SLOTS = 65536
+
+# Lifetime in seconds of the bearer tokens issued by /api/tokens/
+API_TOKEN_TTL = 3600
+
+# Keep a revocation list of bearer tokens (opt-in: verifying a token then
+# costs a lookup), shared by all worker processes: the given cache alias, or
+# the RevokedToken table when None. A local memory cache is refused at
+# startup since each worker would have its own list.
+API_TOKEN_REVOCATION = False
+API_TOKEN_REVOCATION_CACHE = None
+
+# Buffered Entry ingestion (POST /api/entries/create/ with "Prefer: respond-async"):
+# entries per request, back-pressure threshold on pending rows, the seconds a
+# backlog estimate is reused, and the Retry-After sent while saturated
+ENTRY_INGEST_MAX_BATCH = 1000
+ENTRY_BUFFER_MAX_PENDING = 100000
+ENTRY_BUFFER_CHECK_INTERVAL = 1.0
+ENTRY_BUFFER_RETRY_AFTER = 5
+
+# Monthly Entry partitions: months created ahead of time by
+# create_entry_partitions, months kept by archive_entry_partitions (counting
+# the current one) and where the archived partitions are written; with
+# sharding, on the global database and every shard (archives in a
+# subdirectory per database alias)
+ENTRY_PARTITIONS_AHEAD = 3
+ENTRY_RETENTION_MONTHS = 24
+ENTRY_ARCHIVE_DIR = os.path.join(BASE_DIR, "archive")
+
+# Delta sync (/api/changes/): log rows read per call, age after which
+# superseded changes are compacted away and age after which changes are
+# dropped altogether (None keeps them)
+CHANGE_LOG_BATCH_SIZE = 1000
+CHANGE_LOG_COMPACT_AFTER_HOURS = 24
+CHANGE_LOG_RETENTION_DAYS = 90
+
+# Server-sent events stream of new entries (/api/entries/stream/, ASGI only):
+# where events come from ("postgres" LISTEN/NOTIFY across processes, or
+# "local" for a single process), events buffered per connection, seconds
+# between keep-alive comments and connections accepted per process
+ENTRY_STREAM_SOURCE = "postgres"
+ENTRY_STREAM_BUFFER = 100
+ENTRY_STREAM_HEARTBEAT = 15
+ENTRY_STREAM_MAX_SUBSCRIBERS = 10000
+
+# Batched reads (/api/batch/): sub-requests per batch, threads running
+# them concurrently in each process and the seconds those threads keep their
+# database connections (None for ever), whatever CONN_MAX_AGE says
+API_BATCH_MAX_REQUESTS = 20
+API_BATCH_WORKERS = 4
+API_BATCH_CONN_MAX_AGE = 60
+
+# Author deduplication (api_task.dedup) matches on names only: ingestion fills
+# birth_year with publication years, which differ between books of one author
+AUTHOR_DEDUP_MATCH_BIRTH_YEAR = False
+
+# Rows fetched per round trip from the server-side cursor of catalog exports
+# (/api/export/catalog.<format>, export_catalog)
+CATALOG_EXPORT_CHUNK_SIZE = 2000
+
+# Chunks read ahead of the client by the cursor thread of catalog exports
+# served over ASGI
+CATALOG_EXPORT_ASYNC_BUFFER = 8
+
+# Prefork server (manage.py serve): worker processes (None for one per CPU),
+# recycling after a request count plus random jitter or a resident memory
+# limit in MB (0 disables either), and seconds between worker memory reports
+SERVE_WORKERS = None
+SERVE_MAX_REQUESTS = 10000
+SERVE_MAX_REQUESTS_JITTER = 1000
+SERVE_MAX_RSS_MB = 512
+SERVE_REPORT_INTERVAL = 60
+
+# Index advisor (manage.py advise_indexes): sequential scans are only flagged
+# on tables, or reading rows, from this size
+INDEX_ADVISOR_MIN_ROWS = 10000
+
+# Slow-query log (api_task.slow_queries): queries on SLOW_QUERY_LOG_DATABASES
+# taking SLOW_QUERY_THRESHOLD_MS or more are written with their view,
+# serializer, redacted parameters and EXPLAIN plan to SLOW_QUERY_LOG_FILE,
+# one file per process with its pid before the extension (slow_queries.<pid>.log),
+# each rotated at SLOW_QUERY_LOG_MAX_BYTES keeping SLOW_QUERY_LOG_BACKUPS files.
+# Plans are taken on a background thread; past SLOW_QUERY_MAX_PENDING queries
+# waiting for it, slow queries are only counted
+SLOW_QUERY_LOG = True
+SLOW_QUERY_LOG_DATABASES = ["default"]
+SLOW_QUERY_THRESHOLD_MS = 200
+SLOW_QUERY_LOG_FILE = os.path.join(BASE_DIR, "logs", "slow_queries.log")
+SLOW_QUERY_LOG_MAX_BYTES = 10 * 1024 * 1024
+SLOW_QUERY_LOG_BACKUPS = 5
+SLOW_QUERY_MAX_PENDING = 100
+
+# Runs the tests with SLOW_QUERY_LOG_FILE in a temporary directory, so the
+# suite leaves no log behind in BASE_DIR/logs
+TEST_RUNNER = "testTaskproject.test_runner.TestRunner"
+
+# Per-request memory profiling (api_task.profiling): requests sent with the
+# MEMORY_PROFILE_HEADER by staff users, or sampled at MEMORY_PROFILE_SAMPLE_RATE,
+# are traced with tracemalloc keeping MEMORY_PROFILE_FRAMES frames per
+# allocation. A JSON report with the peak and the MEMORY_PROFILE_TOP allocation
+# sites is written to MEMORY_PROFILE_DIR, which keeps the latest
+# MEMORY_PROFILE_KEEP reports (manage.py memory_profile_report)
+MEMORY_PROFILE_HEADER = "X-Profile-Memory"
+MEMORY_PROFILE_SAMPLE_RATE = 0.0
+MEMORY_PROFILE_FRAMES = 25
+MEMORY_PROFILE_TOP = 25
+MEMORY_PROFILE_DIR = os.path.join(BASE_DIR, "logs", "memory_profiles")
+MEMORY_PROFILE_KEEP = 500
+
+# On-demand CPU profiling (api_task.profiling): requests sent by staff users
+# with the CPU_PROFILE_HEADER or the CPU_PROFILE_PARAM query parameter are
+# profiled, by sampling their stack every CPU_PROFILE_INTERVAL seconds into
+# collapsed stacks, or with cProfile when the value is "cprofile" (listing the
+# CPU_PROFILE_TOP costliest functions). Reports go to CPU_PROFILE_DIR, which
+# keeps the latest CPU_PROFILE_KEEP, and are listed at /profiles/
+CPU_PROFILE_HEADER = "X-Profile-CPU"
+CPU_PROFILE_PARAM = "profile"
+CPU_PROFILE_INTERVAL = 0.005
+CPU_PROFILE_TOP = 50
+CPU_PROFILE_DIR = os.path.join(BASE_DIR, "logs", "cpu_profiles")
+CPU_PROFILE_KEEP = 200
+
+# Number of processes hashing passwords during bulk user provisioning
+# (None uses one process per CPU)
+USER_PROVISIONING_WORKERS = None
+
 LOGIN_REDIRECT_URL = 'login'
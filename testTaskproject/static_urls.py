@@ -0,0 +1,16 @@
+"""
+URL configuration used by the static files handlers in
+`testTaskproject.handlers`.
+
+Every path under `STATIC_URL` is a file name relative to `STATIC_ROOT`.
+"""
+import re
+
+from django.conf import settings
+from django.urls import re_path
+
+from api_task.static_serving import serve
+
+urlpatterns = [
+    re_path(r"^%s(?P<path>.*)$" % re.escape(settings.STATIC_URL.lstrip("/")), serve, name="static"),
+]
@@ -0,0 +1,32 @@
+"""
+Test runner keeping the files written while testing out of the project.
+
+The slow-query log is on during tests (TransactionTestCase flushes easily
+exceed `SLOW_QUERY_THRESHOLD_MS`), so `SLOW_QUERY_LOG_FILE` points to a
+temporary directory for the whole run, removed afterwards.
+"""
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._log_dir = tempfile.mkdtemp(prefix="test-logs-")
+        # Set on the settings themselves: override_settings would hide
+        # SETTINGS_MODULE, which the startup profiler passes on
+        self._log_file = settings.SLOW_QUERY_LOG_FILE
+        settings.SLOW_QUERY_LOG_FILE = os.path.join(self._log_dir, "slow_queries.log")
+
+    def teardown_test_environment(self, **kwargs):
+        from api_task import slow_queries
+
+        # Records still pending are written before the directory goes
+        slow_queries.flush(timeout=10)
+        settings.SLOW_QUERY_LOG_FILE = self._log_file
+        shutil.rmtree(self._log_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
@@ -11,12 +11,14 @@ from django.contrib import admin
 from django.contrib.staticfiles.urls import staticfiles_urlpatterns
 from django.urls import path, include
 
-from api_task.views import login_view, dashboard_view
+from api_task.views import login_view, dashboard_view, profile_file_view, profile_index_view
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path('login/', login_view, name='user-login'),
     path('dashboard/', dashboard_view, name='dashboard'),
+    path('profiles/', profile_index_view, name='profile-index'),
+    path('profiles/<str:kind>/<str:name>', profile_file_view, name='profile-file'),
     path("api/", include("api_task.urls"))
 ]
 
@@ -2,6 +2,10 @@
 WSGI config for testTaskproject project.
 
 It exposes the WSGI callable as a module-level variable named ``application``.
+Requests under ``API_URL_PREFIX`` are served by the API-only handler with its
+lean middleware stack; ``api_application`` serves the API alone. With
+``STATIC_SERVE``, files under ``STATIC_URL`` are served from ``STATIC_ROOT``
+by the static handler, precompressed and without middleware.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/wsgi/
@@ -13,4 +17,11 @@ from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "testTaskproject.settings")
 
-application = get_wsgi_application()
+from django.conf import settings  # noqa: E402
+
+from testTaskproject.handlers import PrefixDispatcher, get_api_wsgi_application, get_static_wsgi_application  # noqa: E402
+
+api_application = get_api_wsgi_application()
+application = PrefixDispatcher(api_application, get_wsgi_application())
+if settings.STATIC_SERVE:
+    application = PrefixDispatcher(get_static_wsgi_application(), application, prefix=settings.STATIC_URL)
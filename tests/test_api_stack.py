@@ -0,0 +1,72 @@
+import io
+from wsgiref.util import setup_testing_defaults
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections
+from django.test import SimpleTestCase, TestCase
+
+from testTaskproject.handlers import APIWSGIHandler, PrefixDispatcher
+
+
+def call(app, path):
+    environ = {"PATH_INFO": path, "HTTP_HOST": "testserver", "wsgi.input": io.BytesIO()}
+    setup_testing_defaults(environ)
+    status = []
+    response = app(environ, lambda code, headers, exc_info=None: status.append(code))
+    body = b"".join(response)
+    response.close()
+    return status[0], body
+
+
+class HandlerTestMixin:
+    def setUp(self):
+        # Like django.test.Client, keep the test transaction's connection open
+        for signal in (request_started, request_finished):
+            signal.disconnect(close_old_connections)
+            self.addCleanup(signal.connect, close_old_connections)
+
+
+class APIHandlerTest(HandlerTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.handler = APIWSGIHandler()
+
+    def test_lean_middleware_stack(self):
+        # Only session and auth middleware expose hooks; CSRF, messages and
+        # clickjacking are not loaded
+        middleware = {m.__self__.__class__.__name__ for m in self.handler._view_middleware}
+        self.assertNotIn("CsrfViewMiddleware", middleware)
+
+    def test_api_route(self):
+        status, body = call(self.handler, "/api/health/")
+        self.assertEqual(status, "200 OK")
+        self.assertEqual(body, b'{"status":"ok"}')
+
+    def test_book_list(self):
+        status, _ = call(self.handler, "/api/books/")
+        self.assertEqual(status, "200 OK")
+
+    def test_non_api_routes_are_not_resolved(self):
+        status, _ = call(self.handler, "/admin/login/")
+        self.assertEqual(status, "404 Not Found")
+
+
+class PrefixDispatcherTest(HandlerTestMixin, SimpleTestCase):
+    def test_dispatch_by_prefix(self):
+        calls = []
+
+        def api_app(environ, start_response):
+            calls.append("api")
+
+        def default_app(environ, start_response):
+            calls.append("default")
+
+        dispatcher = PrefixDispatcher(api_app, default_app)
+        dispatcher({"PATH_INFO": "/api/books/"}, None)
+        dispatcher({"PATH_INFO": "/login/"}, None)
+        self.assertEqual(calls, ["api", "default"])
+
+    def test_full_stack_still_serves_login(self):
+        status, _ = call(PrefixDispatcher(APIWSGIHandler(), WSGIHandler()), "/login/")
+        self.assertEqual(status, "200 OK")
@@ -0,0 +1,109 @@
+from django.db.backends.signals import connection_created
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from api_task import batch
+from api_task.models import Author, Book, CustomUser, Entry, Library
+from api_task.registry import user_types
+from api_task.tokens import issue_token
+
+
+@override_settings(API_BATCH_WORKERS=1)
+class BatchTest(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', email='test@example.com')
+        Author.objects.create(name='John Doe', birth_year=1980)
+        self.library = Library.objects.create(name='Test Library')
+        self.book = Book.objects.create(title='Test Book')
+        self.token, _ = issue_token(self.user)
+
+    def batch(self, requests, **extra):
+        return self.client.post(
+            reverse('batch'),
+            {'requests': requests, **extra},
+            content_type='application/json',
+            HTTP_AUTHORIZATION=f'Bearer {self.token}',
+        )
+
+    def test_responses_in_order(self):
+        response = self.batch(['/api/authors/', '/api/books/', '/api/health/'])
+
+        self.assertEqual(response.status_code, 200)
+        responses = response.json()['responses']
+        self.assertEqual([item['status'] for item in responses], [200, 200, 200])
+        self.assertEqual(responses[0]['body'], [{'name': 'John Doe'}])
+        self.assertEqual(responses[1]['body'], [{'title': 'Test Book', 'authors': []}])
+        self.assertEqual(responses[2]['body'], {'status': 'ok'})
+
+    def test_sub_requests_share_the_batch_user(self):
+        Entry.objects.create(user=self.user, library=self.library, book=self.book)
+        response = self.batch(['/api/me/entries/?limit=1', '/api/users/'])
+
+        me, users = response.json()['responses']
+        self.assertEqual(me['status'], 200)
+        self.assertEqual(me['body']['results'][0]['book_title'], 'Test Book')
+        # Permissions still apply per sub-request
+        self.assertEqual(users['status'], 403)
+
+    def test_unknown_and_unbatchable_paths(self):
+        response = self.batch(['/api/nope/', '/api/batch/', '/admin/', '/api/entries/stream/'])
+        self.assertEqual([item['status'] for item in response.json()['responses']], [404, 400, 404, 400])
+
+    def test_streaming_endpoints_are_rejected(self):
+        response = self.batch(['/api/export/catalog.csv', '/api/health/'])
+        export, health = response.json()['responses']
+        self.assertEqual(export, {'status': 400, 'body': {'detail': 'This endpoint cannot be batched.'}})
+        self.assertEqual(health['status'], 200)
+
+    def test_request_cap(self):
+        with self.settings(API_BATCH_MAX_REQUESTS=2):
+            response = self.batch(['/api/health/'] * 3)
+        self.assertEqual(response.status_code, 400)
+
+    def test_snapshot_within_request_transaction(self):
+        response = self.batch(['/api/authors/', '/api/libraries/'], snapshot=True)
+        self.assertEqual([item['status'] for item in response.json()['responses']], [200, 200])
+
+
+@override_settings(API_BATCH_WORKERS=4)
+class ConcurrentBatchTest(TransactionTestCase):
+    def setUp(self):
+        # Worker connections stay open between batches; they must be closed
+        # before the test database is dropped
+        self.addCleanup(batch.shutdown)
+        # The tables are flushed between tests, with the cached user types
+        user_types.invalidate()
+        self.addCleanup(user_types.invalidate)
+        self.user = CustomUser.objects.create_user(username='testuser', email='test@example.com')
+        for number in range(3):
+            Author.objects.create(name=f'Author {number}', birth_year=1900 + number)
+        Library.objects.create(name='Test Library')
+
+    def test_concurrent_sub_requests(self):
+        self.client.force_login(self.user)
+        for snapshot in (False, True):
+            response = self.client.post(
+                reverse('batch'),
+                {'requests': ['/api/authors/', '/api/libraries/', '/api/user-types/'], 'snapshot': snapshot},
+                content_type='application/json',
+            )
+            responses = response.json()['responses']
+            self.assertEqual([item['status'] for item in responses], [200, 200, 200])
+            self.assertEqual(len(responses[0]['body']), 3)
+            self.assertEqual(responses[1]['body'], [{'name': 'Test Library', 'books': []}])
+
+    def test_workers_keep_their_connections(self):
+        batch.shutdown()
+        opened = []
+        receiver = lambda connection, **kwargs: opened.append(connection.alias)
+        connection_created.connect(receiver)
+        self.addCleanup(connection_created.disconnect, receiver)
+
+        self.client.force_login(self.user)
+        for _ in range(3):
+            response = self.client.post(
+                reverse('batch'), {'requests': ['/api/authors/'] * 8}, content_type='application/json'
+            )
+            self.assertEqual({item['status'] for item in response.json()['responses']}, {200})
+        # At most one connection per worker thread, not one per sub-request
+        self.assertLessEqual(len(opened), 4)
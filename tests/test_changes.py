@@ -0,0 +1,142 @@
+import datetime
+import io
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from api_task.changes import compact, sequence_changes
+from api_task.ingestion import enqueue_entries, flush_pending
+from api_task.models import Author, Book, BookAuthor, Change, CustomUser, Entry, Library
+
+
+class ChangeLogTest(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', email='test@example.com')
+        self.staff = CustomUser.objects.create_user(username='staff', email='staff@example.com', is_staff=True)
+        self.author = Author.objects.create(name='John Doe', birth_year=1980)
+        self.book = Book.objects.create(title='Test Book')
+        BookAuthor.objects.create(book=self.book, author=self.author)
+        self.library = Library.objects.create(name='Test Library')
+        self.library.books.add(self.book)
+
+    def changes(self, since=None, **params):
+        if since is not None:
+            params['since'] = since
+        response = self.client.get(reverse('changes'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_cursor_without_since(self):
+        cursor = self.changes()['next']
+        self.assertEqual(cursor, Change.objects.latest('seq').seq)
+        # Nothing changed since the cursor
+        self.assertEqual(self.changes(cursor)['changes'], {})
+
+    def test_initial_delta(self):
+        delta = self.changes(0)
+
+        self.assertFalse(delta['more'])
+        changes = delta['changes']
+        self.assertEqual(changes['authors']['saved'], [{'id': self.author.pk, 'name': 'John Doe', 'birth_year': 1980}])
+        self.assertEqual(changes['books']['saved'], [{'id': self.book.pk, 'title': 'Test Book'}])
+        self.assertEqual(changes['book_authors']['added'], [[self.book.pk, self.author.pk]])
+        self.assertEqual(changes['library_books']['added'], [[self.library.pk, self.book.pk]])
+
+    def test_delta_keeps_last_state(self):
+        cursor = self.changes()['next']
+        self.book.title = 'Renamed'
+        self.book.save()
+        other = Book.objects.create(title='Short-lived')
+        other.title = 'Edited'
+        other.save()
+        other_pk = other.pk
+        other.delete()
+
+        changes = self.changes(cursor)['changes']
+        self.assertEqual(changes['books'], {'saved': [{'id': self.book.pk, 'title': 'Renamed'}], 'deleted': [other_pk]})
+
+    def test_membership_removals(self):
+        other = Library.objects.create(name='Other Library')
+        other.books.add(self.book)
+        cursor = self.changes()['next']
+        self.library.books.remove(self.book)
+        other.books.clear()
+        self.book.authors.clear()
+
+        changes = self.changes(cursor)['changes']
+        self.assertEqual(changes['library_books']['removed'], [[self.library.pk, self.book.pk], [other.pk, self.book.pk]])
+        self.assertEqual(changes['book_authors']['removed'], [[self.book.pk, self.author.pk]])
+
+    def test_deleting_book_removes_memberships(self):
+        cursor = self.changes()['next']
+        book_pk = self.book.pk
+        self.book.delete()
+
+        changes = self.changes(cursor)['changes']
+        self.assertEqual(changes['books']['deleted'], [book_pk])
+        self.assertEqual(changes['library_books']['removed'], [[self.library.pk, book_pk]])
+        self.assertEqual(changes['book_authors']['removed'], [[book_pk, self.author.pk]])
+
+    def test_batches(self):
+        cursor = self.changes()['next']
+        for number in range(5):
+            Author.objects.create(name=f'Author {number}', birth_year=1900 + number)
+
+        seen = []
+        while True:
+            delta = self.changes(cursor, limit=2)
+            seen.extend(author['name'] for author in delta['changes'].get('authors', {}).get('saved', []))
+            cursor = delta['next']
+            if not delta['more']:
+                break
+        self.assertEqual(seen, [f'Author {number}' for number in range(5)])
+
+    def test_entries_only_for_staff(self):
+        cursor = self.changes()['next']
+        Entry.objects.create(user=self.user, library=self.library, book=self.book)
+        enqueue_entries([{'user': self.user.pk, 'library': self.library.pk, 'book': self.book.pk}])
+        flush_pending()
+
+        self.client.force_login(self.user)
+        self.assertNotIn('entries', self.changes(cursor)['changes'])
+
+        self.client.force_login(self.staff)
+        self.assertEqual(len(self.changes(cursor)['changes']['entries']['saved']), 2)
+
+    def test_changes_are_sequenced_in_order(self):
+        self.assertTrue(Change.objects.filter(seq__isnull=True).exists())
+        sequence_changes()
+        self.assertFalse(Change.objects.filter(seq__isnull=True).exists())
+        self.assertEqual(
+            list(Change.objects.order_by('id').values_list('seq', flat=True)),
+            list(Change.objects.order_by('seq').values_list('seq', flat=True)),
+        )
+
+    def test_compaction_keeps_latest_change(self):
+        for number in range(3):
+            self.book.title = f'Title {number}'
+            self.book.save()
+        later = timezone.now() + datetime.timedelta(days=2)
+
+        result = compact(compact_after=datetime.timedelta(hours=1), now=later)
+
+        self.assertEqual(result['superseded'], 3)
+        self.assertEqual(Change.objects.filter(kind='books', object_id=self.book.pk).count(), 1)
+        self.assertEqual(self.changes(0)['changes']['books']['saved'], [{'id': self.book.pk, 'title': 'Title 2'}])
+
+    def test_truncated_cursor_is_gone(self):
+        old_cursor = self.changes()['next']
+        Author.objects.create(name='Jane Doe', birth_year=1990)
+        Change.objects.update(created_at=timezone.now() - datetime.timedelta(days=100))
+
+        out = io.StringIO()
+        call_command('compact_changes', retention_days=90, stdout=out)
+        self.assertRegex(out.getvalue(), r"Removed \d+ superseded and [1-9]\d* expired changes")
+
+        response = self.client.get(reverse('changes'), {'since': old_cursor})
+        self.assertEqual(response.status_code, 410)
+        self.assertTrue(response.json()['reset'])
+        # A fresh cursor works again
+        self.assertEqual(self.changes(self.changes()['next'])['changes'], {})
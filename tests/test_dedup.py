@@ -0,0 +1,230 @@
+import io
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from api_task.changes import sequence_changes
+from api_task.dedup import (
+    AuthorResolver,
+    block_key,
+    content_hash,
+    find_book,
+    find_duplicates,
+    merge_authors,
+    name_key,
+    name_tokens,
+    names_match,
+)
+from api_task.models import Author, Book, BookAuthor, Change
+from api_task.serializers import BookSerializer
+
+
+class NameKeyTest(TestCase):
+    def test_spellings_share_keys(self):
+        spellings = ["J. R. R. Tolkien", "J.R.R. Tolkien", "Tolkien, J. R. R.", "j r r TOLKIEN"]
+        self.assertEqual({name_key(name) for name in spellings}, {"j r r tolkien"})
+        self.assertEqual({block_key(name) for name in spellings}, {"tolkien j"})
+
+    def test_accents_apostrophes_and_suffixes(self):
+        self.assertEqual(name_key("Gabriel García Márquez"), "gabriel garcia marquez")
+        self.assertEqual(name_key("Flannery O'Connor"), "flannery oconnor")
+        self.assertEqual(name_key("King, Jr., Martin Luther"), "martin luther king")
+        self.assertEqual(name_key("Martin Luther King, Jr."), "martin luther king")
+
+    def test_initials_match_full_names(self):
+        self.assertTrue(names_match(name_tokens("J. R. R. Tolkien"), name_tokens("John Ronald Reuel Tolkien")))
+        self.assertTrue(names_match(name_tokens("J.-P. Sartre"), name_tokens("Jean-Paul Sartre")))
+        self.assertFalse(names_match(name_tokens("John Smith"), name_tokens("Jane Smith")))
+        self.assertFalse(names_match(name_tokens("Tolkien"), name_tokens("J. Tolkien")))
+
+    def test_keys_are_saved(self):
+        author = Author.objects.create(name="Tolkien, J.R.R.", birth_year=1892)
+        author.refresh_from_db()
+        self.assertEqual((author.name_key, author.block_key), ("j r r tolkien", "tolkien j"))
+
+        author.name = "Christopher Tolkien"
+        author.save(update_fields=["name"])
+        author.refresh_from_db()
+        self.assertEqual((author.name_key, author.block_key), ("christopher tolkien", "tolkien c"))
+
+
+class AuthorResolverTest(TestCase):
+    def test_reuses_matching_author(self):
+        tolkien = Author.objects.create(name="J. R. R. Tolkien", birth_year=1892)
+        resolver = AuthorResolver()
+
+        # One query loads the block, later spellings hit the cache
+        with self.assertNumQueries(1):
+            self.assertEqual(resolver.resolve("Tolkien, J. R. R.", 1937), tolkien)
+            self.assertEqual(resolver.resolve("J.R.R. Tolkien", 1954), tolkien)
+        self.assertEqual(Author.objects.count(), 1)
+
+    def test_creates_unknown_author(self):
+        resolver = AuthorResolver()
+        created = resolver.resolve("Ursula K. Le Guin", 1929)
+        self.assertEqual(resolver.resolve("Le Guin, Ursula K.", 1969), created)
+        self.assertEqual(Author.objects.count(), 1)
+
+    def test_ambiguous_initial_needs_exact_match(self):
+        john = Author.objects.create(name="John Smith", birth_year=1900)
+        Author.objects.create(name="Jane Smith", birth_year=1900)
+
+        created = AuthorResolver().resolve("J. Smith", 1900)
+        self.assertNotEqual(created, john)
+        self.assertEqual(Author.objects.count(), 3)
+
+    @override_settings(AUTHOR_DEDUP_MATCH_BIRTH_YEAR=True)
+    def test_birth_year_matching(self):
+        Author.objects.create(name="J. R. R. Tolkien", birth_year=1892)
+        AuthorResolver().resolve("Tolkien, J. R. R.", 1937)
+        self.assertEqual(Author.objects.count(), 2)
+
+
+class MergeAuthorsTest(TestCase):
+    def setUp(self):
+        self.tolkien = Author.objects.create(name="J. R. R. Tolkien", birth_year=1892)
+        self.tolkien_2 = Author.objects.create(name="Tolkien, J.R.R.", birth_year=1937)
+        self.tolkien_3 = Author.objects.create(name="John Ronald Reuel Tolkien", birth_year=1954)
+        self.other = Author.objects.create(name="Christopher Tolkien", birth_year=1924)
+        self.hobbit = Book.objects.create(title="The Hobbit")
+        self.rings = Book.objects.create(title="The Lord of the Rings")
+        self.silmarillion = Book.objects.create(title="The Silmarillion")
+        BookAuthor.objects.create(book=self.hobbit, author=self.tolkien_2)
+        BookAuthor.objects.create(book=self.rings, author=self.tolkien)
+        BookAuthor.objects.create(book=self.rings, author=self.tolkien_3)
+        BookAuthor.objects.create(book=self.silmarillion, author=self.tolkien_3)
+        BookAuthor.objects.create(book=self.silmarillion, author=self.other)
+
+    def test_find_duplicates(self):
+        self.assertEqual(find_duplicates(), {self.tolkien.pk: [self.tolkien_2.pk, self.tolkien_3.pk]})
+
+    def test_merge_repoints_book_authors(self):
+        repointed = merge_authors(self.tolkien.pk, [self.tolkien_2.pk, self.tolkien_3.pk])
+
+        # The Lord of the Rings was linked to the canonical author already
+        self.assertEqual(repointed, 2)
+        self.assertEqual(
+            set(BookAuthor.objects.values_list("book__title", "author_id")),
+            {
+                ("The Hobbit", self.tolkien.pk),
+                ("The Lord of the Rings", self.tolkien.pk),
+                ("The Silmarillion", self.tolkien.pk),
+                ("The Silmarillion", self.other.pk),
+            },
+        )
+        self.assertFalse(Author.objects.filter(pk__in=[self.tolkien_2.pk, self.tolkien_3.pk]).exists())
+
+    def test_merge_is_logged(self):
+        sequence_changes()
+        start = Change.objects.latest("seq").seq
+        merge_authors(self.tolkien.pk, [self.tolkien_2.pk])
+        sequence_changes()
+
+        logged = set(Change.objects.filter(seq__gt=start).values_list("kind", "object_id", "related_id", "action"))
+        self.assertIn(("book_authors", self.hobbit.pk, self.tolkien_2.pk, Change.DELETE), logged)
+        self.assertIn(("book_authors", self.hobbit.pk, self.tolkien.pk, Change.SAVE), logged)
+        self.assertIn(("authors", self.tolkien_2.pk, None, Change.DELETE), logged)
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command("merge_duplicate_authors", "--dry-run", stdout=out)
+        self.assertIn("Would merge 2 duplicate authors into 1", out.getvalue())
+        self.assertEqual(Author.objects.count(), 4)
+
+        call_command("merge_duplicate_authors", stdout=out)
+        self.assertEqual(Author.objects.count(), 2)
+        self.assertEqual(find_duplicates(), {})
+
+
+class BookContentHashTest(TestCase):
+    def setUp(self):
+        self.tolkien = Author.objects.create(name="J. R. R. Tolkien", birth_year=1892)
+        self.christopher = Author.objects.create(name="Christopher Tolkien", birth_year=1924)
+
+    def immediate(self):
+        # The constraint is deferred to commit, which never comes in TestCase
+        with connection.cursor() as cursor:
+            cursor.execute("SET CONSTRAINTS book_content_hash_unique IMMEDIATE")
+
+    def test_hash_follows_title_and_authors(self):
+        book = Book.objects.create(title="The Silmarillion")
+        self.assertEqual(book.content_hash, content_hash("the  SILMARILLION", []))
+
+        book.authors.add(self.tolkien, self.christopher)
+        book.refresh_from_db()
+        self.assertEqual(book.content_hash, content_hash("The Silmarillion", [self.christopher.pk, self.tolkien.pk]))
+
+        book.authors.remove(self.christopher)
+        book.refresh_from_db()
+        self.assertEqual(book.content_hash, content_hash("The Silmarillion", [self.tolkien.pk]))
+
+        book.title = "Silmarillion"
+        book.save()
+        book.refresh_from_db()
+        self.assertEqual(book.content_hash, content_hash("Silmarillion", [self.tolkien.pk]))
+
+    def test_hash_saved_with_update_fields(self):
+        book = Book.objects.create(title="The Silmarillion")
+        book.authors.add(self.tolkien)
+        book.refresh_from_db()
+        book.title = "The Hobbit"
+        book.save(update_fields=["title"])
+        book.refresh_from_db()
+        self.assertEqual(book.content_hash, content_hash("The Hobbit", [self.tolkien.pk]))
+
+    def test_find_book(self):
+        book = Book.objects.create(title="The Hobbit")
+        BookAuthor.objects.create(book=book, author=self.tolkien)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(find_book("the hobbit", [self.tolkien]), book)
+        self.assertIsNone(find_book("The Hobbit", [self.tolkien, self.christopher]))
+
+    def test_duplicate_book_rejected(self):
+        book = Book.objects.create(title="The Hobbit")
+        book.authors.add(self.tolkien)
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.immediate()
+            copy = Book.objects.create(title="The hobbit")
+            copy.authors.add(self.tolkien)
+
+    def test_serializer_create_reuses_book(self):
+        serializer = BookSerializer(data={"title": "The Hobbit"})
+        serializer.is_valid(raise_exception=True)
+        book = serializer.save(authors=[{"name": "J.R.R. Tolkien", "birth_year": 1937}])
+        self.assertEqual(list(book.authors.all()), [self.tolkien])
+
+        serializer = BookSerializer(data={"title": "The Hobbit "})
+        serializer.is_valid(raise_exception=True)
+        self.assertEqual(serializer.save(authors=[{"name": "Tolkien, J. R. R.", "birth_year": 1892}]), book)
+        self.assertEqual(Book.objects.count(), 1)
+
+    def test_merge_creating_duplicate_books_fails(self):
+        other = Author.objects.create(name="John R. R. Tolkien", birth_year=1954)
+        first, second = Book.objects.create(title="The Hobbit"), Book.objects.create(title="The Hobbit")
+        first.authors.add(self.tolkien)
+        second.authors.add(other)
+
+        with self.assertRaises(IntegrityError):
+            merge_authors(self.tolkien.pk, [other.pk])
+        self.assertTrue(Author.objects.filter(pk=other.pk).exists())
+
+
+class PopulateOpenLibraryTest(TransactionTestCase):
+    # The deferred content hash constraint is only checked on commit
+    def test_book_sharing_the_title_of_an_authorless_book(self):
+        authorless = Book.objects.create(title="Cosmos")
+        works = {"works": [{"title": "Cosmos", "first_publish_year": 1980, "authors": [{"name": "Carl Sagan"}]}]}
+        response = mock.Mock(**{"json.return_value": works})
+
+        out = io.StringIO()
+        with mock.patch("requests.get", return_value=response):
+            call_command("populate_open_library_data", stdout=out)
+
+        self.assertIn("Data populated successfully", out.getvalue())
+        book = Book.objects.exclude(pk=authorless.pk).get()
+        self.assertEqual([author.name for author in book.authors.all()], ["Carl Sagan"])
+        self.assertEqual(book.content_hash, content_hash("Cosmos", [book.authors.get().pk]))
@@ -0,0 +1,74 @@
+import datetime
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from api_task.models import Book, CustomUser, Entry, Library
+from api_task.tokens import issue_token
+
+
+class EntryFeedTest(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', email='test@example.com')
+        self.other = CustomUser.objects.create_user(username='other', email='other@example.com')
+        self.staff = CustomUser.objects.create_user(username='staff', email='staff@example.com', is_staff=True)
+        self.library = Library.objects.create(name='Test Library')
+        self.book = Book.objects.create(title='Test Book')
+
+        # Five entries one minute apart, two of them sharing a timestamp
+        start = timezone.now() - datetime.timedelta(hours=1)
+        moments = [start, start + datetime.timedelta(minutes=1), start + datetime.timedelta(minutes=1),
+                   start + datetime.timedelta(minutes=2), start + datetime.timedelta(minutes=3)]
+        self.entries = [
+            Entry.objects.create(user=self.user, library=self.library, book=self.book, date_added=moment)
+            for moment in moments
+        ]
+        Entry.objects.create(user=self.other, library=self.library, book=self.book)
+
+    def newest_first(self):
+        return [entry.pk for entry in sorted(self.entries, key=lambda entry: (-entry.date_added.timestamp(), entry.pk))]
+
+    def test_my_entries(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('my-entry-feed'))
+
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([row['id'] for row in results], self.newest_first())
+        self.assertEqual(results[0]['book_title'], 'Test Book')
+        self.assertEqual(results[0]['library_name'], 'Test Library')
+        self.assertIsNone(response.json()['next'])
+
+    def test_pages_follow_keyset_cursor(self):
+        token, _ = issue_token(self.user)
+        url = reverse('user-entry-feed', args=[self.user.pk]) + '?limit=2'
+        seen = []
+        while url:
+            # Each page is a single query, however deep it is
+            with self.assertNumQueries(1):
+                response = self.client.get(url, HTTP_AUTHORIZATION=f'Bearer {token}')
+            body = response.json()
+            self.assertLessEqual(len(body['results']), 2)
+            seen.extend(row['id'] for row in body['results'])
+            url = body['next']
+
+        self.assertEqual(seen, self.newest_first())
+
+    def test_other_users_entries_need_staff(self):
+        self.client.force_login(self.other)
+        response = self.client.get(reverse('user-entry-feed', args=[self.user.pk]))
+        self.assertEqual(response.status_code, 403)
+
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('user-entry-feed', args=[self.user.pk]))
+        self.assertEqual(len(response.json()['results']), 5)
+
+    def test_invalid_cursor(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('my-entry-feed') + '?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+
+    def test_anonymous_is_rejected(self):
+        response = self.client.get(reverse('my-entry-feed'))
+        self.assertIn(response.status_code, (401, 403))
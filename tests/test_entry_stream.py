@@ -0,0 +1,123 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from api_task.api_views import EntryStreamView
+from api_task.events import Subscription, broadcaster, encode_event
+from api_task.models import Book, CustomUser, Entry, Library
+from api_task.tokens import issue_token
+
+
+def event(pk, library=1, user=1):
+    return {"id": pk, "user": user, "library": library, "book": 1, "date_added": "2024-01-26T00:18:00Z"}
+
+
+async def next_frame(frames, timeout=5):
+    return await asyncio.wait_for(anext(frames), timeout)
+
+
+@override_settings(ENTRY_STREAM_SOURCE="local")
+class BroadcasterTest(SimpleTestCase):
+    async def test_events_reach_matching_subscribers(self):
+        everything = broadcaster.subscribe()
+        library = broadcaster.subscribe(library=2)
+        user = broadcaster.subscribe(user=3)
+        both = broadcaster.subscribe(library=2, user=4)
+        try:
+            broadcaster.publish([event(1, library=2, user=3), event(2, library=5, user=4)])
+
+            # Drain what each subscriber got without waiting for heartbeats
+            def ids(subscription):
+                received = []
+                while not subscription._queue.empty():
+                    received.append(int(subscription._queue.get_nowait().split(b"id: ")[1].split(b"\n")[0]))
+                return received
+
+            self.assertEqual(ids(everything), [1, 2])
+            self.assertEqual(ids(library), [1])
+            self.assertEqual(ids(user), [1])
+            self.assertEqual(ids(both), [])
+        finally:
+            for subscription in (everything, library, user, both):
+                broadcaster.unsubscribe(subscription)
+        self.assertEqual(len(broadcaster), 0)
+
+    async def test_slow_subscriber_buffer_is_bounded(self):
+        subscription = Subscription(maxsize=2)
+        for pk in range(5):
+            subscription.push(encode_event("entry", event(pk), pk))
+
+        frames = subscription.frames(heartbeat=5)
+        self.assertIn(b'"dropped":3', await next_frame(frames))
+        self.assertIn(b"id: 3", await next_frame(frames))
+        self.assertIn(b"id: 4", await next_frame(frames))
+
+    async def test_heartbeat(self):
+        frames = Subscription().frames(heartbeat=0.01)
+        self.assertEqual(await next_frame(frames), b": keep-alive\n\n")
+
+
+@override_settings(ENTRY_STREAM_SOURCE="local")
+class EntryStreamViewTest(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', email='test@example.com')
+        self.other = CustomUser.objects.create_user(username='other', email='other@example.com')
+
+    async def test_stream_own_entries(self):
+        token, _ = await sync_to_async(issue_token)(self.user)
+        response = await self.async_client.get(
+            reverse('entry-stream'), headers={'Authorization': f'Bearer {token}'}
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        frames = aiter(response.streaming_content)
+        self.assertEqual(await next_frame(frames), b": connected\n\n")
+        # Non-staff users are limited to their own entries
+        broadcaster.publish([event(1, user=self.other.pk), event(2, user=self.user.pk)])
+        frame = await next_frame(frames)
+        self.assertIn(b"event: entry", frame)
+        self.assertEqual(json.loads(frame.split(b"data: ")[1])["id"], 2)
+        await frames.aclose()
+
+    async def test_closed_stream_unsubscribes(self):
+        stream = EntryStreamView().stream(None, self.user.pk)
+        await next_frame(stream)
+        self.assertEqual(len(broadcaster), 1)
+        # What happens when the client disconnects and the response is cancelled
+        await stream.aclose()
+        self.assertEqual(len(broadcaster), 0)
+
+    async def test_other_users_entries_need_staff(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('entry-stream'), {'user': self.other.pk})
+        self.assertEqual(response.status_code, 403)
+
+    async def test_anonymous_is_rejected(self):
+        response = await self.async_client.get(reverse('entry-stream'))
+        self.assertEqual(response.status_code, 401)
+
+    def test_not_served_over_wsgi(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('entry-stream'))
+        self.assertEqual(response.status_code, 501)
+
+
+class PostgresEntryStreamTest(TransactionTestCase):
+    async def test_committed_entries_are_streamed(self):
+        user = await CustomUser.objects.acreate(username='testuser', email='test@example.com')
+        library = await Library.objects.acreate(name='Test Library')
+        book = await Book.objects.acreate(title='Test Book')
+        subscription = broadcaster.subscribe(library=library.pk)
+        try:
+            await asyncio.wait_for(broadcaster.listening.wait(), 5)
+            entry = await sync_to_async(Entry.objects.create)(user=user, library=library, book=book)
+
+            frames = subscription.frames(heartbeat=5)
+            frame = await next_frame(frames)
+            self.assertEqual(json.loads(frame.split(b"data: ")[1])["id"], entry.pk)
+        finally:
+            broadcaster.unsubscribe(subscription)
+            await broadcaster.stop()
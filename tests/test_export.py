@@ -0,0 +1,131 @@
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+
+from asgiref.sync import sync_to_async
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from api_task.export import astream_catalog, available_formats, stream_catalog
+from api_task.models import Author, Book, BookAuthor, CustomUser, Library
+
+
+class CatalogExportTest(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', email='test@example.com')
+        self.client.force_login(self.user)
+        self.author = Author.objects.create(name='John Doe', birth_year=1980)
+        self.other_author = Author.objects.create(name='Jane "JD" Roe', birth_year=1975)
+        self.book = Book.objects.create(title='Test Book, Vol. 1')
+        self.lonely_book = Book.objects.create(title='Lonely Book')
+        BookAuthor.objects.create(book=self.book, author=self.author)
+        BookAuthor.objects.create(book=self.book, author=self.other_author)
+        self.library = Library.objects.create(name='Test Library')
+        self.library.books.add(self.book)
+
+    def export(self, file_format, **params):
+        response = self.client.get(reverse('catalog-export', args=[file_format]), params)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv(self):
+        response, body = self.export('csv')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('filename="catalog.csv"', response['Content-Disposition'])
+
+        rows = list(csv.DictReader(io.StringIO(body.decode())))
+        self.assertEqual([row['title'] for row in rows], ['Test Book, Vol. 1', 'Lonely Book'])
+        # List columns are JSON arrays
+        self.assertEqual(json.loads(rows[0]['author_names']), ['John Doe', 'Jane "JD" Roe'])
+        self.assertEqual(json.loads(rows[0]['library_ids']), [self.library.pk])
+        self.assertEqual(json.loads(rows[1]['author_ids']), [])
+
+    def test_gzipped_ndjson(self):
+        response, body = self.export('ndjson', compress='gzip')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('filename="catalog.ndjson.gz"', response['Content-Disposition'])
+
+        rows = [json.loads(line) for line in gzip.decompress(body).splitlines()]
+        self.assertEqual(rows[0], {
+            'book_id': self.book.pk,
+            'title': 'Test Book, Vol. 1',
+            'author_ids': [self.author.pk, self.other_author.pk],
+            'author_names': ['John Doe', 'Jane "JD" Roe'],
+            'library_ids': [self.library.pk],
+            'library_names': ['Test Library'],
+        })
+        self.assertEqual(rows[1]['library_names'], [])
+
+    def test_accept_header_of_the_file_type(self):
+        url = reverse('catalog-export', args=['csv'])
+        response = self.client.get(url, HTTP_ACCEPT='text/csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'book_id,title'))
+
+        response = self.client.get(
+            reverse('catalog-export', args=['ndjson']), HTTP_ACCEPT='application/x-ndjson'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 2)
+        # Errors are still rendered, whatever the client accepts
+        response = self.client.get(url, {'compress': 'zip'}, HTTP_ACCEPT='text/csv')
+        self.assertEqual(response.status_code, 400)
+
+    def test_chunk_size_does_not_change_output(self):
+        single = b''.join(stream_catalog('ndjson', chunk_size=1))
+        self.assertEqual(single, b''.join(stream_catalog('ndjson', chunk_size=1000)))
+
+    def test_command_copy_matches_stream(self):
+        # The command produces CSV with COPY, the endpoint from a cursor
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'catalog.csv.gz')
+            call_command('export_catalog', '--format=csv', f'--output={path}', '--gzip', stderr=io.StringIO())
+            with gzip.open(path) as f:
+                copied = f.read()
+        self.assertEqual(copied, b''.join(stream_catalog('csv')))
+
+    def test_unknown_or_unavailable_format(self):
+        response = self.client.get(reverse('catalog-export', args=['xml']))
+        self.assertEqual(response.status_code, 404)
+        if 'parquet' not in available_formats():
+            response = self.client.get(reverse('catalog-export', args=['parquet']))
+            self.assertEqual(response.status_code, 406)
+
+    def test_requires_authentication(self):
+        self.client.logout()
+        response = self.client.get(reverse('catalog-export', args=['csv']))
+        self.assertEqual(response.status_code, 401)
+
+
+class AsyncCatalogExportTest(TransactionTestCase):
+    # The cursor is read from a thread, on a connection of its own, so the
+    # rows must be committed
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', email='test@example.com')
+        library = Library.objects.create(name='Test Library')
+        library.books.add(*[Book.objects.create(title=f'Book {i}') for i in range(10)])
+
+    async def test_streamed_asynchronously_over_asgi(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('catalog-export', args=['ndjson']))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(body, await sync_to_async(lambda: b''.join(stream_catalog('ndjson')))())
+        self.assertEqual(len(body.splitlines()), 10)
+
+    @override_settings(CATALOG_EXPORT_ASYNC_BUFFER=1)
+    async def test_closing_stops_the_cursor_thread(self):
+        chunks = astream_catalog('ndjson', chunk_size=1)
+        await anext(chunks)
+        thread = next(t for t in threading.enumerate() if t.name == 'catalog-export')
+        # What happens when the client disconnects
+        await chunks.aclose()
+        await sync_to_async(thread.join)(5)
+        self.assertFalse(thread.is_alive())
@@ -0,0 +1,105 @@
+import io
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection, migrations
+from django.test import TestCase
+
+from api_task.index_advisor import (
+    Proposal,
+    QueryCollector,
+    advise,
+    is_covered,
+    migration_operations,
+    parent_table,
+    seq_scans,
+)
+from api_task.models import Book, Entry, Library
+
+PLAN = {
+    "Plan": {
+        "Node Type": "Hash Join",
+        "Hash Cond": "(e.book_id = b.id)",
+        "Plans": [
+            {
+                "Node Type": "Seq Scan",
+                "Relation Name": "api_task_entry_y2024m01",
+                "Alias": "e",
+                "Actual Rows": 10,
+                "Rows Removed by Filter": 90,
+                "Actual Loops": 1,
+                "Filter": "((e.library_id = 3) AND (e.date_added >= '2024-01-01'::timestamp with time zone))",
+            },
+            {
+                "Node Type": "Hash",
+                "Plans": [
+                    {"Node Type": "Seq Scan", "Relation Name": "api_task_book", "Alias": "b", "Actual Rows": 5},
+                ],
+            },
+        ],
+    },
+}
+
+
+class IndexAdvisorTest(TestCase):
+    def test_seq_scans_extract_filtered_and_joined_columns(self):
+        scans = list(seq_scans(PLAN))
+        self.assertEqual(scans, [
+            ("api_task_entry_y2024m01", "e", 100, ["library_id"], ["date_added"]),
+            ("api_task_book", "b", 5, ["id"], []),
+        ])
+
+    def test_existing_indexes_cover_columns(self):
+        self.assertTrue(is_covered("api_task_book", ("id",)))
+        self.assertFalse(is_covered("api_task_library", ("name",)))
+
+    def test_partitions_map_to_their_table(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = 'api_task_entry'::regclass")
+            partition = cursor.fetchone()[0]
+        self.assertEqual(parent_table(partition), "api_task_entry")
+        self.assertEqual(parent_table("api_task_book"), "api_task_book")
+
+    def test_proposes_and_measures_index_for_captured_query(self):
+        Library.objects.create(name="City Library")
+        collector = QueryCollector()
+        with connection.execute_wrapper(collector):
+            collector.label = "library-lookup"
+            list(Library.objects.filter(name="City Library"))
+            list(Library.objects.filter(name="Town Library"))
+
+        proposals = advise(list(collector.queries.values()), min_rows=0)
+        proposal = next(p for p in proposals if p.table == "api_task_library")
+        self.assertEqual(proposal.columns, ("name",))
+        self.assertEqual(proposal.endpoints, ["library-lookup"])
+        self.assertEqual(proposal.queries[0].count, 2)
+        self.assertIsNotNone(proposal.before_ms)
+        self.assertIsNotNone(proposal.after_ms)
+        # The index only existed in a rolled-back savepoint
+        self.assertFalse(is_covered("api_task_library", ("name",)))
+
+        operation, = migration_operations([proposal])
+        self.assertIsInstance(operation, migrations.AddIndex)
+        self.assertEqual(operation.model_name, "library")
+        self.assertEqual(operation.index.fields, ["name"])
+        self.assertLessEqual(len(operation.index.name), 30)
+
+    def test_many_to_many_tables_get_raw_sql(self):
+        operation, = migration_operations([Proposal("api_task_library_books", ("book_id",))])
+        self.assertIsInstance(operation, migrations.RunSQL)
+        self.assertIn('ON "api_task_library_books" ("book_id")', operation.sql)
+
+    def test_command_replays_endpoints(self):
+        out = io.StringIO()
+        call_command("advise_indexes", "--min-rows", "0", "--json", stdout=out, stderr=io.StringIO())
+        self.assertIsInstance(json.loads(out.getvalue()), list)
+        # The replay ran in a transaction that was rolled back
+        self.assertFalse(get_user_model().objects.filter(username="index_advisor").exists())
+
+    def test_generated_data_is_rolled_back(self):
+        err = io.StringIO()
+        call_command("advise_indexes", "--generate", "200", "--json", stdout=io.StringIO(), stderr=err)
+        self.assertIn("200 rows in api_task_entry", err.getvalue())
+        self.assertFalse(Entry.objects.exists())
+        self.assertFalse(Book.objects.exists())
@@ -0,0 +1,74 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from api_task.ingestion import flush_pending
+from api_task.models import Book, CustomUser, Entry, Library, PendingEntry
+
+ASYNC = {"HTTP_PREFER": "respond-async"}
+
+
+@override_settings(ENTRY_BUFFER_CHECK_INTERVAL=0)
+class BufferedIngestionTest(TestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create_superuser(username='admin', email='admin@example.com')
+        self.library = Library.objects.create(name='Test Library')
+        self.book = Book.objects.create(title='Test Book')
+        self.client.force_login(self.admin)
+
+    def post(self, data):
+        return self.client.post(reverse('entry-create'), data, content_type='application/json', **ASYNC)
+
+    def entry(self, **kwargs):
+        return {'user': self.admin.pk, 'library': self.library.pk, 'book': self.book.pk, **kwargs}
+
+    def test_buffered_create_returns_202(self):
+        response = self.post([self.entry(), self.entry()])
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json(), {'accepted': 2})
+        self.assertEqual(PendingEntry.objects.count(), 2)
+        self.assertFalse(Entry.objects.exists())
+
+    def test_invalid_payload(self):
+        response = self.post({'user': self.admin.pk, 'library': 'x'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(PendingEntry.objects.exists())
+
+    def test_flush_inserts_and_rejects(self):
+        self.post([self.entry(), self.entry(book=999999)])
+        received_at = PendingEntry.objects.order_by('id').first().received_at
+
+        result = flush_pending()
+
+        self.assertEqual((result.inserted, result.rejected), (1, 1))
+        self.assertEqual(Entry.objects.get().date_added, received_at)
+        failed = PendingEntry.objects.get()
+        self.assertEqual(failed.error, 'This entry must have a valid book.')
+        self.assertEqual(flush_pending().processed, 0)
+
+    def test_status_endpoint(self):
+        self.post([self.entry(), self.entry()])
+        response = self.client.get(reverse('entry-ingest-status'))
+        self.assertEqual(response.json()['pending'], 2)
+        self.assertEqual(response.json()['failed'], 0)
+
+    @override_settings(ENTRY_BUFFER_MAX_PENDING=2)
+    def test_back_pressure(self):
+        self.assertEqual(self.post([self.entry(), self.entry()]).status_code, 202)
+        response = self.post(self.entry())
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+
+    def test_flush_command(self):
+        self.post(self.entry())
+        out = StringIO()
+        call_command('flush_entries', stdout=out)
+        self.assertIn('Inserted 1 entries', out.getvalue())
+        self.assertEqual(Entry.objects.count(), 1)
+
+    def test_synchronous_create_is_unchanged(self):
+        response = self.client.post(reverse('entry-create'), self.entry())
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Entry.objects.count(), 1)
@@ -0,0 +1,104 @@
+import asyncio
+import io
+import json
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.test import LiveServerTestCase, SimpleTestCase
+
+from api_task import loadtest
+from api_task.models import Book, CustomUser, Entry, Library
+from api_task.registry import user_types
+
+
+class LoadTestUnitTest(SimpleTestCase):
+    def test_parse_mix(self):
+        self.assertEqual(loadtest.parse_mix("book-list=3, entry-create"), {"book-list": 3.0, "entry-create": 1.0})
+        with self.assertRaises(ValueError):
+            loadtest.parse_mix("book-list=1,unknown=2")
+        with self.assertRaises(ValueError):
+            loadtest.parse_mix("book-list=0")
+
+    def test_read_chunked_response(self):
+        async def read():
+            reader = asyncio.StreamReader()
+            reader.feed_data(b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n5\r\nhello\r\n6\r\n world\r\n0\r\n\r\n")
+            return await loadtest.read_response(reader)
+
+        self.assertEqual(asyncio.run(read()), (200, b"hello world"))
+
+    def test_summary_percentiles(self):
+        results = [loadtest.Result("book-list", 200, ms / 1000) for ms in range(1, 101)]
+        results.append(loadtest.Result("entry-create", 403, 0.005))
+        results.append(loadtest.Result("entry-create", 0, 0.0, "OSError: refused"))
+        summary = loadtest.summarize(results, elapsed=2.0)
+
+        self.assertEqual((summary["requests"], summary["errors"]), (102, 2))
+        self.assertEqual(summary["throughput_rps"], 50.0)
+        books = summary["scenarios"]["book-list"]["latency_ms"]
+        self.assertEqual((books["p50"], books["p95"], books["p99"], books["max"]), (51.0, 96.0, 100.0, 100.0))
+        # Requests without a response have no latency
+        self.assertEqual(summary["scenarios"]["entry-create"]["latency_ms"]["max"], 5.0)
+        self.assertEqual(summary["scenarios"]["entry-create"]["statuses"], {"403": 1, "0": 1})
+        self.assertEqual(summary["error_samples"], ["OSError: refused"])
+
+    def test_compare(self):
+        old = loadtest.summarize([loadtest.Result("book-list", 200, 0.010)] * 10, elapsed=1.0)
+        new = loadtest.summarize([loadtest.Result("book-list", 200, 0.015)] * 20, elapsed=1.0)
+        comparison = loadtest.compare(new, old)
+        self.assertEqual((comparison["throughput_rps"], comparison["p99"]), (100.0, 50.0))
+        self.assertEqual(comparison["scenarios"]["book-list"]["p50"], 50.0)
+
+
+class LoadTestCommandTest(LiveServerTestCase):
+    def setUp(self):
+        # The tables are flushed between tests, with the cached user types
+        user_types.invalidate()
+        self.addCleanup(user_types.invalidate)
+        self.admin = CustomUser.objects.create_user(
+            username="admin", email="admin@example.com", password="password", is_staff=True
+        )
+        self.user = CustomUser.objects.create_user(username="reader", email="reader@example.com", password="password")
+        self.library = Library.objects.create(name="City Library")
+        self.book = Book.objects.create(title="Test Book")
+        self.library.books.add(self.book)
+
+    def loadtest(self, *args):
+        out = io.StringIO()
+        call_command(
+            "loadtest", self.live_server_url, "--user", "admin:password", "--user", "reader:password",
+            "--duration", "1", *args, stdout=out, stderr=io.StringIO(),
+        )
+        return json.loads(out.getvalue())
+
+    def test_open_loop(self):
+        report = self.loadtest("--rate", "40", "--concurrency", "4")
+        self.assertEqual(report["mode"], "open")
+        self.assertGreaterEqual(report["requests"], 35)
+        self.assertEqual(set(report["scenarios"]), set(loadtest.SCENARIOS))
+        # entry-create is refused for the user without staff rights only
+        for name, scenario in report["scenarios"].items():
+            statuses = set(scenario["statuses"]) - {"403"} if name == "entry-create" else set(scenario["statuses"])
+            self.assertTrue(statuses <= {"200", "201"}, (name, scenario["statuses"]))
+        self.assertIsNotNone(report["latency_ms"]["p99"])
+        self.assertTrue(Entry.objects.filter(user=self.admin).exists())
+
+    def test_closed_loop_and_comparison(self):
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = os.path.join(directory, "baseline.json")
+            self.loadtest("--mix", "book-list", "--concurrency", "2", "--output", baseline)
+            report = self.loadtest("--mix", "book-list", "--compare", baseline, "--label", "candidate")
+
+        self.assertEqual((report["mode"], report["label"], report["error_rate"]), ("closed", "candidate", 0.0))
+        self.assertGreater(report["throughput_rps"], 0)
+        self.assertIn("p95", report["comparison"])
+
+    def test_entry_update_is_dropped_without_entries(self):
+        out, err = io.StringIO(), io.StringIO()
+        call_command(
+            "loadtest", self.live_server_url, "--user", "reader:password", "--mix", "book-list,entry-update",
+            "--duration", "0.2", stdout=out, stderr=err,
+        )
+        self.assertEqual(list(json.loads(out.getvalue())["mix"]), ["book-list"])
+        self.assertIn("entry-update dropped", err.getvalue())
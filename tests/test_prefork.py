@@ -0,0 +1,64 @@
+import os
+import signal
+import urllib.request
+
+from django.db import connection, connections
+from django.test import SimpleTestCase, TransactionTestCase
+
+from testTaskproject.prefork import PreforkServer, current_rss_kb, process_age, process_memory, warm_application
+
+
+class PreforkServerTest(TransactionTestCase):
+    def test_warm_application_closes_connections(self):
+        application = warm_application()
+        self.assertTrue(callable(application))
+        # Nothing opened while warming may be shared with forked workers
+        self.assertIsNone(connection.connection)
+
+    def test_serves_and_recycles_workers(self):
+        listener = PreforkServer.bind("127.0.0.1", 0)
+        port = listener.getsockname()[1]
+        output, output_in = os.pipe()
+        connections.close_all()
+
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                os.close(output)
+                with os.fdopen(output_in, "w") as stdout:
+                    PreforkServer(listener, workers=1, max_requests=2, stdout=stdout).run()
+            except BaseException:
+                status = 1
+            finally:
+                os._exit(status)
+
+        os.close(output_in)
+        listener.close()
+        lines = os.fdopen(output)
+        try:
+            self.assertIn("Application warmed", lines.readline())
+            self.assertIn("1 workers ready, cold start", lines.readline())
+
+            for _ in range(3):
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/health/", timeout=10) as response:
+                    self.assertEqual(response.read(), b'{"status":"ok"}')
+            self.assertIn("Recycling worker", lines.readline())
+        finally:
+            os.kill(pid, signal.SIGTERM)
+            _, status = os.waitpid(pid, 0)
+            rest = lines.read()
+            lines.close()
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+        self.assertIn("Server stopped", rest)
+
+
+class ProcessMemoryTest(SimpleTestCase):
+    def test_reads_proc(self):
+        if not os.path.exists("/proc/self/smaps_rollup"):
+            self.skipTest("/proc is not available")
+        memory = process_memory(os.getpid())
+        self.assertGreater(memory["rss_kb"], 0)
+        self.assertLessEqual(memory["pss_kb"], memory["rss_kb"])
+        self.assertGreater(current_rss_kb(), 0)
+        self.assertGreater(process_age(), 0)
@@ -0,0 +1,170 @@
+import io
+import json
+import os
+import pstats
+import shutil
+import tempfile
+import tracemalloc
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from api_task.models import Book, CustomUser, Library
+from api_task.profiling import read_reports, report_files, summarize_memory
+from api_task.tokens import issue_token
+
+PROFILE_HEADER = {"HTTP_X_PROFILE_MEMORY": "1"}
+
+
+class MemoryProfileTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        override = override_settings(MEMORY_PROFILE_DIR=self.directory, MEMORY_PROFILE_SAMPLE_RATE=0.0)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.admin = CustomUser.objects.create_user(username="admin", email="admin@example.com", is_staff=True)
+        self.user = CustomUser.objects.create_user(username="user", email="user@example.com")
+        library = Library.objects.create(name="City Library")
+        library.books.add(*[Book.objects.create(title=f"Book {i}") for i in range(20)])
+
+    def reports(self):
+        return read_reports(report_files(self.directory, "memory"))
+
+    def test_header_profiles_admin_requests(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse("library-list"), **PROFILE_HEADER)
+        self.assertEqual(response.status_code, 200)
+
+        report, = self.reports()
+        self.assertEqual(report["url_name"], "library-list")
+        self.assertEqual(report["trigger"], "header")
+        self.assertEqual(report["user"], self.admin.pk)
+        self.assertGreater(report["peak_bytes"], 0)
+        self.assertTrue(report["top"])
+        self.assertTrue(all(site["size"] > 0 for site in report["sites"]))
+        # Tracing stops with the request
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_header_accepts_bearer_tokens(self):
+        token, _ = issue_token(self.admin)
+        self.client.get(reverse("book-list"), HTTP_AUTHORIZATION=f"Bearer {token}", **PROFILE_HEADER)
+        report, = self.reports()
+        self.assertEqual(report["url_name"], "book-list")
+
+    def test_header_is_ignored_for_other_users(self):
+        self.client.get(reverse("book-list"), **PROFILE_HEADER)
+        self.client.force_login(self.user)
+        self.client.get(reverse("book-list"), **PROFILE_HEADER)
+        self.assertEqual(self.reports(), [])
+
+    def test_sampled_requests_are_profiled(self):
+        self.client.force_login(self.user)
+        with override_settings(MEMORY_PROFILE_SAMPLE_RATE=1.0):
+            self.client.get(reverse("book-list"))
+        report, = self.reports()
+        self.assertEqual(report["trigger"], "sample")
+
+        self.client.get(reverse("book-list"))
+        self.assertEqual(len(self.reports()), 1)
+
+    def test_old_reports_are_pruned(self):
+        self.client.force_login(self.admin)
+        with override_settings(MEMORY_PROFILE_KEEP=2):
+            for _ in range(3):
+                self.client.get(reverse("book-list"), **PROFILE_HEADER)
+        self.assertEqual(len(report_files(self.directory, "memory")), 2)
+
+    def test_summary_groups_by_url_name(self):
+        site = {"site": "api_task/serializers.py:10", "size": 100, "count": 1}
+        reports = [
+            {"url_name": "library-list", "path": "/a", "peak_bytes": 300, "allocated_bytes": 100, "sites": [site]},
+            {"url_name": "library-list", "path": "/b", "peak_bytes": 500, "allocated_bytes": 100, "sites": [site]},
+            {"url_name": "book-list", "path": "/c", "peak_bytes": 50, "allocated_bytes": 10, "sites": []},
+        ]
+        libraries, books = summarize_memory(reports)
+        self.assertEqual(libraries["url_name"], "library-list")
+        self.assertEqual((libraries["count"], libraries["max_peak_bytes"], libraries["mean_peak_bytes"]), (2, 500, 400))
+        self.assertEqual(libraries["path"], "/b")
+        self.assertEqual(libraries["sites"], [{"site": "api_task/serializers.py:10", "size": 200}])
+        self.assertEqual(books["count"], 1)
+
+    def test_report_command(self):
+        self.client.force_login(self.admin)
+        self.client.get(reverse("library-list"), **PROFILE_HEADER)
+        out = io.StringIO()
+        call_command("memory_profile_report", "--json", stdout=out)
+        summary, = json.loads(out.getvalue())
+        self.assertEqual(summary["url_name"], "library-list")
+
+
+class CPUProfileTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        override = override_settings(CPU_PROFILE_DIR=self.directory, CPU_PROFILE_INTERVAL=0.0005)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.admin = CustomUser.objects.create_user(username="admin", email="admin@example.com", is_staff=True)
+        self.user = CustomUser.objects.create_user(username="user", email="user@example.com")
+        library = Library.objects.create(name="City Library")
+        library.books.add(*[Book.objects.create(title=f"Book {i}") for i in range(50)])
+
+    def reports(self):
+        return read_reports(report_files(self.directory, "cpu"))
+
+    def test_query_parameter_samples_stacks(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse("library-list"), {"profile": "1"})
+        self.assertEqual(response.status_code, 200)
+
+        report, = self.reports()
+        self.assertEqual((report["url_name"], report["mode"]), ("library-list", "sample"))
+        self.assertEqual(report["trigger"], "param")
+        self.assertGreater(report["samples"], 0)
+        collapsed, = report["files"]
+        with open(os.path.join(self.directory, collapsed)) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(sum(int(line.rsplit(" ", 1)[1]) for line in lines), report["samples"])
+        self.assertTrue(all("api_task.profiling" not in line for line in lines))
+
+    def test_header_runs_cprofile(self):
+        token, _ = issue_token(self.admin)
+        self.client.get(reverse("book-list"), HTTP_AUTHORIZATION=f"Bearer {token}", HTTP_X_PROFILE_CPU="cprofile")
+
+        report, = self.reports()
+        self.assertEqual((report["mode"], report["trigger"]), ("cprofile", "header"))
+        self.assertGreater(report["calls"], 0)
+        prof = next(name for name in report["files"] if name.endswith(".prof"))
+        stats = pstats.Stats(os.path.join(self.directory, prof))
+        self.assertEqual(stats.total_calls, report["calls"])
+
+    def test_other_users_are_not_profiled(self):
+        self.client.get(reverse("book-list"), {"profile": "1"})
+        self.client.force_login(self.user)
+        self.client.get(reverse("book-list"), {"profile": "1"}, HTTP_X_PROFILE_CPU="1")
+        self.assertEqual(self.reports(), [])
+
+    def test_index_lists_profiles(self):
+        self.client.force_login(self.admin)
+        self.client.get(reverse("book-list"), {"profile": "1"})
+        report, = self.reports()
+        name = os.path.basename(report_files(self.directory, "cpu")[0])
+
+        response = self.client.get(reverse("profile-index"))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, reverse("profile-file", args=["cpu", name]))
+        self.assertContains(response, reverse("profile-file", args=["cpu", report["files"][0]]))
+
+        response = self.client.get(reverse("profile-file", args=["cpu", report["files"][0]]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(reverse("profile-file", args=["cpu", "missing.json"])).status_code, 404)
+        self.assertEqual(self.client.get(reverse("profile-file", args=["other", name])).status_code, 404)
+
+    def test_index_is_for_admins_only(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("profile-index"))
+        self.assertEqual(response.status_code, 302)
@@ -0,0 +1,93 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth.hashers import check_password
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from api_task.models import CustomUser, UserType
+from api_task.provisioning import CSV, NDJSON, provision_users, read_rows
+
+FAST_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ProvisionUsersTest(TestCase):
+    def setUp(self):
+        self.staff_type = UserType.objects.create(name='staff')
+        CustomUser.objects.create(username='existing', email='existing@example.com')
+
+    def test_create_users_in_parallel(self):
+        # Hash with two worker processes and insert everything in one batch
+        rows = [
+            {"username": f"user{i}", "email": f"user{i}@example.com", "password": "Correct-Horse-42"}
+            for i in range(4)
+        ]
+        result = provision_users(rows, workers=2)
+
+        self.assertEqual(result.created, 4)
+        self.assertEqual(result.errors, [])
+        user = CustomUser.objects.get(username='user3')
+        self.assertTrue(check_password("Correct-Horse-42", user.password))
+        self.assertEqual(user.type.name, UserType.USER)
+
+    def test_row_errors_are_reported(self):
+        rows = read_rows(StringIO(
+            "username,email,password,type\n"
+            "good,good@example.com,Correct-Horse-42,staff\n"
+            "existing,other@example.com,Correct-Horse-42,\n"
+            "bad-email,not-an-email,Correct-Horse-42,\n"
+            "good,dup@example.com,Correct-Horse-42,\n"
+            "typed,typed@example.com,Correct-Horse-42,unknown\n"
+            "weak,weak@example.com,123,\n"
+        ), CSV)
+        result = provision_users(rows, workers=1)
+
+        self.assertEqual(result.created, 1)
+        self.assertEqual(CustomUser.objects.get(username='good').type, self.staff_type)
+        self.assertEqual([error["row"] for error in result.errors], [2, 3, 4, 5, 6])
+        self.assertIn("username", result.errors[0]["errors"])
+        self.assertIn("email", result.errors[1]["errors"])
+        self.assertIn("username", result.errors[2]["errors"])
+        self.assertIn("type", result.errors[3]["errors"])
+        self.assertIn("password", result.errors[4]["errors"])
+
+    def test_invalid_ndjson_line(self):
+        rows = read_rows(StringIO('{"username": "a", "email": "a@example.com"}\nnot json\n'), NDJSON)
+        result = provision_users(rows, workers=1)
+
+        self.assertEqual(result.created, 1)
+        self.assertFalse(CustomUser.objects.get(username='a').has_usable_password())
+        self.assertEqual(result.errors[0]["row"], 2)
+
+    def test_management_command(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".ndjson", delete=False) as handle:
+            handle.write(json.dumps({"username": "cli", "email": "cli@example.com"}) + "\n")
+        self.addCleanup(os.remove, handle.name)
+
+        out = StringIO()
+        call_command("provision_users", handle.name, "--workers", "1", stdout=out)
+
+        self.assertIn("Created 1 users", out.getvalue())
+        self.assertTrue(CustomUser.objects.filter(username='cli').exists())
+
+    def test_bulk_endpoint_requires_admin(self):
+        user = CustomUser.objects.get(username='existing')
+        self.client.force_login(user)
+        response = self.client.post(reverse('user-bulk-create'), "username,email\n", content_type="text/csv")
+        self.assertEqual(response.status_code, 403)
+
+    def test_bulk_endpoint(self):
+        admin = CustomUser.objects.create_superuser(username='admin', email='admin@example.com')
+        self.client.force_login(admin)
+        body = "username,email,password\napi,api@example.com,Correct-Horse-42\n"
+
+        with override_settings(USER_PROVISIONING_WORKERS=1):
+            response = self.client.post(reverse('user-bulk-create'), body, content_type="text/csv")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["created"], 1)
+        self.assertTrue(CustomUser.objects.filter(username='api').exists())
@@ -0,0 +1,102 @@
+import datetime
+import io
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from api_task.ingestion import enqueue_entries, flush_pending
+from api_task.models import Book, CustomUser, Entry, Library, LibraryBookDailyUsage, UserDailyUsage
+
+
+class UsageRollupTest(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='testuser', email='test@example.com')
+        self.library = Library.objects.create(name='Test Library')
+        self.other_library = Library.objects.create(name='Other Library')
+        self.book = Book.objects.create(title='Test Book')
+        self.other_book = Book.objects.create(title='Other Book')
+        self.today = timezone.localdate()
+
+    def usage(self, library, book):
+        return LibraryBookDailyUsage.objects.get(library=library, book=book, day=self.today).entries
+
+    def test_created_entries_are_counted(self):
+        Entry.objects.create(user=self.user, library=self.library, book=self.book)
+        Entry.objects.create(user=self.user, library=self.library, book=self.book)
+
+        self.assertEqual(self.usage(self.library, self.book), 2)
+        self.assertEqual(UserDailyUsage.objects.get(user=self.user, day=self.today).entries, 2)
+
+    def test_updated_entry_moves_count(self):
+        Entry.objects.create(user=self.user, library=self.library, book=self.book)
+        entry = Entry.objects.get()
+        entry.library = self.other_library
+        entry.save()
+
+        self.assertEqual(self.usage(self.library, self.book), 0)
+        self.assertEqual(self.usage(self.other_library, self.book), 1)
+
+    def test_flushed_entries_are_counted(self):
+        enqueue_entries([{'user': self.user.pk, 'library': self.library.pk, 'book': self.book.pk}] * 3)
+        flush_pending()
+        self.assertEqual(self.usage(self.library, self.book), 3)
+
+    def test_rebuild(self):
+        yesterday = timezone.now() - datetime.timedelta(days=1)
+        Entry.objects.create(user=self.user, library=self.library, book=self.book, date_added=yesterday)
+        Entry.objects.create(user=self.user, library=self.library, book=self.book)
+        LibraryBookDailyUsage.objects.all().delete()
+        UserDailyUsage.objects.update(entries=100)
+
+        out = io.StringIO()
+        call_command('rebuild_rollups', stdout=out)
+
+        self.assertIn("Usage rollups rebuilt", out.getvalue())
+        self.assertEqual(self.usage(self.library, self.book), 1)
+        self.assertEqual(
+            LibraryBookDailyUsage.objects.get(day=timezone.localdate(yesterday)).entries, 1
+        )
+        self.assertEqual(UserDailyUsage.objects.get(day=self.today).entries, 1)
+
+    def test_rebuild_day_range_keeps_other_days(self):
+        Entry.objects.create(user=self.user, library=self.library, book=self.book)
+        LibraryBookDailyUsage.objects.update(entries=100)
+        yesterday = self.today - datetime.timedelta(days=1)
+
+        out = io.StringIO()
+        call_command('rebuild_rollups', '--end', yesterday.isoformat(), stdout=out)
+
+        self.assertIn("Usage rollups rebuilt", out.getvalue())
+        self.assertEqual(self.usage(self.library, self.book), 100)
+
+    def test_usage_endpoints(self):
+        for book in (self.book, self.book, self.other_book):
+            Entry.objects.create(user=self.user, library=self.library, book=book)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('library-usage'), {'library': self.library.pk})
+        self.assertEqual(response.json(), [{
+            'library': self.library.pk,
+            'library__name': 'Test Library',
+            'day': self.today.isoformat(),
+            'total': 3,
+        }])
+
+        response = self.client.get(reverse('top-books'), {'limit': 1})
+        self.assertEqual(response.json(), [{'book': self.book.pk, 'book__title': 'Test Book', 'total': 2}])
+
+    def test_user_usage_requires_admin(self):
+        response = self.client.get(reverse('user-usage'))
+        self.assertIn(response.status_code, (401, 403))
+
+        admin = CustomUser.objects.create_superuser(username='admin', email='admin@example.com')
+        self.client.force_login(admin)
+        Entry.objects.create(user=self.user, library=self.library, book=self.book)
+        response = self.client.get(reverse('user-usage'), {'user': self.user.pk})
+        self.assertEqual(response.json()[0]['total'], 1)
+
+    def test_invalid_range(self):
+        response = self.client.get(reverse('library-usage'), {'start': '2024-02-01', 'end': '2024-01-01'})
+        self.assertEqual(response.status_code, 400)
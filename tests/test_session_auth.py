@@ -0,0 +1,61 @@
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+
+from api_task.backends import user_cache
+from api_task.models import CustomUser, UserType
+
+
+class DashboardViewTest(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username='testuser', email='test@example.com', password='Correct-Horse-42'
+        )
+
+    def test_login_and_dashboard(self):
+        response = self.client.post(
+            reverse('user-login'), {'username': 'testuser', 'password': 'Correct-Horse-42'}
+        )
+        self.assertRedirects(response, reverse('dashboard'))
+
+        # Signed-cookie session plus one query loading the user and its type
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('dashboard'))
+        self.assertContains(response, 'User Type: user')
+
+    def test_anonymous_dashboard_redirects_to_login(self):
+        response = self.client.get(reverse('dashboard'))
+        self.assertRedirects(response, reverse('user-login'))
+
+
+class CachedUserLoadingTest(TransactionTestCase):
+    def setUp(self):
+        user_cache.invalidate()
+        self.user = CustomUser.objects.create_user(
+            username='testuser', email='test@example.com', password='Correct-Horse-42'
+        )
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        user_cache.invalidate()
+
+    def test_cached_user_needs_no_query(self):
+        self.client.get(reverse('dashboard'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('dashboard'))
+        self.assertContains(response, 'User Type: user')
+
+    def test_user_save_invalidates_cache(self):
+        self.client.get(reverse('dashboard'))
+        self.user.type = UserType.objects.create(name='staff')
+        self.user.save()
+
+        response = self.client.get(reverse('dashboard'))
+        self.assertContains(response, 'User Type: staff')
+
+    def test_inactive_user_is_logged_out(self):
+        self.client.get(reverse('dashboard'))
+        self.user.is_active = False
+        self.user.save()
+
+        response = self.client.get(reverse('dashboard'))
+        self.assertRedirects(response, reverse('user-login'))
@@ -0,0 +1,225 @@
+import datetime
+import io
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.db import connections
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from api_task import rollups, sharding
+from api_task.ingestion import enqueue_entries, flush_pending
+from api_task.partitions import add_months, create_partition, list_partitions
+from api_task.models import (
+    Author, Book, BookAuthor, Change, CustomUser, Entry, Library, LibraryBookDailyUsage, LibraryShard, UserDailyUsage,
+)
+
+SHARDS = ['shard_1', 'shard_2']
+
+
+@override_settings(SHARD_DATABASES=SHARDS)
+class ShardingTest(TestCase):
+    databases = {'default', *SHARDS}
+
+    def setUp(self):
+        sharding.invalidate()
+        self.addCleanup(sharding.invalidate)
+        # Foreign keys are checked as rows are written, not at a commit
+        # that never comes in a test
+        for alias in self.databases:
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+        self.user = CustomUser.objects.create_user(username='testuser', email='test@example.com', is_staff=True)
+        self.author = Author.objects.create(name='John Doe', birth_year=1980)
+        self.book = Book.objects.create(title='Test Book')
+        BookAuthor.objects.create(book=self.book, author=self.author)
+        self.library = Library.objects.create(name='Test Library')
+        self.other_library = Library.objects.create(name='Other Library')
+        self.library.books.add(self.book)
+        self.other_library.books.add(self.book)
+
+    def test_catalog_is_replicated(self):
+        for alias in SHARDS:
+            self.assertTrue(CustomUser.objects.using(alias).filter(pk=self.user.pk).exists())
+            self.assertEqual(Book.objects.using(alias).get(pk=self.book.pk).title, 'Test Book')
+            self.assertEqual(list(Book.objects.using(alias).get(pk=self.book.pk).authors.all()), [self.author])
+
+        self.book.title = 'Renamed'
+        self.book.save()
+        self.assertEqual(Book.objects.using('shard_2').get(pk=self.book.pk).title, 'Renamed')
+
+    def test_libraries_are_placed_by_id(self):
+        shard = sharding.library_shard(self.library.pk)
+        self.assertEqual(shard, SHARDS[self.library.pk % 2])
+        self.assertEqual(LibraryShard.objects.get(library=self.library).shard, shard)
+        self.assertTrue(Library.objects.using(shard).filter(pk=self.library.pk).exists())
+        self.assertNotEqual(shard, sharding.library_shard(self.other_library.pk))
+
+        # Memberships live on the shard only, and are read from there
+        self.assertEqual(Library.books.through.objects.using(shard).filter(library=self.library).count(), 1)
+        self.assertFalse(Library.books.through.objects.using('default').exists())
+        self.assertEqual(list(self.library.books.all()), [self.book])
+
+    def test_entries_are_written_to_their_library_shard(self):
+        entry = Entry.objects.create(user=self.user, library=self.library, book=self.book)
+        shard = sharding.library_shard(self.library.pk)
+        self.assertEqual(entry._state.db, shard)
+        self.assertTrue(Entry.objects.using(shard).filter(pk=entry.pk).exists())
+        self.assertFalse(Entry.objects.using('default').exists())
+        # Side effects stay on the global database
+        self.assertTrue(Change.objects.filter(kind='entries', object_id=entry.pk).exists())
+
+    def test_entry_ids_are_unique_across_shards(self):
+        entries = [
+            Entry.objects.create(user=self.user, library=library, book=self.book)
+            for library in (self.library, self.other_library, self.library, self.other_library)
+        ]
+        self.assertEqual({entry._state.db for entry in entries}, set(SHARDS))
+        self.assertEqual(len({entry.pk for entry in entries}), 4)
+
+    def test_update_finds_entry_on_its_shard(self):
+        entry = Entry.objects.create(user=self.user, library=self.library, book=self.book)
+        other_book = Book.objects.create(title='Other Book')
+        self.client.force_login(self.user)
+        url = reverse('entry-update', args=[entry.pk])
+        data = {'user': self.user.pk, 'library': self.library.pk, 'book': other_book.pk}
+        response = self.client.put(url, data, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        shard = sharding.library_shard(self.library.pk)
+        self.assertEqual(Entry.objects.using(shard).get(pk=entry.pk).book, other_book)
+
+        # Moving the entry to a library on the other shard moves its row
+        data['library'] = self.other_library.pk
+        response = self.client.put(url, data, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Entry.objects.using(shard).filter(pk=entry.pk).exists())
+        moved = Entry.objects.using(sharding.library_shard(self.other_library.pk)).get(pk=entry.pk)
+        self.assertEqual(moved.library, self.other_library)
+        self.assertEqual(Change.objects.filter(kind='entries', object_id=entry.pk, action=Change.DELETE).count(), 0)
+
+        response = self.client.put(reverse('entry-update', args=[entry.pk + 1000]), data, content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+
+    def test_admin_finds_entry_on_its_shard(self):
+        entry = Entry.objects.create(user=self.user, library=self.library, book=self.book)
+        admin = CustomUser.objects.create_superuser(username='admin', email='admin@example.com')
+        self.client.force_login(admin)
+        response = self.client.get(reverse('admin:api_task_entry_change', args=[entry.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Test Book')
+
+    def test_feed_merges_shards(self):
+        entries = [
+            Entry.objects.create(user=self.user, library=library, book=self.book)
+            for library in (self.library, self.other_library, self.library)
+        ]
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('my-entry-feed'), {'limit': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([e['id'] for e in response.data['results']], [entries[2].pk, entries[1].pk])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([e['id'] for e in response.data['results']], [entries[0].pk])
+        self.assertIsNone(response.data['next'])
+
+    def test_flushed_entries_land_on_their_library_shard(self):
+        enqueue_entries([
+            {'user': self.user.pk, 'library': library.pk, 'book': self.book.pk}
+            for library in (self.library, self.other_library, self.library)
+        ])
+        self.assertEqual(flush_pending().inserted, 3)
+
+        self.assertFalse(Entry.objects.using('default').exists())
+        for library, count in ((self.library, 2), (self.other_library, 1)):
+            shard = sharding.library_shard(library.pk)
+            self.assertEqual(Entry.objects.using(shard).filter(library=library).count(), count)
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('my-entry-feed'))
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertEqual(UserDailyUsage.objects.get(user=self.user).entries, 3)
+
+    def test_partition_maintenance_covers_every_shard(self):
+        this_month = datetime.date.today().replace(day=1)
+        out = io.StringIO()
+        call_command('create_entry_partitions', months=6, stdout=out)
+        for alias in ('default', *SHARDS):
+            self.assertIn(add_months(this_month, 6), list_partitions(alias))
+            self.assertIn(f"Created partition for {add_months(this_month, 6):%Y-%m} on {alias}", out.getvalue())
+
+        old_month = add_months(this_month, -30)
+        shard = sharding.library_shard(self.library.pk)
+        create_partition(old_month, using=shard)
+        moment = datetime.datetime.combine(old_month, datetime.time(12), tzinfo=datetime.timezone.utc)
+        Entry.objects.create(user=self.user, library=self.library, book=self.book, date_added=moment)
+        with tempfile.TemporaryDirectory() as archive_dir:
+            call_command('archive_entry_partitions', retention_months=24, archive_dir=archive_dir, stdout=io.StringIO())
+            self.assertEqual(os.listdir(os.path.join(archive_dir, shard)), [f'api_task_entry_y{old_month:%Y}m{old_month:%m}.ndjson.gz'])
+        self.assertNotIn(old_month, list_partitions(shard))
+
+    def test_library_list_fans_out(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('library-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([library['name'] for library in response.data], ['Test Library', 'Other Library'])
+        self.assertEqual([len(library['books']) for library in response.data], [1, 1])
+
+    def test_deleting_catalog_rows_cascades_on_shards(self):
+        entry = Entry.objects.create(user=self.user, library=self.library, book=self.book)
+        self.book.delete()
+        for alias in SHARDS:
+            self.assertFalse(Book.objects.using(alias).exists())
+        self.assertFalse(Entry.objects.using(sharding.library_shard(self.library.pk)).filter(pk=entry.pk).exists())
+        # Logged once, not once per replica
+        self.assertEqual(Change.objects.filter(kind='books', action=Change.DELETE).count(), 1)
+
+    def test_move_library(self):
+        source = sharding.library_shard(self.library.pk)
+        target = sharding.library_shard(self.other_library.pk)
+        entries = [Entry.objects.create(user=self.user, library=self.library, book=self.book) for _ in range(3)]
+        other = Entry.objects.create(user=self.user, library=self.other_library, book=self.book)
+        self.assertNotIn(other.pk, [e.pk for e in entries])
+
+        self.assertEqual(sharding.move_library(self.library.pk, target, batch_size=2), 3)
+        self.assertEqual(sharding.library_shard(self.library.pk), target)
+        self.assertEqual(LibraryShard.objects.get(library=self.library).shard, target)
+        self.assertEqual(
+            set(Entry.objects.using(target).filter(library=self.library).values_list('pk', flat=True)),
+            {e.pk for e in entries},
+        )
+        self.assertFalse(Entry.objects.using(source).exists())
+        self.assertFalse(Library.objects.using(source).filter(pk=self.library.pk).exists())
+        self.assertEqual(list(self.library.books.all()), [self.book])
+
+        # New entries follow the library
+        entry = Entry.objects.create(user=self.user, library=self.library, book=self.book)
+        self.assertEqual(entry._state.db, target)
+
+    def test_rebuild_rollups_counts_shard_entries(self):
+        for library in (self.library, self.other_library, self.library):
+            Entry.objects.create(user=self.user, library=library, book=self.book)
+        LibraryBookDailyUsage.objects.all().delete()
+        UserDailyUsage.objects.update(entries=100)
+
+        rollups.rebuild()
+        self.assertEqual(
+            dict(LibraryBookDailyUsage.objects.values_list('library_id', 'entries')),
+            {self.library.pk: 2, self.other_library.pk: 1},
+        )
+        self.assertEqual(UserDailyUsage.objects.get(user=self.user).entries, 3)
+
+    def test_plan_rebalance(self):
+        loads = {'shard_1': {1: 50, 2: 30, 3: 20}, 'shard_2': {4: 10}}
+        self.assertEqual(sharding.plan_rebalance(loads), [(1, 'shard_1', 'shard_2')])
+        self.assertEqual(sharding.plan_rebalance({'shard_1': {1: 10}, 'shard_2': {2: 10}}), [])
+        # A single large library cannot be split
+        self.assertEqual(sharding.plan_rebalance({'shard_1': {1: 100}, 'shard_2': {}}), [])
+
+    def test_command_moves_library(self):
+        target = sharding.library_shard(self.other_library.pk)
+        Entry.objects.create(user=self.user, library=self.library, book=self.book)
+        out = io.StringIO()
+        call_command('rebalance_shards', '--move', str(self.library.pk), target, stdout=out)
+        self.assertIn(f'Moved library {self.library.pk}', out.getvalue())
+        self.assertEqual(sharding.library_shard(self.library.pk), target)
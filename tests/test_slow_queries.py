@@ -0,0 +1,106 @@
+import io
+import json
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from api_task import slow_queries
+from api_task.models import Author, Book, BookAuthor, CustomUser
+
+
+class SlowQueryLogTest(TestCase):
+    def setUp(self):
+        self.log_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.log_dir.cleanup)
+        self.log_file = os.path.join(self.log_dir.name, 'slow.log')
+        # Every query counts as slow
+        override = override_settings(SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_LOG_FILE=self.log_file)
+        override.enable()
+        self.addCleanup(override.disable)
+        # Records still pending are written before the settings are restored
+        self.addCleanup(slow_queries.flush, 10)
+
+        self.user = CustomUser.objects.create_user(username='testuser', email='test@example.com')
+        self.client.force_login(self.user)
+        author = Author.objects.create(name='John Doe', birth_year=1980)
+        book = Book.objects.create(title='Secret Title')
+        BookAuthor.objects.create(book=book, author=author)
+
+    def records(self):
+        slow_queries.flush(timeout=10)
+        return slow_queries.read_records(slow_queries.log_files(self.log_file))
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            slow_queries.fingerprint('SELECT "t"."id" FROM "t" WHERE "t"."id" IN (%s, %s, %s)\n  AND name = \'x\' LIMIT 21'),
+            'SELECT "t"."id" FROM "t" WHERE "t"."id" IN (...) AND name = ? LIMIT ?',
+        )
+        self.assertEqual(
+            slow_queries.fingerprint('INSERT INTO "t" ("a", "b") VALUES (%s, %s), (%s, %s)'),
+            slow_queries.fingerprint('INSERT INTO "t" ("a", "b") VALUES (%s, %s)'),
+        )
+
+    def test_redact(self):
+        self.assertEqual(slow_queries.redact(['secret', 42, None, True, [1, 2]]), ['<str:6>', '<int>', None, True, '<list:2>'])
+
+    def test_connection_is_instrumented(self):
+        self.assertTrue(any(isinstance(w, slow_queries.SlowQueryLogger) for w in connection.execute_wrappers))
+
+    def test_logs_view_serializer_and_plan(self):
+        response = self.client.get(reverse('book-list'))
+        self.assertEqual(response.status_code, 200)
+
+        records = [r for r in self.records() if r['path'] == reverse('book-list')]
+        self.assertTrue(records)
+        self.assertTrue(all(r['view'] == 'api_task.api_views.BookListView' for r in records))
+        by_serializer = [r for r in records if r['serializer']]
+        self.assertTrue(by_serializer)
+        self.assertTrue(all(r['serializer'].startswith('api_task.serializers.') for r in by_serializer))
+
+        book_query = next(r for r in records if r['sql'].startswith('SELECT "api_task_book"'))
+        self.assertEqual(book_query['plan']['Node Type'], 'Seq Scan')
+        self.assertEqual(len(book_query['fingerprint']), 16)
+
+    def test_parameters_are_redacted(self):
+        list(Book.objects.filter(title='Secret Title'))
+        record = next(r for r in self.records() if 'WHERE "api_task_book"."title" = ?' in r['sql'])
+        self.assertEqual(record['params'], ['<str:12>'])
+        self.assertNotIn('Secret Title', json.dumps(record))
+        self.assertIsNone(record['view'])
+
+    def test_each_process_writes_its_own_file(self):
+        list(Book.objects.filter(title='Secret Title'))
+        slow_queries.flush(timeout=10)
+        own = os.path.join(self.log_dir.name, f'slow.{os.getpid()}.log')
+        self.assertEqual(slow_queries.worker_log_file(), own)
+        self.assertTrue(os.path.exists(own))
+        self.assertFalse(os.path.exists(self.log_file))
+
+        # Files of other workers, with a rotated backup, are read as well
+        other = os.path.join(self.log_dir.name, 'slow.1.log')
+        record = {'fingerprint': 'f' * 16, 'sql': 'SELECT ?', 'duration_ms': 1.0}
+        for name in (other, other + '.1'):
+            with open(name, 'w') as f:
+                f.write(json.dumps(record) + '\n')
+        open(os.path.join(self.log_dir.name, 'slow.old.log'), 'w').close()
+        self.assertEqual(slow_queries.log_files(self.log_file), [other + '.1', other, own])
+        self.assertEqual(sum(r['fingerprint'] == 'f' * 16 for r in self.records()), 2)
+
+    def test_report_ranks_by_total_time(self):
+        for _ in range(3):
+            list(Book.objects.filter(title='Secret Title'))
+        records = self.records()
+        summary = slow_queries.summarize(records, top=5)
+        self.assertLessEqual(len(summary), 5)
+        totals = [query['total_ms'] for query in summary]
+        self.assertEqual(totals, sorted(totals, reverse=True))
+        book_query = next(q for q in slow_queries.summarize(records, top=100) if 'WHERE "api_task_book"."title" = ?' in q['sql'])
+        self.assertEqual(book_query['count'], 3)
+
+        out = io.StringIO()
+        call_command('slow_query_report', '--file', self.log_file, '--json', stdout=out)
+        self.assertEqual(json.loads(out.getvalue())[0]['fingerprint'], summary[0]['fingerprint'])
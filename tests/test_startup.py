@@ -0,0 +1,73 @@
+import io
+import json
+import os
+import tempfile
+
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase
+
+from api_task.startup import StartupProfile, parse_importtime
+
+IMPORTTIME = """\
+import time: self [us] | cumulative | imported package
+import time:       100 |        100 |     c
+import time:        50 |        150 |   b
+import time:        20 |         20 |   d
+import time:        30 |        200 | a
+import time:        10 |         10 | a.e
+"""
+
+
+class ParseImporttimeTest(SimpleTestCase):
+    def test_tree(self):
+        roots = parse_importtime(IMPORTTIME)
+        self.assertEqual([node.name for node in roots], ["a", "a.e"])
+
+        a = roots[0]
+        self.assertEqual([child.name for child in a.children], ["b", "d"])
+        self.assertEqual(a.children[0].children[0].name, "c")
+        self.assertEqual(a.cumulative_us, 200)
+
+    def test_package_totals(self):
+        profile = StartupProfile(0, 0, 0, "200 OK", parse_importtime(IMPORTTIME))
+        self.assertEqual(profile.package_totals(), {"c": 0.1, "b": 0.05, "a": 0.04, "d": 0.02})
+
+
+class ProfileStartupCommandTest(SimpleTestCase):
+    def test_profile_and_baseline(self):
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = os.path.join(directory, "startup.json")
+            out = io.StringIO()
+            call_command(
+                "profile_startup", "--runs=1", "--json", f"--baseline={baseline}", stdout=out, stderr=io.StringIO()
+            )
+            result = json.loads(out.getvalue())
+            self.assertEqual(result["status"], "200 OK")
+            self.assertGreater(result["first_response_ms"], result["wsgi_import_ms"])
+            self.assertIn("django", result["packages"])
+            self.assertIn("api_task.api_views", [node["name"] for node in result["imports"]])
+
+            # The first run recorded the baseline; pretend it was much faster
+            with open(baseline) as f:
+                recorded = json.load(f)
+            self.assertEqual(recorded["first_response_ms"], result["first_response_ms"])
+            recorded["first_response_ms"] = 1.0
+            with open(baseline, "w") as f:
+                json.dump(recorded, f)
+
+            with self.assertRaisesMessage(CommandError, "Startup regressed"):
+                call_command("profile_startup", "--runs=1", f"--baseline={baseline}", stdout=io.StringIO())
+
+    def test_deferred_imports(self):
+        # Heavy modules only some requests need stay out of a cold start
+        out = io.StringIO()
+        call_command("profile_startup", "--runs=1", "--json", "--min-ms=0", "--depth=50", stdout=out)
+        names = set()
+        stack = json.loads(out.getvalue())["imports"]
+        while stack:
+            node = stack.pop()
+            names.add(node["name"])
+            stack.extend(node.get("children", ()))
+        self.assertIn("api_task.provisioning", names)
+        self.assertNotIn("concurrent.futures.process", names)
+        self.assertNotIn("pyarrow", names)
@@ -0,0 +1,96 @@
+import gzip
+import io
+import os
+import shutil
+import tempfile
+from wsgiref.util import setup_testing_defaults
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+from api_task import static_serving
+from api_task.static_serving import choose_encoding
+from testTaskproject.handlers import StaticWSGIHandler
+
+
+def call_with_headers(app, path, **headers):
+    environ = {"PATH_INFO": path, "HTTP_HOST": "testserver", "wsgi.input": io.BytesIO(), **headers}
+    setup_testing_defaults(environ)
+    started = []
+    response = app(environ, lambda code, response_headers, exc_info=None: started.append((code, response_headers)))
+    body = b"".join(response)
+    response.close()
+    code, response_headers = started[0]
+    return code, dict(response_headers), body
+
+
+class StaticServingTest(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, cls.root)
+        cls.enterClassContext(override_settings(
+            STATIC_ROOT=cls.root,
+            STORAGES={
+                "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+                "staticfiles": {"BACKEND": "api_task.storage.CompressedManifestStaticFilesStorage"},
+            },
+        ))
+        call_command("collectstatic", interactive=False, verbosity=0)
+        cls.script = staticfiles_storage.stored_name("js/script.js")
+
+    def setUp(self):
+        static_serving.file_variants.cache_clear()
+        static_serving._fingerprinted_names.cache_clear()
+        self.handler = StaticWSGIHandler()
+
+    def test_collectstatic_writes_gzip_variants(self):
+        self.assertNotEqual(self.script, "js/script.js")
+        path = os.path.join(self.root, self.script)
+        with open(path, "rb") as f, gzip.open(path + ".gz") as compressed:
+            self.assertEqual(compressed.read(), f.read())
+
+    def test_serves_precompressed_variant(self):
+        status, headers, body = call_with_headers(
+            self.handler, "/static/" + self.script, HTTP_ACCEPT_ENCODING="gzip, deflate"
+        )
+        self.assertEqual(status, "200 OK")
+        self.assertEqual(headers["Content-Encoding"], "gzip")
+        self.assertEqual(headers["Vary"], "Accept-Encoding")
+        self.assertEqual(headers["Cache-Control"], "public, max-age=31536000, immutable")
+        with open(os.path.join(self.root, self.script), "rb") as f:
+            self.assertEqual(gzip.decompress(body), f.read())
+
+    def test_identity_fallback(self):
+        status, headers, body = call_with_headers(self.handler, "/static/" + self.script, HTTP_ACCEPT_ENCODING="gzip;q=0")
+        self.assertEqual(status, "200 OK")
+        self.assertNotIn("Content-Encoding", headers)
+        with open(os.path.join(self.root, self.script), "rb") as f:
+            self.assertEqual(body, f.read())
+
+    def test_unhashed_name_is_revalidated(self):
+        _, headers, _ = call_with_headers(self.handler, "/static/js/script.js")
+        self.assertEqual(headers["Cache-Control"], "public, max-age=60")
+
+    def test_not_modified(self):
+        _, headers, _ = call_with_headers(self.handler, "/static/" + self.script, HTTP_ACCEPT_ENCODING="gzip")
+        status, _, body = call_with_headers(
+            self.handler, "/static/" + self.script, HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=headers["ETag"]
+        )
+        self.assertEqual(status, "304 Not Modified")
+        self.assertEqual(body, b"")
+
+    def test_missing_and_traversal(self):
+        self.assertEqual(call_with_headers(self.handler, "/static/js/missing.js")[0], "404 Not Found")
+        self.assertEqual(call_with_headers(self.handler, "/static/../manage.py")[0], "404 Not Found")
+
+
+class ChooseEncodingTest(SimpleTestCase):
+    def test_preference_and_quality(self):
+        variants = {"identity": None, "gzip": None, "br": None}
+        self.assertEqual(choose_encoding("gzip, br", variants), "br")
+        self.assertEqual(choose_encoding("gzip, br;q=0.5", variants), "gzip")
+        self.assertEqual(choose_encoding("*", {"identity": None, "gzip": None}), "gzip")
+        self.assertEqual(choose_encoding("", variants), "identity")
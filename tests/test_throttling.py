@@ -0,0 +1,73 @@
+import uuid
+from multiprocessing import resource_tracker
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from api_task.models import CustomUser
+from api_task.throttling import SharedMemoryBucketStore, get_store, parse_rate
+
+
+class SharedMemoryBucketStoreTest(SimpleTestCase):
+    def setUp(self):
+        self.name = f"api_task_test_{uuid.uuid4().hex[:8]}"
+        self.store = SharedMemoryBucketStore(self.name, 64)
+        self.addCleanup(self.unlink)
+
+    def unlink(self):
+        # The store unregisters the segment from the resource tracker, which
+        # SharedMemory.unlink() expects to find it in
+        resource_tracker.register(self.store._shm._name, "shared_memory")
+        self.store._shm.unlink()
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate("120/min"), (120.0, 2.0))
+        self.assertEqual(parse_rate("5/s"), (5.0, 5.0))
+
+    def test_bucket_drains_and_reports_wait(self):
+        self.assertEqual(self.store.consume("key", 2, 1), 0)
+        self.assertEqual(self.store.consume("key", 2, 1), 0)
+        wait = self.store.consume("key", 2, 1)
+        self.assertGreater(wait, 0)
+        self.assertLessEqual(wait, 1)
+
+    def test_buckets_are_shared_between_attachments(self):
+        # A second mapping of the segment, as another worker process would have
+        other = SharedMemoryBucketStore(self.name, 64)
+        self.store.consume("key", 1, 0.001)
+        self.assertGreater(other.consume("key", 1, 0.001), 0)
+        self.assertEqual(other.consume("other-key", 1, 0.001), 0)
+
+    def test_full_table_evicts_oldest_bucket(self):
+        for i in range(200):
+            self.assertEqual(self.store.consume(f"key-{i}", 1, 0.001), 0)
+
+
+@override_settings(API_THROTTLE_RATES={"library-list": {"user": "3/min", "anon": "2/min"}})
+class TokenBucketThrottleTest(TestCase):
+    def setUp(self):
+        get_store().reset()
+        self.addCleanup(get_store().reset)
+
+    def test_anonymous_clients_are_limited_per_ip(self):
+        url = reverse('library-list')
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+
+        # Another IP has its own bucket
+        self.assertEqual(self.client.get(url, REMOTE_ADDR='10.0.0.2').status_code, 200)
+
+    def test_users_are_limited_per_user(self):
+        self.client.force_login(CustomUser.objects.create(username='testuser', email='test@example.com'))
+        url = reverse('library-list')
+        for _ in range(3):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.client.get(url).status_code, 429)
+
+    def test_unlisted_views_are_not_throttled(self):
+        for _ in range(5):
+            self.assertEqual(self.client.get(reverse('book-list')).status_code, 200)
@@ -0,0 +1,149 @@
+import datetime
+import shutil
+import tempfile
+
+from django.core import signing
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from api_task.models import Book, CustomUser, Entry, Library, RevokedToken
+from api_task.tokens import SALT, InvalidToken, check_revocation_cache, issue_token, verify_token
+
+
+class SignedTokenAuthenticationTest(TestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create_superuser(
+            username='admin', email='admin@example.com', password='Correct-Horse-42'
+        )
+        self.user = CustomUser.objects.create_user(username='testuser', email='test@example.com')
+        self.library = Library.objects.create(name='Test Library')
+        self.book = Book.objects.create(title='Test Book')
+
+    def auth(self, token):
+        return {"HTTP_AUTHORIZATION": f"Bearer {token}"}
+
+    def test_obtain_token(self):
+        response = self.client.post(
+            reverse('token-obtain'), {'username': 'admin', 'password': 'Correct-Horse-42'}
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(signing.loads(response.json()['token'], salt=SALT)['user'], self.admin.pk)
+
+    def test_obtain_token_with_bad_credentials(self):
+        response = self.client.post(reverse('token-obtain'), {'username': 'admin', 'password': 'wrong'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_authentication_needs_no_query(self):
+        token, _ = issue_token(self.admin)
+        # Only the author list query itself
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('author-list'), **self.auth(token))
+        self.assertEqual(response.status_code, 200)
+
+    def test_create_entry_without_csrf(self):
+        token, _ = issue_token(self.admin)
+        client = self.client_class(enforce_csrf_checks=True)
+        response = client.post(
+            reverse('entry-create'),
+            {'user': self.user.pk, 'library': self.library.pk, 'book': self.book.pk},
+            **self.auth(token),
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Entry.objects.filter(user=self.user, book=self.book).exists())
+
+    def test_owner_can_update_entry(self):
+        entry = Entry.objects.create(user=self.user, library=self.library, book=self.book)
+        other_library = Library.objects.create(name='Other Library')
+        token, _ = issue_token(self.user)
+
+        response = self.client.patch(
+            reverse('entry-update', args=[entry.pk]),
+            {'library': other_library.pk},
+            content_type='application/json',
+            **self.auth(token),
+        )
+        self.assertEqual(response.status_code, 200)
+        entry.refresh_from_db()
+        self.assertEqual(entry.library, other_library)
+
+    def test_non_admin_token_cannot_create_entry(self):
+        token, _ = issue_token(self.user)
+        response = self.client.post(reverse('entry-create'), {}, **self.auth(token))
+        self.assertEqual(response.status_code, 403)
+
+    def test_expired_token(self):
+        token, _ = issue_token(self.admin, ttl=-1)
+        response = self.client.get(reverse('user-list'), **self.auth(token))
+        self.assertEqual(response.status_code, 401)
+
+    def test_tampered_token(self):
+        token, _ = issue_token(self.user)
+        payload = signing.loads(token, salt=SALT)
+        payload['superuser'] = payload['staff'] = True
+        forged = signing.dumps(payload, salt=SALT, key='not-the-secret-key')
+        response = self.client.get(reverse('user-list'), **self.auth(forged))
+        self.assertEqual(response.status_code, 401)
+
+    @override_settings(API_TOKEN_REVOCATION=True)
+    def test_revoked_token(self):
+        token, _ = issue_token(self.admin)
+        response = self.client.post(reverse('token-revoke'), **self.auth(token))
+        self.assertEqual(response.status_code, 204)
+
+        response = self.client.get(reverse('user-list'), **self.auth(token))
+        self.assertEqual(response.status_code, 401)
+        # Revocations are kept in the database, seen by every worker process
+        revoked = RevokedToken.objects.get()
+        self.assertEqual(revoked.expires.timestamp(), signing.loads(token, salt=SALT)["exp"])
+
+    @override_settings(API_TOKEN_REVOCATION=True)
+    def test_expired_revocations_are_dropped(self):
+        RevokedToken.objects.create(jti='old', expires=timezone.now() - datetime.timedelta(seconds=1))
+        token, _ = issue_token(self.admin)
+        self.client.post(reverse('token-revoke'), **self.auth(token))
+        self.assertEqual(RevokedToken.objects.count(), 1)
+        self.assertFalse(RevokedToken.objects.filter(jti='old').exists())
+
+    @override_settings(API_TOKEN_REVOCATION=True)
+    def test_revocation_in_shared_cache(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        caches = {
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'tokens': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory},
+        }
+        with override_settings(CACHES=caches, API_TOKEN_REVOCATION_CACHE='tokens'):
+            check_revocation_cache()
+            token, _ = issue_token(self.admin)
+            self.client.post(reverse('token-revoke'), **self.auth(token))
+            response = self.client.get(reverse('user-list'), **self.auth(token))
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(RevokedToken.objects.exists())
+
+    @override_settings(API_TOKEN_REVOCATION=True)
+    def test_local_memory_revocation_cache_is_refused(self):
+        with override_settings(API_TOKEN_REVOCATION_CACHE='default'):
+            with self.assertRaises(ImproperlyConfigured):
+                check_revocation_cache()
+
+    @override_settings(API_TOKEN_REVOCATION=True)
+    def test_verify_token_checks_the_database(self):
+        token, _ = issue_token(self.admin)
+        payload = verify_token(token)
+        RevokedToken.objects.create(jti=payload['jti'], expires=timezone.now() + datetime.timedelta(hours=1))
+        with self.assertRaisesMessage(InvalidToken, 'revoked'):
+            verify_token(token)
+
+    def test_revocation_disabled(self):
+        # Revocation is opt-in, and nothing is stored or looked up without it
+        token, _ = issue_token(self.admin)
+        self.client.post(reverse('token-revoke'), **self.auth(token))
+        response = self.client.get(reverse('user-list'), **self.auth(token))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(RevokedToken.objects.exists())
+        with self.assertNumQueries(0):
+            verify_token(token)
+        with override_settings(API_TOKEN_REVOCATION_CACHE='default'):
+            check_revocation_cache()
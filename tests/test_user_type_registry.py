@@ -0,0 +1,46 @@
+from django.test import TestCase, TransactionTestCase
+
+from api_task.models import CustomUser, UserType
+from api_task.registry import user_types
+
+
+class UserTypeRegistryTest(TransactionTestCase):
+    def setUp(self):
+        user_types.invalidate()
+        self.admin_type = UserType.objects.create(name=UserType.ADMIN)
+        self.user_type = UserType.objects.create(name=UserType.USER)
+        user_types.warm()
+
+    def tearDown(self):
+        user_types.invalidate()
+
+    def test_save_skips_user_type_lookup(self):
+        # A warm registry leaves only the INSERT of the user itself
+        with self.assertNumQueries(1):
+            user = CustomUser.objects.create(username='testuser', email='test@example.com')
+        self.assertEqual(user.type_id, self.user_type.pk)
+
+    def test_superuser_gets_admin_type(self):
+        superuser = CustomUser.objects.create_superuser(username='admin', email='admin@example.com')
+        self.assertEqual(superuser.type_id, self.admin_type.pk)
+
+    def test_renamed_user_type_invalidates_registry(self):
+        # Renaming the cached type must not leave a stale id behind
+        self.user_type.name = 'renamed'
+        self.user_type.save()
+        user = CustomUser.objects.create(username='testuser', email='test@example.com')
+        self.assertNotEqual(user.type_id, self.user_type.pk)
+        self.assertEqual(user.type.name, UserType.USER)
+
+    def test_deleted_user_type_invalidates_registry(self):
+        self.user_type.delete()
+        user = CustomUser.objects.create(username='testuser', email='test@example.com')
+        self.assertEqual(user.type.name, UserType.USER)
+
+
+class UserTypeRegistryRollbackTest(TestCase):
+    def test_lookup_in_transaction_is_not_cached(self):
+        # Ids resolved inside an uncommitted transaction are never remembered
+        user_types.invalidate()
+        user_types.get_id('rolled_back')
+        self.assertNotIn('rolled_back', user_types._ids)